@@ -0,0 +1,341 @@
+##################################################
+#    This file is part of the HABTracker project for tracking high altitude balloons.
+#
+#    Copyright (C) 2019,2020,2021 Jeff Deaton (N6BA)
+#
+#    HABTracker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    HABTracker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with HABTracker.  If not, see <https://www.gnu.org/licenses/>.
+#
+##################################################
+
+import sys
+import time
+
+
+##################################
+# The KISS and AX.25 codec
+#
+# The low level encoding and decoding shared by the KISS processor (frames from direwolf) and the RTP decoders (frames from
+# ka9q-radio).  Everything here works on whole bytes objects (replace, translate, slicing) rather than a byte at a time.
+##################################
+
+KISS_FEND = b'\xc0'      # Frame start/end marker
+KISS_FESC = b'\xdb'      # Escape character
+KISS_TFEND = b'\xdc'     # If after an escape, means there was an 0xC0 in the source message
+KISS_TFESC = b'\xdd'     # If after an escape, means there was an 0xDB in the source message
+
+KISS_FESC_TFEND = KISS_FESC + KISS_TFEND
+KISS_FESC_TFESC = KISS_FESC + KISS_TFESC
+
+AX25_FLAG = 0x7e
+AX25_CONTROL_FIELD = 0x03       # UI frame
+AX25_PROTOCOL_ID = 0xf0         # no layer 3 protocol
+AX25_ADDRESS_LEN = 7
+
+# the maximum number of digipeaters in an AX.25 address field
+AX25_MAX_DIGIPEATERS = 8
+
+# Each callsign character in an AX.25 address is shifted left by one bit, this table undoes that for a whole address with bytes.translate
+SHIFT_TABLE = bytes(i >> 1 for i in range(256))
+
+# AX.25 addresses decoded so far.  The same few stations, digipeaters and destinations show up over and over again so this saves
+# decoding them each time.  Bounded in case of a stream of garbage.
+ADDRESS_CACHE_SIZE = 4096
+_addresses = {}
+
+
+##################################
+# remove the KISS escaping from a frame
+##################################
+def kissUnescape(data: bytes)->bytes:
+    """
+    Recover the FEND and FESC bytes that were escaped within a KISS frame.
+    """
+
+    if KISS_FESC not in data:
+        return data
+
+    # In a properly escaped frame every FESC starts an escape sequence, so replacing the escaped FENDs first can't create a false match
+    # for the escaped FESCs (the other order can, ex. FESC TFESC TFEND).
+    return data.replace(KISS_FESC_TFEND, KISS_FEND).replace(KISS_FESC_TFESC, KISS_FESC)
+
+
+##################################
+# KISS escape a frame
+##################################
+def kissEscape(data: bytes)->bytes:
+    """
+    Escape any FEND and FESC bytes within a frame so it can be sent in KISS framing.
+    """
+
+    # FESC first so the FESC bytes added by escaping the FENDs aren't escaped again
+    return data.replace(KISS_FESC, KISS_FESC_TFESC).replace(KISS_FEND, KISS_FESC_TFEND)
+
+
+##################################
+# split a KISS frame into the channel (the port from the command byte) and the AX.25 frame it carries
+##################################
+def decodeKISS(data: bytes)->tuple:
+    """
+    Unescape a KISS frame returning a tuple of the channel and the AX.25 frame.  Leading and trailing FEND bytes are optional.  Returns
+    (None, None) for an empty frame.
+    """
+
+    frame = kissUnescape(data.strip(KISS_FEND))
+    if not frame:
+        return (None, None)
+
+    return (frame[0] >> 4, frame[1:])
+
+
+##################################
+# convert a 7 byte AX.25 address to a callsign
+##################################
+def decodeAddress(address: bytes)->str:
+    """
+    Convert an AX.25 address to a callsign string (with its SSID, if it isn't zero).  The address argument should be at least 7 bytes,
+    otherwise None is returned.
+    """
+
+    address = bytes(address[0:AX25_ADDRESS_LEN])
+    callsign = _addresses.get(address)
+
+    if callsign is None:
+        if len(address) < AX25_ADDRESS_LEN:
+            return None
+
+        # right-shift each byte of the name by 1 bit, the low bit of each is always 0 so the result is 7 bit ASCII
+        name = address[0:6].translate(SHIFT_TABLE).decode('ascii', errors='ignore').strip()
+
+        # the SSID.  If it's '0' then just return the station callsign
+        ssid = (address[6] >> 1) & 0xf
+        callsign = f"{name}-{ssid}" if ssid else name
+
+        if len(_addresses) >= ADDRESS_CACHE_SIZE:
+            _addresses.clear()
+        _addresses[address] = callsign
+
+    return callsign
+
+
+##################################
+# decode the address field at the start of an AX.25 frame
+##################################
+def decodeAddressField(frame: bytes, pos: int = 0, maxdigipeaters: int = None)->tuple:
+    """
+    Decode the destination, source, and digipeater addresses of an AX.25 frame starting at pos.  Returns a tuple of the destination,
+    the source, a list of the digipeaters, and the position just past the last address decoded (i.e. the control field).  Returns None
+    if the frame is too short for the destination and source.
+
+    Digipeaters are decoded until one has its extension bit set (the end of the address field), maxdigipeaters have been decoded, the
+    frame runs out, or an address decodes to an empty callsign.
+    """
+
+    if len(frame) < pos + 2 * AX25_ADDRESS_LEN:
+        return None
+
+    destination = decodeAddress(frame[pos:pos + 7])
+    source = decodeAddress(frame[pos + 7:pos + 14])
+
+    # the extension bit on the last byte of an address is set on the final address of the field
+    ext = frame[pos + 13] & 0x01
+    pos += 14
+
+    digipeaters = []
+    length = len(frame)
+    while not ext and pos + AX25_ADDRESS_LEN <= length:
+        if maxdigipeaters is not None and len(digipeaters) >= maxdigipeaters:
+            break
+
+        digi = decodeAddress(frame[pos:pos + 7])
+        if not digi:
+            break
+
+        digipeaters.append(digi)
+        ext = frame[pos + 6] & 0x01
+        pos += 7
+
+    return (destination, source, digipeaters, pos)
+
+
+##################################
+# encode a callsign as an AX.25 address
+##################################
+def encodeAddress(callsign: str, final: bool = False)->bytes:
+    """
+    Encode a callsign (ex. KC0D-1 or WIDE2-1) as a 7 byte AX.25 address.  The final argument denotes if this is the last address in the
+    address field.
+    """
+
+    call, _, ssid = callsign.upper().partition("-")
+    name = call[0:6].ljust(6).encode('ascii', errors='replace')
+
+    return bytes(c << 1 for c in name) + bytes([((int(ssid or 0) & 0xf) << 1) | 0x60 | (0x01 if final else 0)])
+
+
+##################################
+# encode an APRS packet as a KISS framed AX.25 UI frame
+##################################
+def encodeKISS(source: str, destination: str, path: list, info: bytes, channel: int = 0)->bytes:
+    """
+    Build an AX.25 UI frame for the source, destination, and digipeater path with info as its information part, then wrap it in a KISS
+    data frame for the channel (ready for transmission by direwolf).
+    """
+
+    path = list(path or [])
+    addresses = [destination, source] + path
+
+    frame = b''.join(encodeAddress(a, i == len(addresses) - 1) for i, a in enumerate(addresses))
+    frame += bytes([AX25_CONTROL_FIELD, AX25_PROTOCOL_ID])
+
+    if isinstance(info, str):
+        info = info.encode('utf-8', errors='ignore')
+
+    return KISS_FEND + kissEscape(bytes([(channel & 0xf) << 4]) + frame + info) + KISS_FEND
+
+
+
+##################################
+# Golden frames
+#
+# KISS frames as read from direwolf (with their FENDs) and the channel and APRS text the KISS processor decodes them to, then AX.25
+# frames as carried by ka9q-radio's RTP stream (with their trailing FCS) and the APRS text the RTP decoder produces.  The expected
+# results were recorded from the byte at a time decoders this codec replaced.  None means the frame is rejected.
+##################################
+GOLDEN_KISS = (
+    # a typical packet with a digipeater path
+    ("c00082a0a4a640406096866088404062ae92888a624062ae92888a64406303f03a4b43304420202020203a74657374c0",
+        0, "KC0D-1>APRS,WIDE1-1,WIDE2-1::KC0D     :test"),
+    # a position report with 8 digipeaters and SSIDs up to 15
+    ("c00082a0a4a64040609686608840407eae92888a62406296a8a4a6ae4060ae92888a62406096866088404062a4a490a69a406eb0a0829e964064ae92888a66406296a8a4a6ae40ff03f02f3031313931327a333934362e32344e2f31303435392e3034575f3237302f3030342f413d303331323334c0",
+        0, "KC0D-15>APRS,WIDE1-1,KTRSW,WIDE1,KC0D-1,RRHSM-7,XPAOK-2,WIDE3-1,KTRSW-15:/011912z3946.24N/10459.04W_270/004/A=031234"),
+    # escaped FEND and FESC bytes in the information part
+    ("c00082a0a4a640406096866088404062ae92888a62406303f03e65736361706564dbdc616e64dbdd6279746573dbdddcc0",
+        0, "KC0D-1>APRS,WIDE1-1:>escapedandbytes"),
+    # an escaped FEND in the command byte (channel 12)
+    ("c0dbdc82a0a4a64040609686608840406303f03e6368616e6e656c203132c0",
+        12, "KC0D-1>APRS:>channel 12"),
+    # channel 1, no digipeaters, trailing whitespace and CR/LF
+    ("c01082a0b48aa662609c60868298987303f021333934362e32344e2f31303435392e3034573e20200d0affc0",
+        1, "N0CALL-9>APZES1:!3946.24N/10459.04W>"),
+    # UTF-8 in the information part
+    ("c00082a0a4a640406096866088404064ae92888a64406503f03e6772c3bcc39f6520e29883c0",
+        0, "KC0D-2>APRS,WIDE2-2:>grüße ☃"),
+    # a U frame other than UI
+    ("c00082a0a4a6404060968660884040632ff03e7361626dc0",
+        0, "KC0D-1>APRS:"),
+    # not a U frame (an I frame)
+    ("c00082a0a4a64040609686608840406300f03e6e6f74205549c0",
+        None, None),
+    # too short
+    ("c00082a0a4a6406060968660c0",
+        None, None),
+    # the address field runs off the end of the frame
+    ("c00082a0a4a640406096866088404062ae92888ac0",
+        None, None),
+    # no control field
+    ("c00082a0a4a640406096866088404063c0",
+        None, None),
+)
+
+GOLDEN_RTP_AX25 = (
+    # a typical packet with a digipeater path
+    ("82a0a4a640406096866088404062ae92888a624062ae92888a64406303f03a4b43304420202020203a74657374beef",
+        "KC0D-1>APRS,WIDE1-1,WIDE2-1::KC0D     :test"),
+    # with the HDLC flags left on
+    ("7e82a0a4a640406096866088404062ae92888a624062ae92888a64406303f03e666c6167730d0abeef7e",
+        "KC0D-1>APRS,WIDE1-1,WIDE2-1:>flags"),
+    # a digipeated packet, the last non-WIDE digipeater is tagged
+    ("82a0a4a640406096866088404062ae92888a62406296a8a4a6ae40e0ae92888a64406303f03e64696769706561746564beef",
+        "KC0D-1>APRS,WIDE1-1,KTRSW*,WIDE2-1:>digipeated"),
+    # no digipeaters, non UTF-8 bytes in the information part
+    ("82a0a4a64040609686608840407f03f0213339343628b0f2e4e4beef",
+        "KC0D-15>APRS:!3946("),
+    # two non-WIDE digipeaters
+    ("82a0b48aa66260968660884040629c60868298986296a8a4a6ae4064ae92888a64406103f03e74776f206469676973beef",
+        "KC0D-1>APZES1,N0CALL-1,KTRSW-2*,WIDE2:>two digis"),
+    # a U frame other than UI
+    ("82a0a4a6404060968660884040632ff03e7361626dbeef",
+        "KC0D-1>APRS:>sabm"),
+    # not a U frame (an S frame)
+    ("82a0a4a64040609686608840406301f03e6e6f74205549beef",
+        None),
+    # too short
+    ("82a0a4a6406060968660",
+        None),
+)
+
+
+
+##################################################
+# main
+#
+# Check the codec against the golden frames, then measure the decode throughput of the KISS processor and the RTP AX.25 decoder
+##################################################
+def main():
+
+    from kissprocessor import KISSProcessor
+    from decoders import parse_ax25
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    kiss = KISSProcessor()
+
+    def kissResult(frame):
+        p = kiss.decode(frame)
+        return (p.properties["channel"], p.text) if p else (None, None)
+
+    def rtpResult(frame):
+        p = parse_ax25(frame)
+        return p["utf8text"] if p and p["is_aprs"] else None
+
+    failures = 0
+    for name, corpus, decode in (("KISS", GOLDEN_KISS, kissResult), ("RTP AX.25", GOLDEN_RTP_AX25, rtpResult)):
+        for i, (frame, *expected) in enumerate(corpus):
+            expected = tuple(expected) if len(expected) > 1 else expected[0]
+            got = decode(bytes.fromhex(frame))
+            if got != expected:
+                failures += 1
+                print(f"   {name} golden frame {i}:  expected {expected!r}, got {got!r}")
+        print(f"{name}:  {len(corpus)} golden frames checked")
+
+    if failures:
+        print(f"{failures} golden frames failed")
+        sys.exit(1)
+
+    # the decodable frames from each corpus, cycled through n times
+    for name, corpus, decode in (("KISS", GOLDEN_KISS, kiss.decode), ("RTP AX.25", GOLDEN_RTP_AX25, parse_ax25)):
+        frames = [bytes.fromhex(f) for f, *expected in corpus if expected[-1]]
+        start = time.perf_counter()
+        for i in range(n):
+            for f in frames:
+                decode(f)
+        secs = time.perf_counter() - start
+        print(f"{name} decode:  {n * len(frames) / secs:.0f} frames/sec ({secs / (n * len(frames)) * 1e6:.2f}us per frame)")
+
+    # the low level pieces on their own
+    escaped = bytes.fromhex(GOLDEN_KISS[2][0])
+    start = time.perf_counter()
+    for i in range(n * 10):
+        kissUnescape(escaped)
+    print(f"kissUnescape:  {(time.perf_counter() - start) / (n * 10) * 1e6:.2f}us per frame")
+
+    address = bytes.fromhex(GOLDEN_KISS[0][0])[9:16]
+    start = time.perf_counter()
+    for i in range(n * 10):
+        decodeAddress(address)
+    print(f"decodeAddress:  {(time.perf_counter() - start) / (n * 10) * 1e6:.2f}us per address")
+
+
+if __name__ == "__main__":
+    main()
@@ -38,9 +38,17 @@ from logging.handlers import QueueHandler, QueueListener
 
 from decoders import parse_RTP_AX25
 from packet import Packet
+from framebuffer import FrameBuffer
+from rtpsequence import SequenceTracker
+from igateegress import DupeFilter, LatencyTracker, dupeKey
+from igatestats import IgateStatistics
+from radiuscontroller import RadiusController
+from serverpool import ServerPool, parseServers
+from packetqueue import PacketClassifier
 import kissprocessor
 import habconfig
 import queries
+import geodesy
 
 
 class ServerConnectionError(Exception):
@@ -108,6 +116,10 @@ class PacketHandler:
     # for decoding, this function should return a Packet object
     transform: callable = None
 
+    # priority function (decoding only).  Returns the priority class of a Packet object, which is saved as the packet's "priority" property
+    # so the queue knows which packets to drop first when it's full.
+    priority: callable = None
+
 
 ##################################    
 # the Server class
@@ -254,6 +266,7 @@ class PacketStream:
     stopevent: mp.Event = None
     can_send: bool = False
     can_read: bool = True
+    alternates: list = None
     sock: socket.socket = field(init=False)
     logger: logging.Logger = field(init=False)
     okay: mp.Event = field(init=False)
@@ -281,6 +294,9 @@ class PacketStream:
         # The network socket connection
         self.sock = None
 
+        # The receive buffer that frames (i.e. lines or KISS frames) are carved out of.  This is created when a connection is made.
+        self.framebuffer = None
+
         # handlers for dealing with packets being written too and read from the network socket
         self.writehandlers = []
         self.readhandlers = []
@@ -288,6 +304,17 @@ class PacketStream:
         # internal (to this class) Event object that when triggered causes threads to stop running
         self.okay = mp.Event()
 
+        # The servers we can connect to:  this one first, then any alternates, in order of preference.  The connection fails over between
+        # them (see serverpool.py) and self.server is always the one we're connected to (or were last).
+        self.pool = ServerPool(servers = [self.server] + list(self.alternates or []), name = self.server.nickname, loggingqueue = self.loggingqueue)
+
+        # the function to open a standby connection with (see establish()), None if this stream doesn't keep one
+        self.standby = None
+
+        # a connection that's heard nothing for this many seconds is taken to be dead (0 to wait forever), and when we last heard something
+        self.idletimeout = 0
+        self.lastheard = None
+
         # This is the default queue aging parameter.  This is used to determine if a packet that has been lanquishing in a queue for <insert time>.
         # If the packet has been in the queue for longer than this time (in seconds), then don't send it to the socket.  If this variable is 0, then a 
         # packet's time in the queue isn't evaluated and a packet can have lived in the queue for infinite time.
@@ -321,17 +348,73 @@ class PacketStream:
         self.logger.debug(f"{self.server.nickname} disconnected.")
 
 
+    def handshake(self, server: Server, timeout: float)->tuple:
+        """
+        Open a connection to a server (within timeout seconds), returning a tuple of the socket and a FrameBuffer for it.  Anything that
+        has to be done before the connection can be used (ex. logging in) is done here, it's run in parallel for several servers.
+        """
+
+        sock = socket.create_connection((server.hostname, server.portnum), timeout = timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+        return (sock, FrameBuffer(self.delimiter))
+
+
+    def promote(self, sock: socket.socket)->bool:
+        """
+        Get a standby connection ready to take over.  Returns False if it couldn't be.
+        """
+        return True
+
+
+    def establish(self)->tuple:
+        """
+        Connect to the best server available:  the standby connection if there is one, otherwise the servers are tried in parallel.  Returns
+        a tuple of (socket, FrameBuffer), or None if none of the servers could be reached.
+        """
+
+        conn = self.pool.takeStandby()
+        if conn is not None:
+            server, sock, framebuffer = conn
+            self.logger.info(f"{server.nickname} switching over to the standby connection with {server.hostname}:{server.portnum}")
+
+            if not self.promote(sock):
+                sock.close()
+                self.pool.down(server, "standby connection failed")
+                conn = None
+
+        if conn is None:
+            conn = self.pool.connect(self.handshake, self.stopevent)
+
+        if conn is None:
+            self.logger.error(f"{self.server.nickname}: unable to connect to {', '.join(f'{s.hostname}:{s.portnum}' for s in self.pool.servers)}")
+            return None
+
+        self.server, sock, framebuffer = conn
+
+        # keep a standby connection to another server from now on (if we can)
+        if self.standby is not None:
+            self.pool.keepStandby(self.standby, self.stopevent)
+
+        return (sock, framebuffer)
+
+
     def connect(self)->bool:
         
         if self.sock:
             return True
 
+        conn = self.establish()
+        if conn is None:
+            self.okay.set()
+            return False
+
         try:
-            # create the socket, set options, set the socket to be non-blocking
-            self.sock = socket.create_connection((self.server.hostname, self.server.portnum) , timeout = 2)
-            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            # the socket is non-blocking from here on.  The FrameBuffer has anything that was read along with the login.
+            self.sock, self.framebuffer = conn
             self.sock.setblocking(0)
             self.peername = self.sock.getpeername()[0]
+            self.lastheard = time.monotonic()
 
             # clear the internal flag (if set)
             self.okay.clear()
@@ -339,20 +422,30 @@ class PacketStream:
         except (socket.error) as e:
             # if there was a socket error then return False
             self.logger.error(f"{self.server.nickname}: connection error: {e}")
+            self.pool.down(self.server, str(e))
             self.disconnect()
             self.okay.set()
             self.sock = None
             return False
 
-        #except (KeyboardInterrupt, SystemExit) as e:
-        #    self.logger.debug(f"{self.server.nickname} base-connect: got signal to end.")
-        #    self.disconnect()
-        #    self.okay.set()
-        #    return False
-
         return True
 
 
+    def retryDelay(self, trycount: int)->float:
+        """
+        The number of seconds to wait before trying to connect again, after trycount failed attempts in a row.  The servers that failed
+        are held down for a while (see serverpool.py), so this waits until one is available again.
+        """
+        return max(self.pool.retryDelay(), 0.5)
+
+
+    def sessionEnded(self)->bool:
+        """
+        Called when a connection ends.  Returns True to reconnect right away, or False to wait (see retryDelay) before reconnecting.
+        """
+        return False
+
+
     def send(self, data: str)->None:
         """ 
         Send a single line of text to the socket
@@ -396,12 +489,16 @@ class PacketStream:
         self.readhandlers = handlers
 
 
-    def getPacketFromQueue(self)->list:
+    def getPacketFromQueue(self, timeout: float = 0, limit: int = 64)->list:
         """
-        This will loop through the input packet handlers returning a list of packets properly encoded for sending to a network socket.
+        This will loop through the input packet handlers returning a list of (Packet, bytes) tuples, the packets taken from the queues
+        and their bytes properly encoded for sending to a network socket.
+
+        Everything waiting on the queues is taken (up to limit packets from each queue) so it can be sent all at once.  If there's nothing
+        waiting and timeout is given, this waits up to timeout seconds on the first queue for a packet to arrive.
         """
 
-        # the list of packets we need to write to the socket connection.  These should be binary strings.
+        # the list of packets we need to write to the socket connection.  The encoded packets should be binary strings.
         packetlist = []
 
         # Loop through the packethandlers checking for any data available on their queue
@@ -409,50 +506,81 @@ class PacketStream:
 
             # loop through the list of queues for this packet handler
             for (q, qname) in ph.q:
-                try:
+                for i in range(limit):
+                    try:
 
-                    # get a packet from the queue
-                    packet = q.get_nowait()
+                        # get a packet from the queue
+                        packet = q.get_nowait()
 
-                    self.logger.debug(f"{self.server.nickname} getPacketFromQueue:  {qname}, [{q.qsize()}]  {packet}")
+                    except (Empty) as e:
+                        # the queue was empty, but we don't care...go check the next queue
+                        break
 
-                    # run this packet through the filter (if it exists)
-                    packet = ph.pfilter(packet) if ph.pfilter else packet
+                    self.logger.debug("%s getPacketFromQueue:  %s  %s", self.server.nickname, qname, packet)
 
-                    # Convert/encode the packet before sending
-                    packetbytes = ph.transform(packet) if ph.transform else packet.bytestring
+                    # filter and encode the packet
+                    packetbytes = self.encodePacket(ph, packet)
 
                     # if we ended up with a packet after filtering and encoding, then add it to our packet list
                     if packetbytes:
 
-                        # check how long this packet has been in the queue
-                        if self.queue_age > 0:
+                        # add this packet to the list we'll return
+                        packetlist.append((packet, packetbytes))
+
+        # Nothing was waiting.  Block on the first queue so a packet is sent as soon as it's queued, rather than polling.
+        if not packetlist and timeout > 0 and self.writehandlers and self.writehandlers[0].q:
+            ph = self.writehandlers[0]
+            q, qname = ph.q[0]
+            try:
+                packet = q.get(timeout = timeout)
+            except (Empty):
+                return packetlist
+
+            self.logger.debug("%s getPacketFromQueue:  %s  %s", self.server.nickname, qname, packet)
+            packetbytes = self.encodePacket(ph, packet)
+            if packetbytes:
+                packetlist.append((packet, packetbytes))
+
+            # and anything queued along with it
+            packetlist += self.getPacketFromQueue(limit = limit)
+
+        return packetlist
 
-                            # time when this packet was added to this queue
-                            receive_time = int(packet.properties["decode_time"]) if "decode_time" in packet.properties else int(packet.properties["queue_time"]) if "queue_time" in packet.properties else ts
+    def packetSent(self, packet: Packet)->None:
+        """
+        Called for each packet after it's been written to the network socket
+        """
+        pass
 
-                            # Amount of time this packet has spent in the queue
-                            time_in_queue = int(time.time()) - receive_time
+    def encodePacket(self, ph: PacketHandler, packet: Packet)->bytes:
+        """
+        Run a packet taken from one of the write handler's queues through that handler's filter and encoder.  Returns the byte string to
+        write to the network socket, or None if the packet was filtered out or has been sitting in the queue for too long.
+        """
 
-                            self.logger.debug(f"{self.server.nickname} getPacketFromQueue: {receive_time=} queue_time={packet.properties['queue_time'] if 'queue_time' in packet.properties else None} decode_time={packet.properties['decode_time'] if 'decode_time' in packet.properties else None} {time_in_queue=}")
-                            
-                            # if the time this packet spent in the queue is < the queue_age then add it to the list we'll return
-                            if time_in_queue < self.queue_age:
+        # run this packet through the filter (if it exists)
+        packet = ph.pfilter(packet) if ph.pfilter else packet
 
-                                # add this packet to the list we'll return
-                                packetlist.append(packetbytes)  
+        # Convert/encode the packet before sending
+        packetbytes = ph.transform(packet) if ph.transform else packet.bytestring if packet else None
 
-                        else:
-                            # queue_age limits not being inforced.
+        # check how long this packet has been in the queue
+        if packetbytes and self.queue_age > 0:
 
-                            # add this packet to the list we'll return
-                            packetlist.append(packetbytes)  
+            # time when this packet was added to this queue
+            receive_time = int(packet.properties["decode_time"]) if "decode_time" in packet.properties else int(packet.properties["queue_time"]) if "queue_time" in packet.properties else int(time.time())
 
-                except (Empty) as e:
-                    # the queue was empty, but we don't care...go check the next queue
-                    pass
+            # Amount of time this packet has spent in the queue
+            time_in_queue = int(time.time()) - receive_time
+
+            self.logger.debug(f"{self.server.nickname} encodePacket: {receive_time=} queue_time={packet.properties['queue_time'] if 'queue_time' in packet.properties else None} decode_time={packet.properties['decode_time'] if 'decode_time' in packet.properties else None} {time_in_queue=}")
+
+            # if the time this packet spent in the queue is >= the queue_age then it's too old to send
+            if time_in_queue >= self.queue_age:
+                return None
+
+        return packetbytes
 
-        return packetlist
 
     def putPacketOnQueue(self, packet: bytes)->None:
         """
@@ -461,59 +589,29 @@ class PacketStream:
         The packet argument is the byte string that came from the network socket.
         """
 
-        # point at which we no longer add packets to the queue (i.e. these packets are dropped)
-        q_low_watermark = 200
-
-        # point at which we clear the queue.  Presumably because there's no catching up...because the downstream consumers aren't working this queue.
-        q_high_watermark = 250
-
         # loop through each packet handler
         for ph in self.readhandlers:
 
                 # Convert/decode the packet.  If there isn't a transform then we default to UTF-8...but we shouldn't do this since the packet could be framed (ex. RTP, AX25, etc.)
-                packetobj = ph.transform(packet) if ph.transform else Packet(text = packet.decode(encoding='utf-8', errors='ignore'), frequency=None, source="unknown")
+                packetobj = ph.transform(packet) if ph.transform else Packet(text = str(packet, encoding='utf-8', errors='ignore'), frequency=None, source="unknown")
 
                 # run this packet through the filter (if it exists)
                 packetobj = ph.pfilter(packetobj) if ph.pfilter else packetobj
 
                 # if we ended up with a packet after filtering and decoding, then put this packet on each queue in this packet handler
                 if packetobj:
-                    for (q, qname) in ph.q:
-                        try:
-
-                            # number of items in the queue
-                            size = q.qsize()
 
-                            # check the size of the queue to determine if we should add another packet on top.
-                            if size < q_low_watermark:
-                                self.logger.debug(f"{self.server.nickname}  placing packet on {qname}[{size}]:  {packetobj}")
-                                packetobj.properties["queue_time"] = int(time.time())
-                                q.put(packetobj)  
+                    # The priority class of this packet.  When a queue is full it drops its oldest, lowest priority packets first (and keeps
+                    # count of what it's dropped), so packets from the beacons we're tracking aren't lost among the general traffic.
+                    if ph.priority:
+                        packetobj.properties["priority"] = ph.priority(packetobj)
 
-                            elif size > q_high_watermark:
-                                # Above the high_watermark.  Assumed at this point that we can't catch up, so we clear the queue
-                                self.logger.warn(f"{self.server.nickname} clearing {qname}[{size}] [above high water mark]") 
+                    packetobj.properties["queue_time"] = int(time.time())
 
-                                # Attempt to clear the queue
-                                while not q.empty():
-                                    try:
-                                        q.get(block=False)
-                                    except Empty:
-                                        continue
-
-                                self.logger.warn(f"{self.server.nickname} {qname} cleared. qsize={q.qsize()}") 
-
-                                # with the queue cleared, add this most recent packet to the queue.
-                                packetobj.properties["queue_time"] = int(time.time())
-                                q.put(packetobj)  
-
-                            else:
-                                # queue is > than the low_watermark, but < high_watermark.  
-                                self.logger.warn(f"{self.server.nickname} placing packet on {qname}[{size}] [above low water mark]: {packetobj}")
-
-                                # Finally, go ahead and place the new packet on the queue
-                                packetobj.properties["queue_time"] = int(time.time())
-                                q.put(packetobj)  
+                    for (q, qname) in ph.q:
+                        try:
+                            self.logger.debug(f"{self.server.nickname}  placing packet on {qname}:  {packetobj}")
+                            q.put(packetobj)  
 
                         except (Full) as e:
                             # the queue was full, but we don't care...go check the next packet handle queue.
@@ -538,18 +636,20 @@ class PacketStream:
 
                 try:
 
-                    # get a list of packets from the the writehandlers (PacketHandler objects)
-                    packetlist = self.getPacketFromQueue()
+                    # get a list of packets from the the writehandlers (PacketHandler objects), waiting a short time for one if the queues are empty
+                    packetlist = self.getPacketFromQueue(timeout = 0.5)
 
                     # write any returned packets to he socket
                     if packetlist:
-                        for p in packetlist: 
+                        self.logger.debug("%s: sending %d packets to server: %s", self.server.nickname, len(packetlist), packetlist)
 
-                            self.logger.debug(f"{self.server.nickname}: sending packet to server: {p}")
+                        # send these packets to the server all at once
+                        self.sock.sendall(b"".join(p for packet, p in packetlist))
 
-                            # send this packet to the server
-                            self.sock.sendall(p)
-                    else:
+                        for packet, p in packetlist:
+                            self.packetSent(packet)
+
+                    elif not self.writehandlers:
 
                         # wait a short time before retrying to get an item from the queues
                         self.okay.wait(1)
@@ -577,8 +677,10 @@ class PacketStream:
         if not self.sock:
             return None
 
-        #Initial loop variables
-        bigbuffer = b''
+        # a line left over from an earlier read
+        line = self.framebuffer.next()
+        if line is not None:
+            return line
 
         # loop continuously unless our connection fails or the stopevent is set
         while not self.stopevent.is_set() and not self.okay.is_set():
@@ -589,20 +691,12 @@ class PacketStream:
                 isready = self.ready()
                 if isready[0] and self.sock:
 
-                    # Try to read at most 4096 bytes from the socket
-                    data = self.sock.recv(4096)
-
-                    if data:
-                        # append whatever data was read to the bigbuffer
-                        bigbuffer += data
-
-                        # parse the big buffer carving out whole lines.  This trims down the bigbuffer on each iteration.
-                        while self.delimiter in bigbuffer:
-
-                            # split out indivdual lines from the bigbuffer
-                            line, bigbuffer = bigbuffer.split(self.delimiter, 1)
+                    # Try to read at most 4096 bytes from the socket straight into the receive buffer
+                    if self.framebuffer.recv_into(self.sock):
 
-                            # we've found one line, return it
+                        # we've found one line, return it.  Anything read after it stays in the buffer for the next call.
+                        line = self.framebuffer.next()
+                        if line is not None:
                             return line
                 else:
 
@@ -632,11 +726,12 @@ class PacketStream:
         if not self.sock:
             return None
 
-        #Initial loop variables
-        bigbuffer = b''
-
         self.logger.debug(f"{self.server.nickname} read_thread: starting socket read loop")
 
+        # anything that arrived along with the login
+        for line in self.framebuffer.frames():
+            self.putPacketOnQueue(line)
+
         # loop continuously unless our connection fails or the stopevent is set
         while not self.stopevent.is_set() and not self.okay.is_set():
 
@@ -646,34 +741,26 @@ class PacketStream:
                 isready = self.ready()
                 if isready[0] and self.sock:
 
-                    # Try to read at most 4096 bytes from the socket
-                    data = self.sock.recv(4096)
-
-                    #if not data:
-                        # sock.recv returns empty if the connection drops
-                    #    self.logger.error(f"{self.server.nickname}:  {self.server.hostname} socket.recv(): returned empty")
+                    # Try to read at most 4096 bytes from the socket straight into the receive buffer
+                    if self.framebuffer.recv_into(self.sock):
+                        self.lastheard = time.monotonic()
 
-                        # close our connection
-                    #    self.disconnect()
-                    #    self.okay.set()
+                        # carve out whole lines, looping our read handlers decoding each packet and adding it to the output queues.
+                        for line in self.framebuffer.frames():
+                            self.putPacketOnQueue(line)
 
-                    #else:
-                        #self.logger.debug(f"{self.server.nickname}  read_thread data: {data}")
-
-                    if data:
-
-                        # append whatever data was read to the bigbuffer
-                        bigbuffer += data
-
-                        # parse the big buffer carving out whole lines.  This trims down the bigbuffer on each iteration.
-                        while self.delimiter in bigbuffer:
+                    else:
+                        # the server closed the connection
+                        self.logger.error(f"{self.server.nickname} read_thread: connection closed by {self.server.hostname}")
+                        self.disconnect()
+                        self.okay.set()
 
-                            # split out indivdual lines from the bigbuffer
-                            line, bigbuffer = bigbuffer.split(self.delimiter, 1)
+                elif self.idletimeout and time.monotonic() - self.lastheard > self.idletimeout:
+                    # Nothing heard for too long, the connection is dead (ex. a cellular link that dropped without the connection being closed)
+                    self.logger.error(f"{self.server.nickname} read_thread: nothing heard from {self.server.hostname} for {self.idletimeout}s")
+                    self.disconnect()
+                    self.okay.set()
 
-                            # Loop our read handlers decoding this packet and adding it to the output queues.
-                            if line != None:
-                                self.putPacketOnQueue(line)
                 else:
                     # Socket wasn't ready
                     # wait a little bit before trying to read data from the socket again
@@ -736,6 +823,9 @@ class PacketStream:
         # keep track of how many connection retries have been attempted
         trycount = 0
 
+        # set when a connection ends, as the first attempt to reconnect is made without waiting
+        reconnect = False
+
         self.logger.debug(f"{self.server.nickname} in run function.")
 
         try:
@@ -776,26 +866,23 @@ class PacketStream:
                     self.okay.set()
                     online = False
 
+                    # streams that can fail over to another server reconnect right away, the others wait before retrying
+                    reconnect = self.sessionEnded()
+
                     self.logger.debug(f"{self.server.nickname} run().  Done with threads")
 
                 if not self.stopevent.is_set():
 
-                    # the retry delay in seconds
-                    retry_delay = 1
-
-                    # Increment the trycount
-                    trycount += 1
-
-                    #try:
-                    if trycount > 5:
-
-                        # as the try count increases increase the wait time between retries
-                        retry_delay = (trycount**2 if trycount**2 < 121 else 120)
+                    if reconnect:
+                        reconnect = False
 
-                    self.logger.debug(f"{self.server.nickname} run loop: {retry_delay=}, {trycount=}")
+                    else:
+                        # Increment the trycount and wait before retrying to connect
+                        trycount += 1
+                        retry_delay = self.retryDelay(trycount)
 
-                    # wait before retrying to connect
-                    self.stopevent.wait(retry_delay)
+                        self.logger.debug(f"{self.server.nickname} run loop: {retry_delay=}, {trycount=}")
+                        self.stopevent.wait(retry_delay)
 
                     self.logger.info(f"{self.server.nickname} run loop:  Reconnecting")
 
@@ -805,12 +892,44 @@ class PacketStream:
 
 
 
+# the largest datagram that can be received on a multicast stream
+MAX_DATAGRAM = 65536
+
+
 ##################################    
 # A UDP Multicast PacketStream
 ##################################    
 @dataclass
 class MulticastPacketStream(PacketStream):
 
+    def __post_init__(self)->None:
+        super().__post_init__()
+
+        # The receive buffer.  Each datagram is read straight into this (with recv_into) and handed to the read handlers as a memoryview
+        # on the buffer, so nothing is allocated for a datagram until a packet is decoded from it.  The read handlers are finished with
+        # one datagram before the next is read, so the same buffer is used for all of them.
+        self.rxbuffer = bytearray(MAX_DATAGRAM)
+        self.rxview = memoryview(self.rxbuffer)
+
+
+    def retryDelay(self, trycount: int)->float:
+        """
+        The number of seconds to wait before joining the multicast group again:  1 second for the first 5 tries, then growing up to 2 minutes.
+        """
+        return 1 if trycount <= 5 else min(trycount**2, 120)
+
+
+    def receive(self)->memoryview:
+        """
+        Read a datagram from the socket into the receive buffer, returning a memoryview of it.  The view is only good until the next receive.
+
+        Socket errors (ex. timeouts or BlockingIOError) are left for the caller to deal with.
+        """
+
+        n = self.sock.recv_into(self.rxbuffer)
+        return self.rxview[:n]
+
+
     def connect(self)->bool:
 
         if self.sock:
@@ -820,6 +939,12 @@ class MulticastPacketStream(PacketStream):
             # create a UDP socket instead, and join it to the server address/port.
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
             self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+            # so several worker processes can each have a socket on the same group and port.  (Every socket joined to a multicast group
+            # gets its own copy of each datagram, it's up to the workers to split up the work.)
+            if hasattr(socket, "SO_REUSEPORT"):
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
             self.sock.bind((self.server.hostname, self.server.portnum))
             mreq = struct.pack("4sl", socket.inet_aton(self.server.hostname), socket.INADDR_ANY)
             self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
@@ -859,12 +984,21 @@ class RTPStream(MulticastPacketStream):
     # The configuration dictionary
     configuration: dict = None
 
+    # With several RTP workers sharing the multicast group, this worker's number (starting from 0) and the number of workers.  Each
+    # worker decodes the packets for the ssrc's (i.e. frequencies) where ssrc % workers == worker and ignores the rest, so every packet
+    # is decoded by exactly one worker and the packets from each frequency stay in order.
+    worker: int = 0
+    workers: int = 1
+
     def __post_init__(self)->None:
         super().__post_init__()
 
         if self.configuration is None:
             raise TypeError('configuration cannot be None')
 
+        # this worker's share of the ssrc's
+        self.partition = (self.worker, self.workers) if self.workers > 1 else None
+
         # For RTP streams (i.e. listening to a ka9q-radio instance), we only turn on igating if direwolf is not already igating (i.e. Direwolf is connected to an SDR).
         # The reasoning for this is because aprsc disallows multiple logins from the same callsign-ssid.  Therefore, we can forward packets heard from ka9q-radio on to 
         # APRS-IS (or the local aprsc instance) only if direwolf is not running.
@@ -876,11 +1010,38 @@ class RTPStream(MulticastPacketStream):
         else:
             queuelist = [ (self.configuration["databasequeue"], "database queue") ]
 
+        # for ranking packets from the beacons we're tracking above everything else
+        self.classifier = PacketClassifier(self.configuration)
+
+        # the RTP sequence numbers from each frequency, for counting the packets lost between ka9q-radio and us.  The counts are logged
+        # once a minute when there have been new losses.
+        self.sequences = SequenceTracker()
+        self.lastreport = time.monotonic()
+        self.reportedlost = 0
+
         # this packet handler should decode the RTP+AX25 packet, then save it to both the igating and database queues
-        readhandler = PacketHandler(q=queuelist, pfilter=None, transform=parse_RTP_AX25)
+        readhandler = PacketHandler(q=queuelist, pfilter=None, transform=self.transform, priority=self.classifier.classify)
         self.setReadHandlers([readhandler])
 
 
+    def transform(self, data: bytes)->Packet:
+        """
+        Used to convert RTP frames read from the ka9q-radio multicast stream to a Packet object, keeping count of RTP packets that were lost along the way.
+        """
+
+        packet = parse_RTP_AX25(data, self.sequences, self.partition)
+
+        now = time.monotonic()
+        if now - self.lastreport >= 60:
+            self.lastreport = now
+            received, lost = self.sequences.totals()
+            if lost != self.reportedlost:
+                self.reportedlost = lost
+                self.logger.info(f"{self.server.nickname}: {self.sequences.summary()}")
+
+        return packet
+
+
     def readline(self)->None:
         """
         Adjusted for RTP frames.
@@ -900,8 +1061,8 @@ class RTPStream(MulticastPacketStream):
 
             try:
 
-                # Try to read at most 4096 bytes from the socket
-                data = self.sock.recv(4096)
+                # Read a datagram from the socket (a copy, as the receive buffer is reused)
+                data = bytes(self.receive())
 
                 #if not data:
                     # sock.recv returns empty if the connection drops
@@ -948,8 +1109,8 @@ class RTPStream(MulticastPacketStream):
 
             try:
 
-                # Try to read at most 4096 bytes from the socket
-                data = self.sock.recv(4096)
+                # Read a datagram from the socket into the receive buffer
+                data = self.receive()
 
                 #if not data:
                     # sock.recv returns empty if the connection drops
@@ -982,6 +1143,10 @@ class RTPStream(MulticastPacketStream):
         return None
 
 
+# the host names that are this system (i.e. the local aprsc)
+LOCALHOSTS = ("127.0.0.1", "localhost", "::1")
+
+
 ##################################    
 # the APRSIS class for connecting to an APRS-IS system
 ##################################    
@@ -1003,8 +1168,11 @@ class AprsisStream(PacketStream):
         if self.creds is None:
             raise TypeError('creds cannot be None')
 
+        # for ranking packets from the beacons we're tracking above everything else
+        self.classifier = PacketClassifier(self.configuration)
+
         # this packet handler should decode the packets from the aprs-is server, then save it the database queue
-        readhandler = PacketHandler(q=[(self.configuration["databasequeue"], "database queue")], pfilter=self.filterComments, transform=self.transform)
+        readhandler = PacketHandler(q=[(self.configuration["databasequeue"], "database queue")], pfilter=self.filterComments, transform=self.transform, priority=self.classifier.classify)
         self.setReadHandlers([readhandler])
 
 
@@ -1041,8 +1209,15 @@ class AprsisStream(PacketStream):
         # station callsign (not necessarily the same as the credentials used for logging into the APRS-IS server)
         self.station_callsign = self.configuration["callsign"] if "callsign" in self.configuration else None
 
-        # igating statistics
-        self.igated_stations = {}
+        # igating statistics, counted here and published to the telemetry process every few seconds
+        self.igatestats = IgateStatistics(queue = self.configuration["igatestatistics"] if "igatestatistics" in self.configuration else None, stopevent = self.stopevent)
+
+        # The packets igated over the last 30 seconds (the same packet is often heard on more than one frequency or through more than one
+        # digipeater), and how long the igated packets took to get from RF to the APRS-IS server.
+        self.dupes = DupeFilter(window = 30)
+        self.latency = LatencyTracker()
+        self.lastreport = time.monotonic()
+        self.reportedcount = 0
 
         # the internet beaconing rate
         rate = self.configuration["ibeaconrate"]
@@ -1089,6 +1264,25 @@ class AprsisStream(PacketStream):
 
         self.logger.debug(f"{self.server.nickname} initial aprs filter string: {self.aprsfilter.filterstring}")
 
+        # The radius of the APRS-IS range filter follows the load:  it's cut when more packets are coming in than the database can take and
+        # grown back (up to the configured aprsisradius) when things are quiet.  See radiuscontroller.py.
+        self.accepted = 0
+        self.radiuscontrol = RadiusController(
+                minradius = float(self.configuration["aprsisminradius"]) if "aprsisminradius" in self.configuration else 25.0,
+                maxradius = float(self.configuration["aprsisradius"]) if "aprsisradius" in self.configuration else 50.0,
+                maxrate = float(self.configuration["aprsismaxrate"]) if "aprsismaxrate" in self.configuration else 50.0,
+                name = self.server.nickname, loggingqueue = self.loggingqueue)
+
+        # APRS-IS servers send a keepalive comment every 20 seconds, so a connection that's heard nothing for a minute is dead
+        self.idletimeout = 60
+
+        # A read-only connection keeps a standby connection logged in (without a filter) so it can switch over right away when the connection
+        # drops.  A connection that igates is logged in with our callsign, which the server won't let us log in with twice, so it can't.  There's
+        # no point when all we're connecting to is the local aprsc.
+        standby = self.configuration["aprsisstandby"] == "true" if "aprsisstandby" in self.configuration else True
+        if standby and not self.can_send and any(s.hostname not in LOCALHOSTS for s in self.pool.servers):
+            self.standby = self.standbyHandshake
+
         # don't igate packets older than this number of seconds
         self.igating_time_limit = 30
 
@@ -1096,45 +1290,86 @@ class AprsisStream(PacketStream):
         self.queue_age = self.igating_time_limit
 
 
-    def connect(self)->bool:
-        ret = super().connect()
+    def readBanner(self, sock: socket.socket, framebuffer: FrameBuffer, deadline: float)->str:
+        """
+        Read one line from an APRS-IS server while logging in, waiting (on select) until the deadline (a time.monotonic() time) at most.
+        """
 
-        # something happened during the socket connection
-        if not ret and self.okay.is_set():
-            self.logger.debug(f"{self.server.nickname} aprs-connect.  Something happened during connection, returning False")
-            return False
+        line = framebuffer.next()
+        while line is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+                raise TimeoutError("timed out waiting on the server's banner")
 
+            if framebuffer.recv_into(sock) == 0:
+                raise ConnectionError("connection closed while logging in")
 
-        if self.sock and ret:
-            banner = self.readline()
-            if banner: 
-                banner = banner.decode(encoding='UTF-8', errors='ignore').rstrip()
+            line = framebuffer.next()
 
-            else:
-                # Something went wrong with readline()
-                self.logger.debug(f"{self.server.nickname} aprs-connect: got null back from readline #1.")
-                self.okay.set()
-                return False
+        return line.decode(encoding='UTF-8', errors='ignore').rstrip()
 
-            self.logger.info(f"{self.server.nickname} Banner: {banner}")
+
+    def handshake(self, server: Server, timeout: float, login: str = None)->tuple:
+        """
+        Connect and log in to an APRS-IS server.  The server sends a banner, then expects our login string (along with our initial filter),
+        and then replies with a second banner.
+        """
+
+        deadline = time.monotonic() + timeout
+        sock, framebuffer = super().handshake(server, timeout)
+
+        if login is None:
+            login = self.creds.loginstring + self.aprsfilter.filterstring
+
+        try:
+            banner = self.readBanner(sock, framebuffer, deadline)
+            self.logger.info(f"{server.nickname} Banner: {banner}")
 
             # send the login string
-            self.send(self.creds.loginstring + self.aprsfilter.filterstring)
+            sock.sendall(login.encode(encoding='utf-8', errors='ignore') + b'\r\n')
 
-            banner = self.readline()
-            if banner: 
-                banner = banner.decode(encoding='UTF-8', errors='ignore').rstrip()
+            banner = self.readBanner(sock, framebuffer, deadline)
+            self.logger.info(f"{server.nickname} Banner: {banner}")
 
-            else:
-                # Something went wrong with readline()
-                self.logger.debug(f"{self.server.nickname} aprs-connect: got null back from readline #2.")
-                self.okay.set()
-                return False
+        except (OSError):
+            sock.close()
+            raise
+
+        return (sock, framebuffer)
+
+
+    def standbyHandshake(self, server: Server, timeout: float)->tuple:
+        """
+        Log in a standby connection.  It's logged in with a random callsign and without a filter, so it only gets the server's keepalives
+        until it's needed.
+        """
+        creds = CredentialSet(callsign = randomCallsign(self.creds.callsign), name = self.creds.name, version = self.creds.version)
+        return self.handshake(server, timeout, login = creds.loginstring)
+
+
+    def sessionEnded(self)->bool:
+        """
+        The server we were connected to is marked down, and we reconnect right away (to the standby connection, or whichever server answers
+        first).
+        """
+        self.pool.down(self.server)
+        return True
+
+
+    def promote(self, sock: socket.socket)->bool:
+        """
+        The standby connection is taking over, so it needs our filter.
+        """
 
-            self.logger.info(f"{self.server.nickname} Banner: {banner}")
+        try:
+            sock.settimeout(self.pool.timeout)
+            sock.sendall(('#' + self.aprsfilter.filterstring).encode(encoding='utf-8', errors='ignore') + b'\r\n')
 
-        self.logger.debug(f"{self.server.nickname} aprs-connect: returning: {ret=}, okay: {self.okay.is_set()}")
-        return ret
+        except (OSError) as e:
+            self.logger.error(f"{self.server.nickname} unable to send the filter to the standby connection: {e}")
+            return False
+
+        return True
 
 
     def filterComments(self, packet: Packet)->Packet:
@@ -1143,6 +1378,7 @@ class AprsisStream(PacketStream):
         """
         if packet.text:
             if packet.text[0] != "#":
+                self.accepted += 1
                 return packet
         return None
 
@@ -1267,6 +1503,12 @@ class AprsisStream(PacketStream):
                     self.logger.info(f"{self.server.nickname} igatingFilter.  Packet age decode_timestamp={int(properties['decode_timestamp'])} is too old to igate: {p}")
                     return None
 
+            # Only igate the first copy of a packet heard within the duplicate window (APRS-IS would throw the others away anyway)
+            if "source" in properties and "destination" in properties and "information" in properties:
+                if self.dupes.isDupe(dupeKey(properties["source"], properties["destination"], properties["information"])):
+                    self.logger.debug("%s igatingFilter.  Not igating duplicate packet: %s", self.server.nickname, p)
+                    return None
+
         else:
             self.logger.info(f"{self.server.nickname} igatingFilter.  Not igating packet, no properties defined: {p}")
             return None
@@ -1276,17 +1518,29 @@ class AprsisStream(PacketStream):
 
         # update statistics
         if 'source' in p.properties:
-            self.igated_stations[p.properties['source']] = (self.igated_stations[p.properties['source']] if p.properties['source'] in self.igated_stations else 0) + 1
-            self.logger.debug(f"{self.server.nickname} {self.igated_stations=}")
-
-            # Update the shared (between processes) dictionary for station's we've igated
-            igstats = self.configuration["igatestatistics"]
-            if igstats is not None:
-                igstats["igated_stations"] = self.igated_stations
+            self.igatestats.add(p.properties['source'])
 
         return p
 
 
+    def packetSent(self, packet: Packet)->None:
+        """
+        Record the RF to APRS-IS latency of an igated packet, logging a summary once a minute
+        """
+
+        properties = packet.properties
+        decoded = properties["decode_timestamp"] if "decode_timestamp" in properties else properties["decode_time"] if "decode_time" in properties else None
+        if decoded is not None:
+            self.latency.record(time.time() - decoded)
+
+        now = time.monotonic()
+        if now - self.lastreport >= 60:
+            self.lastreport = now
+            if self.latency.count != self.reportedcount:
+                self.reportedcount = self.latency.count
+                self.logger.info("%s %s, %d duplicates suppressed", self.server.nickname, self.latency.summary(), self.dupes.suppressed)
+
+
     def createThreads(self)->None:
         threadlist = super().createThreads()
 
@@ -1497,6 +1751,25 @@ class AprsisStream(PacketStream):
         return None
 
 
+    def adaptRadius(self)->int:
+        """
+        The radius (km) for the APRS-IS range filter, adjusted to the rate packets are being accepted from the feed and how far behind
+        the database writer is.  The beacon and friend filters are never cut back.
+        """
+
+        q = self.configuration["databasequeue"]
+        maxdepth = q.maxsize if hasattr(q, "maxsize") else 0
+        dropped = sum(c["dropped"] for c in q.stats().values()) if hasattr(q, "stats") else 0
+
+        radius = self.radiuscontrol.update(self.accepted, q.qsize(), maxdepth, dropped)
+
+        # publish the radius and the load it was adjusted for (the telemetry process writes these out for the web pages)
+        if "statebus" in self.configuration:
+            self.configuration["statebus"].setFeed(self.radiuscontrol.status())
+
+        return radius
+
+
     def getAprsFilter(self)->str:
         """
         This will construct the APRS-IS filter string that can be sent to the APRS-IS server for limiting the amount of 
@@ -1515,7 +1788,7 @@ class AprsisStream(PacketStream):
         if self.taptype == 'aprs':
             # our location
             #self.logger.debug(f"{self.server.nickname} getAprsFilter: {gpsposition=}")
-            radiusfilter = 'r/' + str(gpsposition["latitude"]) + '/' + str(gpsposition["longitude"]) + '/' + str(self.configuration["aprsisradius"]) if gpsposition["isvalid"] else None
+            radiusfilter = 'r/' + str(gpsposition["latitude"]) + '/' + str(gpsposition["longitude"]) + '/' + str(self.adaptRadius()) if gpsposition["isvalid"] else None
             if radiusfilter:
                 filterlist.append(radiusfilter)
 
@@ -1531,7 +1804,7 @@ class AprsisStream(PacketStream):
                 filterlist.append(stationfilter)
             
             # active beacon callsign and radius filters
-            beacons = self.configuration["activebeacons"]["callsigns"] if "callsigns" in self.configuration["activebeacons"] else None
+            beacons = self.configuration["statebus"].getBeacons() if "statebus" in self.configuration else None
             beaconfilter = 'b' + ''.join('/' + b for b in beacons) if beacons else None
             friendfilter = ''.join('f/' + b + '/50 ' for b in beacons) if beacons else None
             if beacons:
@@ -1541,24 +1814,14 @@ class AprsisStream(PacketStream):
         elif self.taptype == 'cwop':
             # for cwop, we really just want a radius and weather packets filter.  So we average the position of this station with where all the landing locations are at.
 
-            landings = self.configuration["landinglocations"]["landings"] if "landings" in self.configuration["landinglocations"] else None
-
-            # try to compute an average position between this stations's GPS coords and the coordinates for any landing locations (from active flights).
-            i = 0
-            if gpsposition["isvalid"]:
-                sum_x = float(gpsposition["longitude"])
-                sum_y = float(gpsposition["latitude"]) # latitude is the y-axis
-                i += 1
-
-            if landings:
-                for x,y in landings:
-                    sum_x += x
-                    sum_y += y
-                    i += 1
-            if i:
-                avg_x = sum_x / float(i)
-                avg_y = sum_y / float(i)
-                filterlist.append(f" r/{avg_y:.6f}/{avg_x:.6f}/{str(self.configuration['aprsisradius'])}")
+            landings = self.configuration["statebus"].getLandings() if "statebus" in self.configuration else None
+
+            # compute the center point between this stations's GPS coords and the coordinates for any landing locations (from active flights).
+            # reference:  landings are (longitude, latitude) tuples
+            lons = [float(gpsposition["longitude"])] + [x for x, y in landings or []]
+            lats = [float(gpsposition["latitude"])] + [y for x, y in landings or []]
+            avg_y, avg_x = geodesy.centroid(lats, lons)
+            filterlist.append(f" r/{avg_y:.6f}/{avg_x:.6f}/{str(self.configuration['aprsisradius'])}")
 
                 # Commenting this out because adding the "t/w" filter string to CWOP connections seems to override the radius filter.
                 #filterlist.append(" t/w")
@@ -1601,12 +1864,10 @@ class AprsisStream(PacketStream):
             while nofix == True and trycount < 2:
 
                 # This retreives the latest GPS data (assuing GPS Poller process is running)
-                g = self.configuration["position"]
+                position = self.configuration["statebus"].getPosition() if "statebus" in self.configuration else None
 
 
-                if "gpsdata" in g:
-                    position = g["gpsdata"]
-
+                if position:
                     if "mode"  in position:
                         mode = int(position["mode"])
 
@@ -1714,8 +1975,11 @@ class DirewolfKISS(PacketStream):
         # Our KISS processing object
         self.kiss = kissprocessor.KISSProcessor(loggingqueue = self.configuration["loggingqueue"])
 
+        # for ranking packets from the beacons we're tracking above everything else
+        self.classifier = PacketClassifier(self.configuration)
+
         # this packet handler should decode the KISS packet, then save it to both the igating and database queues
-        readhandler = PacketHandler(q=queuelist, pfilter=None, transform=self.transform)
+        readhandler = PacketHandler(q=queuelist, pfilter=None, transform=self.transform, priority=self.classifier.classify)
         self.setReadHandlers([readhandler])
 
 
@@ -1724,7 +1988,7 @@ class DirewolfKISS(PacketStream):
         Used to convert packets read from the direwolf KISS port to a Packet object
         """
 
-        self.logger.debug(f"{self.server.nickname}: in transform with {packetbytes=}")
+        self.logger.debug("%s: in transform with packetbytes=%r", self.server.nickname, packetbytes)
 
         # if nothing was given to us, then we return nothing
         if not packetbytes:
@@ -1740,18 +2004,18 @@ class DirewolfKISS(PacketStream):
             if "channel" in packet.properties:
                 channel = packet.properties["channel"]
 
-        self.logger.debug(f"{self.server.nickname}: {packet=}, {channel=}")
+        self.logger.debug("%s: packet=%r, channel=%r", self.server.nickname, packet, channel)
 
         if packet == None or channel == None:
             return None
 
         # the direwolf channel to frequency mapping
         freqmap = self.configuration["direwolffreqmap"] if "direwolffreqmap" in self.configuration else None
-        self.logger.debug(f"{self.server.nickname}: {freqmap=}")
+        self.logger.debug("%s: freqmap=%r", self.server.nickname, freqmap)
 
         # the channel used for direwolf beaconing when using an external radio
         xmitchannel = self.configuration["xmit_channel"] if "xmit_channel" in self.configuration else None
-        self.logger.debug(f"{self.server.nickname}: {xmitchannel=}")
+        self.logger.debug("%s: xmitchannel=%r", self.server.nickname, xmitchannel)
 
         if xmitchannel != None:
             if xmitchannel == channel:
@@ -1761,7 +2025,7 @@ class DirewolfKISS(PacketStream):
                 # update the source name
                 packet.source = self.server.nickname
 
-                self.logger.debug(f"{self.server.nickname}: found external radio channel for packet: {packet=}")
+                self.logger.debug("%s: found external radio channel for packet: %r", self.server.nickname, packet)
                 return packet
 
         # if there was a frequency map, then we try to find the direwolf channel and frequency it was heard on.
@@ -1775,11 +2039,11 @@ class DirewolfKISS(PacketStream):
                     # update the source name
                     packet.source = self.server.nickname
 
-                    self.logger.debug(f"{self.server.nickname}: found direwolf channel for packet: {packet=}")
+                    self.logger.debug("%s: found direwolf channel for packet: %r", self.server.nickname, packet)
                     return packet
 
         # if we're here, then nothing was decoded
-        self.logger.debug(f"{self.server.nickname}: nothing decoded in transform")
+        self.logger.debug("%s: nothing decoded in transform", self.server.nickname)
         return None
 
 
@@ -1788,30 +2052,61 @@ class DirewolfKISS(PacketStream):
 
 
 ##################################################
-# the connectorTap process.  This is intended to be run as a sub-process through Python's multiprocessing.
+# the RTP worker processes to run:  a list of dictionaries with the multicast group, port, worker number, and number of workers
+#
+# ka9q-radio sends the packets for all of its frequencies to a multicast group.  The "rtpgroups" configuration setting lists the groups
+# (as "address:port" strings) when it's been set up to send to more than one.  The "rtpworkers" setting is the number of processes that
+# share each group, each decoding the packets for its share of the frequencies.
 ##################################################
-def connectorTap(configuration, typeoftap = 'aprs'):
+RTP_GROUP = "239.85.210.44"
+RTP_PORT = 5004
 
-    # signal handler for catching kills
-    signal.signal(signal.SIGTERM, local_signal_handler)
+def rtpWorkers(configuration)->list:
 
-    # setup logging
-    logger = logging.getLogger(f"{__name__}")
-    logger.setLevel(logging.INFO)
-    logger.propagate = False
-    loggingqueue = configuration["loggingqueue"]
+    groups = configuration["rtpgroups"] if "rtpgroups" in configuration and configuration["rtpgroups"] else [f"{RTP_GROUP}:{RTP_PORT}"]
+    if isinstance(groups, str):
+        groups = groups.split(",")
+
+    try:
+        workers = max(int(configuration["rtpworkers"]), 1) if "rtpworkers" in configuration else 1
+    except (TypeError, ValueError):
+        workers = 1
+
+    result = []
+    for g in groups:
+        group, sep, port = g.strip().partition(":")
+        for w in range(workers):
+            result.append({ "group" : group, "port" : int(port) if sep else RTP_PORT, "worker" : w, "workers" : workers })
+
+    return result
 
-    # check if a logging queue was supplied
-    if loggingqueue is not None:
-        handler = QueueHandler(loggingqueue)
-        logger.addHandler(handler)
+
+##################################################
+# create the PacketStream object for a type of tap ('aprs', 'cwop', 'dwkiss', or 'rtp')
+##################################################
+def createTap(configuration, typeoftap = 'aprs', logger = None, rtpworker = None)->PacketStream:
+
+    if logger is None:
+        logger = logging.getLogger(f"{__name__}")
+
+    tap = None
 
     if typeoftap == 'rtp':
         # start the RTP + AX.25 connection to the ka9q-radio backend
 
+        # which multicast group, and which share of its frequencies (see rtpWorkers()).  By default, all of the first group.
+        if rtpworker is None:
+            rtpworker = rtpWorkers(configuration)[0]
+            rtpworker["workers"] = 1
+
+        nickname = "RTP Multicast"
+        if rtpworker["workers"] > 1 or rtpworker["group"] != RTP_GROUP:
+            nickname = f"RTP Multicast {rtpworker['group']}:{rtpworker['port']} worker {rtpworker['worker'] + 1}/{rtpworker['workers']}"
+
         # create a new RTP connection object
-        server = Server(hostname="239.85.210.44", portnum=5004, nickname="RTP Multicast")
-        tap = RTPStream(server = server, loggingqueue = configuration["loggingqueue"], stopevent = configuration["stopevent"], configuration = configuration)
+        server = Server(hostname=rtpworker["group"], portnum=rtpworker["port"], nickname=nickname)
+        tap = RTPStream(server = server, loggingqueue = configuration["loggingqueue"], stopevent = configuration["stopevent"], configuration = configuration,
+                worker = rtpworker["worker"], workers = rtpworker["workers"])
 
     elif typeoftap == 'aprs' or typeoftap == 'cwop':
 
@@ -1821,20 +2116,21 @@ def connectorTap(configuration, typeoftap = 'aprs'):
         else:
             mycallsign = configuration["callsign"] if "callsign" in configuration and configuration["callsign"] != '' else randomCallsign("EOSS")
 
-        logger.debug(f"connectorTap: using {mycallsign} for {typeoftap} tap")
+        logger.debug(f"createTap: using {mycallsign} for {typeoftap} tap")
 
-        # aprsis server name
-        aprsserver = configuration["cwopserver"] if typeoftap == "cwop" else configuration["aprsisserver"]
+        # The aprsis servers, in order of preference.  This is a comma separated list of hostnames (each with an optional ":port"), the
+        # connection fails over between them.
+        aprsservers = parseServers(configuration["cwopserver"] if typeoftap == "cwop" else configuration["aprsisserver"])
 
         # we don't need a passcode for read-only connections
         passcode = None
 
         # credentials
         mycreds = CredentialSet(callsign = mycallsign, passcode = passcode, name='eosstracker', version='1.5')
-        logger.debug(f"connectorTap: using {mycreds=}")
+        logger.debug(f"createTap: using {mycreds=}")
 
-        # server
-        server = Server(hostname = aprsserver, portnum = 14580, nickname = aprsserver)
+        # servers
+        servers = [Server(hostname = hostname, portnum = portnum, nickname = hostname) for hostname, portnum in aprsservers]
 
         # create a new APRS-IS connection object
         tap = AprsisStream(
@@ -1843,13 +2139,42 @@ def connectorTap(configuration, typeoftap = 'aprs'):
                 stopevent = configuration["stopevent"], 
                 creds = mycreds, 
                 taptype = typeoftap, 
-                server = server)
+                server = servers[0],
+                alternates = servers[1:])
 
     elif typeoftap == 'dwkiss':
         server = Server(hostname="127.0.0.1", portnum=8001, nickname="direwolf")
-        logger.info(f"connectorTap: starting direwolf kiss tap")
+        logger.info(f"createTap: starting direwolf kiss tap")
         tap = DirewolfKISS(configuration=configuration, loggingqueue = configuration["loggingqueue"], stopevent = configuration["stopevent"], server = server)
 
+    return tap
+
+
+##################################################
+# the connectorTap process.  This is intended to be run as a sub-process through Python's multiprocessing.
+##################################################
+def connectorTap(configuration, typeoftap = 'aprs', rtpworker = None):
+
+    # signal handler for catching kills
+    signal.signal(signal.SIGTERM, local_signal_handler)
+
+    # setup logging
+    logger = logging.getLogger(f"{__name__}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    loggingqueue = configuration["loggingqueue"]
+
+    # check if a logging queue was supplied
+    if loggingqueue is not None:
+        handler = QueueHandler(loggingqueue)
+        logger.addHandler(handler)
+
+    # create the stream for this type of tap
+    tap = createTap(configuration, typeoftap, logger, rtpworker)
+    if tap is None:
+        logger.error(f"connectorTap:  unknown tap type: {typeoftap}")
+        return
+
     try:
         tap.run()
     except (GracefulExit, KeyboardInterrupt, SystemExit) as e:
@@ -1859,5 +2184,5 @@ def connectorTap(configuration, typeoftap = 'aprs'):
     finally:
         tap.disconnect()
 
-    logger.info(f"connectorTap:  {typeoftap} tap ended with {server}")
+    logger.info(f"connectorTap:  {typeoftap} tap ended with {tap.server}")
 
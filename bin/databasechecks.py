@@ -30,7 +30,7 @@ import habconfig
 ##################################################
 # Single function for processing the collection of database/table updates
 ##################################################
-def databaseUpdates(logger):
+def databaseUpdates(logger, dbstring = habconfig.dbConnectionString):
     """
     This function contains a collection of checks and upates to database tables.  As the version of this code advances, 
     place updates to tables here.
@@ -39,7 +39,7 @@ def databaseUpdates(logger):
     try:
         # Database connection 
         dbconn = None
-        dbconn = pg.connect (habconfig.dbConnectionString)
+        dbconn = pg.connect (dbstring)
         dbconn.set_session(autocommit=True)
         dbcur = dbconn.cursor()
 
@@ -39,6 +39,7 @@ from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandl
 #import local configuration items
 import habconfig 
 from packet import Packet
+import positionparser
 
 
 #####################################
@@ -115,6 +116,10 @@ class databaseWriter(object):
         # long timeout
         long_timeout = timeout * 12
 
+        # when the queue's drop counters were last checked and what they were
+        statstime = time.monotonic()
+        dropped = {}
+
         # This will attempt a connection multiples times (ie. the following while loop), waiting a few seconds in between tries.
         while not self.stopevent.is_set():
 
@@ -141,6 +146,15 @@ class databaseWriter(object):
                     # Update the last timestamp
                     self.ts = datetime.datetime.now()
 
+                    # Once a minute, log the packets the queue has had to drop (if that's changed) instead of logging every one
+                    if time.monotonic() - statstime > 60 and hasattr(self.packetqueue, "stats"):
+                        statstime = time.monotonic()
+                        stats = self.packetqueue.stats()
+                        drops = { name : stats[name]["dropped"] for name in stats }
+                        if any(drops.values()) and drops != dropped:
+                            self.logger.warning(f"Packet queue full, packets dropped so far by class: {drops}, currently queued: {self.packetqueue.qsize()}")
+                        dropped = drops
+
                     try: 
                         # attempt to read a packet from the queue
                         packet = self.packetqueue.get_nowait()
@@ -288,8 +302,8 @@ class databaseWriter(object):
             # The source (i.e. we're listening to packets from Direwolf's KISS port, the ka9q-radio, etc.)
             packetsource = p.source  # "ka9q-radio", "direwolf", etc.
 
-            # Parse the raw APRS packet
-            packet = aprslib.parse(x)
+            # Parse the raw APRS packet (position reports and Mic-E are parsed by the fast path, everything else by aprslib)
+            packet = positionparser.parse(x)
 
             # The list of key names from the APRS packet structure (parsed above) that we're insterested in for inserting this packet into the database (down below).
             keys = ["object_name", "comment", "latitude", "longitude", "altitude", "course", "symbol", "symbol_table", "speed"]
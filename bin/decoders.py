@@ -21,104 +21,101 @@
 import struct
 import time
 import kissprocessor
+import ax25codec
 from packet import Packet
 
 
+# The fixed part of the RTP header:  version/padding/extension/csrc count, marker/payload type, sequence number, timestamp, ssrc
+RTP_HEADER = struct.Struct("!BBHII")
+
+# The start of an RTP header extension:  the profile specific id and the length (in 32 bit words) of the extension
+RTP_EXTENSION = struct.Struct("!HH")
+
+
 #####################################
-# parse an incoming Realtime Transport Protocol packet
+# parse just what's needed from the header of an RTP packet
 #####################################
-def parse_RTP(packet: bytes)->dict:
+def parse_RTP_header(packet: bytes)->tuple:
     """
-    Parse through the RTP packet returning a dictionary with populated fields.  The "payload" key in the returned dictionary contains the unwrapped RTP packet content.
-
-    The packet argument should be a byte string (i.e. it was just read from a network socket).
+    Parse the header of an RTP packet returning a tuple of the payload type, sequence number, timestamp, ssrc, and the start and end
+    offsets of the payload within the packet.  Returns None if the packet is too short or malformed.
 
+    The packet argument can be any bytes-like object (ex. a memoryview on a receive buffer), nothing is copied.
     """
 
+    length = len(packet)
+
     # if the packet isn't longer than the minimum header field, then return nothing
-    if len(packet) < 12:
+    if length < RTP_HEADER.size:
         return None
 
-    # where we store the results
-    result = {}
-    result['csrc'] = []
-
-    # convert first 32 bits to host-based byte ordering (vs. network-based ordering)
-    chunk = struct.unpack('!I', packet[0:4])[0]
-
-    # First byte of the RTP header
-    result['version'] = (chunk >> 30) & 0x03
-    result['padding'] = (chunk >> 29) & 0x01
-    result['extension'] = (chunk >> 28) & 0x01
-    result['csrc_count'] = (chunk >> 24) & 0x0f 
-
-    # Second byte of the RTP header
-    result['marker'] = (chunk >> 23) & 0x01
-    result['payload_type'] = (chunk >> 16) & 0x7f
-
-    # Third and fourth bytes of the RTP header (16 bits)
-    result['sequence_number'] = (chunk & 0xffff)
+    first, second, sequence, timestamp, ssrc = RTP_HEADER.unpack_from(packet, 0)
 
-    # Bytes 4-8 are the timestamp (32 bits)
-    result['timestamp'] = struct.unpack('!I', packet[4:8])[0]
+    # the payload starts after the header and the csrc's (contributing source IDs), 32 bits each
+    payloadstart = RTP_HEADER.size + 4 * (first & 0x0f)
 
-    # Bytes 8-12 are the ssrc (synchronization source identifier), 32 bits
-    result['ssrc'] = struct.unpack('!I', packet[8:12])[0]
+    # skip over any extension header, its length is in 32 bit words
+    if first & 0x10:
+        if length < payloadstart + RTP_EXTENSION.size:
+            return None
 
-    # loop through the csrc's (contributing source IDs), 32 bits each
-    for i in range(result['csrc_count']):
-        start = 12 + 4 * i  
-        end = start + 4  # end is start + 32 bits (i.e. 4 bytes)
+        ext_header_id, ext_header_len = RTP_EXTENSION.unpack_from(packet, payloadstart)
+        payloadstart += RTP_EXTENSION.size + 4 * ext_header_len
 
-        # append the results to a list for the csrc's
-        result['csrc'].append(struct.unpack('!I', packet[start:end]))
-
-    # If there was an extension indicated, then we need to capture that and set the location for where the payload starts
-    if result['extension']:
+    # If padding was added, then the last byte is the number of padding bytes (including itself)
+    payloadend = length
+    if first & 0x20:
+        payloadend -= packet[-1]
 
-        # The starting location for the extention header
-        ext_start = 12 + 4 * result['csrc_count']
+    if payloadstart > payloadend:
+        return None
 
-        # Convert the first 32bits to host-based byte ordering
-        chunk = struct.unpack('!I', packet[extstart:ext_start+4])[0]
-        
-        # Now mask off the extension header ID and the header length
-        result['ext_header_id'] = (chunk >> 16) & 0xffff
-        result['ext_header_len'] = chunk & 0xffff
+    return (second & 0x7f, sequence, timestamp, ssrc, payloadstart, payloadend)
 
-        # Mark the location at which the payload starts
-        payloadstart = ext_start + 4 + result['ext_header_len']
 
-        # Now convert each uint32 of the header by looping through each 32bit int
-        extensionheader = bytearray()
-        for i in range(result['ext_header_len']):
+#####################################
+# parse an incoming Realtime Transport Protocol packet
+#####################################
+def parse_RTP(packet: bytes)->dict:
+    """
+    Parse through the RTP packet returning a dictionary with populated fields.  The "payload" key in the returned dictionary contains the unwrapped RTP packet content.
 
-            # Convert each uint32 of the extension header to host-based byte ordering
-            chunk = struct.unpack('!I', packet[extstart+4+i:extstart+8+i])[0]
+    The packet argument should be a byte string (i.e. it was just read from a network socket).
 
-            # now append the resulting integer to the extensionheader bytearray
-            extensionheader.append(chunk)
+    """
 
-        # update our results with the extension header data
-        result['ext_header'] = extensionheader
+    header = parse_RTP_header(packet)
+    if header is None:
+        return None
 
-    else:
-        payloadstart = 12 + 4 * result['csrc_count']
+    (payload_type, sequence, timestamp, ssrc, payloadstart, payloadend) = header
 
-    # If padding was added, then we need to adjust the end of the payload to trim off the padding
-    if result['padding']:
+    # the first 32 bits of the header again, for the individual flags
+    chunk = struct.unpack_from('!I', packet, 0)[0]
 
-        # need to determine how many bytes were added to the end of the packet for padding
-        npaddingbytes = struct.unpack('!B', packet[-1])[0]
-        payloadend = npaddingbytes + 1
+    # where we store the results
+    result = {}
+    result['version'] = (chunk >> 30) & 0x03
+    result['padding'] = (chunk >> 29) & 0x01
+    result['extension'] = (chunk >> 28) & 0x01
+    result['csrc_count'] = (chunk >> 24) & 0x0f 
+    result['marker'] = (chunk >> 23) & 0x01
+    result['payload_type'] = payload_type
+    result['sequence_number'] = sequence
+    result['timestamp'] = timestamp
+    result['ssrc'] = ssrc
 
-        # The rest of the packet is the payload
-        result['payload'] = packet[payloadstart:-payloadend]
+    # the csrc's (contributing source IDs), 32 bits each
+    result['csrc'] = [struct.unpack_from('!I', packet, 12 + 4 * i) for i in range(result['csrc_count'])]
 
-    else:
+    # If there was an extension, capture its id and contents
+    if result['extension']:
+        ext_start = 12 + 4 * result['csrc_count']
+        result['ext_header_id'], result['ext_header_len'] = RTP_EXTENSION.unpack_from(packet, ext_start)
+        result['ext_header'] = bytes(packet[ext_start + 4:ext_start + 4 + 4 * result['ext_header_len']])
 
-        # The rest of the packet is the payload
-        result['payload'] = packet[payloadstart:]
+    # The rest of the packet (less any padding) is the payload
+    result['payload'] = bytes(packet[payloadstart:payloadend])
 
     # return the resulting decoded RTP packet
     return result
@@ -138,22 +135,7 @@ def parse_ax25address(address: bytes)->str:
     if len(address) < 7:
         return None
 
-    # to get a station name, you have to right-shift each byte by 1 bit, then append them into a byte array, and ultimately convert to a UTF-8 string
-    try:
-        name = (b''.join([bytes([a >> 1]) for a in address[0:6]])).decode('utf-8', errors='ignore').strip()
-    except Exception as e:
-        return None
-
-    # the SSID
-    ssid = (address[6] >> 1) & 0xf
-
-    # if the ssid is '0' then we ignore and just return the station callsign
-    if ssid:
-        callsign = '{}-{}'.format(name, ssid)
-    else:
-        callsign = name
-
-    return callsign
+    return ax25codec.decodeAddress(address)
 
 
 #####################################
@@ -170,56 +152,30 @@ def parse_ax25(packet: bytes)->dict:
     if len(packet) < 14:
         return None
 
-    # where we store the results
-    results = {}
-    results['digipeaters'] = []
-
     # The starting position of the frame
     framestart = 0
 
     # the flag field for an AX.25 frame should be 0x7e
-    if packet[0] == 0x7e:
+    if packet[0] == ax25codec.AX25_FLAG:
         framestart += 1
 
-    # The destination and source addresses
-    results['destination'] = parse_ax25address(packet[framestart:framestart+7])
-    results['source'] = parse_ax25address(packet[framestart+7:framestart+14])
-
-    # HDLC Extention bit for the source address field
-    extbit = packet[framestart+13] & 0x01
-
-    # Starting point for the control field
-    ctrl_start = framestart + 14
-
-    #If the extension bit is '0', then that means we need to process through some digipeaters
-    if extbit == 0:
-
-        # now loop through all the potential digipeaters there can be up to 8 of them
-        for i in range(8):
-            
-            # starting and ending locations for the digipeater within the packet
-            start = framestart + 14 + i * 7
-            end = start + 7
-
-            #If we're looking past the end of this packet then break out of this loop
-            if end > len(packet):
-                break
+    # The destination and source addresses, then up to 8 digipeaters
+    addresses = ax25codec.decodeAddressField(packet, framestart, ax25codec.AX25_MAX_DIGIPEATERS)
+    if addresses is None:
+        return None
 
-            # the digipeater station address
-            digi = parse_ax25address(packet[start:end])
-            
-            # If we got a station address from the address decoder then process, if "None" then break out of this loop
-            if digi:
-                results['digipeaters'].append(digi)
+    # Starting point for the control field is just past the addresses
+    (destination, source, digipeaters, ctrl_start) = addresses
 
-                # Now increment our ctrl_start counter by 7
-                ctrl_start = end
+    # make sure this packet wasn't truncated...
+    if ctrl_start >= len(packet):
+        return None
 
-                # If this address has the HDLC extension bit set then we break out of this loop
-                if packet[end - 1] & 0x01:
-                    break
-            else:
-                break
+    # where we store the results
+    results = {}
+    results['digipeaters'] = digipeaters
+    results['destination'] = destination
+    results['source'] = source
 
     # The control field and frame type
     results['control_field'] = packet[ctrl_start]
@@ -277,8 +233,9 @@ def parse_ax25(packet: bytes)->dict:
         # re-reverse our list so it's in correct order
         taggedlist = taggedlist[::-1]
 
-        # At this point, we've got a successfully decoded APRS packet.  We add a timestamp that represents the "decoded time".
-        results["decode_timestamp"] = int(time.time())
+        # At this point, we've got a successfully decoded APRS packet.  We add a timestamp that represents the "decoded time" (with the
+        # fraction of a second, for measuring the igating latency).
+        results["decode_timestamp"] = time.time()
 
         # finally we construct the raw APRS packet string
         results['utf8text'] = results['source'] + ">" + results['destination'] + ''.join(',' + a for a in taggedlist) + ":" + results['information'].decode('utf-8', errors='ignore')
@@ -289,41 +246,54 @@ def parse_ax25(packet: bytes)->dict:
 #####################################
 # this a higher level function that will parse an AX.25 packet sent over an RTP stream
 #####################################
-def parse_RTP_AX25(packet_bytes: bytes)->Packet:
+def parse_RTP_AX25(packet_bytes: bytes, sequences = None, partition: tuple = None)->Packet:
     """
     This will parse an RTP packet that contains an AX.25 packet that contans an APRS frame.  ;)
+
+    The packet_bytes argument can be any bytes-like object (ex. a memoryview on a receive buffer), only the AX.25 payload is copied.  If
+    given, the sequence number of every RTP packet is recorded with the sequences object (an rtpsequence.SequenceTracker).
+
+    With several workers sharing the RTP stream, partition is a tuple of (this worker's number, the number of workers).  Packets from
+    ssrc's that belong to another worker (i.e. ssrc % workers != worker) are ignored.
     """
 
-    # Decode the RTP frame
-    rtp = parse_RTP(packet_bytes)
+    # Decode the RTP header
+    header = parse_RTP_header(packet_bytes)
+    if header is None:
+        return None
+
+    (payload_type, sequence, timestamp, ssrc, payloadstart, payloadend) = header
 
-    # if the packet was decoded successfully...
-    if rtp:
+    # another worker's packet
+    if partition is not None and ssrc % partition[1] != partition[0]:
+        return None
 
-        # only interested in payload type 96 as that's identifier used by KA9Q's backend RTP streamer
-        if rtp['payload_type'] == 96:
+    # keep track of any RTP packets lost along the way
+    if sequences is not None:
+        sequences.update(ssrc, sequence)
 
-            # Now parse the AX.25 payload 
-            packet = parse_ax25(rtp['payload'])
+    # only interested in payload type 96 as that's identifier used by KA9Q's backend RTP streamer
+    if payload_type != 96:
+        return None
 
-            # if the parsing was successful
-            if packet:
+    # Now parse the AX.25 payload 
+    packet = parse_ax25(bytes(packet_bytes[payloadstart:payloadend]))
 
-                # Set the frequency that the backend heard this packet on
-                packet['frequency'] = int(rtp['ssrc']) * 1000 
+    # if the parsing was successful and this was an APRS packet...
+    if packet and packet['is_aprs']:
 
-                # if this was an APRS packet...
-                if packet['is_aprs']:
+        # Set the frequency that the backend heard this packet on
+        packet['frequency'] = int(ssrc) * 1000 
 
-                    # Set the packet source (i.e. where did this packet come from)
-                    packet['packetsource'] = 'ka9q-radio'
+        # Set the packet source (i.e. where did this packet come from)
+        packet['packetsource'] = 'ka9q-radio'
 
-                    # create a new packet object 
-                    p = Packet(text=packet["utf8text"], frequency=packet["frequency"], source=packet["packetsource"])
-                    p.properties = packet
+        # create a new packet object 
+        p = Packet(text=packet["utf8text"], frequency=packet["frequency"], source=packet["packetsource"])
+        p.properties = packet
 
-                    # return the decoded APRS packet
-                    return p
+        # return the decoded APRS packet
+        return p
 
     # otherwise, we return None
     return None
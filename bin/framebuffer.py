@@ -0,0 +1,281 @@
+##################################################
+#    This file is part of the HABTracker project for tracking high altitude balloons.
+#
+#    Copyright (C) 2019,2020,2021 Jeff Deaton (N6BA)
+#
+#    HABTracker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    HABTracker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with HABTracker.  If not, see <https://www.gnu.org/licenses/>.
+#
+##################################################
+
+import sys
+import time
+import socket
+
+
+#####################################
+# The FrameBuffer Class
+#
+# A receive buffer for carving delimited frames out of a byte stream.  This is used for CRLF terminated lines from an APRS-IS server
+# as well as FEND (0xC0) delimited KISS frames from direwolf.
+#
+# Data is read from the socket straight into a preallocated bytearray (with recv_into) and frames are located with a moving read
+# offset, so the only copy made is of each frame as it's returned.  The unread remainder is moved to the front of the buffer only
+# when there isn't room left at the end for another read.
+#
+# Empty frames (ex. the back to back FENDs between KISS frames) are skipped.
+#####################################
+class FrameBuffer(object):
+
+    def __init__(self, delimiter: bytes = b'\r\n', size: int = 65536, maxsize: int = 1048576)->None:
+
+        # the bytes separating frames
+        self.delimiter = bytes(delimiter)
+
+        # the buffer grows (by doubling) up to this size if a single frame won't fit
+        self.maxsize = maxsize
+
+        # the buffer.  Unread data lives between the start and end offsets.
+        self.buffer = bytearray(size)
+        self.start = 0
+        self.end = 0
+
+        # where to resume searching for the delimiter, so bytes already searched aren't searched again
+        self.scan = 0
+
+        # count of bytes thrown away because a frame was longer than maxsize
+        self.discarded = 0
+
+
+    ################################
+    # the number of unread bytes in the buffer
+    ################################
+    def __len__(self)->int:
+        return self.end - self.start
+
+
+    ################################
+    # throw away any unread data
+    ################################
+    def clear(self)->None:
+        self.start = 0
+        self.end = 0
+        self.scan = 0
+
+
+    ################################
+    # make sure there's room for at least this many bytes at the end of the buffer
+    ################################
+    def reserve(self, nbytes: int)->None:
+
+        if len(self.buffer) - self.end >= nbytes:
+            return
+
+        # Move the unread data to the front of the buffer
+        pending = self.end - self.start
+        if self.start > 0:
+            self.buffer[0:pending] = self.buffer[self.start:self.end]
+            self.scan -= self.start
+            self.start = 0
+            self.end = pending
+
+        if len(self.buffer) - self.end >= nbytes:
+            return
+
+        # Still not enough room, so grow the buffer
+        size = len(self.buffer)
+        while size - self.end < nbytes and size < self.maxsize:
+            size *= 2
+
+        if size - self.end < nbytes:
+            # A frame longer than maxsize without a delimiter.  Nothing sensible can be done with it, so throw it away.
+            self.discarded += pending
+            self.clear()
+            size = len(self.buffer)
+
+        self.buffer.extend(bytes(size - len(self.buffer)))
+
+
+    ################################
+    # read from a socket directly into the buffer.  Returns the number of bytes read (0 means the connection was closed).
+    #
+    # Socket errors (ex. BlockingIOError or timeouts) are left for the caller to deal with.
+    ################################
+    def recv_into(self, sock: socket.socket, nbytes: int = 4096)->int:
+
+        self.reserve(nbytes)
+
+        with memoryview(self.buffer) as view:
+            n = sock.recv_into(view[self.end:self.end + nbytes])
+
+        self.end += n
+        return n
+
+
+    ################################
+    # add data (ex. from an asyncio protocol or a file) to the buffer
+    ################################
+    def feed(self, data: bytes)->None:
+
+        n = len(data)
+        self.reserve(n)
+        self.buffer[self.end:self.end + n] = data
+        self.end += n
+
+
+    ################################
+    # return the next complete frame (without its delimiter), or None if there isn't one yet
+    ################################
+    def next(self)->bytes:
+
+        dlen = len(self.delimiter)
+
+        while True:
+            i = self.buffer.find(self.delimiter, max(self.scan, self.start), self.end)
+
+            if i < 0:
+                # no delimiter yet.  Next time start looking where a delimiter split across reads could begin.
+                self.scan = max(self.start, self.end - dlen + 1)
+
+                # with nothing left unread, go back to the front of the buffer
+                if self.start == self.end:
+                    self.clear()
+                return None
+
+            frame = bytes(self.buffer[self.start:i])
+            self.start = i + dlen
+            self.scan = self.start
+
+            if frame:
+                return frame
+
+
+    ################################
+    # iterate over every complete frame in the buffer
+    #
+    # This is the same as calling next() until it returns None, but with the bookkeeping kept in local variables as it's the hot loop
+    # when a burst of packets arrives.
+    ################################
+    def frames(self):
+
+        buf = self.buffer
+        delimiter = self.delimiter
+        dlen = len(delimiter)
+        find = buf.find
+        start = self.start
+        end = self.end
+
+        i = find(delimiter, max(self.scan, start), end)
+        while i >= 0:
+            if i > start:
+                frame = bytes(buf[start:i])
+                start = i + dlen
+                self.start = start
+                self.scan = start
+                yield frame
+            else:
+                start = i + dlen
+
+            i = find(delimiter, start, end)
+
+        self.start = start
+        self.scan = max(start, end - dlen + 1)
+
+        # with nothing left unread, go back to the front of the buffer
+        if start == end:
+            self.clear()
+
+
+##################################################
+# main
+#
+# Throughput benchmark of the FrameBuffer against the bytes concatenate and split loop PacketStream used, replaying a recorded burst
+# in 4096 byte reads.  The recording is a raw capture of bytes read from the socket.  Without one, a burst of typical APRS-IS
+# lines is made up.
+##################################################
+def main():
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            burst = f.read()
+        delimiter = b'\xc0' if burst[:1] == b'\xc0' else b'\r\n'
+    else:
+        line = b'KC0D-1>APRS,TCPIP*,qAC,T2USANE:@011912z3946.24N/10459.04W_270/004g008t061r000p000P000h24b10152L548.WD 31\r\n'
+        burst = line * 100000
+        delimiter = b'\r\n'
+
+    chunks = [burst[i:i + 4096] for i in range(0, len(burst), 4096)]
+    print(f"Burst of {len(burst)} bytes, {len(chunks)} reads, delimiter {delimiter}")
+
+    # The original approach
+    start = time.perf_counter()
+    count = 0
+    bigbuffer = b''
+    for data in chunks:
+        bigbuffer += data
+        while delimiter in bigbuffer:
+            line, bigbuffer = bigbuffer.split(delimiter, 1)
+            if line:
+                count += 1
+    split_secs = time.perf_counter() - start
+    print(f"   bytes split:  {count} frames in {split_secs * 1000:.1f}ms ({len(burst) / split_secs / 1e6:.1f}MB/s)")
+
+    # The same reads, but as one burst backed up in the socket (i.e. the consumer fell behind and each read returns 64KB)
+    big = [burst[i:i + 65536] for i in range(0, len(burst), 65536)]
+    start = time.perf_counter()
+    count = 0
+    bigbuffer = b''
+    for data in big:
+        bigbuffer += data
+        while delimiter in bigbuffer:
+            line, bigbuffer = bigbuffer.split(delimiter, 1)
+            if line:
+                count += 1
+    backlog_secs = time.perf_counter() - start
+    print(f"   bytes split (64KB reads):  {count} frames in {backlog_secs * 1000:.1f}ms ({len(burst) / backlog_secs / 1e6:.1f}MB/s)")
+
+    for name, reads in (("FrameBuffer", chunks), ("FrameBuffer (64KB reads)", big)):
+        fb = FrameBuffer(delimiter)
+        start = time.perf_counter()
+        count = 0
+        for data in reads:
+            fb.feed(data)
+            for frame in fb.frames():
+                count += 1
+        secs = time.perf_counter() - start
+        print(f"   {name}:  {count} frames in {secs * 1000:.1f}ms ({len(burst) / secs / 1e6:.1f}MB/s)")
+
+    # Over a real socket with recv_into
+    a, b = socket.socketpair()
+    b.setblocking(False)
+    fb = FrameBuffer(delimiter)
+    count = 0
+    start = time.perf_counter()
+    for data in big:
+        a.sendall(data)
+        while True:
+            try:
+                if fb.recv_into(b) == 0:
+                    break
+            except BlockingIOError:
+                break
+            for frame in fb.frames():
+                count += 1
+    secs = time.perf_counter() - start
+    a.close()
+    b.close()
+    print(f"   FrameBuffer.recv_into over a socketpair:  {count} frames in {secs * 1000:.1f}ms ({len(burst) / secs / 1e6:.1f}MB/s)")
+
+
+if __name__ == "__main__":
+    main()
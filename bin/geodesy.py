@@ -0,0 +1,216 @@
+##################################################
+#    This file is part of the HABTracker project for tracking high altitude balloons.
+#
+#    Copyright (C) 2019,2020,2021 Jeff Deaton (N6BA)
+#
+#    HABTracker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    HABTracker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with HABTracker.  If not, see <https://www.gnu.org/licenses/>.
+#
+##################################################
+
+##################################################
+# Distance, bearing, and position math on a spherical earth
+#
+# Every function accepts scalars or numpy arrays (which are broadcast against each other), so a whole list of stations or every
+# point along a path can be handled in one call.  Scalar arguments return a plain float.  Latitudes and longitudes are in decimal
+# degrees and bearings are in degrees clockwise from true north.
+#
+# Functions:
+#     haversine(lat1, lon1, lat2, lon2, radius)
+#     bearing(lat1, lon1, lat2, lon2)
+#     destination(lat, lon, bearing, distance, radius)
+#     centroid(lats, lons)
+#     feetPerDegree(lat)
+#     degreesToFeet(dlat, dlon, lat)
+#     feetToDegrees(north, east, lat)
+##################################################
+
+import sys
+import math
+import time
+import numpy as np
+
+
+# Radius of the earth in miles (the value the landing predictor has always used), feet, kilometers, and meters
+EARTH_RADIUS_MILES = 3956.0
+EARTH_RADIUS_FEET = EARTH_RADIUS_MILES * 5280.0
+EARTH_RADIUS_KM = 6371.0
+EARTH_RADIUS_METERS = 6371000.0
+
+
+##################################################
+# Return a plain float for a scalar result, otherwise the array
+##################################################
+def _result(value):
+    return float(value) if np.ndim(value) == 0 else value
+
+
+##################################################
+# Great circle distance between points (in the units of radius, miles by default)
+##################################################
+def haversine(lat1, lon1, lat2, lon2, radius = EARTH_RADIUS_MILES):
+    lat1 = np.radians(lat1)
+    lon1 = np.radians(lon1)
+    lat2 = np.radians(lat2)
+    lon2 = np.radians(lon2)
+
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+
+    # Clip to guard against rounding pushing the value just past 1 for antipodal points
+    return _result(2 * radius * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0))))
+
+
+##################################################
+# Initial bearing (degrees, 0 to 360) from the first point towards the second
+##################################################
+def bearing(lat1, lon1, lat2, lon2):
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    dlon = np.radians(np.subtract(lon2, lon1))
+
+    y = np.sin(dlon) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+
+    return _result(np.mod(np.degrees(np.arctan2(y, x)), 360.0))
+
+
+##################################################
+# The point reached by traveling distance (in the units of radius, miles by default) along a bearing from a starting point
+#
+# Returns a tuple of latitude, longitude
+##################################################
+def destination(lat, lon, bearing, distance, radius = EARTH_RADIUS_MILES):
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    theta = np.radians(bearing)
+    delta = np.divide(distance, radius)
+
+    lat2 = np.arcsin(np.sin(lat) * np.cos(delta) + np.cos(lat) * np.sin(delta) * np.cos(theta))
+    lon2 = lon + np.arctan2(np.sin(theta) * np.sin(delta) * np.cos(lat), np.cos(delta) - np.sin(lat) * np.sin(lat2))
+
+    # Keep longitudes within -180 to 180
+    lon2 = np.mod(lon2 + math.pi, 2 * math.pi) - math.pi
+
+    return _result(np.degrees(lat2)), _result(np.degrees(lon2))
+
+
+##################################################
+# The geographic center of a set of points (the mean of their positions on the sphere)
+#
+# Returns a tuple of latitude, longitude
+##################################################
+def centroid(lats, lons):
+    lats = np.radians(np.asarray(lats, dtype='float64'))
+    lons = np.radians(np.asarray(lons, dtype='float64'))
+
+    x = np.mean(np.cos(lats) * np.cos(lons))
+    y = np.mean(np.cos(lats) * np.sin(lons))
+    z = np.mean(np.sin(lats))
+
+    return float(np.degrees(np.arctan2(z, np.hypot(x, y)))), float(np.degrees(np.arctan2(y, x)))
+
+
+##################################################
+# Feet per degree of latitude and of longitude at a latitude
+#
+# Returns a tuple of feet per degree latitude, feet per degree longitude
+##################################################
+def feetPerDegree(lat):
+    per_degree = EARTH_RADIUS_FEET * math.pi / 180.0
+
+    return _result(np.full(np.shape(lat), per_degree)), _result(per_degree * np.cos(np.radians(lat)))
+
+
+##################################################
+# Convert a change in latitude and longitude (degrees) at a latitude to feet north and feet east
+##################################################
+def degreesToFeet(dlat, dlon, lat):
+    lat_feet, lon_feet = feetPerDegree(lat)
+
+    return _result(np.multiply(dlat, lat_feet)), _result(np.multiply(dlon, lon_feet))
+
+
+##################################################
+# Convert feet north and feet east at a latitude to a change in latitude and longitude (degrees)
+##################################################
+def feetToDegrees(north, east, lat):
+    lat_feet, lon_feet = feetPerDegree(lat)
+
+    return _result(np.divide(north, lat_feet)), _result(np.divide(east, lon_feet))
+
+
+
+##################################################
+# main
+#
+# Benchmark the vectorized functions against the scalar, one point at a time, math we've used up until now
+##################################################
+def main():
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    # The scalar haversine the landing predictor used
+    def scalarDistance(lat1, lon1, lat2, lon2):
+        lon1 = math.radians(lon1)
+        lon2 = math.radians(lon2)
+        lat1 = math.radians(lat1)
+        lat2 = math.radians(lat2)
+        dlon = lon2 - lon1
+        dlat = lat2 - lat1
+        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
+        c = 2 * math.asin(math.sqrt(a))
+        return float(c * 3956)
+
+    # Stations scattered around Colorado and a single reference point
+    rng = np.random.default_rng(1)
+    lats = 37.0 + rng.random(n) * 4.0
+    lons = -109.0 + rng.random(n) * 7.0
+    lat0 = 39.75
+    lon0 = -104.99
+
+    start = time.perf_counter()
+    scalar = [scalarDistance(lat0, lon0, lat, lon) for lat, lon in zip(lats.tolist(), lons.tolist())]
+    scalar_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = haversine(lat0, lon0, lats, lons)
+    vector_secs = time.perf_counter() - start
+
+    print(f"haversine, {n} points:  scalar {scalar_secs * 1000:.2f}ms, vectorized {vector_secs * 1000:.2f}ms ({scalar_secs / vector_secs:.1f}x faster)")
+    print(f"    max difference: {np.max(np.abs(np.array(scalar) - vectorized)):.3e} miles")
+
+    # The averaging loop used for the CWOP filter
+    start = time.perf_counter()
+    sum_x = 0.0
+    sum_y = 0.0
+    for x, y in zip(lons.tolist(), lats.tolist()):
+        sum_x += x
+        sum_y += y
+    loop_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    centroid(lats, lons)
+    centroid_secs = time.perf_counter() - start
+    print(f"averaging, {n} points:  loop {loop_secs * 1000:.2f}ms, centroid {centroid_secs * 1000:.2f}ms")
+
+    # Round trip a path through destination/bearing/haversine
+    start = time.perf_counter()
+    dest_lats, dest_lons = destination(lats, lons, 45.0, 10.0)
+    back = bearing(dest_lats, dest_lons, lats, lons)
+    dist = haversine(lats, lons, dest_lats, dest_lons)
+    roundtrip_secs = time.perf_counter() - start
+    print(f"destination + bearing + haversine, {n} points:  {roundtrip_secs * 1000:.2f}ms, distance error: {np.max(np.abs(dist - 10.0)):.3e} miles, back bearing: {np.mean(back):.1f}")
+
+
+if __name__ == "__main__":
+    main()
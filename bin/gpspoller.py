@@ -39,6 +39,7 @@ from dataclasses import dataclass, field
 
 #import local configuration items
 import habconfig
+from statebus import StateBus
 
 
 
@@ -55,8 +56,8 @@ class GPSPoller(object):
     # Placeholder for multiprocessing event from run() function
     stopevent: mp.Event = mp.Event()
 
-    # this is the multiprocess dictionary that we regularly update with our position info 
-    position: dict = None
+    # this is the shared state (see statebus.py) that we regularly update with our position info 
+    statebus: StateBus = None
 
     # The database connection object
     dbconn: pg.extensions.connection = None
@@ -208,7 +209,7 @@ class GPSPoller(object):
 
 
     ##################################################
-    # update the shared (between processes) dictionary
+    # update the shared (between processes) position
     # ...other processes read this shared object to get the latest position
     ##################################################
     def _updatePosition(self, gs: dict = None)->None:
@@ -217,9 +218,9 @@ class GPSPoller(object):
         if gs:
             gpsstats = gs
 
-        # if we've got a valid position object then update that with this new gps info
-        if self.position is not None:
-            self.position["gpsdata"] = gpsstats
+        # if we've got a valid state bus then update that with this new gps info
+        if self.statebus is not None:
+            self.statebus.setPosition(gpsstats)
 
 
     ##################################################
@@ -933,7 +934,7 @@ def runGPSPoller(config, logginglevel: int = logging.INFO):
 
         # Create a new GPSPoller object
         logger.info("Starting GPS poller process.")
-        g = GPSPoller(stopevent = config["stopevent"], position = config["position"], loggingqueue = config["loggingqueue"], gpshost = config["gpshost"], timezone = config["timezone"], logginglevel = logginglevel)
+        g = GPSPoller(stopevent = config["stopevent"], statebus = config["statebus"], loggingqueue = config["loggingqueue"], gpshost = config["gpshost"], timezone = config["timezone"], logginglevel = logginglevel)
 
         # Start the poller
         g.run()
@@ -973,8 +974,8 @@ if __name__ == "__main__":
     qlistener = QueueListener(loggingqueue, ch)
     qlistener.start()
 
-    # Create a manager object
-    manager = mp.Manager()
+    # Create the shared state our position is published to
+    bus = StateBus()
 
     gpshost = ""
     if len(sys.argv) > 1:
@@ -985,9 +986,10 @@ if __name__ == "__main__":
             "stopevent": mp.Event(),
             "gpshost" : gpshost,
             "timezone": "America/Denver",
-            "position": manager.dict()
+            "statebus": bus
             }
 
     runGPSPoller(conf, logginglevel = logginglevel)
     qlistener.stop()
+    bus.unlink()
 
@@ -56,6 +56,10 @@ import databasechecks
 import databasewriter
 import subprocesses
 import connectors
+import ingestengine
+import packetqueue
+import igatestats
+import statebus
 import queries
 
 
@@ -242,6 +246,8 @@ def readConfiguration(configfile, options):
             "passcode" : "", 
             "gpshost": "",
             "ka9qradio": "false",
+            "rtpworkers" : "1",
+            "rtpgroups" : "",
             "fastspeed" : "45", 
             "fastrate" : "01:00", 
             "slowspeed" : "5", 
@@ -264,7 +270,14 @@ def readConfiguration(configfile, options):
             "mobilestation" : "true",
             "aprsisserver" : "noam.aprs2.net",
             "cwopserver" : "cwop.aprs.net",
-            "cwopradius" : 200
+            "cwopradius" : 200,
+            "aprsisminradius" : "25",
+            "aprsismaxrate" : "50",
+            "aprsisstandby" : "true",
+            "pathtolerance" : "0",
+            "demdirectory" : "/eosstracker/dem",
+            "predictorstate" : "/eosstracker/predictor.state",
+            "ingestengine" : "threads"
     }
 
     for the_key in list(defaultkeys.keys()):
@@ -328,17 +341,24 @@ def createProcesses(configuration):
     aprscprocess.daemon = True
     procs.append(aprscprocess)
 
-    # This is the APRS-IS connection tap, it will connect to the aprsc process we start above.
-    logger.debug(f"Creating APRS-IS Tap subprocess")
-    aprstap = mp.Process(name="APRS-IS Tap", target=connectors.connectorTap, args=(configuration, "aprs"))
-    aprstap.daemon = True
-    procs.append(aprstap)
+    # Are all of the connection taps hosted within a single asyncio ingest process (instead of one process per tap)?
+    asyncingest = True if configuration["ingestengine"] == "async" else False
 
-    # This is the CWOP connection tap.  
-    logger.debug(f"Creating CWOP Tap subprocess")
-    cwoptap = mp.Process(name="CWOP Tap", target=connectors.connectorTap, args=(configuration, "cwop"))
-    cwoptap.daemon = True
-    procs.append(cwoptap)
+    # The taps the ingest process will run
+    taps = ["aprs", "cwop"]
+
+    if not asyncingest:
+        # This is the APRS-IS connection tap, it will connect to the aprsc process we start above.
+        logger.debug(f"Creating APRS-IS Tap subprocess")
+        aprstap = mp.Process(name="APRS-IS Tap", target=connectors.connectorTap, args=(configuration, "aprs"))
+        aprstap.daemon = True
+        procs.append(aprstap)
+
+        # This is the CWOP connection tap.  
+        logger.debug(f"Creating CWOP Tap subprocess")
+        cwoptap = mp.Process(name="CWOP Tap", target=connectors.connectorTap, args=(configuration, "cwop"))
+        cwoptap.daemon = True
+        procs.append(cwoptap)
 
     # This is the GnuRadio aprsreceiver process(es)
     freqlist = configuration["direwolffreqlist"]
@@ -399,31 +419,57 @@ def createProcesses(configuration):
         procs.append(dfprocess)
 
         # The direwolf tap process 
-        logger.debug(f"Creating Direwolf Tap subprocess")
-        dftapprocess = mp.Process(name="Direwolf KISS Tap", target=connectors.connectorTap, args=(configuration, "dwkiss"))
-        dftapprocess.daemon = True
-        dftapprocess.name = "Direwolf KISS Tap"
-        procs.append(dftapprocess)
-
+        if asyncingest:
+            taps.append("dwkiss")
+        else:
+            logger.debug(f"Creating Direwolf Tap subprocess")
+            dftapprocess = mp.Process(name="Direwolf KISS Tap", target=connectors.connectorTap, args=(configuration, "dwkiss"))
+            dftapprocess.daemon = True
+            dftapprocess.name = "Direwolf KISS Tap"
+            procs.append(dftapprocess)
 
-    # if we're igating, then create a process to update a JSON file with igating statistics.  
-    # Might expand on this idea in the future with a "stats" or "telemetry" process that publishes data about the backend.
-    #igating = (True if configuration["igating"] == "true" else False) if "igating" in configuration else False
-    #if igating:
 
-        # The telemetry process
-    #    logger.debug(f"Creating Telemetry subprocess")
-    #    tmprocess = mp.Process(name="Telemetry", target=telemetry, args=(configuration,))
-    #    tmprocess.daemon = True
-    #    procs.append(tmprocess)
+    # The telemetry process updates JSON files with the igating statistics (if we're igating) and the APRS-IS filter radius along with
+    # the feed load it's adjusted for.
+    logger.debug(f"Creating Telemetry subprocess")
+    tmprocess = mp.Process(name="Telemetry", target=telemetry, args=(configuration,))
+    tmprocess.daemon = True
+    procs.append(tmprocess)
 
 
     # This is the RTP Multicast connection tap.  
     ka9qradio = True if configuration["ka9qradio"] == "true" else False
     if ka9qradio:
-        rtp = mp.Process(name="RTP Multicast Tap", target=connectors.connectorTap, args=(configuration, "rtp"))
-        rtp.daemon = True
-        procs.append(rtp)
+        rtpworkers = connectors.rtpWorkers(configuration)
+
+        if len(rtpworkers) == 1:
+            if asyncingest:
+                taps.append(("rtp", rtpworkers[0]))
+            else:
+                rtp = mp.Process(name="RTP Multicast Tap", target=connectors.connectorTap, args=(configuration, "rtp", rtpworkers[0]))
+                rtp.daemon = True
+                procs.append(rtp)
+
+        else:
+            # Several RTP workers (more than one worker per multicast group and/or more than one group).  Each worker is its own process
+            # (so they can run on separate CPU cores), with its own socket on the group, decoding its share of the frequencies and putting
+            # the packets on the same downstream queues.
+            for w in rtpworkers:
+                name = f"RTP Multicast Tap {w['group']}:{w['port']} {w['worker'] + 1}/{w['workers']}"
+                logger.debug(f"Creating {name} subprocess")
+                if asyncingest:
+                    rtp = mp.Process(name=name, target=ingestengine.runIngestEngine, args=(configuration, [("rtp", w)]))
+                else:
+                    rtp = mp.Process(name=name, target=connectors.connectorTap, args=(configuration, "rtp", w))
+                rtp.daemon = True
+                procs.append(rtp)
+
+    # The asyncio ingest process running all of the taps
+    if asyncingest:
+        logger.debug(f"Creating Packet Ingest subprocess for: {taps}")
+        ingest = mp.Process(name="Packet Ingest", target=ingestengine.runIngestEngine, args=(configuration, taps))
+        ingest.daemon = True
+        procs.append(ingest)
 
 
     # Return the list of newly created processes
@@ -465,10 +511,18 @@ def telemetry(config)->None:
 
     # where we store the telemetry we want to publish
     jsonFile = "/eosstracker/www/igatestats.json"
-    jsonTempFile = "/eosstracker/www/igatestats.json.tmp"
 
-    # Get the igate stats dictionary
-    igatestats = config["igatestatistics"] if "igatestatistics" in config else None
+    # Get the igate stats queue
+    statsqueue = config["igatestatistics"] if "igatestatistics" in config else None
+
+    # The igating counts for the top 100 stations, merged from the deltas the igating tap puts on the queue.  The JSON file is only
+    # rewritten when those change.
+    collector = igatestats.IgateStatsCollector(queue = statsqueue, jsonfile = jsonFile, capacity = 100) if statsqueue is not None else None
+
+    # where we store the APRS-IS filter radius and the feed load it's adjusted for (see radiuscontroller.py), and when it was last updated
+    feedFile = "/eosstracker/www/aprsisfeed.json"
+    bus = config["statebus"] if "statebus" in config else None
+    feedupdated = None
     
     try:
         
@@ -479,38 +533,29 @@ def telemetry(config)->None:
         while not stopevent.is_set():
 
             # handle igating statistics
-            if igatestats:
-
-                # make sure the object exists
-                if "igated_stations" in igatestats:
-
-                    # ...and that there is a valid dictionary therein...
-                    stats = igatestats["igated_stations"]
-                    if stats:
-
-
-                        ##### need a better way to do this instead of just dumping to a JSON file.  Seems poorly thought out.  However, 
-                        ##### at the moment it will do. 
-
-                        # sort the stats dictionary by value in reverse order.
-                        #sorted_stats = sorted(stats.items(), key=lambda x: x[1], reverse=True)
-                        sorted_stats = { x: v for x, v in sorted(stats.items(), key=lambda x: x[1], reverse=True)}
-
-                        telemlogger.debug(f"{name} Igate statistics: {sorted_stats=}")
-
-                        # open the JSON temp file and write our telemetry to it
-                        with open(jsonTempFile, "w") as f:
-                            f.write(json.dumps(sorted_stats))
-
-                        # Now move the temp file in place over the real one.
-                        if os.path.isfile(jsonTempFile):
-                            os.rename(jsonTempFile, jsonFile)
-
-                        # every 60th time through the loop we write an info message to system logging
-                        if not i % 60:
-                            topstations = {A:N for (A,N) in [ k for k in sorted_stats.items()][:3]}
-                            #topstations = sorted_stats[:3]
-                            telemlogger.info(f"{name} Total igated packets: {sum(stats.values())}, top stations {topstations}")
+            if collector and collector.collect():
+
+                # write the JSON file (if anything changed)
+                if collector.write():
+                    telemlogger.debug(f"{name} Igate statistics: {collector.written}")
+
+                # every 60th time through the loop we write an info message to system logging
+                if i >= 60:
+                    i = 0
+                    telemlogger.info(f"{name} Total igated packets: {collector.stations.total}, top stations {collector.top(3)}")
+
+            # write the APRS-IS filter radius and feed load when the APRS-IS tap has adjusted it
+            feed = bus.getFeed() if bus is not None else None
+            if feed is not None and feed["updated"] != feedupdated:
+                feedupdated = feed["updated"]
+                feed["rate"] = round(feed["rate"], 1)
+                try:
+                    with open(feedFile + ".tmp", "w") as f:
+                        json.dump(feed, f)
+                    os.rename(feedFile + ".tmp", feedFile)
+                    telemlogger.debug(f"{name} APRS-IS feed: {feed}")
+                except OSError as e:
+                    telemlogger.debug(f"{name} unable to write {feedFile}: {e}")
 
             # wait a few seconds before getting igate stats again
             stopevent.wait(5)
@@ -789,11 +834,9 @@ def getPosition(configuration)->dict:
             }
 
     # This retreives the latest GPS data (assuing GPS Poller process is running)
-    g = configuration["position"]
-
-    if "gpsdata" in g:
-        position = g["gpsdata"]
+    position = configuration["statebus"].getPosition() if "statebus" in configuration else None
 
+    if position:
         if "mode"  in position:
             mode = int(position["mode"])
 
@@ -863,39 +906,26 @@ def main():
         # Add the stopevent to the our configuration
         configuration["stopevent"] = stopevent
 
-        # incoming packet queue for database writes.  All sub-processes that ingest packets place packets in this queue.
-        configuration["databasequeue"] = mp.Queue(maxsize = 0)
+        # incoming packet queue for database writes.  All sub-processes that ingest packets place packets in this queue.  When it's full, general
+        # traffic is dropped (oldest first) to make room, but packets from active flight beacons and this station are always kept.  Packets
+        # are passed through shared memory ring buffers (4MB per priority class) rather than pipes.
+        configuration["databasequeue"] = packetqueue.PacketQueue(maxsize = 250, ringsize = 4194304)
 
         # for all packets that we're intending to igate. sub-processes will add packets for igating consideration to this queue
-        configuration["igatingqueue"] = mp.Queue(maxsize = 0)
+        configuration["igatingqueue"] = packetqueue.PacketQueue(maxsize = 250, ringsize = 4194304)
+
+        # Igating statistics.  The igating tap counts the packets igated from each station and every few seconds puts the counts since the
+        # last time on this queue (see igatestats.py).  The telemetry process reads them.
+        configuration["igatestatistics"] = mp.Queue(maxsize = 100)
 
         # add the logging queue to the configuration sent to sub-processes so their log messages are routed back here
         configuration["loggingqueue"] = loggingqueue
 
-        # a central, shared location for disimenating latest information from a variety of processes
-        # this is our multi-process manager object (for handling shared dictionaries)
-        manager = mp.Manager()
-
-        # if the manager creation was successful
-        if manager:
-
-            # create a dictionary for storing our position information (gpspoller updates it).  Other processes read this to get latest position details
-            configuration["position"] = manager.dict()
-
-            # Create a list of landing locations for active flights.  this is a list of tuples (i.e. coordinates) for all active flights.  Updated by the 
-            # landing predictor process.  
-            configuration["landinglocations"] = manager.dict()
-
-            # Create a list of all beacon callsigns on active flights.  This is a list of beacon callsigns updated by the landing predictor process.
-            configuration["activebeacons"] = manager.dict()
-
-            # Create an object where we store igating statistics.  This is a dictionary with keys representing a station's callsign.  Values are number of packets igated.
-            configuration["igatestatistics"] = manager.dict()
-
-        else:
-
-            # if we couldn't create a manager object then we set the "position" key to None
-            configuration["position"] = None
+        # a central, shared location for disimenating latest information from a variety of processes (see statebus.py):
+        #    - our position information (gpspoller updates it).  Other processes read this to get latest position details
+        #    - the landing locations for active flights, a list of (lon, lat) tuples.  Updated by the landing predictor process.
+        #    - the beacon callsigns on active flights.  Updated by the landing predictor process.
+        configuration["statebus"] = statebus.StateBus()
 
 
         #######################################################
@@ -989,6 +1019,11 @@ def main():
     # stop the logging listener as all the sub-processes are not stopped
     loglistener.stop()
 
+    # free the shared memory used by the packet queues and the state bus
+    for q in ["databasequeue", "igatingqueue", "statebus"]:
+        if q in configuration and hasattr(configuration[q], "unlink"):
+            configuration[q].unlink()
+
     # Save the operating mode and status to a JSON file...as basically empty as we're now shutting down
     jsonStatusFile = "/eosstracker/www/daemonstatus.json"
     jsonStatusTempFile = "/eosstracker/www/daemonstatus.json.tmp"
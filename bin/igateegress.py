@@ -0,0 +1,217 @@
+##################################################
+#    This file is part of the HABTracker project for tracking high altitude balloons.
+#
+#    Copyright (C) 2019,2020,2021 Jeff Deaton (N6BA)
+#
+#    HABTracker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    HABTracker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with HABTracker.  If not, see <https://www.gnu.org/licenses/>.
+#
+##################################################
+
+import sys
+import time
+import socket
+from collections import deque
+from dataclasses import dataclass
+
+
+##################################################
+# The duplicate check key for a packet:  the source callsign, the destination callsign (without its SSID), and the information field
+# with any trailing spaces, CR's, and LF's removed.  The path isn't part of it.  This is the same check aprsc uses, so a packet
+# APRS-IS would throw away as a duplicate is never sent.
+##################################################
+def dupeKey(source: str, destination: str, information)->tuple:
+
+    if isinstance(information, str):
+        information = information.encode(encoding = 'utf-8', errors = 'ignore')
+
+    return (source.upper(), destination.split("-")[0].upper(), information.rstrip(b" \r\n"))
+
+
+#####################################
+# The DupeFilter Class
+#
+# Remembers the packets igated over the last window seconds.  The same packet is often heard on several direwolf channels and by
+# ka9q-radio (or through more than one digipeater), only the first copy is igated.  A copy only counts as a duplicate within window
+# seconds of the first one heard, hearing it again doesn't extend that.
+#####################################
+@dataclass
+class DupeFilter(object):
+
+    # the duplicate window (in seconds), the same as APRS-IS
+    window: float = 30.0
+
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        # dupe key -> when it was first heard, and the (time, key) pairs in the order they were heard for aging them out
+        self.seen = {}
+        self.order = deque()
+
+        # the number of duplicates suppressed
+        self.suppressed = 0
+
+
+    ################################
+    # Returns True if a packet with this key was already seen in the duplicate window, otherwise remembers it and returns False
+    ################################
+    def isDupe(self, key: tuple, now: float = None)->bool:
+
+        if now is None:
+            now = time.monotonic()
+
+        # forget the packets that have aged out of the window
+        seen = self.seen
+        order = self.order
+        expired = now - self.window
+        while order and order[0][0] <= expired:
+            heard, k = order.popleft()
+            if seen.get(k) == heard:
+                del seen[k]
+
+        if key in seen:
+            self.suppressed += 1
+            return True
+
+        seen[key] = now
+        order.append((now, key))
+        return False
+
+
+#####################################
+# The LatencyTracker Class
+#
+# Records how long each igated packet took to get from RF (when it was decoded) to the APRS-IS socket.  The most recent samples are
+# kept for the percentiles, along with running totals.
+#####################################
+@dataclass
+class LatencyTracker(object):
+
+    # the number of recent samples kept
+    samples: int = 1000
+
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        self.recent = deque(maxlen = self.samples)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+
+    ################################
+    # record the latency (in seconds) of one packet
+    ################################
+    def record(self, latency: float)->None:
+
+        self.recent.append(latency)
+        self.count += 1
+        self.total += latency
+        if latency > self.maximum:
+            self.maximum = latency
+
+
+    ################################
+    # the latency statistics (in seconds):  the number of packets, the mean and max over all of them, and the median and 95th
+    # percentile of the recent ones
+    ################################
+    def stats(self)->dict:
+
+        if not self.count:
+            return { "count" : 0, "mean" : None, "median" : None, "p95" : None, "max" : None }
+
+        recent = sorted(self.recent)
+        return { "count" : self.count, "mean" : self.total / self.count, "median" : recent[len(recent) // 2],
+                "p95" : recent[min(int(len(recent) * 0.95), len(recent) - 1)], "max" : self.maximum }
+
+
+    ################################
+    # a one line summary
+    ################################
+    def summary(self)->str:
+
+        s = self.stats()
+        if not s["count"]:
+            return "no packets igated"
+
+        return f"{s['count']} packets igated, RF to APRS-IS latency:  median {s['median'] * 1000:.0f}ms, 95% {s['p95'] * 1000:.0f}ms, max {s['max'] * 1000:.0f}ms"
+
+
+
+##################################################
+# main
+#
+# Igate a stream of packets where each is heard three times (ex. on two direwolf channels and by ka9q-radio), checking that only the
+# first copy is sent, and compare one sendall() per packet with one sendall() for each batch.
+##################################################
+def main():
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 30000
+
+    lines = []
+    for i in range(count):
+        line = f"KC0D-{i // 3 % 16}>APRS,WIDE2-1,qAO,N0CALL:@011912z3946.24N/10459.04W_270/004g008t061 seq {i // 3}".encode()
+        lines.append(line + b"\r\n")
+
+    dupes = DupeFilter()
+    start = time.perf_counter()
+    sendlist = []
+    for i, line in enumerate(lines):
+        header, info = line.split(b":", 1)
+        source, path = header.split(b">", 1)
+        if not dupes.isDupe(dupeKey(source.decode(), path.split(b",")[0].decode(), info), now = i * 0.001):
+            sendlist.append(line)
+    secs = time.perf_counter() - start
+
+    print(f"{count} packets heard, {len(sendlist)} sent, {dupes.suppressed} duplicates suppressed ({secs / count * 1e6:.2f}us per packet)")
+    assert len(sendlist) == (count + 2) // 3
+
+    # a copy heard after the window is igated again
+    d = DupeFilter(window = 30)
+    key = dupeKey("KC0D-1", "APRS-2", b"hello  \r\n")
+    assert not d.isDupe(key, 0) and d.isDupe(dupeKey("kc0d-1", "APRS", b"hello"), 29.9) and not d.isDupe(key, 30.1)
+
+    for batch in (1, 8, 64):
+        a, b = socket.socketpair()
+        b.setblocking(False)
+        received = 0
+        start = time.perf_counter()
+        for i in range(0, len(sendlist), batch):
+            if batch == 1:
+                a.sendall(sendlist[i])
+            else:
+                a.sendall(b"".join(sendlist[i:i + batch]))
+            try:
+                while True:
+                    received += len(b.recv(65536))
+            except BlockingIOError:
+                pass
+        secs = time.perf_counter() - start
+        a.close()
+        b.close()
+        print(f"sendall of {batch:>2} packets at a time:  {secs / len(sendlist) * 1e6:.2f}us per packet")
+
+    latency = LatencyTracker()
+    for i in range(count):
+        latency.record(0.05 + (i % 100) * 0.001)
+    print(latency.summary())
+
+
+if __name__ == "__main__":
+    main()
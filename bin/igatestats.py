@@ -0,0 +1,321 @@
+##################################################
+#    This file is part of the HABTracker project for tracking high altitude balloons.
+#
+#    Copyright (C) 2019,2020,2021 Jeff Deaton (N6BA)
+#
+#    HABTracker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    HABTracker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with HABTracker.  If not, see <https://www.gnu.org/licenses/>.
+#
+##################################################
+
+##################################################
+# Igating statistics:  the number of packets igated from each station.
+#
+# The tap doing the igating counts the packets locally (IgateStatistics) and every few seconds puts the counts since the last time on
+# a queue, one small dictionary of deltas.  The telemetry process merges these (IgateStatsCollector) into a bounded top-K table and
+# writes it to the igatestats.json file, only when what it would write has changed.
+##################################################
+
+import multiprocessing as mp
+import threading as th
+import os
+import sys
+import json
+import time
+import random
+from queue import Empty, Full
+from dataclasses import dataclass
+
+
+#####################################
+# The TopK Class
+#
+# Counts for at most capacity keys (the "space saving" algorithm).  When a new key arrives and the table is full, the key with the
+# smallest count is replaced and the new key takes over its count.  The heavy hitters are always kept, and a count is over by at most
+# the count of the key it replaced.
+#####################################
+@dataclass
+class TopK(object):
+
+    # the most keys that are counted
+    capacity: int = 100
+
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        self.counts = {}
+
+        # the total of everything counted (including keys since replaced)
+        self.total = 0
+
+
+    ################################
+    # add n to the count for a key
+    ################################
+    def add(self, key, n: int = 1)->None:
+
+        self.total += n
+        counts = self.counts
+
+        if key in counts:
+            counts[key] += n
+
+        elif len(counts) < self.capacity:
+            counts[key] = n
+
+        else:
+            smallest = min(counts, key = counts.get)
+            counts[key] = counts.pop(smallest) + n
+
+
+    ################################
+    # the keys and their counts, largest first
+    ################################
+    def top(self, n: int = None)->dict:
+        return { k : v for k, v in sorted(self.counts.items(), key = lambda x: x[1], reverse = True)[:n] }
+
+
+
+#####################################
+# The IgateStatistics Class
+#
+# Counts the igated packets for each station in the tap's process.  The counts since the last publish are put on the queue every
+# interval seconds (by a background thread, started with the first packet) as a tuple of (packets, { callsign : packets }).  At most
+# capacity stations are listed in each delta, the rest are only in the packet total.  If the queue is full (i.e. nothing is reading
+# it) the delta is thrown away.
+#####################################
+@dataclass
+class IgateStatistics(object):
+
+    # the queue the deltas are put on
+    queue: mp.Queue = None
+
+    # the Event that's set when it's time to stop
+    stopevent: mp.Event = None
+
+    # how often (in seconds) the deltas are published.  0 to only publish when publish() is called.
+    interval: float = 5.0
+
+    # the most stations listed in a delta
+    capacity: int = 256
+
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        # the counts since the last publish
+        self.pending = {}
+        self.pendingtotal = 0
+        self.lock = th.Lock()
+
+        # the totals for this process
+        self.total = 0
+        self.dropped = 0
+
+        self.publisher = None
+
+
+    ################################
+    # count a packet igated from a station
+    ################################
+    def add(self, callsign: str)->None:
+
+        with self.lock:
+            self.pendingtotal += 1
+            pending = self.pending
+            if callsign in pending:
+                pending[callsign] += 1
+            elif len(pending) < self.capacity:
+                pending[callsign] = 1
+
+        self.total += 1
+
+        if self.publisher is None and self.queue is not None and self.interval > 0:
+            self.publisher = th.Thread(name = "igate statistics", target = self.publishLoop, daemon = True)
+            self.publisher.start()
+
+
+    ################################
+    # put the counts since the last publish on the queue.  Returns False if there weren't any or they couldn't be queued.
+    ################################
+    def publish(self)->bool:
+
+        with self.lock:
+            if not self.pendingtotal:
+                return False
+            delta = (self.pendingtotal, self.pending)
+            self.pending = {}
+            self.pendingtotal = 0
+
+        try:
+            self.queue.put_nowait(delta)
+        except (Full, OSError, ValueError):
+            self.dropped += 1
+            return False
+
+        return True
+
+
+    ################################
+    # the background thread publishing the deltas
+    ################################
+    def publishLoop(self)->None:
+
+        while self.stopevent is None or not self.stopevent.is_set():
+            if self.stopevent is None:
+                time.sleep(self.interval)
+            else:
+                self.stopevent.wait(self.interval)
+            self.publish()
+
+
+
+#####################################
+# The IgateStatsCollector Class
+#
+# Merges the deltas from the IgateStatistics queue into the top capacity stations and writes them (as a JSON dictionary of callsign
+# to packets igated, largest first) to the stats file when they've changed.
+#####################################
+@dataclass
+class IgateStatsCollector(object):
+
+    # the queue the deltas are taken from
+    queue: mp.Queue = None
+
+    # the JSON file to write
+    jsonfile: str = "/eosstracker/www/igatestats.json"
+
+    # the number of stations kept
+    capacity: int = 100
+
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        self.stations = TopK(capacity = self.capacity)
+
+        # what's in the JSON file now (so it isn't rewritten with the same thing)
+        try:
+            with open(self.jsonfile) as f:
+                self.written = f.read()
+        except OSError:
+            self.written = None
+
+
+    ################################
+    # merge everything waiting on the queue.  Returns the number of deltas merged.
+    ################################
+    def collect(self)->int:
+
+        n = 0
+        while True:
+            try:
+                total, stations = self.queue.get_nowait()
+            except (Empty, EOFError, OSError):
+                return n
+
+            n += 1
+            for callsign, count in stations.items():
+                self.stations.add(callsign, count)
+
+            # packets from stations that didn't fit in the delta
+            self.stations.total += total - sum(stations.values())
+
+
+    ################################
+    # the packets igated from the top stations
+    ################################
+    def top(self, n: int = None)->dict:
+        return self.stations.top(n)
+
+
+    ################################
+    # write the stats file if its contents have changed.  Returns True if it was written.
+    ################################
+    def write(self)->bool:
+
+        stats = self.stations.top()
+        if not stats:
+            return False
+
+        content = json.dumps(stats)
+        if content == self.written:
+            return False
+
+        # write a temp file then move it in place over the real one
+        tempfile = self.jsonfile + ".tmp"
+        with open(tempfile, "w") as f:
+            f.write(content)
+        os.rename(tempfile, self.jsonfile)
+
+        self.written = content
+        return True
+
+
+
+##################################################
+# main
+#
+# Igate packets from a few busy stations and a long tail of others, comparing the cost per packet of writing the whole station
+# dictionary to a Manager dictionary (as the tap used to) with counting locally and publishing deltas.
+##################################################
+def main():
+
+    import tempfile
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    rng = random.Random(1)
+    callsigns = [f"KC0D-{rng.randint(0, 9)}" if rng.random() < 0.6 else f"N{rng.randint(0, 3000)}" for i in range(count)]
+
+    manager = mp.Manager()
+    shared = manager.dict()
+    stations = {}
+    start = time.perf_counter()
+    for c in callsigns:
+        stations[c] = stations.get(c, 0) + 1
+        shared["igated_stations"] = stations
+    old = (time.perf_counter() - start) / count
+    manager.shutdown()
+
+    queue = mp.Queue(maxsize = 1000)
+    stats = IgateStatistics(queue = queue, interval = 0)
+    start = time.perf_counter()
+    for i, c in enumerate(callsigns):
+        stats.add(c)
+        if i % 500 == 499:
+            stats.publish()
+    stats.publish()
+    new = (time.perf_counter() - start) / count
+
+    print(f"{count} packets from {len(stations)} stations:  Manager dictionary {old * 1e6:.1f}us per packet, local counts + deltas {new * 1e6:.2f}us per packet")
+
+    time.sleep(0.5)
+    with tempfile.TemporaryDirectory() as d:
+        collector = IgateStatsCollector(queue = queue, jsonfile = os.path.join(d, "igatestats.json"))
+        print(f"collected {collector.collect()} deltas, {collector.stations.total} packets, wrote file: {collector.write()}, rewrote unchanged file: {collector.write()}")
+
+    # the heavy hitters are exact
+    exact = sorted(stations.items(), key = lambda x: x[1], reverse = True)[:10]
+    print(f"top 10 match exact counts: {list(collector.top(10).items()) == exact}")
+
+
+if __name__ == "__main__":
+    main()
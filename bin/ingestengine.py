@@ -0,0 +1,679 @@
+##################################################
+#    This file is part of the HABTracker project for tracking high altitude balloons.
+#
+#    Copyright (C) 2019,2020,2021 Jeff Deaton (N6BA)
+#
+#    HABTracker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    HABTracker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with HABTracker.  If not, see <https://www.gnu.org/licenses/>.
+#
+##################################################
+
+##################################################
+# An asyncio event loop that hosts any number of PacketStream objects (APRS-IS, CWOP, direwolf KISS, RTP multicast) in a single process.
+#
+# The threaded PacketStream.run() polls its socket with select(..., 0) and sleeps for up to a second when there's nothing to read (or
+# nothing on its queues to send).  Here every socket is registered with the event loop instead, so a packet is handed to the read
+# handlers as soon as it arrives.  Packets to be sent are pulled from the (multiprocessing) write handler queues by a blocking get()
+# in a small feeder thread per queue, which wakes the event loop right away.  The feeders only do that while a session is up and they
+# block while the stream's (bounded) outbound queue is full, so packets wait on the write handler queues, where the oldest low priority
+# packets are dropped when they fill up.
+#
+# The streams themselves are unchanged:  the engine uses their read/write PacketHandlers, delimiter, encodePacket(), putPacketOnQueue(),
+# and for APRS-IS connections the login, filter, and beacon logic.  The slow bits of the latter (GPS position and database lookups)
+# run in the loop's default executor.
+##################################################
+
+import multiprocessing as mp
+import threading as th
+import asyncio
+import socket
+import signal
+import time
+import sys
+import logging
+import concurrent.futures
+from queue import Empty
+from dataclasses import dataclass
+from logging.handlers import QueueHandler
+
+import connectors
+from packet import Packet
+
+
+# The size of a stream's outbound queue when its write handler queues aren't limited
+OUTBOUND_SIZE = 250
+
+#####################################
+# The IngestEngine Class
+#####################################
+@dataclass
+class IngestEngine(object):
+
+    # the Event that's set when it's time to stop
+    stopevent: mp.Event = None
+
+    # the logging queue
+    loggingqueue: mp.Queue = None
+
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        # setup logging
+        self.logger = logging.getLogger(f"{__name__}.{__class__}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+
+        # check if a logging queue was supplied
+        if self.loggingqueue is not None:
+
+            # a queue was supplied so we setup a queuehandler
+            handler = QueueHandler(self.loggingqueue)
+            self.logger.addHandler(handler)
+
+        if self.stopevent is None:
+            self.stopevent = mp.Event()
+
+        # The PacketStream objects this engine is running
+        self.streams = []
+
+        # set once the event loop has finished so the helper threads know to end
+        self.finished = th.Event()
+
+        # the event loop and the asyncio version of the stopevent (both are created when the engine is run)
+        self.loop = None
+        self.stopping = None
+
+        self.logger.debug("IngestEngine instance created.")
+
+
+    ################################
+    # add a PacketStream for the engine to run
+    ################################
+    def add(self, stream: connectors.PacketStream)->None:
+        self.streams.append(stream)
+
+
+    ################################
+    # run the engine until the stopevent is set.  This blocks.
+    ################################
+    def run(self)->None:
+        try:
+            asyncio.run(self.main())
+        finally:
+            self.finished.set()
+            for stream in self.streams:
+                stream.disconnect()
+
+
+    ################################
+    # the top level coroutine
+    ################################
+    async def main(self)->None:
+
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        self.finished.clear()
+
+        # stop on a SIGTERM (only possible from the main thread)
+        if th.current_thread() is th.main_thread():
+            self.loop.add_signal_handler(signal.SIGTERM, self.stop)
+
+        # watch the (multiprocessing) stopevent from a thread so the loop is told as soon as it's set
+        th.Thread(name="IngestEngine:stopwatcher", target=self.stopWatcher, daemon=True).start()
+
+        tasks = [asyncio.create_task(self.serve(stream), name=stream.server.nickname) for stream in self.streams]
+        self.logger.info(f"IngestEngine running {len(tasks)} streams: {', '.join(s.server.nickname for s in self.streams)}")
+
+        # wait until we're told to stop
+        await self.stopping.wait()
+
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions = True)
+
+        self.finished.set()
+        self.logger.info("IngestEngine ended")
+
+
+    ################################
+    # tell the engine to stop
+    ################################
+    def stop(self)->None:
+        self.stopevent.set()
+        if self.stopping is not None:
+            self.stopping.set()
+
+
+    ################################
+    # thread that waits on the stopevent, then wakes up the event loop
+    ################################
+    def stopWatcher(self)->None:
+        while not self.finished.is_set():
+            if self.stopevent.wait(0.5):
+                self.loop.call_soon_threadsafe(self.stopping.set)
+                break
+
+
+    ################################
+    # wait on the stopping event for at most this many seconds.  Returns True if it's time to stop.
+    ################################
+    async def pause(self, seconds: float)->bool:
+        try:
+            await asyncio.wait_for(self.stopping.wait(), timeout = seconds)
+        except asyncio.TimeoutError:
+            pass
+
+        return self.stopping.is_set()
+
+
+    ################################
+    # the connect/session/reconnect loop for one stream.  This follows the same retry schedule as PacketStream.run():  streams that can
+    # fail over reconnect right away when a connection ends, then wait as long as the stream says between failed attempts.
+    ################################
+    async def serve(self, stream: connectors.PacketStream)->None:
+
+        # The stream is offline until a session is established, so the feeder threads leave packets on the write handler queues until then
+        stream.okay.set()
+
+        # Packets waiting to be sent to this stream's socket.  These are filled by feeder threads reading from the write handler queues and
+        # are limited to about what one of those queues holds.
+        sizes = [q.maxsize for ph in stream.writehandlers for (q, qname) in ph.q if getattr(q, "maxsize", 0) > 0]
+        outbound = asyncio.Queue(maxsize = max(sizes) if sizes else OUTBOUND_SIZE)
+        if stream.can_send:
+            for ph in stream.writehandlers:
+                for (q, qname) in ph.q:
+                    th.Thread(name=f"{stream.server.nickname}:{qname} feeder", target=self.queueFeeder, args=(stream, ph, q, outbound), daemon=True).start()
+
+        # keep track of how many connection retries have been attempted
+        trycount = 0
+
+        try:
+            while not self.stopping.is_set():
+
+                online, reader, writer = await self.connect(stream)
+
+                if online:
+                    self.logger.info(f"{stream.server.nickname} connected to [{stream.server.hostname}] {stream.peername}:{stream.server.portnum}")
+
+                    # set our retry count back to 0 since we just connected
+                    trycount = 0
+
+                    await self.session(stream, reader, writer, outbound)
+
+                    # packets that weren't sent during the session are thrown away rather than being sent on the next connection
+                    dropped = 0
+                    while not outbound.empty():
+                        outbound.get_nowait()
+                        dropped += 1
+                    if dropped:
+                        self.logger.debug(f"{stream.server.nickname} serve: dropped {dropped} unsent packets")
+
+                # the session ended (or never started), so close things down
+                if writer:
+                    writer.close()
+                stream.disconnect()
+
+                if self.stopping.is_set():
+                    break
+
+                # streams that can fail over to another server reconnect right away, the others wait before retrying
+                if not (online and stream.sessionEnded()):
+
+                    # Increment the trycount and wait before retrying to connect
+                    trycount += 1
+                    retry_delay = stream.retryDelay(trycount)
+
+                    self.logger.debug(f"{stream.server.nickname} serve: {retry_delay=}, {trycount=}")
+                    if await self.pause(retry_delay):
+                        break
+
+                self.logger.info(f"{stream.server.nickname} serve:  Reconnecting")
+
+        except asyncio.CancelledError:
+            pass
+
+        finally:
+            stream.disconnect()
+
+        self.logger.debug(f"{stream.server.nickname} serve ended")
+
+
+    ################################
+    # connect a stream.  Returns a tuple of (online, reader, writer).  The reader and writer are None for multicast streams.
+    ################################
+    async def connect(self, stream: connectors.PacketStream):
+
+        # Multicast (UDP) streams set up their own socket.  That's run in the executor as joining the group can block for a while.
+        if isinstance(stream, connectors.MulticastPacketStream):
+            online = await self.loop.run_in_executor(None, stream.connect)
+            if online and stream.sock:
+                stream.sock.setblocking(False)
+            return online and stream.sock is not None, None, None
+
+        # The stream connects (and logs in to APRS-IS servers), failing over between its servers or switching to its standby connection.  That's
+        # the same blocking code the threaded streams use, so it's run in the executor.
+        conn = await self.loop.run_in_executor(None, stream.establish)
+        if conn is None:
+            return False, None, None
+
+        sock, framebuffer = conn
+        try:
+            sock.setblocking(False)
+            reader, writer = await asyncio.open_connection(sock = sock)
+
+        except OSError as e:
+            self.logger.error(f"{stream.server.nickname}: connection error: {e}")
+            sock.close()
+            stream.pool.down(stream.server, str(e))
+            return False, None, None
+
+        stream.peername = writer.get_extra_info('peername')[0]
+        stream.lastheard = time.monotonic()
+
+        # clear the internal flag (if set)
+        stream.okay.clear()
+
+        # anything that arrived along with the login
+        for line in framebuffer.frames():
+            stream.putPacketOnQueue(line)
+
+        return True, reader, writer
+
+
+    ################################
+    # run the read, send, filter, and beacon tasks for a connected stream until one of them ends (i.e. the connection fails) or we're stopped
+    ################################
+    async def session(self, stream: connectors.PacketStream, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, outbound: asyncio.Queue)->None:
+
+        tasks = []
+
+        if stream.can_read:
+            if reader is not None:
+                tasks.append(asyncio.create_task(self.readLoop(stream, reader)))
+            else:
+                tasks.append(asyncio.create_task(self.datagramLoop(stream)))
+
+        if writer is not None:
+            if stream.can_send:
+                tasks.append(asyncio.create_task(self.sendLoop(stream, writer, outbound)))
+
+            if stream.idletimeout:
+                tasks.append(asyncio.create_task(self.idleLoop(stream)))
+
+            if isinstance(stream, connectors.AprsisStream):
+                tasks.append(asyncio.create_task(self.filterLoop(stream, writer)))
+
+                if stream.can_send and stream.can_beacon and stream.igating:
+                    tasks.append(asyncio.create_task(self.beaconLoop(stream, writer)))
+
+        if not tasks:
+            await self.stopping.wait()
+            return
+
+        stopper = asyncio.create_task(self.stopping.wait())
+        try:
+            await asyncio.wait(tasks + [stopper], return_when = asyncio.FIRST_COMPLETED)
+        finally:
+            for t in tasks + [stopper]:
+                t.cancel()
+            await asyncio.gather(*tasks, stopper, return_exceptions = True)
+
+            # mark the stream as not okay so the feeder threads stop pulling packets from the queues
+            stream.okay.set()
+
+        self.logger.debug(f"{stream.server.nickname} session ended")
+
+
+    ################################
+    # read delimited lines (or KISS frames) from a TCP stream, handing each to the stream's read handlers
+    ################################
+    async def readLoop(self, stream: connectors.PacketStream, reader: asyncio.StreamReader)->None:
+
+        dlen = len(stream.delimiter)
+
+        while True:
+            try:
+                line = await reader.readuntil(stream.delimiter)
+
+            except asyncio.IncompleteReadError:
+                # the server closed the connection
+                self.logger.error(f"{stream.server.nickname} readLoop: connection closed by {stream.server.hostname}")
+                return
+
+            except asyncio.LimitOverrunError as e:
+                # an absurdly long line without a delimiter.  Throw it away.
+                self.logger.warning(f"{stream.server.nickname} readLoop: discarding {e.consumed} bytes without a delimiter")
+                await reader.readexactly(e.consumed)
+                continue
+
+            except OSError as e:
+                self.logger.error(f"Socket error in readLoop with {stream.server.nickname}: {e}")
+                return
+
+            stream.lastheard = time.monotonic()
+
+            # KISS frames are both started and ended with a FEND, so empty lines are skipped
+            if len(line) > dlen:
+                stream.putPacketOnQueue(line[:-dlen])
+
+
+    ################################
+    # end the session when nothing's been heard from the server for longer than the stream's idletimeout (a dead connection)
+    ################################
+    async def idleLoop(self, stream: connectors.PacketStream)->None:
+
+        while True:
+            if await self.pause(stream.idletimeout / 4):
+                return
+
+            if time.monotonic() - stream.lastheard > stream.idletimeout:
+                self.logger.error(f"{stream.server.nickname} idleLoop: nothing heard from {stream.server.hostname} for {stream.idletimeout}s")
+                return
+
+
+    ################################
+    # read datagrams (ex. RTP frames) from a multicast stream, handing each to the stream's read handlers
+    ################################
+    async def datagramLoop(self, stream: connectors.PacketStream)->None:
+
+        done = self.loop.create_future()
+        sock = stream.sock
+
+        def ready():
+            # read everything that's waiting, up to a limit so one busy stream can't starve the others
+            for i in range(64):
+                try:
+                    # straight into the stream's receive buffer, the read handlers are done with it before the next read
+                    data = stream.receive()
+                except (BlockingIOError, InterruptedError):
+                    return
+                except OSError as e:
+                    self.logger.error(f"Socket error in datagramLoop with {stream.server.nickname}: {e}")
+                    self.loop.remove_reader(sock)
+                    if not done.done():
+                        done.set_result(None)
+                    return
+
+                if data:
+                    stream.putPacketOnQueue(data)
+
+        self.loop.add_reader(sock, ready)
+        try:
+            await done
+        finally:
+            if sock.fileno() >= 0:
+                self.loop.remove_reader(sock)
+
+
+    ################################
+    # thread that waits on one of a stream's write handler queues, passing packets to the event loop as soon as they arrive
+    ################################
+    def queueFeeder(self, stream: connectors.PacketStream, ph: connectors.PacketHandler, q, outbound: asyncio.Queue)->None:
+
+        while not self.finished.is_set():
+
+            # Leave packets on the queue while the stream is offline, just like the threaded send_thread does
+            if stream.okay.is_set():
+                self.finished.wait(0.5)
+                continue
+
+            try:
+                packet = q.get(timeout = 0.5)
+            except (Empty, EOFError, OSError):
+                continue
+
+            # wait for room on the outbound queue, leaving any other packets on the write handler queue in the meantime
+            try:
+                future = asyncio.run_coroutine_threadsafe(outbound.put((ph, packet)), self.loop)
+            except RuntimeError:
+                # the event loop has ended
+                return
+
+            while not self.finished.is_set():
+                try:
+                    future.result(timeout = 0.5)
+                    break
+                except concurrent.futures.TimeoutError:
+                    continue
+                except concurrent.futures.CancelledError:
+                    return
+
+
+    ################################
+    # send packets from the write handler queues to the socket
+    ################################
+    async def sendLoop(self, stream: connectors.PacketStream, writer: asyncio.StreamWriter, outbound: asyncio.Queue)->None:
+
+        while True:
+            # wait for a packet, then take everything else that's waiting too so it's all written at once
+            batch = [await outbound.get()]
+            while not outbound.empty() and len(batch) < 64:
+                batch.append(outbound.get_nowait())
+
+            # filter, encode, and check the age of the packets
+            packetlist = []
+            for ph, packet in batch:
+                packetbytes = stream.encodePacket(ph, packet)
+                if packetbytes:
+                    packetlist.append((packet, packetbytes))
+
+            if not packetlist:
+                continue
+
+            self.logger.debug("%s: sending %d packets to server: %s", stream.server.nickname, len(packetlist), packetlist)
+
+            try:
+                writer.write(b"".join(p for packet, p in packetlist))
+                await writer.drain()
+            except OSError as e:
+                self.logger.error(f"Socket error with {stream.server.nickname}: {e}")
+                return
+
+            for packet, p in packetlist:
+                stream.packetSent(packet)
+
+
+    ################################
+    # periodically send the APRS-IS filter string (the same as AprsisStream.filter_thread)
+    ################################
+    async def filterLoop(self, stream: connectors.AprsisStream, writer: asyncio.StreamWriter)->None:
+
+        while True:
+            filterlist = await self.loop.run_in_executor(None, stream.getAprsFilter)
+
+            if filterlist:
+                stream.aprsfilter.setfilter(filterlist)
+                self.logger.debug(f"{stream.server.nickname} filterLoop: setting {stream.taptype.upper()} filter to: # {stream.aprsfilter.filterstring}")
+
+                try:
+                    writer.write(('#' + stream.aprsfilter.filterstring).encode(encoding='utf-8', errors='ignore') + b'\r\n')
+                    await writer.drain()
+                except OSError as e:
+                    self.logger.error(f"{stream.server.nickname} filterLoop:  socket error: {e}")
+                    return
+
+            if await self.pause(20):
+                return
+
+
+    ################################
+    # periodically beacon our position to the APRS-IS server (the same as AprsisStream.beacon_thread)
+    ################################
+    async def beaconLoop(self, stream: connectors.AprsisStream, writer: asyncio.StreamWriter)->None:
+
+        # wait a little bit before sending data to the aprs-is server
+        if await self.pause(5):
+            return
+
+        while True:
+            posit = await self.loop.run_in_executor(None, stream.getPositionPacket)
+
+            if posit:
+                self.logger.debug(f"{stream.server.nickname} Beaconing to APRS-IS: {posit}")
+
+                try:
+                    writer.write(posit.encode(encoding='utf-8', errors='ignore') + b'\r\n')
+                    await writer.drain()
+                except OSError as e:
+                    self.logger.error(f"{stream.server.nickname} beaconLoop:  socket error: {e}")
+                    return
+
+            if await self.pause(stream.ibeacon_rate):
+                return
+
+
+
+##################################################
+# the ingest engine process.  This is intended to be run as a sub-process through Python's multiprocessing and replaces one
+# connectorTap process per type of tap.
+##################################################
+def runIngestEngine(configuration, taps = ['aprs', 'cwop']):
+
+    # setup logging
+    logger = logging.getLogger(f"{__name__}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    loggingqueue = configuration["loggingqueue"]
+
+    # check if a logging queue was supplied
+    if loggingqueue is not None:
+        handler = QueueHandler(loggingqueue)
+        logger.addHandler(handler)
+
+    engine = IngestEngine(stopevent = configuration["stopevent"], loggingqueue = loggingqueue)
+
+    # each tap is a type of tap, or for RTP workers, a tuple of ('rtp', the worker from connectors.rtpWorkers())
+    names = []
+    for t in taps:
+        typeoftap, rtpworker = (t, None) if isinstance(t, str) else t
+        tap = connectors.createTap(configuration, typeoftap, logger, rtpworker)
+        if tap is None:
+            logger.error(f"runIngestEngine:  unknown tap type: {typeoftap}")
+            continue
+        engine.add(tap)
+        names.append(tap.server.nickname if rtpworker else typeoftap)
+
+    try:
+        engine.run()
+    except (connectors.GracefulExit, KeyboardInterrupt, SystemExit):
+        logger.debug("runIngestEngine caught keyboardinterrupt")
+        configuration["stopevent"].set()
+
+    logger.info(f"runIngestEngine:  ended {', '.join(names)} taps")
+
+
+
+##################################################
+# main
+#
+# Benchmark wakeup latency (the time from a line being written by a server to it reaching a read handler's queue) and CPU use
+# of the threaded PacketStream.run() against the IngestEngine.
+##################################################
+def main():
+
+    packets = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    idlesecs = 5
+
+    # a local server that sends timestamped lines with a random gap between them
+    def lineServer(listener, count, ready):
+        conn, addr = listener.accept()
+        ready.wait()
+        import random
+        for i in range(count):
+            time.sleep(random.uniform(0.005, 0.05))
+            conn.sendall(f"N0CALL>APRS:{time.perf_counter():.9f}\r\n".encode())
+
+        # nothing more to send, leaving the connection idle so we can measure CPU use while waiting
+        time.sleep(idlesecs + 1)
+        conn.close()
+
+    class Recorder(object):
+        # stands in for a multiprocessing queue, recording latencies as packets arrive
+        def __init__(self):
+            self.latencies = []
+            self.done = th.Event()
+            self.expected = packets
+
+        def qsize(self):
+            return 0
+
+        def put(self, packet):
+            self.latencies.append(time.perf_counter() - float(packet.text.split(":")[1]))
+            if len(self.latencies) >= self.expected:
+                self.done.set()
+
+    def transform(packetbytes):
+        return Packet(text = packetbytes.decode(), frequency = None, source = "benchmark")
+
+    def bench(name, start):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        port = listener.getsockname()[1]
+        ready = th.Event()
+        server = th.Thread(target=lineServer, args=(listener, packets, ready), daemon=True)
+        server.start()
+
+        recorder = Recorder()
+        stopevent = th.Event()
+        stream = connectors.PacketStream(server = connectors.Server("127.0.0.1", port, name), stopevent = stopevent)
+        stream.setReadHandlers([connectors.PacketHandler(q=[(recorder, "recorder")], transform=transform)])
+
+        runner = start(stream, stopevent)
+
+        # let the connection get established before the server starts sending
+        time.sleep(0.5)
+        cpu0 = time.process_time()
+        wall0 = time.perf_counter()
+        ready.set()
+        recorder.done.wait(60)
+        busy_cpu = time.process_time() - cpu0
+        busy_wall = time.perf_counter() - wall0
+
+        # measure the CPU used while the connection is idle
+        cpu0 = time.process_time()
+        time.sleep(idlesecs)
+        idle_cpu = time.process_time() - cpu0
+
+        stopevent.set()
+        runner.join(5)
+        listener.close()
+
+        lat = sorted(recorder.latencies)
+        if not lat:
+            print(f"{name}: no packets received")
+            return
+        print(f"{name:>9}:  {len(lat)} packets, latency median {lat[len(lat)//2] * 1000:.2f}ms, p95 {lat[int(len(lat) * .95)] * 1000:.2f}ms, max {lat[-1] * 1000:.2f}ms, "
+                f"CPU {busy_cpu / busy_wall * 100:.1f}% busy, {idle_cpu / idlesecs * 100:.2f}% idle")
+
+    def threaded(stream, stopevent):
+        t = th.Thread(target=stream.run, daemon=True)
+        t.start()
+        return t
+
+    def engine(stream, stopevent):
+        e = IngestEngine(stopevent = stopevent)
+        e.add(stream)
+        t = th.Thread(target=e.run, daemon=True)
+        t.start()
+        return t
+
+    bench("threaded", threaded)
+    bench("asyncio", engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -37,29 +37,13 @@ import logging
 from logging.handlers import QueueHandler, QueueListener
 
 from packet import Packet
-
-KISS_FESC = b'\xdb'      #0xDB   # Escape character
-KISS_FEND = b'\xc0'      #0xC0   # Frame start/end marker
-KISS_TFEND = b'\xdc'     #0xDC   # If after an escape, means there was an 0xC0 in the source message
-KISS_TFESC = b'\xdd'     #0xDD   # If after an escape, means there was an 0xDB in the source message
-int_fend = int.from_bytes(KISS_FEND, 'big')
-int_fesc = int.from_bytes(KISS_FESC, 'big')
-int_tfend = int.from_bytes(KISS_TFEND, 'big')
-int_tfesc = int.from_bytes(KISS_TFESC, 'big')
-
-KISS_FESC_TFESC = b''.join([KISS_FESC, KISS_TFESC])
-KISS_FESC_TFEND = b''.join([KISS_FESC, KISS_TFEND])
-int_fesc_tfesc = int.from_bytes(KISS_FESC_TFESC, 'big')
-int_fesc_tfend = int.from_bytes(KISS_FESC_TFEND, 'big')
-
-AX25_CONTROL_FIELD = b'\x03'    #0x03
-AX25_PROTOCOL_ID = b'\xf0'      #0xF0
-INFO_DELIM = b''.join([AX25_CONTROL_FIELD, AX25_PROTOCOL_ID])
+import ax25codec
 
 ##################################    
 # the KISS frame processor class
 #
-# Really just a consolidated location for all "stuff" for encoding and decoding KISS frames
+# Really just a consolidated location for all "stuff" for encoding and decoding KISS frames.  The byte level work is done by the
+# ax25codec module.
 ##################################    
 @dataclass
 class KISSProcessor:
@@ -67,6 +51,9 @@ class KISSProcessor:
     # The logging queue for where to send messages
     loggingqueue: mp.Queue = None
 
+    # The callsign used as the source address for frames we encode
+    callsign: str = None
+
     def __post_init__(self)->None:
 
         # setup logging
@@ -84,29 +71,19 @@ class KISSProcessor:
 
     def decode(self, incomingbytes: bytes = None)->Packet:
         """
-        Decodes a kiss frame returning a tuple with the APRS text of the decoded frame along with an integer that represents the channel direwolf heard the packet on.
+        Decodes a kiss frame returning a Packet object for the APRS frame it contains, with the direwolf channel the packet was heard on in its "channel" property.
         """
 
-        self.logger.debug(f"decode called with {incomingbytes=}")
-
         if not incomingbytes:
             return None
 
-        # for each frame in the kiss_frames list, run the 'cleanframe' method against it.  Take those results and create a new list, of clean, normalized KISS frames.
-        frame = self._cleanframe(incomingbytes)
-
-        # Get the direwolf channel
-        channel = frame[0] >> 4
-        self.logger.debug(f"frame[0]: {frame[0]}, channel: {channel}")
-
-        # Strip off the first byte, as that's the KISS data frame byte and any trailing FEND bytes
-        s = frame[1:]
-        s = s.strip(KISS_FEND)
-        self.logger.debug(f"Parsing frame({len(frame)})[{channel}]: {frame} : {s}")
+        # Unescape the KISS frame and split off the command byte to get the direwolf channel
+        channel, frame = ax25codec.decodeKISS(incomingbytes)
+        if frame is None:
+            return None
 
-        # parse the KISS frame into APRS text
-        p = self._parseFrame(s)
-        self.logger.debug(f"Parsed APRS packet: {p=}")
+        # parse the AX.25 frame into APRS text
+        p = self._parseFrame(frame)
 
         if p:
             p.properties["channel"] = channel
@@ -115,266 +92,63 @@ class KISSProcessor:
         return p
         
 
-    def _cleanframe(self, s: bytes)->bytes:
-        """ 
-        This recovers any previously escaped FESC/FEND codes and removes the beginning command from the KISS frame
-        """
-
-        # Recover escaped FEND codes
-        tmp = b''
-        f_fesc = False
-        for idx, a in enumerate(s):
-            if idx == 0 and a == int_fend:
-                pass
-            elif f_fesc:
-                if a == int_tfesc:
-                    tmp += KISS_FESC
-                elif a == int_tfend:
-                    tmp += KISS_FEND
-                else:
-                    tmp += KISS_FESC
-                    tmp += bytes([a])
-
-                f_fesc = False
-
-            elif a == int_fesc:
-                f_fesc = True
-            else:
-                tmp += bytes([a])
-                f_fesc = False
-
-        # Now remove any newline/space chars
-        tmp.strip()
-
-        return tmp
-
-
-    def _decode_addr(self, data, cursor):
-        """
-        extract addresses from the KISS frame...as part of building the APRS text 
-        """
-
-        if len(data) < cursor+7:
-            return (None, None, None)
-
-        addr = data[cursor:cursor+7]
-
-        #h = (ord(addr[6]) >> 7) & 0x1
-        #ssid = (ord(addr[6]) >> 1) & 0xf     
-        #ext = ord(addr[6]) & 0x1
-
-        h = (addr[6] >> 7) & 0x1
-        ssid = (addr[6] >> 1) & 0xf     
-        ext = addr[6] & 0x1
-
-        self.logger.debug(f"decode: {addr}, h: {h}, ssid: {ssid}, ext: {ext}, type(addr): {type(addr)}, type(addr[0]): {type(addr[0])}")
-        #converted_addr = ''.join([chr(ord(a) >> 1) for a in addr[0:6]])
-        converted_addr = b''.join([bytes([a >> 1]) for a in addr[0:6]])
-        address = converted_addr.decode("UTF-8", "ignore")
-
-        self.logger.debug(f"decode. converted_addr: {converted_addr}, address: {address}")
-
-        if ssid != 0:
-            call = "{}-{}".format(address.strip(), ssid)
-        else:
-            call = address.strip()
-
-        return (call, h, ext)
-
-
-    def _decode_uframe(self, ctrl, data, pos)->str:
-        if ctrl == 0x3:
-            pos += 1
-            info = data[pos:]
-            infopart = info.rstrip(b'\xff\x0d\x20\x0a').decode("UTF-8", "ignore")
-            return infopart
-        else:
-            return None
-             
-    def _parseFrame(self, frame)->Packet:
-        pos = 0
-
-        # Length of the frame
-        length = len(frame)
+    def _parseFrame(self, frame: bytes)->Packet:
 
         # If it's not at least 14 chars then eject...
-        if length < 14:
-            print("Frame not long enough [", length, "]: ", frame)
+        if len(frame) < 14:
+            self.logger.debug("Frame not long enough [%d]: %s", len(frame), frame)
             return None
 
-        # dictionary to store various properties of this packet
-        properties = {}
-
-        # destination address
-        (dest_addr, dest_hrr, dest_ext) = self._decode_addr(frame, pos)
-
-        self.logger.debug(f"_parseFrame destination: {dest_addr}:{type(dest_addr)}, {dest_hrr}:{type(dest_hrr)}, {dest_ext}:{type(dest_ext)}")
-
-        if dest_addr is None:
-            self.logger.debug("_parseFrame: Destination address is invalid")
+        # destination, source, and repeater list
+        addresses = ax25codec.decodeAddressField(frame)
+        if addresses is None:
             return None
-        pos += 7
-        
-        # source address
-        (src_addr, src_hrr, src_ext) = self._decode_addr(frame, pos)  
-
-        self.logger.debug("_parseFrame source: {src_addr}, {src_hrr}, {src_ext}")
 
-        if src_addr is None:
-            self.logger.debug("_parseFrame: Source address is invalid")
-            return None
-        pos += 7
-        
-        # Repeater list
-        ext = src_ext
-        repeater_list = ""
-        repeaters = []
-        while ext == 0:
-            rpt_addr, rpt_h, ext = self._decode_addr(frame, pos)
-            if rpt_addr is None:
-                break
-
-            repeater_list += "," + rpt_addr 
-            repeaters.append(rpt_addr)
-            pos += 7
+        (dest_addr, src_addr, repeaters, pos) = addresses
 
         # make sure this packet wasn't truncated...
-        if pos >= length:
+        if pos >= len(frame):
             return None
 
-        # begin to populat the properties dictionary
-        properties["destination"] = dest_addr
-        properties["source"] = src_addr
-        properties["digipeaters"] = repeaters
-
-        # control code
-        #ctrl = ord(frame[pos])
+        # control code.  Only U frames are APRS packets
         ctrl = frame[pos]
-        pos += 1
-      
-        # if this is a U frame
-        info = ""
-        if (ctrl & 0x3) == 0x3:
-            info = self._decode_uframe(ctrl, frame, pos)
-            if info == None:
-                info = ""
-        else:
+        if (ctrl & 0x3) != 0x3:
             return None
 
-        self.logger.debug(f"src_addr({type(src_addr)}): {src_addr}, dest_addr({type(dest_addr)}): {dest_addr}, repeater_list({type(repeater_list)}): {repeater_list}")
-
-        # the information part of the packet
-        properties["information"] = info
-
-        try:
-            # Assemble the APRS text string for the packet
-            aprstext = src_addr + ">" + dest_addr + repeater_list + ":" + info
-
-            # the time we've decoded this packet
-            properties["decode_time"] = int(time.time())
+        # The information part of the packet for a UI frame, skipping the protocol id
+        info = ""
+        if ctrl == ax25codec.AX25_CONTROL_FIELD:
+            info = frame[pos + 2:].rstrip(b'\xff\x0d\x20\x0a').decode("UTF-8", "ignore")
 
-            # yes, it's an APRS packet
-            properties["is_aprs"] = True
+        # dictionary to store various properties of this packet
+        properties = {
+                "destination" : dest_addr,
+                "source" : src_addr,
+                "digipeaters" : repeaters,
+                "information" : info,
 
-            # create a new Packet object and return it
-            p = Packet(text = aprstext, frequency=None, source="kiss", properties = properties)
-            return p
+                # the time we've decoded this packet (with the fraction of a second, for measuring the igating latency)
+                "decode_time" : time.time(),
 
-        except TypeError as e: 
+                # yes, it's an APRS packet
+                "is_aprs" : True
+                }
 
-            # if there were issues decoding the packet, just log some errors and return nothing
-            self.logger.warning(f"_parseFrame:  Type Error occured: {e}")
-            self.logger.debug(f"src_addr({type(src_addr)}): {src_addr}, dest_addr({type(dest_addr)}): {dest_addr}, repeater_list({type(repeater_list)}): {repeater_list}")
+        # Assemble the APRS text string for the packet
+        aprstext = "".join([src_addr, ">", dest_addr] + ["," + r for r in repeaters] + [":", info])
 
-            return None
-
-
-    def _encode_address(self, s: str, final: bool)->bytes:
-        """
-        This encodes an address (i.e. a callsign or directive like WIDE2-1).  The final argument denotes if this address is the last one in the APRS packet.
-        """
-        if "-" not in s:
-            s = s + "-0"    # default to SSID 0
-        call, ssid = s.split('-')
-        if len(call) < 6:
-            call = call + " "*(6 - len(call)) # pad with spaces
-        encoded_call = [ord(x) << 1 for x in call[0:6]]
-        encoded_ssid = (int(ssid) << 1) | 0b01100000 | (0b00000001 if final else 0)
-        return encoded_call + [encoded_ssid]
+        # create a new Packet object and return it
+        return Packet(text = aprstext, frequency=None, source="kiss", properties = properties)
 
 
     # Create the full KISS encapculated ax.25 packet with the direwolf 'channel' specified.
-    def encode(self, info: str, channel: int, via: str)->bytes:
+    def encode(self, info: str, channel: int, via: list)->bytes:
         """
-        This private function will encode a string into a valid AX.25 frame and properly ecapsulated into KISS.  
+        This will encode a string into a valid AX.25 frame and properly ecapsulated into KISS.  
         Ready for transmission by direwolf.
         """
 
-        # Make a UI frame by concatenating the parts together
-        # This is just an array of ints representing bytes at this point
-        dest_addr = self._encode_address('APZES1', False)
-        src_addr = self._encode_address(self.callsign, False)
-
-        # AX25 control field
-        c_byte = [AX25_CONTROL_FIELD]           # This is a UI frame
-
-        # AX25 protocol id
-        pid = [AX25_PROTOCOL_ID]              # No protocol
-
-        # Convert the information part to bytes
-        msg = [ord(c) for c in info]
-        self.logger.debug(f"msg({type(msg)}): {msg}, info: {info}")
-        packet = dest_addr + src_addr 
-        self.logger.debug("packet({type(packet)}): {packet}, dest_addr: {dest_addr}, src_addr: {src_addr}")
-
-        dlen = len(via)
-        i = 0
-        self.logger.debug(f"via path length: {dlen}, viapath: {via}")
-        for d in via:
-            if i < dlen-1:
-                self.logger.debug(f"encoding destination element: {d}")
-                packet += self._encode_address(d, False)
-            else:
-                self.logger.debug(f"encoding last destination element: {d}")
-                packet += self._encode_address(d, True)
-            i += 1
-
-        #packet += bytearray(c_byte + pid) + msg
-        packet += c_byte + pid + msg
-        chan_cmd = channel << 4
-        if chan_cmd == int_fend:
-            chan_cmd = [KISS_FESC, KISS_TFEND]
-        else:
-            chan_cmd = [chan_cmd.to_bytes(1, 'big')]
-
-        self.logger.debug(f"Channel command({type(chan_cmd)}): {chan_cmd}")
-
-        # Escape the packet in case either KISS_FEND or KISS_FESC ended up in our stream
-        packet_escaped = []
-        for element in packet:
-            if type(element) is int:
-                x = element.to_bytes(1, 'big')
-            elif type(element) is bytes:
-                x = element
-            else:
-                x = element
-
-            if x == int_fesc:
-                packet_escaped += [KISS_FESC, KISS_TFEND]
-            elif x == int_fesc:
-                packet_escaped += [KISS_FESC, KISS_TFESC]
-            else:
-                packet_escaped += [x]
-
-        # Build the frame that we will send to Dire Wolf and turn it into a string
-        kiss_frame = b''.join([KISS_FEND] + chan_cmd + packet_escaped + [KISS_FEND])
-        self.logger.debug(f"kiss_frame to be transmitted({type(kiss_frame)}): [{kiss_frame}]")
-
-        output = bytearray(kiss_frame)
-
-        self.logger.debug(f"output to be transmitted({type(output)}): [{output}]")
-
+        kiss_frame = ax25codec.encodeKISS(self.callsign, "APZES1", via, info, channel)
+        self.logger.debug("kiss_frame to be transmitted: [%s]", kiss_frame)
 
         return kiss_frame
-
-
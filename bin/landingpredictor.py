@@ -31,18 +31,383 @@ from scipy.interpolate import *
 from scipy.optimize import *
 from inspect import getframeinfo, stack
 import json
+import zipfile
 import logging
 import multiprocessing as mp
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from logging.handlers import QueueHandler
 
 #import local configuration items
 import habconfig 
 import queries
+from statebus import StateBus
+import terrain
+import geodesy
 
 class GracefulExit(Exception):
     pass
 
+
+# The predictor state file is a compressed numpy archive (.npz) of plain arrays along with a JSON header describing them.  Nothing in it is
+# pickled, so loading it can't run code.  The format is bumped whenever the state changes shape.
+STATE_MAGIC = "EOSSLP"
+STATE_FORMAT = 2
+
+
+#####################################
+# Convert the numpy scalars and arrays within the predictor state to their JSON equivalents
+def jsonDefault(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"{type(obj).__name__} isn't JSON serializable")
+
+
+#####################################
+# Convert the lists within a value loaded from JSON back to the tuples they were saved from
+def toTuple(value):
+    if isinstance(value, list):
+        return tuple(toTuple(v) for v in value)
+    return value
+
+
+#####################################
+# The PredictFile Class
+#
+# This holds the rows from a flight's predict file, split up front so that finding where a flight is within the predict file is a
+# binary search instead of a loop over every row.
+#
+# reference:  rows columns:
+#     altitude,
+#     latitude,
+#     longitude,
+#     vert_rate,
+#     delta_secs
+#####################################
+@dataclass
+class PredictFile(object):
+
+    # the predict file rows (float64), in launch to landing order
+    rows: np.ndarray = None
+
+    # the version of the predict file these rows came from (see queries.getPredictFileVersion)
+    version: tuple = None
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        self.rows = np.array(self.rows, dtype='float64')
+        self.length = self.rows.shape[0]
+
+        # Altitudes from the launch site forward and from the landing backwards
+        self.altitudes = self.rows[:, 0] if self.length > 0 else np.array([])
+        self.altitudes_rev = self.altitudes[::-1]
+
+        # The number of rows in the ascent segment (from the launch site up until the altitude first drops) and in the descent segment
+        # (from the landing back up until the altitude first drops).  Within each segment the altitudes only increase, so they're sorted.
+        self.ascent_len = self.monotonicLength(self.altitudes)
+        self.descent_len = self.monotonicLength(self.altitudes_rev)
+
+
+    #####################################
+    # The number of leading elements that are in non-decreasing order
+    @staticmethod
+    def monotonicLength(alts):
+        drops = np.flatnonzero(np.diff(alts) < 0)
+        return int(drops[0]) + 1 if drops.shape[0] > 0 else alts.shape[0]
+
+
+    #####################################
+    # Find the first row at or above the given altitude within the sorted segment of alts (segment_len rows long), searching at most
+    # length rows.  If the altitude is above the segment, then this is the top of the segment (or the last row searched).
+    @staticmethod
+    def searchSegment(alts, segment_len, altitude, length):
+        k = min(segment_len, length)
+        idx = int(np.searchsorted(alts[0:k], altitude, side='left'))
+        if idx >= k:
+            idx = length - 1 if segment_len >= length - 1 else segment_len - 1
+        return idx
+
+
+    #####################################
+    # Find the first row in the ascent segment at or above the given altitude (or the top of the ascent segment).
+    def ascentIndex(self, altitude):
+        return self.searchSegment(self.altitudes, self.ascent_len, altitude, self.length)
+
+
+    #####################################
+    # Counting backwards from the landing (i.e. an index into the reversed rows), find the first row in the descent segment at or above
+    # the given altitude (or the top of the descent segment).  If length is given, then only that many rows from the landing are searched.
+    def descentIndex(self, altitude, length = None):
+        return self.searchSegment(self.altitudes_rev, self.descent_len, altitude, self.length if length is None else length)
+
+
+#####################################
+# The WindProfile Class
+#
+# The latitude and longitude change rates observed during a flight's ascent, binned by altitude.  Ascent packets from each beacon on the
+# flight are added as they're heard, and the profile is only rebuilt (averaging the rates within each altitude bin) when something changes.
+# Lookups by altitude are a binary search.
+#####################################
+@dataclass
+class WindProfile(object):
+
+    # Size of the altitude bins in feet
+    binsize: int = 100
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        # The packets added from each source (i.e. beacon callsign):
+        #     identity:  the timestamp of the first ascent packet and if pre-launch packets were trimmed.  If this changes, the source is reloaded.
+        #     count:  the number of ascent packets added thus far
+        #     bins:  bin number -> [number of packets, sum of altitudes, sum of latitude rates, sum of longitude rates]
+        self.sources = {}
+
+        # Incremented every time the profile changes
+        self.version = 0
+
+        # The rebuilt profile, in increasing altitude order
+        self.dirty = False
+        self.altitudes = np.array([])
+        self.latrates = np.array([])
+        self.lonrates = np.array([])
+
+
+    #####################################
+    # Add any new ascent packets from a source
+    #
+    # Arguments:
+    #    source:  the beacon callsign these packets are from
+    #    times:  (array) timestamps of the ascent packets
+    #    ascent_portion:  (array) columns:  altitude, latitude, longitude, altitude_change_rate, latitude_change_rate, longitude_change_rate
+    #    trimmed:  (boolean) if packets from before the launch were trimmed off
+    def update(self, source, times, ascent_portion, trimmed):
+
+        n = ascent_portion.shape[0]
+        if n == 0:
+            return
+
+        identity = (str(times[0]), trimmed)
+        state = self.sources.get(source)
+
+        # If the beginning of the ascent has changed (or gotten shorter) then start over for this source
+        if state is None or state["identity"] != identity or state["count"] > n:
+            state = { "identity" : identity, "count" : 0, "bins" : {} }
+            self.sources[source] = state
+            self.dirty = True
+
+        # Add the new packets to their altitude bins
+        for alt, latrate, lonrate in ascent_portion[state["count"]:, [0, 4, 5]]:
+            if np.isfinite(alt) and np.isfinite(latrate) and np.isfinite(lonrate):
+                b = state["bins"].setdefault(int(alt // self.binsize), [0, 0.0, 0.0, 0.0])
+                b[0] += 1
+                b[1] += alt
+                b[2] += latrate
+                b[3] += lonrate
+                self.dirty = True
+
+        state["count"] = n
+
+
+    #####################################
+    # Rebuild the profile from the altitude bins of all sources.  Each bin becomes one point at the mean altitude of the packets in that bin
+    # with the mean latitude and longitude rates.
+    def rebuild(self):
+
+        if not self.dirty:
+            return
+
+        merged = {}
+        for state in self.sources.values():
+            for b, sums in state["bins"].items():
+                m = merged.setdefault(b, [0, 0.0, 0.0, 0.0])
+                for i in range(4):
+                    m[i] += sums[i]
+
+        if len(merged) > 0:
+            sums = np.array([merged[b] for b in sorted(merged)], dtype='float64')
+            self.altitudes = sums[:, 1] / sums[:, 0]
+            self.latrates = sums[:, 2] / sums[:, 0]
+            self.lonrates = sums[:, 3] / sums[:, 0]
+        else:
+            self.altitudes = np.array([])
+            self.latrates = np.array([])
+            self.lonrates = np.array([])
+
+        self.dirty = False
+        self.version += 1
+
+
+    #####################################
+    # Split the altitude range from lower to upper into segments at each point in the profile.
+    #
+    # Returns (arrays, one element for each segment):
+    #    lo:  bottom altitude of the segment
+    #    hi:  top altitude of the segment
+    #    alt:  altitude of the profile point that the rates come from (the first point at or above the top of the segment)
+    #    latrate:  latitude change rate
+    #    lonrate:  longitude change rate
+    def segments(self, lower, upper):
+
+        self.rebuild()
+
+        n = self.altitudes.shape[0]
+        if n == 0 or upper <= lower:
+            return np.array([]), np.array([]), np.array([]), np.array([]), np.array([])
+
+        # The profile points between the two altitudes are the segment boundaries
+        first = int(np.searchsorted(self.altitudes, lower, side='right'))
+        last = int(np.searchsorted(self.altitudes, upper, side='left'))
+        edges = np.concatenate(([lower], self.altitudes[first:last], [upper]))
+        lo = edges[:-1]
+        hi = edges[1:]
+
+        # Each segment uses the rates from the first profile point at or above the top of the segment
+        idx = np.minimum(np.searchsorted(self.altitudes, hi, side='left'), n - 1)
+
+        return lo, hi, self.altitudes[idx], self.latrates[idx], self.lonrates[idx]
+
+
+#####################################
+# The AirDensityProfile Class
+#
+# This holds the air density measured during a flight by the KC0D payloads (from their temperature and pressure readings), binned by
+# altitude.  Packets are added to the bins as they arrive from each beacon on the flight, and the air density curve (the measured
+# values spliced into the standard air densities) is only rebuilt when the bins change.
+#####################################
+@dataclass
+class AirDensityProfile(object):
+
+    # The standard air densities (slugs/ft^3) with altitude, columns:  altitude, air density
+    standard: np.ndarray = None
+
+    # Size of the altitude bins in feet
+    binsize: int = 100
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        # The packets added from each source (i.e. beacon callsign):
+        #     identity:  the timestamp of the first packet.  If this changes, the source is reloaded.
+        #     count:  the number of packets added thus far
+        #     nulls:  the number of those packets without a temperature and pressure
+        #     bins:  bin number -> [number of packets, sum of altitudes, sum of temperatures (K), sum of pressures (Pa)]
+        self.sources = {}
+
+        # Incremented every time the curve changes
+        self.version = 0
+
+        # The rebuilt curve, or None if there aren't enough measurements to use
+        self.dirty = False
+        self.used = ()
+        self.airdensity = None
+
+
+    #####################################
+    # Add any new packets from a source
+    #
+    # Arguments:
+    #    source:  the beacon callsign these packets are from
+    #    times:  (array) timestamps of the packets
+    #    measurements:  (array) columns:  altitude, temperature (K), pressure (Pa)
+    def update(self, source, times, measurements):
+
+        n = measurements.shape[0]
+        if n == 0:
+            return
+
+        identity = str(times[0])
+        state = self.sources.get(source)
+
+        # If the beginning of the packets has changed (or gotten shorter) then start over for this source
+        if state is None or state["identity"] != identity or state["count"] > n:
+            state = { "identity" : identity, "count" : 0, "nulls" : 0, "bins" : {} }
+            self.sources[source] = state
+            self.dirty = True
+
+        # Add the new packets to their altitude bins
+        for alt, temperature, pressure in measurements[state["count"]:]:
+            if np.isfinite(alt) and np.isfinite(temperature) and np.isfinite(pressure) and temperature > 0:
+                b = state["bins"].setdefault(int(alt // self.binsize), [0, 0.0, 0.0, 0.0])
+                b[0] += 1
+                b[1] += alt
+                b[2] += temperature
+                b[3] += pressure
+            else:
+                state["nulls"] += 1
+            self.dirty = True
+
+        state["count"] = n
+
+
+    #####################################
+    # Rebuild the air density curve from the altitude bins of those sources that are reporting measurements in nearly every packet
+    # (i.e. < 5% without).  The measured air densities replace the standard ones over the altitude range of the measurements.
+    def rebuild(self):
+
+        if not self.dirty:
+            return
+
+        self.dirty = False
+
+        # The sources (and how many of their packets) that go into the curve.  If these haven't changed, then neither has the curve.
+        used = tuple(sorted((source, state["identity"], state["count"]) for source, state in self.sources.items() if state["count"] > 3 and state["nulls"] / state["count"] < .05))
+        if used == self.used:
+            return
+        self.used = used
+
+        self.airdensity = self.buildCurve()
+        self.version += 1
+
+
+    #####################################
+    # Build the air density curve from the sources that go into it, or None if there aren't enough measurements
+    def buildCurve(self):
+
+        merged = {}
+        for source, identity, count in self.used:
+            for b, sums in self.sources[source]["bins"].items():
+                m = merged.setdefault(b, [0, 0.0, 0.0, 0.0])
+                for i in range(4):
+                    m[i] += sums[i]
+
+        airdensity = None
+        if len(merged) > 1:
+            sums = np.array([merged[b] for b in sorted(merged)], dtype='float64')
+            altitudes = sums[:, 1] / sums[:, 0]
+
+            # Air density in slugs/ft^3 from the mean temperature and pressure in each bin
+            densities = ((sums[:, 3] / sums[:, 0]) / (287.05 * (sums[:, 2] / sums[:, 0]))) / 515.2381961366
+
+            # Splice the measured air densities in to the standard ones
+            below = self.standard[self.standard[:, 0] < altitudes[0]]
+            above = self.standard[self.standard[:, 0] > altitudes[-1]]
+            points = np.concatenate((below, np.column_stack((altitudes, densities)), above))
+
+            try:
+                airdensity = interpolate.interp1d(points[:, 0], points[:, 1], kind='cubic')
+            except ValueError:
+                airdensity = None
+
+        return airdensity
+
+
+    #####################################
+    # Return the measured air density curve, or None if there aren't enough measurements
+    def curve(self):
+
+        self.rebuild()
+
+        return self.airdensity
+
 #####################################
 # The PredictorBase Class
 # 
@@ -123,22 +488,65 @@ class PredictorBase(object):
 
 
     #####################################
-    # Function to use to determine distance between two points
+    # Function to use to determine distance (in miles) between two points.  Any of the arguments can be arrays.
     def distance(self, lat1, lon1, lat2, lon2):
-        lon1 = math.radians(lon1)
-        lon2 = math.radians(lon2)
-        lat1 = math.radians(lat1)
-        lat2 = math.radians(lat2)
+        return geodesy.haversine(lat1, lon1, lat2, lon2)
+
+
+    #####################################
+    # Simplify a path (Douglas-Peucker) so that no removed point is farther than tolerance (in meters) from the simplified path.
+    #
+    # Arguments:
+    #    lats:  (array) latitudes in decimal degrees
+    #    lons:  (array) longitudes in decimal degrees
+    #    tolerance:  (float) the maximum distance in meters a removed point can be from the simplified path
+    #
+    # Returns an array of the indexes of the points to keep.  The first and last points are always kept.
+    def simplifyPath(self, lats, lons, tolerance):
+
+        lats = np.asarray(lats, dtype='float64')
+        lons = np.asarray(lons, dtype='float64')
+        n = lats.shape[0]
+
+        if n < 3 or tolerance <= 0:
+            return np.arange(n)
+
+        # Project the points onto a flat plane (in meters) centered on the path.  Paths are short enough that this is plenty accurate.
+        r = geodesy.EARTH_RADIUS_METERS
+        lat0 = np.radians(np.mean(lats))
+        px = np.radians(lons) * r * np.cos(lat0)
+        py = np.radians(lats) * r
+
+        keep = np.zeros(n, dtype=bool)
+        keep[0] = True
+        keep[-1] = True
+
+        # Work through the segments with a list of those still to check instead of recursion
+        segments = [(0, n - 1)]
+        while segments:
+            first, last = segments.pop()
+            if last - first < 2:
+                continue
+
+            # Perpendicular distance from each interior point to the line from first to last
+            dx = px[last] - px[first]
+            dy = py[last] - py[first]
+            seglen = math.hypot(dx, dy)
+            ix = px[first+1:last] - px[first]
+            iy = py[first+1:last] - py[first]
+            if seglen > 0:
+                d = np.abs(dx * iy - dy * ix) / seglen
+            else:
+                d = np.hypot(ix, iy)
 
-        # Haversine formula
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        #r = 6371 # Radius of earth in kilometers. Use 3956 for miles
-        r = 3956 # Radius of earth in kilometers. Use 3956 for miles
+            i = int(np.argmax(d))
+            if d[i] > tolerance:
+                idx = first + 1 + i
+                keep[idx] = True
+                segments.append((first, idx))
+                segments.append((idx, last))
 
-        return float(c * r)
+        return np.flatnonzero(keep)
 
 
     ################################
@@ -147,9 +555,144 @@ class PredictorBase(object):
         self.logger.debug("Starting processPredictions...")
 
 
+    #####################################
+    # Split off the ascent portion of a flight and trim off those packets from before the actual launch.
+    #
+    # Arguments:
+    #    latestpackets:  (array) the packets heard from a beacon (see queries.getLatestPackets)
+    #    idx:  (int) index of the maximum altitude within latestpackets
+    #
+    # Returns:
+    #    start:  (int) the index within latestpackets of the first ascent packet that was kept
+    #    ascent_portion:  (array) columns:  altitude, latitude, longitude, altitude_change_rate, latitude_change_rate, longitude_change_rate
+    #    trimmed:  (boolean) true if packets were trimmed from the beginning of the flight
+    def trimAscent(self, latestpackets, idx):
+
+        # convert to a numpy array and trim off the timestamp column
+        ascent_portion = np.array(latestpackets[0:(idx+1), 1:7], dtype='float64')
+
+        # Find the first packet where the ascent rate (ft/s) is > 5ft/s.  This eliminates those early packets from the beacons prior
+        # to actual launch...we don't want those.
+        loop_limit = ascent_portion.shape[0] - 1
+        loop_counter = 0
+        if loop_limit > 0:
+            launched = np.flatnonzero(~(ascent_portion[0:loop_limit, 3] < 5))
+            loop_counter = int(launched[0]) if launched.shape[0] > 0 else loop_limit
+
+        if loop_counter > 0:
+            # We trim off those packets from the beginning of the flight that don't matter.  Only want to keep those packets from just before
+            # the balloon is launched (aka the altitude starts to rise).  If this flight has yet to start ascending, then this array will only have
+            # one two packets.
+            ascent_portion = ascent_portion[(loop_counter-1):,0:]
+
+            # This sets the first packet for our ascent_rates array to have the same altitude, latitude, and longitude change rates.
+            # reference:  columns:  altitude, latitude, longitude, altitude_change_rate, latitude_change_rate, longitude_change_rate
+            ascent_portion[0,3:6] = ascent_portion[1,3:6]
+
+            return loop_counter - 1, ascent_portion, True
+
+        return 0, ascent_portion, False
+
+
+    #####################################
+    # Add any new ascent packets from a beacon to a flight's wind profile.
+    #
+    # Arguments:
+    #    windprofile:  (WindProfile) the wind profile for the flight
+    #    source:  (str) the beacon callsign the packets are from
+    #    latestpackets:  (array) the packets heard from the beacon (see queries.getLatestPackets)
+    def updateWindProfile(self, windprofile, source, latestpackets):
+
+        if latestpackets.shape[0] <= 0:
+            return
+
+        # The ascent portion runs up to the maximum altitude
+        idx = int(np.argmax(latestpackets[0:, 1]))
+        start, ascent_portion, trimmed = self.trimAscent(latestpackets, idx)
+
+        windprofile.update(source, latestpackets[start:(idx+1), 0], ascent_portion, trimmed)
+
+
+    #####################################
+    # Add any new temperature and pressure measurements from a beacon to a flight's air density profile.
+    #
+    # Arguments:
+    #    airdensityprofile:  (AirDensityProfile) the air density profile for the flight
+    #    source:  (str) the beacon callsign the packets are from
+    #    latestpackets:  (array) the packets heard from the beacon (see queries.getLatestPackets)
+    def updateAirDensityProfile(self, airdensityprofile, source, latestpackets):
+
+        if latestpackets.shape[0] <= 0:
+            return
+
+        # Only the packets up to the maximum altitude are used
+        idx = int(np.argmax(latestpackets[0:, 1]))
+
+        airdensityprofile.update(source, latestpackets[0:(idx+1), 0], np.array(latestpackets[0:(idx+1), [1, 8, 9]], dtype='float64'))
+
+
+    #####################################
+    # Compute the time (in seconds) it takes to descend through each segment of altitude.
+    #
+    # Arguments:
+    #    v:  (callable) descent velocity (ft/s) at a given altitude.  Must accept an array of altitudes.
+    #    lo:  (array) bottom altitude of each segment
+    #    hi:  (array) top altitude of each segment
+    #    step_size:  (float) each segment is integrated in altitude chunks of this size (feet)
+    def integrateSegments(self, v, lo, hi, step_size):
+
+        if lo.shape[0] == 0:
+            return np.array([])
+
+        # The number of steps within each segment.  The last step in a segment is whatever is left over.
+        n = np.maximum(np.ceil((hi - lo) / step_size).astype(int), 1)
+        offsets = np.cumsum(n) - n
+
+        # Bottom and top altitudes for every step of every segment
+        steps = np.arange(n.sum()) - np.repeat(offsets, n)
+        h_0 = np.repeat(lo, n) + steps * step_size
+        h_1 = np.minimum(h_0 + step_size, np.repeat(hi, n))
+
+        # time through each step using the average velocity over the step, then summed for each segment
+        v_avg = (v(h_0) + v(h_1)) / 2.0
+        t = np.abs((h_1 - h_0) / v_avg)
+
+        return np.add.reduceat(t, offsets)
+
+
+    #####################################
+    # Create the list of points for the predicted flight path
+    #
+    # Arguments:
+    #    x, y:  (float) the last heard latitude, longitude of the flight
+    #    last_heard_altitude:  (float) the last heard altitude of the flight
+    #    t:  (array) the time through each altitude segment (from the floor up)
+    #    lat_rate, lon_rate:  (array) the latitude and longitude change rates for each altitude segment
+    #    lo:  (array) the bottom altitude of each segment
+    #
+    # Returns a list of (lat, lon, ttl, altitude) tuples beginning with the last heard position of the flight
+    def buildFlightPath(self, x, y, last_heard_altitude, t, lat_rate, lon_rate, lo):
+
+        # Running time to live (from the floor up)
+        ttl_sums = np.cumsum(t)
+        ttl = float(ttl_sums[-1]) if ttl_sums.shape[0] > 0 else 0
+
+        # The first point in the predicted flight path is the latest position of the flight
+        flightpath_points = [(x, y, ttl, last_heard_altitude)]
+
+        # Collect the points determined along the way
+        # This is reversed because the segments run from the prediction_floor up to the last_heard_altitude, basically calculating
+        # the delta points in reverse.
+        lats = x + np.cumsum((t * lat_rate)[::-1])
+        lons = y + np.cumsum((t * lon_rate)[::-1])
+        flightpath_points.extend(zip(lats.tolist(), lons.tolist(), ttl_sums[::-1].tolist(), lo[::-1].tolist()))
+
+        return flightpath_points
+
+
     ##########################################################
     # The landing prediction algorithm
-    #     This should only be called once the flight is descending.  
+    #     This should only be called once the flight is descending.
     # Arguments:
     #    latestpackets:  (list) a list of points (lat, lon, altitude) of the flight path observed thus far
     #    launch_lat:  (float) the latitude (in decimal degrees) of the launch location
@@ -159,15 +702,16 @@ class PredictorBase(object):
     #    surface_winds:  (boolean) This controls if allowances for surface winds are used as a flight descends from upper wind levels to surface wind levels
     #    wind_rates:  (list) of the surface wind components
     #    airdensity_function:  (callable) this is a callback function that accepts an altitude as input and returned the air density at that altitude.
+    #    windprofile:  (WindProfile) the winds observed during the ascent for this flight.  If not given, one is created from latestpackets.
     #
     # Returns:
     #    flightpath:  (list) list of points (lat, lon, altitude) of the predicted flight path
-    #    lat:  (float) latitude of the predicted landing 
-    #    lon:  (float) longitude of the predicted landing 
+    #    lat:  (float) latitude of the predicted landing
+    #    lon:  (float) longitude of the predicted landing
     #    ttl:  (float) the time remaining before touchdown (in minutes)
     #    err:  (boolean) if true, then an error occured and the variables values are invalid
     #
-    def predictionAlgo(self, latestpackets, launch_lat, launch_lon, launch_elev, algo_floor, surface_winds = False, wind_rates = None, airdensity_function = None):
+    def predictionAlgo(self, latestpackets, launch_lat, launch_lon, launch_elev, algo_floor, surface_winds = False, wind_rates = None, airdensity_function = None, windprofile = None):
         self.logger.debug("Launch params: %.3f, %.3f, %.3f, %.3f" % (launch_lat, launch_lon, launch_elev, algo_floor))
         self.logger.debug("latestpackets size: %d" % latestpackets.shape[0])
 
@@ -199,89 +743,31 @@ class PredictorBase(object):
         idx = np.argmax(altitudes)
         max_altitude = altitudes[idx]
         self.logger.debug("Max altitude heard thus far: %d" % max_altitude)
-       
-        # split the latestpackets list into two portions based on the index just discovered and convert to numpy arrays and trim off the timestamp column
-        ascent_portion = np.array(latestpackets[0:(idx+1), 1:7], dtype='f')
+
+        # split the latestpackets list into two portions based on the index just discovered and convert to numpy arrays and trim off the timestamp column.
+        # Packets from before the actual launch are trimmed from the ascent portion.
+        start, ascent_portion, trimmed = self.trimAscent(latestpackets, idx)
         descent_portion = np.array(latestpackets[idx:, 1:7], dtype='f')
         self.logger.debug("ascent_portion.shape: %s" % str(ascent_portion.shape))
         self.logger.debug("descent_portion.shape: %s" % str(descent_portion.shape))
 
-        # Loop through the ascent rates heard thus far until we find a value where the ascent rate (ft/s) is > 5ft/s.  This eliminates
-        # those early packets from the beacons prior to actual launch...we don't want those.
-        loop_limit = ascent_portion.shape[0] - 1
-        loop_counter = 0
-        if ascent_portion.shape[0] > 0:
-            while ascent_portion[loop_counter, 3] < 5 and loop_counter < loop_limit:
-                loop_counter += 1
-        
-        if loop_counter > 0:
-            # We trim off those packets from the beginning of the flight that don't matter.  Only want to keep those packets from just before
-            # the balloon is launched (aka the altitude starts to rise).  If this flight has yet to start ascending, then this array will only have 
-            # one two packets.
-            ascent_portion = ascent_portion[(loop_counter-1):,0:]
-
-            # This sets the first packet for our ascent_rates array to have the same altitude, latitude, and longitude change rates.
-            # reference:  columns:  altitude, latitude, longitude, altitude_change_rate, latitude_change_rate, longitude_change_rate
-            ascent_portion[0,3] = ascent_portion[1,3]
-            ascent_portion[0,4] = ascent_portion[1,4]
-            ascent_portion[0,5] = ascent_portion[1,5]
-
-        if ascent_portion.shape[0] > 0:
-            self.logger.debug("ascent_portion[0]:  %f, %f, %f, %f, %f, %f" % (ascent_portion[0,0], 
-                ascent_portion[0,1],
-                ascent_portion[0,2],
-                ascent_portion[0,3],
-                ascent_portion[0,4],
-                ascent_portion[0,5]
-                ))
-        if ascent_portion.shape[0] > 1:
-            self.logger.debug("ascent_portion[1]:  %f, %f, %f, %f, %f, %f" % (ascent_portion[1,0], 
-                ascent_portion[1,1],
-                ascent_portion[1,2],
-                ascent_portion[1,3],
-                ascent_portion[1,4],
-                ascent_portion[1,5]
-                ))
+        # If a wind profile for this flight wasn't supplied, then create one from these packets
+        if windprofile is None:
+            windprofile = WindProfile()
+            windprofile.update(None, latestpackets[start:(idx+1), 0], ascent_portion, trimmed)
 
         if ascent_portion.shape[0] > 0:
-            self.logger.debug("ascent_portion[last]:  %f, %f, %f, %f, %f, %f" % (ascent_portion[-1,0], 
-                ascent_portion[-1,1],
-                ascent_portion[-1,2],
-                ascent_portion[-1,3],
-                ascent_portion[-1,4],
-                ascent_portion[-1,5]
-                ))
+            self.logger.debug("ascent_portion[0]:  %f, %f, %f, %f, %f, %f" % tuple(ascent_portion[0]))
+            self.logger.debug("ascent_portion[last]:  %f, %f, %f, %f, %f, %f" % tuple(ascent_portion[-1]))
 
         if descent_portion.shape[0] > 0:
-            self.logger.debug("descent_portion[0]:  %f, %f, %f, %f, %f, %f" % (descent_portion[0,0], 
-                descent_portion[0,1],
-                descent_portion[0,2],
-                descent_portion[0,3],
-                descent_portion[0,4],
-                descent_portion[0,5]
-                ))
-        if descent_portion.shape[0] > 1:
-            self.logger.debug("descent_portion[1]:  %f, %f, %f, %f, %f, %f" % (descent_portion[1,0], 
-                descent_portion[1,1],
-                descent_portion[1,2],
-                descent_portion[1,3],
-                descent_portion[1,4],
-                descent_portion[1,5]
-                ))
-
-        if descent_portion.shape[0] > 0:
-            self.logger.debug("descent_portion[last]:  %f, %f, %f, %f, %f, %f" % (descent_portion[-1,0], 
-                descent_portion[-1,1],
-                descent_portion[-1,2],
-                descent_portion[-1,3],
-                descent_portion[-1,4],
-                descent_portion[-1,5]
-                ))
+            self.logger.debug("descent_portion[0]:  %f, %f, %f, %f, %f, %f" % tuple(descent_portion[0]))
+            self.logger.debug("descent_portion[last]:  %f, %f, %f, %f, %f, %f" % tuple(descent_portion[-1]))
 
         # To determine if this flight is descending yet...
         # 1.  find max altitude
         # 2.  split array into ascending and descending portions
-        # 3.  measure length of the two arrays (i.e. ascending and descending)  
+        # 3.  measure length of the two arrays (i.e. ascending and descending)
         # 4.  if the descending portion is less than 1 in length, then nope, balloon is not descending yet.
 
         # If the index of max altitude is less than the length of the of the flight...implies we've seen an alitude "hump" and are now descending
@@ -296,7 +782,7 @@ class PredictorBase(object):
             self.logger.debug("flight is descending, processing a prediction")
 
             ####################################
-            # START:  prepend a synthetic packet to the beginning of the flight's ascent_portion
+            # START:  compute the rates from the launch site to the first packet
             ####################################
             # Why?
             #
@@ -307,19 +793,19 @@ class PredictorBase(object):
             # A         /
             # L        /
             # T       3   <--- we received an APRS packet here, packet #3
-            # I      / 
+            # I      /
             # T     2  <--- we received an APRS packet here, packet #2
             # U     |
-            # D     |  
+            # D     |
             # E     1  <--- we received an APRS packet here, packet #1 (this is the first packet we've heard)
             #       |
             #       |
             #-------0----------   <===== launch site elevation (aka, the prediction_floor)
 
-            # For packets greater than #2, we have change rates for altitude, latitude, and longitude calculated.  However, for packet #1 
+            # For packets greater than #2, we have change rates for altitude, latitude, and longitude calculated.  However, for packet #1
             # and for conditions at the launch site, #0, we don't. Packet #1 is addressed up above and is assigned the change rates
-            # from packet #2.  For the prediction_floor location, however, there isn't a packet in the latestpackets list.  So we need to 
-            # prepend the rates observed from the several packets just afer launch (an average) to this #0 location.
+            # from packet #2.  For the prediction_floor location, however, there isn't a packet in the latestpackets list.  So we need to
+            # use the rates observed from the several packets just afer launch (an average) from this #0 location up to packet #1.
             #
 
             # The last altitude we've heard
@@ -327,9 +813,12 @@ class PredictorBase(object):
 
             self.logger.debug("last_heard_altitude: %f" % last_heard_altitude)
 
+            # The altitude of the first packet we heard.  Below this altitude the launch rates are used instead of the wind profile.
+            first_altitude = float(ascent_portion[0,0])
+            use_launch_rates = False
+
             # If the flight is already lower than the prediction_floor then we don't bother with this, because we're not going to calculate
-            # a prediction when the flight is below the floor.  Otherwise we preappend a row with updated rates for altitude, lat, lon, 
-            # alt_rate, lat_rate, and lon_rate
+            # a prediction when the flight is below the floor.
             if last_heard_altitude > self.prediction_floor:
 
                 # This is the location and elevation of the launch site (aka where the balloon started its trip from)
@@ -337,13 +826,13 @@ class PredictorBase(object):
                 origin_y = launch_lon
                 origin_alt = launch_elev
 
-                # Difference in the elevation at the launch site and the altitude of the balloon for the first packet we heard 
-                dz = float(ascent_portion[0,0]) - origin_alt
+                # Difference in the elevation at the launch site and the altitude of the balloon for the first packet we heard
+                dz = first_altitude - origin_alt
                 self.logger.debug("Altitude gained from launch site to first packet: %fft" % dz)
 
                 # Calculate the mean vertical rate for the first 5 APRS packets.
                 avg_ascent_rate = float(np.mean(ascent_portion[0:5, 3]))
-                self.logger.debug("Mean ascent rate for the first 5 packets: %fft/sec" % avg_ascent_rate) 
+                self.logger.debug("Mean ascent rate for the first 5 packets: %fft/sec" % avg_ascent_rate)
 
                 # Estimate how long it took the balloon to travel from the launch site elevation to the first packet we heard
                 time_to_first = dz / avg_ascent_rate
@@ -353,31 +842,13 @@ class PredictorBase(object):
                 # reference:  columns:  altitude, latitude, longitude, altitude_change_rate, latitude_change_rate, longitude_change_rate
                 latrate_to_first = (float(ascent_portion[0,1]) - float(origin_x)) / time_to_first
                 lonrate_to_first = (float(ascent_portion[0,2]) - float(origin_y)) / time_to_first
-                #latrate_to_first = (origin_x - float(ascent_portion[0,1]) ) / time_to_first
-                #lonrate_to_first = (origin_y - float(ascent_portion[0,2]) ) / time_to_first
                 self.logger.debug("latrate_to_first: (%f - %f) / %f = %f" % (ascent_portion[0,1], origin_x, time_to_first, latrate_to_first))
                 self.logger.debug("lonrate_to_first: (%f - %f) / %f = %f" % (ascent_portion[0,2], origin_y, time_to_first, lonrate_to_first))
 
-                # Append the entry for the prediction_floor elevation to the ascent_portion array
-                tempray = np.array([ [self.prediction_floor, origin_x, origin_y, avg_ascent_rate, latrate_to_first, lonrate_to_first ]], dtype='f')
-                self.logger.debug("Pre-pending to ascent_portion: %f, %f, %f, %f, %f, %f" % (tempray[0,0],
-                    tempray[0,1],
-                    tempray[0,2],
-                    tempray[0,3],
-                    tempray[0,4],
-                    tempray[0,5]
-                    ))
-
-                # Update the initial packet with these calculated vertical, lat, and lon rates
-                ascent_portion[0,3] = avg_ascent_rate
-                ascent_portion[0,4] = latrate_to_first
-                ascent_portion[0,5] = lonrate_to_first
-
-                # Add a record for the launch site itself to the beginning of our list of packets
-                ascent_portion = np.insert(ascent_portion, 0, tempray, axis=0)
+                use_launch_rates = True
 
             ####################################
-            # END:  prepend a synthetic packet to the beginning of the flight's ascent_portion
+            # END:  compute the rates from the launch site to the first packet
             ####################################
 
 
@@ -421,19 +892,12 @@ class PredictorBase(object):
             y = float(descent_portion[-1, 2])
             self.logger.debug("last heard location (x,y): %f, %f" % (x, y))
 
-            # This is basically the starting altitude for the prediction.  It's the last altitude value we received from the flight.
-            backstop = float(descent_portion[-1, 0])
-            self.logger.debug("backstop: %f" % backstop)
-
-            # Size of the altitude chunks (in feet) that we loop through in calculating predictions for the future.  
+            # Size of the altitude chunks (in feet) that we loop through in calculating predictions for the future.
             # Smaller = more acccurate, but longer compute times.  30 seems to be a good compromise.
             step_size = 30
             self.logger.debug("stepsize: %d" % step_size)
 
-            # Length of the ascent portion of the flight
-            length = ascent_portion.shape[0]
-
-            # The weight assigned to the two different functions used for predictions.  Essentially a precentage value based on 
+            # The weight assigned to the two different functions used for predictions.  Essentially a precentage value based on
             # "where" in the descent a flight is at it varies from 0 to 1.  With 1 being at the max altitude, and 0 being at the prediction_floor.
             #     Shortly after burst?  ...then apply more weight to the curve fitting function
             #     Well into the descent?  ...then apply more weight to the drag caluclation function
@@ -483,7 +947,7 @@ class PredictorBase(object):
                         w_sum += w
                         lat_sum += lat
                         lon_sum += lon
-                        
+
                         # loop counter.  This determines the weight of each waypoint.
                         i += 1
 
@@ -498,266 +962,79 @@ class PredictorBase(object):
                 else:
                     use_surface_wind = False
 
-            # Loop params
-            k_idx = 0
-            first_time = True
-
-            # this is the list of points that comprise the flight path, setting to empty values prior to entering the loop
-            flightpath_deltas = []
-            flightpath_altitudes = []
-
-            # This is the time to live until landing, in seconds
-            ttl = 0
-
             ####################################
             # END:  initialize loop variables
             ####################################
 
 
             ####################################
-            # START:  primary prediction calculation loop
+            # START:  primary prediction calculation
             ####################################
             # We're here because:  a) the flight is descending, and b) conditions are such that we want to calculate a prediction.
 
             # Lambda function that represents our velocity prediction curve
             v = lambda altitude : function_weight * self.func_x2(altitude, *p) + (1 - function_weight) * pred_v_curve(altitude)
 
-            # Loop through all of the heard altitudes (from the ascent portion of the flight), from lowest to highest (aka burst) 
-            #for k in ascent_portion[np.where(ascent_portion[:,0] <= last_heard_altitude)]:
-            #for k in ascent_portion:
-            k_len = ascent_portion.shape[0]
-            while k_idx < k_len and first_time:
-
-                # The row
-                k = ascent_portion[k_idx,]
-
-                # We want to skip this section the first time through the loop.  That is for the first value of "k[0]" which should be the
-                # prediction_floor, we don't want to run any calculations.  The "backstop" is therefore set to the last_heard_altitude (up above)
-                # to ensure this happens.
-                if k[0] >= self.prediction_floor and k_idx > 0 and k[0] > backstop:
-
-                   # If the prior heard altitude (i.e. during the ascent) is lower than the last heard position of the flight then continue 
-                   # with calcuations from one ascent waypoint to the next higher one.
-                   if k[0] < last_heard_altitude:
-
-                       upper_idx = k_idx + 5
-                       lower_idx = k_idx - 5
-
-                       if upper_idx > length:
-                           upper_idx = length
-                       if lower_idx < 0:
-                           lower_idx = 0
-
-                       avg_asc_rate = np.mean(ascent_portion[lower_idx:upper_idx, 3])
-                       delta = avg_asc_rate - k[3] 
-
-                       t = 0
-                       h_range = []
-                       if k[0] - backstop <= step_size:
-                           v_0 =  v(backstop)
-                           v_1 =  v(k[0])
-                           v_avg = (v_0 + v_1) / 2.0
-                           t = abs((k[0] - backstop) / v_avg)
-
-                       else:
-                           h_range = np.arange(backstop + step_size, k[0], step_size)
-                           for h in h_range:
-                               v_0 =  v(h - step_size)
-                               v_1 =  v(h)
-                               v_avg = (v_0 + v_1) / 2.0
-                               t += abs(step_size / v_avg)
-
-                           v_0 =  v(h_range[-1])
-                           v_1 =  v(k[0])
-                           v_avg = (v_0 + v_1) / 2.0
-                           t += abs((k[0] - h_range[-1]) / v_avg)
-
-
-                       if surface_winds:
-
-                           # Which wind vector to use?
-                           if wind_rates is None:
-                               lat_wind_rate = k[4]
-                               lon_wind_rate = k[5]
-                               self.logger.debug("No wind rates given")
-                           else:
-                               surface_weight = (1 - (k[0] - surface_wind_cutoff) / float(surface_wind_threshold - surface_wind_cutoff))**surface_exponent_weight
-                               if surface_weight > 1:
-                                   surface_weight = 1
-                               if surface_weight < 0:
-                                   surface_weight = 0
-
-                               if k[0] >= surface_wind_threshold:
-                                   surface_weight = 0
-
-
-                               lat_wind_rate = surface_weight * wind_rates[0] + (1 - surface_weight) * k[4]
-                               lon_wind_rate = surface_weight * wind_rates[1] + (1 - surface_weight) * k[5]
-                               self.logger.debug("latest alt: %f, wind[0]: %f, wind[1]: %f, k[0]: %f, surface_weight: %f, latwr: %f, lonwr: %f" % (last_heard_altitude, wind_rates[0], wind_rates[1], k[0], surface_weight, lat_wind_rate, lon_wind_rate))
-
-
-                           # If this is true then the flight is already descending below the surface_wind_threshold
-                           if use_surface_wind:
-                               # Weighting for surface winds components.  The closer to landing, the more weight surface winds have.
-                               surface_weight = (1 - (last_heard_altitude - surface_wind_cutoff) / float(surface_wind_threshold - surface_wind_cutoff))**surface_exponent_weight
-
-                               if surface_weight > 1:
-                                   surface_weight = 1
-                               if surface_weight < 0:
-                                   surface_weight = 0
-
-                               # compute weighted avg of wind vectors
-                               lat_rate = surface_weight * avg_lat_rate + (1 - surface_weight) * lat_wind_rate
-                               lon_rate = surface_weight * avg_lon_rate + (1 - surface_weight) * lon_wind_rate
-                               self.logger.debug("///////> surface wind weighting: %f, alt: %f, lat_rate: %f, lon_rate: %f, avg_lat_rate: %f, avg_lon_rate: %f" % (surface_weight, k[0], lat_rate, lon_rate, avg_lat_rate, avg_lon_rate))
-
-                           # the flight has yet to descend below the surface_wind_threshold
-                           else:
-                               lat_rate = lat_wind_rate
-                               lon_rate = lon_wind_rate 
-
-                           dx = t * lat_rate
-                           dy = t * lon_rate
-                       else:
-                           dx = t * k[4]
-                           dy = t * k[5]
-
-                       x += dx
-                       y += dy
-                       ttl += t
-                       self.logger.debug("TOP:  backstop: %f, time: %f, k: %f, %f, %f, %f, %f, %f" %(backstop, t, k[0], k[1], k[2], k[3], k[4], k[5]))
-                       if k_idx == 0:
-                           a = self.prediction_floor
-                       else:
-                           a = ascent_portion[k_idx - 1,0]
-                       flightpath_deltas.append((dx, dy, ttl, a))
-
-                   
-                   else:
-                       if first_time and last_heard_altitude > backstop:
-                           first_time = False
-
-                           upper_idx = k_idx + 5
-                           lower_idx = k_idx - 5
-
-                           if upper_idx > length:
-                               upper_idx = length
-                           if lower_idx < 0:
-                               lower_idx = 0
-
-                           avg_asc_rate = np.mean(ascent_portion[lower_idx:upper_idx, 3])
-                           delta = avg_asc_rate - k[3]
-
-                           t = 0
-                           h_range = []
-                           if last_heard_altitude - backstop <= step_size and last_heard_altitude > backstop:
-                               v_0 =  v(backstop)
-                               v_1 =  v(last_heard_altitude)
-                               v_avg = (v_0 + v_1) / 2.0
-                               t = abs((last_heard_altitude - backstop) / v_avg)
-                           else:
-                               h_range = np.arange(backstop + step_size, last_heard_altitude, step_size)
-                               for h in h_range:
-                                   v_0 =  v(h - step_size)
-                                   v_1 =  v(h)
-                                   v_avg = (v_0 + v_1) / 2.0
-                                   t += abs(step_size / v_avg)
-
-                               v_0 =  v(h_range[-1])
-                               v_1 =  v(last_heard_altitude)
-                               v_avg = (v_0 + v_1) / 2.0
-                               t += abs((last_heard_altitude - h_range[-1]) / v_avg)
-
-                           if surface_winds:
-
-                               # Which wind vector to use?
-                               if wind_rates is None:
-                                   lat_wind_rate = k[4]
-                                   lon_wind_rate = k[5]
-                               else:
-                                   surface_weight = (1 - (k[0] - surface_wind_cutoff) / float(surface_wind_threshold - surface_wind_cutoff))**surface_exponent_weight
-                                   if surface_weight > 1:
-                                       surface_weight = 1
-                                   if surface_weight < 0:
-                                       surface_weight = 0
-
-                                   if k[0] >= surface_wind_threshold:
-                                       surface_weight = 0
-
-                                   lat_wind_rate = surface_weight * wind_rates[0] + (1 - surface_weight) * k[4]
-                                   lon_wind_rate = surface_weight * wind_rates[1] + (1 - surface_weight) * k[5]
-
-                               # If this is true then the flight is already descending below the surface_wind_threshold
-                               if use_surface_wind:
-                                   # Weighting for surface winds components.  The closer to landing, the more weight surface winds have.
-                                   surface_weight = (1 - (last_heard_altitude - surface_wind_cutoff) / float(surface_wind_threshold - surface_wind_cutoff))**surface_exponent_weight
-
-                                   if surface_weight > 1:
-                                       surface_weight = 1
-                                   if surface_weight < 0:
-                                       surface_weight = 0
-
-                                   # compute weighted avg of wind vectors
-                                   lat_rate = surface_weight * avg_lat_rate + (1 - surface_weight) * lat_wind_rate
-                                   lon_rate = surface_weight * avg_lon_rate + (1 - surface_weight) * lon_wind_rate
-                                   self.logger.debug("///////> surface wind weighting: %f, alt: %f, lat_rate: %f, lon_rate: %f, avg_lat_rate: %f, avg_lon_rate: %f" % (surface_weight, k[0], lat_rate, lon_rate, avg_lat_rate, avg_lon_rate))
-
-                               # the flight has yet to descend below the surface_wind_threshold
-                               else:
-                                   lat_rate = lat_wind_rate
-                                   lon_rate = lon_wind_rate
-
-                               dx = t * lat_rate
-                               dy = t * lon_rate
-                           else:
-                               dx = t * k[4]
-                               dy = t * k[5]
-
-                           x += dx
-                           y += dy
-                           ttl += t
-                           self.logger.debug("BOTTOM:  backstop: %f, time: %f, k: %f, %f, %f, %f, %f, %f" %(backstop, t, k[0], k[1], k[2], k[3], k[4], k[5]))
-                           if k_idx == 0:
-                               a = self.prediction_floor
-                           else:
-                               a = ascent_portion[k_idx - 1,0]
-                           flightpath_deltas.append((dx, dy, ttl, a))
-
-                   # END:  if k[0] < last_heard_altitude:
+            # The altitude segments from the prediction_floor up to the last heard altitude along with the winds observed (during the
+            # ascent) for each one.
+            lo, hi, wind_alt, wind_lat, wind_lon = windprofile.segments(self.prediction_floor, last_heard_altitude)
+
+            # Below the first packet we heard, we use the rates from the launch site to that first packet
+            if use_launch_rates:
+                below = hi <= first_altitude
+                wind_alt[below] = first_altitude
+                wind_lat[below] = latrate_to_first
+                wind_lon[below] = lonrate_to_first
 
+            # The time it takes to descend through each altitude segment
+            t = self.integrateSegments(v, lo, hi, step_size)
 
+            if surface_winds:
+
+                # Which wind vector to use?
+                if wind_rates is None:
+                    lat_wind_rate = wind_lat
+                    lon_wind_rate = wind_lon
+                    self.logger.debug("No wind rates given")
                 else:
-                   self.logger.debug("NO RUN:  backstop: %f, k: %f, %f, %f, %f, %f, %f" %(backstop, k[0], k[1], k[2], k[3], k[4], k[5]))
+                    surface_weight = np.clip((1 - (wind_alt - surface_wind_cutoff) / float(surface_wind_threshold - surface_wind_cutoff))**surface_exponent_weight, 0, 1)
+                    surface_weight[wind_alt >= surface_wind_threshold] = 0
 
-                # END:  if k[0] >= prediction_floor and k_idx > 0 and k[0] > backstop:
+                    lat_wind_rate = surface_weight * wind_rates[0] + (1 - surface_weight) * wind_lat
+                    lon_wind_rate = surface_weight * wind_rates[1] + (1 - surface_weight) * wind_lon
 
+                # If this is true then the flight is already descending below the surface_wind_threshold
+                if use_surface_wind:
+                    # Weighting for surface winds components.  The closer to landing, the more weight surface winds have.
+                    surface_weight = (1 - (last_heard_altitude - surface_wind_cutoff) / float(surface_wind_threshold - surface_wind_cutoff))**surface_exponent_weight
 
-                backstop = k[0]
-                k_idx += 1
+                    if surface_weight > 1:
+                        surface_weight = 1
+                    if surface_weight < 0:
+                        surface_weight = 0
 
-            # END:  for k in ascent_portion:
-                
-            ####################################
-            # END:  primary prediction calculation loop
-            ####################################
+                    # compute weighted avg of wind vectors
+                    lat_rate = surface_weight * avg_lat_rate + (1 - surface_weight) * lat_wind_rate
+                    lon_rate = surface_weight * avg_lon_rate + (1 - surface_weight) * lon_wind_rate
+                    self.logger.debug("///////> surface wind weighting: %f, alt: %f, avg_lat_rate: %f, avg_lon_rate: %f" % (surface_weight, last_heard_altitude, avg_lat_rate, avg_lon_rate))
+
+                # the flight has yet to descend below the surface_wind_threshold
+                else:
+                    lat_rate = lat_wind_rate
+                    lon_rate = lon_wind_rate
+
+            else:
+                lat_rate = wind_lat
+                lon_rate = wind_lon
 
-            # The first point in the predicted flight path is the latest position of the flight
-            flightpath_points = [(descent_portion[-1,1], descent_portion[-1,2], ttl, last_heard_altitude)]
+            self.logger.debug("Prediction segments: %d, time to live: %fs" % (t.shape[0], float(np.sum(t))))
 
-            # Set the previous lat/lon points to the last value of the flightpath_points array, which should be 
-            # the last position of the flight.
-            prev_x = flightpath_points[-1][0] 
-            prev_y = flightpath_points[-1][1]
+            ####################################
+            # END:  primary prediction calculation
+            ####################################
 
-            # Collect the points determined along the way
-            # This is reversed because the prediction loop (above) runs from the prediction_floor up to the last_heard_altitude, basically calculating
-            # the delta points in reverse.
-            for u,v,t,a in flightpath_deltas[::-1]:
-                pos_x = prev_x + u 
-                pos_y = prev_y + v 
-                flightpath_points.append((pos_x, pos_y, t, a))
-                prev_x = pos_x
-                prev_y = pos_y
+            # The points in the predicted flight path, starting with the latest position of the flight
+            flightpath_points = self.buildFlightPath(x, y, last_heard_altitude, t, lat_rate, lon_rate, lo)
 
             return flightpath_points, parachute_coef
 
@@ -771,22 +1048,21 @@ class PredictorBase(object):
     #
     # Arguments:
     #    latestpackets:  (list) a list of points (lat, lon, altitude) of the flight path observed thus far
+    #    descent_rates:  (array) altitude and descent velocity (ft/s) pairs from the predict file
     #    launch_lat:  (float) the latitude (in decimal degrees) of the launch location
     #    launch_lon:  (float) the longitude (in decimal degrees) of the launch location
     #    launch_elev:  (float) the elevation (in feet) of the launch location
     #    algo_floor:  (float) the altitude below which the prediction algorithm will no longer compute predictions.  Should be ground level near the landing area.
-    #    surface_winds:  (boolean) This controls if allowances for surface winds are used as a flight descends from upper wind levels to surface wind levels
-    #    wind_rates:  (list) of the surface wind components
-    #    airdensity_function:  (callable) this is a callback function that accepts an altitude as input and returned the air density at that altitude.
+    #    windprofile:  (WindProfile) the winds observed during the ascent for this flight.  If not given, one is created from latestpackets.
     #
     # Returns:
     #    flightpath:  (list) list of points (lat, lon, altitude) of the predicted flight path
-    #    lat:  (float) latitude of the predicted landing 
-    #    lon:  (float) longitude of the predicted landing 
+    #    lat:  (float) latitude of the predicted landing
+    #    lon:  (float) longitude of the predicted landing
     #    ttl:  (float) the time remaining before touchdown (in minutes)
     #    err:  (boolean) if true, then an error occured and the variables values are invalid
     #
-    def predictionAlgoCutdown(self, latestpackets, descent_rates, launch_lat, launch_lon, launch_elev, algo_floor):
+    def predictionAlgoCutdown(self, latestpackets, descent_rates, launch_lat, launch_lon, launch_elev, algo_floor, windprofile = None):
         self.logger.debug("Launch params: %.3f, %.3f, %.3f, %.3f" % (launch_lat, launch_lon, launch_elev, algo_floor))
         self.logger.debug("latestpackets size: %d" % latestpackets.shape[0])
 
@@ -794,9 +1070,6 @@ class PredictorBase(object):
         if not launch_lat or not launch_lon or not launch_elev or not algo_floor:
             return None
 
-        # airdensity function
-        ad = self.airdensity
-
         # if no packets are provided then return
         if latestpackets.shape[0] <= 0:
             return None
@@ -817,93 +1090,28 @@ class PredictorBase(object):
 
         self.logger.debug("Min altitude heard thus far: %d" % min_altitude)
         self.logger.debug("Max altitude heard thus far: %d" % max_altitude)
-       
+
         # split the latestpackets list into two portions based on the index just discovered and convert to numpy arrays and trim off the timestamp column
-        ascent_portion = np.array(latestpackets[0:(idx+1), 1:7], dtype='f')
+        # Packets from before the actual launch are trimmed from the ascent portion.
+        start, ascent_portion, trimmed = self.trimAscent(latestpackets, idx)
         descent_portion = np.array(latestpackets[idx:, 1:7], dtype='f')
         self.logger.debug("ascent_portion.shape: %s" % str(ascent_portion.shape))
         self.logger.debug("descent_portion.shape: %s" % str(descent_portion.shape))
 
-        # Loop through the ascent rates heard thus far until we find a value where the ascent rate (ft/s) is > 5ft/s.  This eliminates
-        # those early packets from the beacons prior to actual launch...we don't want those.
-        loop_limit = ascent_portion.shape[0] - 1
-        loop_counter = 0
-        if ascent_portion.shape[0] > 0:
-            while ascent_portion[loop_counter, 3] < 5 and loop_counter < loop_limit:
-                loop_counter += 1
-        
-        if loop_counter > 0:
-            # We trim off those packets from the beginning of the flight that don't matter.  Only want to keep those packets from just before
-            # the balloon is launched (aka the altitude starts to rise).  If this flight has yet to start ascending, then this array will only have 
-            # one two packets.
-            ascent_portion = ascent_portion[(loop_counter-1):,0:]
-
-            # This sets the first packet for our ascent_rates array to have the same altitude, latitude, and longitude change rates.
-            # reference:  columns:  altitude, latitude, longitude, altitude_change_rate, latitude_change_rate, longitude_change_rate
-            ascent_portion[0,3] = ascent_portion[1,3]
-            ascent_portion[0,4] = ascent_portion[1,4]
-            ascent_portion[0,5] = ascent_portion[1,5]
+        # If a wind profile for this flight wasn't supplied, then create one from these packets
+        if windprofile is None:
+            windprofile = WindProfile()
+            windprofile.update(None, latestpackets[start:(idx+1), 0], ascent_portion, trimmed)
 
         if ascent_portion.shape[0] > 0:
-            self.logger.debug("ascent_portion[0]:  %f, %f, %f, %f, %f, %f" % (ascent_portion[0,0], 
-                ascent_portion[0,1],
-                ascent_portion[0,2],
-                ascent_portion[0,3],
-                ascent_portion[0,4],
-                ascent_portion[0,5]
-                ))
-        if ascent_portion.shape[0] > 1:
-            self.logger.debug("ascent_portion[1]:  %f, %f, %f, %f, %f, %f" % (ascent_portion[1,0], 
-                ascent_portion[1,1],
-                ascent_portion[1,2],
-                ascent_portion[1,3],
-                ascent_portion[1,4],
-                ascent_portion[1,5]
-                ))
-
-        if ascent_portion.shape[0] > 0:
-            self.logger.debug("ascent_portion[last]:  %f, %f, %f, %f, %f, %f" % (ascent_portion[-1,0], 
-                ascent_portion[-1,1],
-                ascent_portion[-1,2],
-                ascent_portion[-1,3],
-                ascent_portion[-1,4],
-                ascent_portion[-1,5]
-                ))
-
-        if descent_portion.shape[0] > 0:
-            self.logger.debug("descent_portion[0]:  %f, %f, %f, %f, %f, %f" % (descent_portion[0,0], 
-                descent_portion[0,1],
-                descent_portion[0,2],
-                descent_portion[0,3],
-                descent_portion[0,4],
-                descent_portion[0,5]
-                ))
-        if descent_portion.shape[0] > 1:
-            self.logger.debug("descent_portion[1]:  %f, %f, %f, %f, %f, %f" % (descent_portion[1,0], 
-                descent_portion[1,1],
-                descent_portion[1,2],
-                descent_portion[1,3],
-                descent_portion[1,4],
-                descent_portion[1,5]
-                ))
+            self.logger.debug("ascent_portion[0]:  %f, %f, %f, %f, %f, %f" % tuple(ascent_portion[0]))
+            self.logger.debug("ascent_portion[last]:  %f, %f, %f, %f, %f, %f" % tuple(ascent_portion[-1]))
 
         if descent_portion.shape[0] > 0:
-            self.logger.debug("descent_portion[last]:  %f, %f, %f, %f, %f, %f" % (descent_portion[-1,0], 
-                descent_portion[-1,1],
-                descent_portion[-1,2],
-                descent_portion[-1,3],
-                descent_portion[-1,4],
-                descent_portion[-1,5]
-                ))
+            self.logger.debug("descent_portion[0]:  %f, %f, %f, %f, %f, %f" % tuple(descent_portion[0]))
+            self.logger.debug("descent_portion[last]:  %f, %f, %f, %f, %f, %f" % tuple(descent_portion[-1]))
 
-        # To determine if this flight is descending yet...
-        # 1.  find max altitude
-        # 2.  split array into ascending and descending portions
-        # 3.  measure length of the two arrays (i.e. ascending and descending)  
-        # 4.  if the descending portion is less than 1 in length, then nope, balloon is not descending yet.
-
-        # If the index of max altitude is less than the length of the of the flight...implies we've seen an alitude "hump" and are now descending
-        # ...AND the max altitude is > 14,999 feet (sanity check)...
+        # If the max altitude is > 14,999 feet (sanity check)...
         # ...AND we've got at least three packets from the ascent portion (without hearing packets on the way up we can't really predict anything)...
         # ...THEN continue on and try to predict a landing location for this flight
         alt_sanity_threshold = 14999
@@ -919,50 +1127,22 @@ class PredictorBase(object):
             # START:  initialize loop variables
             ####################################
             # Last heard location of the flight
-            x = float(ascent_portion[-1, 1])
-            y = float(ascent_portion[-1, 2])
+            x = float(descent_portion[-1, 1])
+            y = float(descent_portion[-1, 2])
             self.logger.debug("last heard location (x,y): %f, %f" % (x, y))
 
-            # This is basically the starting altitude for the prediction.  It's the last altitude value we received from the flight.
-            backstop = float(ascent_portion[-1, 0])
-            self.logger.debug("backstop: %f" % backstop)
-
-            # Size of the altitude chunks (in feet) that we loop through in calculating predictions for the future.  
+            # Size of the altitude chunks (in feet) that we loop through in calculating predictions for the future.
             # Smaller = more acccurate, but longer compute times.  30 seems to be a good compromise.
             step_size = 30
             self.logger.debug("stepsize: %d" % step_size)
 
-            # Length of the ascent portion of the flight
-            length = ascent_portion.shape[0]
-
-            # The weight assigned to the two different functions used for predictions.  Essentially a precentage value based on 
-            # "where" in the descent a flight is at it varies from 0 to 1.  With 1 being at the max altitude, and 0 being at the prediction_floor.
-            #     Shortly after burst?  ...then apply more weight to the curve fitting function
-            #     Well into the descent?  ...then apply more weight to the drag caluclation function
-            function_weight = (float(last_heard_altitude) - self.prediction_floor) / (float(descent_portion[0, 0]) - self.prediction_floor)
-
-            # Adjust the weight so that it more aggressively favors the drag calculation function instead of the curve fitting model.
-            function_weight = function_weight**2
-            self.logger.debug("function_weight: %f" % function_weight)
-
-            # Loop params
-            k_idx = 0
-            first_time = True
-
-            # this is the list of points that comprise the flight path, setting to empty values prior to entering the loop
-            flightpath_deltas = []
-            flightpath_altitudes = []
-
-            # This is the time to live until landing, in seconds
-            ttl = 0
-
             ####################################
             # END:  initialize loop variables
             ####################################
 
 
             ####################################
-            # START:  primary prediction calculation loop
+            # START:  primary prediction calculation
             ####################################
             # We're here because:  conditions are such that we want to calculate a prediction.
 
@@ -975,161 +1155,29 @@ class PredictorBase(object):
             if max_altitude > descent_rates[-1,0]:
                 upper_array = np.array([[round(float(max_altitude) * 1.02) , descent_rates[-1,1]]])
                 descent_rates = np.append(descent_rates, upper_array, axis=0)
-                
+
             # create a curve that will serve as the predicted descent velocity at a given altitude
             pred_v_curve = interpolate.interp1d(descent_rates[0:, 0], descent_rates[0:, 1], kind='cubic')
 
             # Lambda function that represents our velocity prediction curve
             v = lambda altitude : pred_v_curve(altitude)
 
-            # Loop through all of the heard altitudes (from the ascent portion of the flight), from lowest to highest (aka burst) 
-            #for k in ascent_portion[np.where(ascent_portion[:,0] <= last_heard_altitude)]:
-            #for k in ascent_portion:
-            k_len = ascent_portion.shape[0]
-            while k_idx < k_len and first_time:
-
-                # The row
-                k = ascent_portion[k_idx,]
-
-                # We want to skip this section the first time through the loop.  That is for the first value of "k[0]" which should be the
-                # prediction_floor, we don't want to run any calculations.  The "backstop" is therefore set to the last_heard_altitude (up above)
-                # to ensure this happens.
-                if k[0] >= self.prediction_floor and k_idx > 0 and k[0] > backstop:
-
-                   # If the prior heard altitude (i.e. during the ascent) is lower than the last heard position of the flight then continue 
-                   # with calcuations from one ascent waypoint to the next higher one.
-                   if k[0] < last_heard_altitude:
-
-                       upper_idx = k_idx + 5
-                       lower_idx = k_idx - 5
-
-                       if upper_idx > length:
-                           upper_idx = length
-                       if lower_idx < 0:
-                           lower_idx = 0
-
-                       avg_asc_rate = np.mean(ascent_portion[lower_idx:upper_idx, 3])
-                       delta = avg_asc_rate - k[3] 
-
-                       t = 0
-                       h_range = []
-                       if k[0] - backstop <= step_size:
-                           v_0 =  v(backstop)
-                           v_1 =  v(k[0])
-                           v_avg = (v_0 + v_1) / 2.0
-                           t = abs((k[0] - backstop) / v_avg)
-
-                       else:
-                           h_range = np.arange(backstop + step_size, k[0], step_size)
-                           for h in h_range:
-                               v_0 =  v(h - step_size)
-                               v_1 =  v(h)
-                               v_avg = (v_0 + v_1) / 2.0
-                               t += abs(step_size / v_avg)
-
-                           v_0 =  v(h_range[-1])
-                           v_1 =  v(k[0])
-                           v_avg = (v_0 + v_1) / 2.0
-                           t += abs((k[0] - h_range[-1]) / v_avg)
-
-
-                       dx = t * k[4]
-                       dy = t * k[5]
-
-                       x += dx
-                       y += dy
-                       ttl += t
-                       self.logger.debug("TOP:  backstop: %f, time: %f, k: %f, %f, %f, %f, %f, %f" %(backstop, t, k[0], k[1], k[2], k[3], k[4], k[5]))
-                       if k_idx == 0:
-                           a = self.prediction_floor
-                       else:
-                           a = ascent_portion[k_idx - 1,0]
-                       flightpath_deltas.append((dx, dy, ttl, a))
-
-                   
-                   else:
-                       if first_time and last_heard_altitude > backstop:
-                           first_time = False
-
-                           upper_idx = k_idx + 5
-                           lower_idx = k_idx - 5
-
-                           if upper_idx > length:
-                               upper_idx = length
-                           if lower_idx < 0:
-                               lower_idx = 0
-
-                           avg_asc_rate = np.mean(ascent_portion[lower_idx:upper_idx, 3])
-                           delta = avg_asc_rate - k[3]
-
-                           t = 0
-                           h_range = []
-                           if last_heard_altitude - backstop <= step_size and last_heard_altitude > backstop:
-                               v_0 =  v(backstop)
-                               v_1 =  v(last_heard_altitude)
-                               v_avg = (v_0 + v_1) / 2.0
-                               t = abs((last_heard_altitude - backstop) / v_avg)
-                           else:
-                               h_range = np.arange(backstop + step_size, last_heard_altitude, step_size)
-                               for h in h_range:
-                                   v_0 =  v(h - step_size)
-                                   v_1 =  v(h)
-                                   v_avg = (v_0 + v_1) / 2.0
-                                   t += abs(step_size / v_avg)
-
-                               v_0 =  v(h_range[-1])
-                               v_1 =  v(last_heard_altitude)
-                               v_avg = (v_0 + v_1) / 2.0
-                               t += abs((last_heard_altitude - h_range[-1]) / v_avg)
-
-                           dx = t * k[4]
-                           dy = t * k[5]
-
-                           x += dx
-                           y += dy
-                           ttl += t
-                           self.logger.debug("BOTTOM:  backstop: %f, time: %f, k: %f, %f, %f, %f, %f, %f" %(backstop, t, k[0], k[1], k[2], k[3], k[4], k[5]))
-                           if k_idx == 0:
-                               a = self.prediction_floor
-                           else:
-                               a = ascent_portion[k_idx - 1,0]
-                           flightpath_deltas.append((dx, dy, ttl, a))
-
-                   # END:  if k[0] < last_heard_altitude:
-
-
-                else:
-                   self.logger.debug("NO RUN:  backstop: %f, k: %f, %f, %f, %f, %f, %f" %(backstop, k[0], k[1], k[2], k[3], k[4], k[5]))
-
-                # END:  if k[0] >= prediction_floor and k_idx > 0 and k[0] > backstop:
+            # The altitude segments from the first packet heard (or the prediction_floor if that's higher) up to the last heard altitude along
+            # with the winds observed (during the ascent) for each one.
+            lower = max(self.prediction_floor, float(ascent_portion[0,0]))
+            lo, hi, wind_alt, wind_lat, wind_lon = windprofile.segments(lower, last_heard_altitude)
 
+            # The time it takes to descend through each altitude segment
+            t = self.integrateSegments(v, lo, hi, step_size)
 
-                backstop = k[0]
-                k_idx += 1
+            self.logger.debug("Prediction segments: %d, time to live: %fs" % (t.shape[0], float(np.sum(t))))
 
-            # END:  for k in ascent_portion:
-                
             ####################################
-            # END:  primary prediction calculation loop
+            # END:  primary prediction calculation
             ####################################
 
-            # The first point in the predicted flight path is the latest position of the flight
-            flightpath_points = [(descent_portion[-1,1], descent_portion[-1,2], ttl, last_heard_altitude)]
-
-            # Set the previous lat/lon points to the last value of the flightpath_points array, which should be 
-            # the last position of the flight.
-            prev_x = flightpath_points[-1][0] 
-            prev_y = flightpath_points[-1][1]
-
-            # Collect the points determined along the way
-            # This is reversed because the prediction loop (above) runs from the prediction_floor up to the last_heard_altitude, basically calculating
-            # the delta points in reverse.
-            for u,v,t,a in flightpath_deltas[::-1]:
-                pos_x = prev_x + u 
-                pos_y = prev_y + v 
-                flightpath_points.append((pos_x, pos_y, t, a))
-                prev_x = pos_x
-                prev_y = pos_y
+            # The points in the predicted flight path, starting with the latest position of the flight
+            flightpath_points = self.buildFlightPath(x, y, last_heard_altitude, t, wind_lat, wind_lon, lo)
 
             return flightpath_points, 0.0
 
@@ -1162,11 +1210,8 @@ class LandingPredictor(PredictorBase):
     # The database connection object
     landingconn: pg.extensions.connection = pg.extensions.connection 
 
-    # Where we upload latest landing locations for all active flights
-    landinglocations: list = None
-
-    # Where we upload latest landing locations for all active flights
-    activebeacons: list = None
+    # Where we upload latest landing locations and beacon callsigns for all active flights
+    statebus: StateBus = None
 
     # The timezone
     timezone: str = 'America/Denver'
@@ -1176,6 +1221,39 @@ class LandingPredictor(PredictorBase):
     # Default is set to 60 mins.
     timeout: int = 60
 
+    # Time in seconds between rewriting a prediction to the database when its inputs haven't changed.  This keeps the prediction from
+    # aging out of the map displays (they only look back 5 mins) without recomputing it every cycle.
+    refresh: int = 60
+
+    # Tolerance in meters used to simplify predicted flight paths before they're stored in the database.  Points closer than this to the 
+    # simplified path are dropped.  A value of 0 disables simplification.
+    pathtolerance: float = 0.0
+
+    # The directory holding DEM tiles (.hgt files) for looking up ground elevations.  If there aren't any tiles, then the prediction 
+    # floor is estimated from the GPS position or nearby stations instead.
+    demdirectory: str = None
+
+    # Seconds between predictions for a beacon in each phase of its flight.  Beacons that are close to landing are updated the most often
+    # while those sitting on the pad or no longer heard from are updated rarely.
+    intervals: dict = field(default_factory = lambda: { "final" : 5, "descent" : 10, "ascent" : 30, "prelaunch" : 120, "stale" : 120 })
+
+    # The order beacons are processed in when several are due.  Beacons not yet seen are processed right after those in their final descent.
+    priorities: dict = field(default_factory = lambda: { "final" : 0, "new" : 1, "descent" : 2, "ascent" : 3, "prelaunch" : 4, "stale" : 5 })
+
+    # A descending beacon is in its final descent when its predicted time to landing is less than this many seconds
+    finalttl: int = 600
+
+    # Seconds of CPU time and database time a prediction cycle can use before the remaining beacons are put off until the next cycle
+    cpubudget: float = 2.0
+    dbbudget: float = 3.0
+
+    # The file the predictor's state is saved to (and reloaded from at startup) so that predictions pick up where they left off after a
+    # restart.  If not set, the state isn't saved.
+    statefile: str = None
+
+    # Saved state older than this many seconds isn't reloaded
+    statemaxage: int = 21600
+
     # the logging queue
     loggingqueue: mp.Queue = None
 
@@ -1200,41 +1278,480 @@ class LandingPredictor(PredictorBase):
             handler = QueueHandler(self.loggingqueue)
             self.logger.addHandler(handler)
 
+        # The last prediction computed for each flightid/callsign along with the fingerprint of the inputs used to create it
+        self.predictioncache = {}
+
+        # Counts of how often a prior prediction was reused (hits) vs. recomputed (misses)
+        self.cachestats = { "hits" : 0, "misses" : 0 }
+
+        # The predict file for each flightid/launchsite, kept until the predict file in the database changes
+        self.predictfiles = {}
+
+        # The wind profile for each flightid built from the ascent packets of all of its beacons
+        self.windprofiles = {}
+
+        # The measured air density profile for each flightid built from the ascent packets of all of its beacons
+        self.airdensityprofiles = {}
+
+        # Running totals of the number of points (and bytes) for flight paths before and after simplification along with the time spent
+        self.pathstats = { "paths" : 0, "points_in" : 0, "points_out" : 0, "bytes_in" : 0, "bytes_out" : 0, "seconds" : 0.0 }
+
+        # The clock used for scheduling beacons and refreshing prior predictions.  A replay of a flight substitutes its own simulated time.
+        self.clock = time.monotonic
+
+        # The flight phase of each flightid/callsign and when it's next due for a prediction
+        self.schedule = {}
+
+        # Counts of cycles, beacons processed, cycles cut short by the CPU or database budgets, beacons put off because of those, and 
+        # beacons processed more than one interval past when they were due.
+        self.schedstats = { "cycles" : 0, "processed" : 0, "cpu_overruns" : 0, "db_overruns" : 0, "deferred" : 0, "late" : 0 }
+
+        # Seconds spent in database queries this cycle (see query)
+        self.dbtime = 0.0
+
+        # The latest packets heard from each flightid/callsign (see queries.getLatestPackets), kept so they can be saved with the state
+        self.tracks = {}
+
+        # The tracks reloaded with the state.  The first time each beacon is processed after that, only the packets heard since are queried.
+        self.savedtracks = {}
+
+        # The latest landing locations for each flightid/callsign, kept across cycles for beacons that weren't due
+        self.beaconlandings = {}
+
+        # Ground elevations from local DEM tiles
+        self.terrain = None
+        if self.demdirectory:
+            self.terrain = terrain.Terrain(directory = self.demdirectory, loggingqueue = self.loggingqueue)
+            if not self.terrain.hasTiles():
+                self.logger.info(f"No DEM tiles found in {self.demdirectory}, using nearby stations for landing elevations.")
+                self.terrain = None
+
         self.logger.debug("LandingPredictor instance created.")
 
 
     ################################
-    # update the shared list with latest landing prediction locations
+    # return the hit rate for reusing predictions whose inputs haven't changed
     ################################
-    def updateLocations(self, locs):
+    def getCacheStats(self):
+
+        total = self.cachestats["hits"] + self.cachestats["misses"]
+
+        return {
+                "hits" : self.cachestats["hits"],
+                "misses" : self.cachestats["misses"],
+                "hitrate" : (self.cachestats["hits"] / total) if total > 0 else 0.0
+                }
+
+
+    ################################
+    # save the per-flight and per-beacon state of the predictor to the state file
+    ################################
+    def saveState(self):
+
+        if not self.statefile:
+            return False
+
+        # The wind and air density bins of each source, as lists of [bin number, sums...] since JSON keys can only be strings
+        def sources(profile):
+            return [dict(state, source = source, bins = [[b] + list(sums) for b, sums in state["bins"].items()]) for source, state in profile.sources.items()]
+
+        # The arrays saved along with the header.  Each beacon's track is saved as its packet times (as text) and the rest of its columns
+        # as floats (NaN for nulls).
+        arrays = {}
+        for n, track in enumerate(self.tracks.values()):
+            arrays[f"track{n}_times"] = np.array([str(t) for t in track[:, 0]])
+            arrays[f"track{n}"] = np.array(track[:, 1:].tolist(), dtype='float64')
+        for n, p in enumerate(self.predictfiles.values()):
+            arrays[f"predictfile{n}"] = p.rows
+
+        # Dictionaries keyed by flightid/callsign (or flightid/launchsite) are saved as lists of [key, value] pairs
+        state = {
+                "magic" : STATE_MAGIC,
+                "format" : STATE_FORMAT,
+                "saved" : time.time(),
+                "windprofiles" : { fid : { "binsize" : w.binsize, "sources" : sources(w), "version" : w.version } for fid, w in self.windprofiles.items() },
+                "airdensityprofiles" : { fid : { "binsize" : a.binsize, "sources" : sources(a), "used" : a.used, "version" : a.version } for fid, a in self.airdensityprofiles.items() },
+                "predictfiles" : [[list(key), p.version] for key, p in self.predictfiles.items()],
+                "predictioncache" : [[list(key), { k : v for k, v in entry.items() if k != "written" }] for key, entry in self.predictioncache.items()],
+                "phases" : [[list(key), entry["phase"]] for key, entry in self.schedule.items()],
+                "beaconlandings" : [[list(key), landings] for key, landings in self.beaconlandings.items()],
+                "tracks" : [list(key) for key in self.tracks]
+                }
+
+        try:
+            arrays["header"] = np.array(json.dumps(state, default = jsonDefault))
 
-        if self.landinglocations is not None:
+            # Write to a temp file first, then rename it so there's never a partially written state file
+            tmpfile = self.statefile + ".tmp"
+            with open(tmpfile, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmpfile, self.statefile)
 
-            newlist = []
+            self.logger.debug(f"Saved predictor state to {self.statefile}, {os.path.getsize(self.statefile)} bytes")
+            return True
 
-            # now add all of our latest landing tuples (i.e. lat, lon pairs)
-            for tup in locs:
-                newlist.append(tup)
+        except (OSError, TypeError, ValueError) as e:
+            self.logger.warning(f"Unable to save predictor state to {self.statefile}: {e}")
+            return False
 
-            # update the landing locations shared list
-            self.landinglocations["landings"] = newlist
 
     ################################
-    # update the shared list with the beacon callsigns from active flights
+    # reload the state of the predictor saved by saveState.  The first cycle afterwards tops this up with any packets heard since.
     ################################
-    def updateBeacons(self, flightlist):
+    def loadState(self):
+
+        if not self.statefile or not os.path.isfile(self.statefile):
+            return False
+
+        # Only plain arrays are loaded (nothing pickled), so a damaged or planted state file can't run code
+        try:
+            data = np.load(self.statefile, allow_pickle = False)
+            if not isinstance(data, np.lib.npyio.NpzFile) or "header" not in data.files:
+                self.logger.warning(f"{self.statefile} isn't a predictor state file, ignoring.")
+                return False
+
+            with data:
+                arrays = { name : data[name] for name in data.files }
+            state = json.loads(arrays["header"].item())
+
+        except (OSError, ValueError, EOFError, zipfile.BadZipFile) as e:
+            self.logger.warning(f"Unable to load predictor state from {self.statefile}: {e}")
+            return False
+
+        if not isinstance(state, dict) or state.get("magic") != STATE_MAGIC:
+            self.logger.warning(f"{self.statefile} isn't a predictor state file, ignoring.")
+            return False
+
+        if state.get("format") != STATE_FORMAT:
+            self.logger.info(f"Predictor state in {self.statefile} is from a different version, ignoring.")
+            return False
+
+        age = time.time() - state["saved"]
+        if age > self.statemaxage or age < 0:
+            self.logger.info(f"Predictor state in {self.statefile} is {age / 60:.0f} mins old, ignoring.")
+            return False
+
+        # The wind and air density bins of each source saved by saveState
+        def sources(saved):
+            restored = {}
+            for s in saved:
+                restored[s["source"]] = dict({ k : v for k, v in s.items() if k != "source" }, identity = toTuple(s["identity"]), bins = { int(b[0]) : list(b[1:]) for b in s["bins"] })
+            return restored
+
+        # Everything is rebuilt before any of it replaces the current state, so a state file that's missing something is ignored altogether
+        try:
+            windprofiles = {}
+            for fid, w in state["windprofiles"].items():
+                windprofile = WindProfile(binsize = w["binsize"])
+                windprofile.sources = sources(w["sources"])
+                windprofile.dirty = True
+                windprofile.rebuild()
+
+                # Rebuilding counts as a change, but nothing has changed since the state was saved
+                windprofile.version = w["version"]
+                windprofiles[fid] = windprofile
+
+            airdensityprofiles = {}
+            for fid, a in state["airdensityprofiles"].items():
+                airdensityprofile = AirDensityProfile(standard = np.column_stack((self.airdensities[:, 0], self.airdensities[:, 1] * 10**-4)), binsize = a["binsize"])
+                airdensityprofile.sources = sources(a["sources"])
+                airdensityprofile.used = toTuple(a["used"])
+                airdensityprofile.version = a["version"]
+                airdensityprofile.airdensity = airdensityprofile.buildCurve()
+                airdensityprofiles[fid] = airdensityprofile
+
+            predictfiles = {}
+            for n, (key, version) in enumerate(state["predictfiles"]):
+                predictfiles[tuple(key)] = PredictFile(rows = arrays[f"predictfile{n}"], version = toTuple(version))
+
+            # Saved predictions are written to the database again the first time they're reused
+            predictioncache = {}
+            for key, entry in state["predictioncache"]:
+                entry["fingerprint"] = toTuple(entry["fingerprint"])
+                entry["written"] = -math.inf
+                predictioncache[tuple(key)] = entry
+
+            # Every beacon is due right away
+            now = self.clock()
+            schedule = { tuple(key) : { "phase" : phase, "due" : now, "last" : now } for key, phase in state["phases"] }
+
+            beaconlandings = { tuple(key) : [tuple(loc) for loc in landings] for key, landings in state["beaconlandings"] }
+
+            # The tracks go back to the packet times (time of day) in the first column followed by the rest of the columns
+            savedtracks = {}
+            for n, key in enumerate(state["tracks"]):
+                values = arrays[f"track{n}"]
+                track = np.empty((values.shape[0], values.shape[1] + 1), dtype=object)
+                track[:, 0] = [datetime.time.fromisoformat(t) for t in arrays[f"track{n}_times"]]
+                track[:, 1:] = values
+                savedtracks[tuple(key)] = track
+
+        except (KeyError, TypeError, ValueError, IndexError) as e:
+            self.logger.warning(f"Unable to load predictor state from {self.statefile}: {e}")
+            return False
+
+        self.windprofiles = windprofiles
+        self.airdensityprofiles = airdensityprofiles
+        self.predictfiles = predictfiles
+        self.predictioncache = predictioncache
+        self.schedule = schedule
+        self.beaconlandings = beaconlandings
+        self.tracks = dict(savedtracks)
+        self.savedtracks = savedtracks
+
+        self.logger.info(f"Loaded predictor state from {self.statefile} ({age:.0f} secs old):  {len(self.windprofiles)} flights, {len(self.schedule)} beacons, {sum(t.shape[0] for t in savedtracks.values())} packets")
+        return True
+
+
+    ################################
+    # return the scheduler counters along with the number of beacons in each flight phase
+    ################################
+    def getScheduleStats(self):
+
+        stats = dict(self.schedstats)
+        for entry in self.schedule.values():
+            stats[entry["phase"]] = stats.get(entry["phase"], 0) + 1
+
+        return stats
+
+
+    ################################
+    # return the active flightid/callsign records that are due for a prediction, most urgent first
+    ################################
+    def dueBeacons(self, flightids):
+
+        now = self.clock()
+        due = []
+        for rec in flightids:
+            entry = self.schedule.get((rec[0], rec[1]))
+            if entry is None:
+                due.append((self.priorities["new"], 0.0, rec))
+            elif entry["due"] <= now:
+                due.append((self.priorities[entry["phase"]], entry["due"], rec))
+
+        due.sort(key = lambda d: (d[0], d[1]))
+
+        return [d[2] for d in due]
+
+
+    ################################
+    # run one of the database queries (see queries.py), adding the time it takes to this cycle's database time
+    ################################
+    def query(self, function, **kwargs):
+
+        start = time.perf_counter()
+        try:
+            return function(dbconn = self.landingconn, logger = self.logger, **kwargs)
+        finally:
+            self.dbtime += time.perf_counter() - start
+
+
+    ################################
+    # return "cpu" or "db" if this cycle has used up that time budget, otherwise None
+    ################################
+    def checkBudget(self, cpustart):
+
+        # Only the time spent in the database queries themselves counts against the database budget
+        cpu = time.process_time() - cpustart
+
+        if cpu > self.cpubudget:
+            return "cpu"
+        if self.dbtime > self.dbbudget:
+            return "db"
+
+        return None
+
+
+    ################################
+    # note that a beacon is being processed now.  Until its phase is known, it's next due based on its last phase.
+    ################################
+    def startBeacon(self, flightid, callsign):
+
+        now = self.clock()
+        entry = self.schedule.setdefault((flightid, callsign), { "phase" : "new", "due" : now, "last" : now })
+
+        if entry["phase"] != "new" and now - entry["due"] > self.intervals[entry["phase"]]:
+            self.schedstats["late"] += 1
+
+        self.schedstats["processed"] += 1
+        entry["last"] = now
+        entry["due"] = now + self.intervals.get(entry["phase"], self.intervals["descent"])
+
+
+    ################################
+    # record the flight phase of a beacon, which sets when it's next due for a prediction
+    ################################
+    def scheduleBeacon(self, flightid, callsign, phase, ttl = None):
+
+        if phase == "descent" and ttl is not None and ttl < self.finalttl:
+            phase = "final"
+
+        entry = self.schedule[(flightid, callsign)]
+        entry["phase"] = phase
+        entry["due"] = entry["last"] + self.intervals[phase]
+
+
+    ################################
+    # return the seconds until the next beacon is due for a prediction
+    ################################
+    def nextDue(self):
+
+        if len(self.schedule) == 0:
+            return self.intervals["final"]
+
+        return max(0.0, min(entry["due"] for entry in self.schedule.values()) - self.clock())
+
+
+    ################################
+    # return the point and byte savings from simplifying flight paths
+    ################################
+    def getPathStats(self):
+
+        stats = dict(self.pathstats)
+        stats["savings"] = (1 - stats["bytes_out"] / stats["bytes_in"]) if stats["bytes_in"] > 0 else 0.0
+
+        return stats
+
+
+    ################################
+    # simplify a flight path (if enabled) and return it as a binary LINESTRING for the database
+    ################################
+    def makePathGeometry(self, lats, lons):
+
+        lats = np.asarray(lats, dtype='float64')
+        lons = np.asarray(lons, dtype='float64')
+        points_in = lats.shape[0]
 
+        if self.pathtolerance > 0:
+            start = time.perf_counter()
+            keep = self.simplifyPath(lats, lons, self.pathtolerance)
+            lats = lats[keep]
+            lons = lons[keep]
+            self.pathstats["seconds"] += time.perf_counter() - start
 
-        if self.activebeacons is not None:
+        # Each LINESTRING is a 13 byte header plus 16 bytes per point
+        self.pathstats["paths"] += 1
+        self.pathstats["points_in"] += points_in
+        self.pathstats["points_out"] += lats.shape[0]
+        self.pathstats["bytes_in"] += 13 + 16 * points_in
+        self.pathstats["bytes_out"] += 13 + 16 * lats.shape[0]
 
-            newlist = []
+        return queries.makeLineString(lats, lons)
 
-            # now add all of the callsigns from the flightlist
-            for callsign in flightlist:
-                newlist.append(callsign)
 
-            # update the beacon list shared object
-            self.activebeacons["callsigns"] = newlist
+    ################################
+    # return the ground elevation from the DEM tiles to use as the prediction floor for a beacon, or None if there isn't DEM coverage
+    ################################
+    def getTerrainFloor(self, flightid, callsign, lat, lon):
+
+        if self.terrain is None:
+            return None
+
+        # Use the ground elevation at the prior landing prediction for this beacon if there is one, otherwise the ground under the flight
+        cached = self.predictioncache.get((flightid, callsign))
+        if cached is not None and cached["flightpath"]:
+            lat = cached["flightpath"][-1][0]
+            lon = cached["flightpath"][-1][1]
+
+        return self.terrain.elevation(lat, lon)
+
+
+    ################################
+    # end a predicted flight path where it first meets the ground instead of at the flat prediction floor
+    ################################
+    def clipToTerrain(self, flightpath):
+
+        if self.terrain is None or not flightpath:
+            return flightpath
+
+        clipped = self.terrain.clipPath(flightpath)
+        if clipped is None:
+            return flightpath
+
+        self.logger.debug("Flight path meets the ground at %f, %f, %.0fft" % (clipped[-1,0], clipped[-1,1], clipped[-1,3]))
+
+        return [tuple(p) for p in clipped.tolist()]
+
+
+    ################################
+    # return the predict file for a flight, only querying the full predict file from the database if it has changed
+    ################################
+    def getPredictFile(self, flightid, launchsite):
+
+        # The version of the predict file currently in the database
+        version = self.query(queries.getPredictFileVersion, flightid = flightid, launchsite = launchsite)
+        if version is None:
+            self.predictfiles.pop((flightid, launchsite), None)
+            return None
+
+        predictfile = self.predictfiles.get((flightid, launchsite))
+        if predictfile is None or predictfile.version != version:
+            self.logger.debug("Loading predict file for %s, version: %s" % (flightid, str(version)))
+            rows = self.query(queries.getPredictFile, flightid = flightid, launchsite = launchsite)
+            predictfile = PredictFile(rows = rows if len(rows) > 0 else np.empty((0, 5)), version = version)
+            self.predictfiles[(flightid, launchsite)] = predictfile
+
+        return predictfile
+
+
+    ################################
+    # return the latest packets heard from a beacon (see queries.getLatestPackets).  Right after the state has been reloaded, the beacon's
+    # saved track is topped up with only the packets heard since it was saved instead of querying all of the packets again.
+    ################################
+    def getLatestPackets(self, flightid, callsign):
+
+        track = self.savedtracks.pop((flightid, callsign), None)
+        if track is None or track.shape[0] == 0:
+            latestpackets = np.array(self.query(queries.getLatestPackets, callsign = callsign, timezone = self.timezone, cutoff = 20))
+
+        else:
+            # epoch column of the last packet in the saved track
+            newer = self.query(queries.getLatestPackets, callsign = callsign, timezone = self.timezone, cutoff = 20, since = float(track[-1, 11]))
+            self.logger.debug("Topping up the saved track for %s (%d packets) with %d newer packets" % (callsign, track.shape[0], len(newer)))
+
+            # The elapsed minutes for the saved packets have grown since they were saved
+            track[:, 7] = np.round((time.time() - track[:, 11].astype('float64')) / 60.0)
+
+            if len(newer) > 0:
+                # The newer packets' columns are converted to floats (NaN for nulls) the same as the saved packets' columns were
+                newer = np.array(newer, dtype=object)
+                newer[:, 1:] = np.array(newer[:, 1:].tolist(), dtype='float64')
+                latestpackets = np.concatenate((track, newer))
+            else:
+                latestpackets = track
+
+            # Same as queries.getLatestPackets, nothing is returned for a beacon that hasn't been heard from lately
+            if latestpackets[-1, 7] > 20:
+                latestpackets = np.array([])
+
+        if latestpackets.shape[0] > 0:
+            self.tracks[(flightid, callsign)] = latestpackets
+        else:
+            self.tracks.pop((flightid, callsign), None)
+
+        return latestpackets
+
+
+    ################################
+    # update the shared list with latest landing prediction locations
+    ################################
+    def updateLocations(self, locs):
+
+        if self.statebus is not None:
+
+            # update the landing locations shared list with our latest landing tuples (i.e. lon, lat pairs)
+            self.statebus.setLandings(locs)
+
+    ################################
+    # update the shared list with the beacon callsigns from active flights
+    ################################
+    def updateBeacons(self, flightlist):
+
+
+        if self.statebus is not None:
+
+            # update the beacon list shared object with all of the callsigns from the flightlist
+            self.statebus.setBeacons(flightlist)
 
     ################################
     # destructor
@@ -1304,19 +1821,21 @@ class LandingPredictor(PredictorBase):
         if self.landingconn.closed:
             return False
 
-        # Database cursor
-        landingcur = self.landingconn.cursor()
-
         # get list of active flightids/callsign combo records
         # columns:  flightid, callsign, launchsite name, launchsite lat, launch lon, launchsite elevation
-        flightids = queries.getFlights(dbconn = self.landingconn, logger = self.logger)
+        flightids = self.query(queries.getFlights)
 
         # update the beacon list shared with other processes
         if len(flightids) > 0:
             self.updateBeacons(flightids[0:,1])
 
-        # our list of landing locations for all flights processed
-        landings = []
+        # When this cycle started, for checking the CPU and database time budgets
+        cpustart = time.process_time()
+        self.dbtime = 0.0
+        self.schedstats["cycles"] += 1
+
+        # the landing prediction records created this cycle.  These are written to the database all at once at the end of the cycle.
+        predictionrows = []
 
         try:
 
@@ -1332,9 +1851,54 @@ class LandingPredictor(PredictorBase):
             if "airdensity" not in config:
                 config["airdensity"] = "off"
 
-
-            # Loop through each record creating a prediction
-            for rec in flightids:
+            # A version string for the configuration.  If the configuration changes, then any saved predictions are no longer valid.
+            configversion = json.dumps(config, sort_keys = True)
+
+            # Forget saved predictions for beacons that are no longer part of an active flight
+            activekeys = set((rec[0], rec[1]) for rec in flightids)
+            for key in list(self.predictioncache.keys()):
+                if key not in activekeys:
+                    del self.predictioncache[key]
+
+            # Forget predict files for flights that are no longer active
+            activeflights = set(rec[0] for rec in flightids)
+            for key in list(self.predictfiles.keys()):
+                if key[0] not in activeflights:
+                    del self.predictfiles[key]
+
+            # Forget wind and air density profiles for flights that are no longer active
+            for key in list(self.windprofiles.keys()):
+                if key not in activeflights:
+                    del self.windprofiles[key]
+            for key in list(self.airdensityprofiles.keys()):
+                if key not in activeflights:
+                    del self.airdensityprofiles[key]
+
+            # Forget the schedule and landing locations for beacons that are no longer part of an active flight
+            for key in list(self.schedule.keys()):
+                if key not in activekeys:
+                    del self.schedule[key]
+            for key in list(self.beaconlandings.keys()):
+                if key not in activekeys:
+                    del self.beaconlandings[key]
+            for key in list(self.tracks.keys()):
+                if key not in activekeys:
+                    del self.tracks[key]
+            self.updateLocations([loc for locs in self.beaconlandings.values() for loc in locs])
+
+
+            # Loop through each record that's due, most urgent first, creating a prediction
+            duebeacons = self.dueBeacons(flightids)
+            for n, rec in enumerate(duebeacons):
+
+                # If this cycle has used up its CPU or database time, then the remaining beacons are put off until the next cycle.  They're 
+                # still due so they'll be first in line.
+                overrun = self.checkBudget(cpustart)
+                if overrun:
+                    self.schedstats[overrun + "_overruns"] += 1
+                    self.schedstats["deferred"] += len(duebeacons) - n
+                    self.logger.debug("Cycle over its %s budget, putting off %d beacons" % (overrun, len(duebeacons) - n))
+                    break
             
                 # this is the flightid
                 fid = rec[0]
@@ -1343,6 +1907,11 @@ class LandingPredictor(PredictorBase):
                 callsign = rec[1]
 
                 self.logger.debug("============ start processing: %s : %s ==========" % (fid, callsign))
+                self.startBeacon(fid, callsign)
+
+                # The landing locations for this beacon replace those from the last time it was processed
+                landings = []
+                self.beaconlandings[(fid, callsign)] = landings
 
                 # launchsite particulars
                 launchsite = { 
@@ -1368,7 +1937,7 @@ class LandingPredictor(PredictorBase):
                 #    latitude_change_rate, 
                 #    longitude_change_rate, 
                 #    elapsed_mins
-                latestpackets =  np.array(queries.getLatestPackets(dbconn = self.landingconn, callsign = callsign, timezone = self.timezone, cutoff = 20, logger = self.logger))
+                latestpackets = self.getLatestPackets(fid, callsign)
                 self.logger.debug("latestpackets.shape: %s" % str(latestpackets.shape))
 
                 # Have there been any packets heard from this callsign yet? 
@@ -1394,6 +1963,7 @@ class LandingPredictor(PredictorBase):
                 # ...if no packets heard, then return.
                 else:
                     self.logger.debug("No packets heard from this callsign: %s" % callsign)
+                    self.scheduleBeacon(fid, callsign, "stale")
                     self.logger.debug("============ end processing:   %s : %s ==========" % (fid, callsign))
                     continue
 
@@ -1405,6 +1975,7 @@ class LandingPredictor(PredictorBase):
                 # No sense in creating a prediction for a flight that is over.
                 if elapsed_mins > self.timeout:
                     self.logger.debug("Elapsed time (%d mins) greater than timeout (%d mins), not processing prediction." %(elapsed_mins, self.timeout))
+                    self.scheduleBeacon(fid, callsign, "stale")
                     self.logger.debug("============ end processing:   %s : %s ==========" % (fid, callsign))
                     continue
 
@@ -1421,6 +1992,18 @@ class LandingPredictor(PredictorBase):
                 descent_portion = np.array(latestpackets[idx:, 1:], dtype='f')
                 self.logger.debug("processPredictions: ascent_portion.shape: %s" % str(ascent_portion.shape))
                 self.logger.debug("processPredictions: descent_portion.shape: %s" % str(descent_portion.shape))
+
+                # Add any new ascent packets from this beacon to the wind profile for the flight
+                windprofile = self.windprofiles.setdefault(fid, WindProfile())
+                self.updateWindProfile(windprofile, callsign, latestpackets)
+                windprofile.rebuild()
+
+                # ...and any new temperature/pressure measurements to the air density profile for the flight
+                airdensityprofile = self.airdensityprofiles.get(fid)
+                if airdensityprofile is None:
+                    airdensityprofile = AirDensityProfile(standard = np.column_stack((self.airdensities[:, 0], self.airdensities[:, 1] * 10**-4)))
+                    self.airdensityprofiles[fid] = airdensityprofile
+                self.updateAirDensityProfile(airdensityprofile, callsign, latestpackets)
      
                 if descent_portion.shape[0] > 2:
                     is_descending = True
@@ -1439,32 +2022,39 @@ class LandingPredictor(PredictorBase):
                     # balloon's ultimate landing location.  ...and we want to have the prediction algorithm calculate predicitons down to 
                     # that elevation.  This should increase landing prediction accuracy a small amount.
 
-                    # Get our latest position
-                    gpsposition = queries.getGPSPosition(dbconn = self.landingconn, logger = self.logger)
-
-                    gps_estimate = False
-                    if gpsposition['isvalid']:
-                        # Calculate the distance between this system (wherever it might be...home...vehicle...etc.) and the last packet 
-                        # received from the balloon
-                        dist_to_balloon = self.distance(
-                                gpsposition['latitude'], 
-                                gpsposition['longitude'], 
-                                descent_portion[-1, 1], 
-                                descent_portion[-1, 2]
-                                )
-
-                        # If we're close to the balloon, then set the prediction floor to that elevation
-                        if dist_to_balloon < 30:
-                            self.logger.debug("Current location < 30 miles from the current flight, using GPS for landing prediction elevation")
-                            landingprediction_floor = float(gpsposition['altitude'])
-                            gps_estimate = True
-
-                    # If we were unable to get an estimate elevation from the brick's GPS, then then query the database for nearby stations
-                    if gps_estimate == False:
-                        self.logger.debug("Checking for stations near the landing prediction to estimate landing prediction elevation")
-                        estimate = queries.getLandingElevation(dbconn = self.landingconn, callsign = callsign, distance = 30, logger = self.logger)
-                        if estimate > 0:
-                            landingprediction_floor = float(estimate)
+                    # Use the ground elevation from the DEM tiles if they cover where this flight is landing
+                    terrain_floor = self.getTerrainFloor(fid, callsign, float(descent_portion[-1, 1]), float(descent_portion[-1, 2]))
+                    if terrain_floor is not None:
+                        self.logger.debug("Using DEM tiles for landing prediction elevation")
+                        landingprediction_floor = terrain_floor
+
+                    else:
+                        # Get our latest position
+                        gpsposition = self.query(queries.getGPSPosition)
+
+                        gps_estimate = False
+                        if gpsposition['isvalid']:
+                            # Calculate the distance between this system (wherever it might be...home...vehicle...etc.) and the last packet 
+                            # received from the balloon
+                            dist_to_balloon = self.distance(
+                                    gpsposition['latitude'], 
+                                    gpsposition['longitude'], 
+                                    descent_portion[-1, 1], 
+                                    descent_portion[-1, 2]
+                                    )
+
+                            # If we're close to the balloon, then set the prediction floor to that elevation
+                            if dist_to_balloon < 30:
+                                self.logger.debug("Current location < 30 miles from the current flight, using GPS for landing prediction elevation")
+                                landingprediction_floor = float(gpsposition['altitude'])
+                                gps_estimate = True
+
+                        # If we were unable to get an estimate elevation from the brick's GPS, then then query the database for nearby stations
+                        if gps_estimate == False:
+                            self.logger.debug("Checking for stations near the landing prediction to estimate landing prediction elevation")
+                            estimate = self.query(queries.getLandingElevation, callsign = callsign, distance = 30)
+                            if estimate > 0:
+                                landingprediction_floor = float(estimate)
 
                     self.logger.debug("Prediction floor set to: %f" % landingprediction_floor)
 
@@ -1481,181 +2071,150 @@ class LandingPredictor(PredictorBase):
                     # getSurfaceWinds function retuns "None" for winds.
 
                     # Get the surface winds at the landing location:
-                    winds, validity = queries.getSurfaceWinds(dbconn = self.landingconn, flightid = fid, logger = self.logger)
+                    winds, validity = self.query(queries.getSurfaceWinds, flightid = fid)
 
                     ####################################
                     # END:  get surface winds
                     ####################################
-                    
+
 
 
                     ####################################
-                    # START:  Check if there were KC0D airdensity values
+                    # START:  check for an unchanged prediction
                     ####################################
+                    # The inputs to the prediction algorithm are the packets heard from the beacon, the prediction floor, the surface winds, and
+                    # the configuration.  If none of those have changed since the last cycle, then the prediction would come out exactly the same,
+                    # so we reuse the prior result instead of recomputing it.
+                    fingerprint = (
+                            str(latestpackets[-1, 0]),
+                            latestpackets.shape[0],
+                            round(landingprediction_floor),
+                            bool(validity),
+                            tuple(round(float(w), 6) for w in winds) if validity else None,
+                            configversion,
+                            windprofile.version,
+                            (airdensityprofile.curve() is not None, airdensityprofile.version) if config["airdensity"] == "on" else None
+                            )
 
-                    # Only use the air density from the kc0d payloads if the option is explictly set to true
-                    if config["airdensity"] == "on":
-
-                        self.logger.debug("Airdensity option was set to ON.")
-
-                        # slice (aka list) off just the altitude and air_density columns
-                        ad = np.array(ascent_portion[0:, [0,9]], dtype='float64')
-
-                        # Check that the values aren't just a bunch of NULL's
-                        num = 0
-                        for alt, d in ad:
-                            if np.isnan(d):
-                                num += 1
-
-                        self.logger.debug("Percentage of NULL data points from payload measured air density: %.2f%%." % (100 * num / ad.shape[0]))
+                    cached = self.predictioncache.get((fid, callsign))
+                    if cached is not None and cached["fingerprint"] == fingerprint:
+                        self.cachestats["hits"] += 1
 
-                        # Check that the number of NULLs is minimal (ex. < 5%)
-                        if num / ad.shape[0] < .05 and ad.shape[0] > 3:
+                        # Only refresh the database record for this prediction every so often so that it doesn't age out for the map displays.
+                        if self.clock() - cached["written"] < self.refresh:
+                            self.logger.debug("Inputs unchanged for %s, skipping prediction." % callsign)
+                            self.scheduleBeacon(fid, callsign, "descent", ttl = cached["flightpath"][0][2] if cached["flightpath"] else None)
+                            self.logger.debug("============ end processing:   %s : %s ==========" % (fid, callsign))
+                            continue
 
-                            self.logger.debug("Using payload measured air density.")
+                        self.logger.debug("Inputs unchanged for %s, refreshing prior prediction." % callsign)
+                        flightpath = cached["flightpath"]
+                        coef = cached["coef"]
+                        predictiontype = cached["predictiontype"]
+                        windarray = cached["windarray"]
 
-                            # Beginning and ending altitudes for flight air densities
-                            beginning_alt = ad[0,0]
-                            ending_alt = ad[-1, 0]
+                    else:
+                        self.cachestats["misses"] += 1
 
-                            # now find the splice points for inserting the air densities from the flight in to the standard engineering defined ones.
-                            # starting splice point
-                            start_splice_idx = 0
-                            for alt, d in self.airdensities:
-                                if alt > beginning_alt:
-                                    break
-                                start_splice_idx += 1
+                        ####################################
+                        # START:  Check if there were KC0D airdensity values
+                        ####################################
 
-                            # ending splice point
-                            end_splice_idx = self.airdensities.shape[0]
-                            for alt, d in self.airdensities[::-1]:
-                                if alt < ending_alt:
-                                    break
-                                end_splice_idx -= 1
+                        # Only use the air density from the kc0d payloads if the option is explictly set to true
+                        airdensity_curve = self.airdensity
+                        if config["airdensity"] == "on":
 
-                            # Adjust for the fact that self.airdensities is in 10^-4 values.
-                            temp_ad = np.copy(self.airdensities)
-                            temp_ad[:,1] *= 10**-4
+                            self.logger.debug("Airdensity option was set to ON.")
 
-                            # splice together the various pieces to build the array of air densities 
-                            temp1 = temp_ad[0:start_splice_idx, 0:]
-                            temp2 = np.concatenate((temp1, ad), axis=0)
-                            if end_splice_idx < self.airdensities.shape[0] - 1:
-                                temp3 = np.concatenate((temp2, temp_ad[end_splice_idx:, 0:]), axis=0)
+                            # The air density measured by the payloads on this flight (from all of its beacons), if there's enough of it
+                            measured_curve = airdensityprofile.curve()
+                            if measured_curve is not None:
+                                self.logger.debug("Using payload measured air density.")
+                                airdensity_curve = measured_curve
 
-                            # Remove duplicate values from the array
-                            temp4 = []
-                            prev_alt = -99
-                            for alt,den in temp3:
-                                if alt != prev_alt:
-                                    temp4.append([alt, den])
-                                prev_alt = alt
+                            # Otherwise, we just use the standard engineering air densities
+                            else:
+                                self.logger.debug("Using pre-calculated air density instead of payload measured values.")
+                        else:
+                            self.logger.debug("kc0dairdensity configuration setting set not true, skipping airdensity calcs.")
 
-                            # Finally convert the resulting list to a numpy array
-                            final_air_densities = np.array(temp4)
 
-                            # Catch any values errors that occur and fallback to using the pre-calculated air desnsity values.
-                            try:
-                                # Create a curve that represents the air density
-                                airdensity_curve = interpolate.interp1d(final_air_densities[0:,0], final_air_densities[0:,1], kind='cubic')
+                        ####################################
+                        # END:  airdensity section
+                        ####################################
 
-                            except ValueError as e:
-                                self.logger.debug("ValueError in creating interpolated curve for air density: {}".format(e))
-                                self.logger.debug("Falling back to using pre-calculated air density instead of payload measured values.")
-                                airdensity_curve = self.airdensity
 
 
-                        # Otherwise, we just use the standard engineering air densities
+                        ####################################
+                        # START:  compute the landing prediction
+                        ####################################
+                        # If we're unable to estimate the surface winds, then just run a "regular" prediction without winds
+                        # However, in either case (surface winds or not) we only want to process a single landing prediction so the javascript/map display
+                        # will only display a single 'X' on the map.
+
+                        coef = 0.0
+                        if not validity:
+                            winds = None
+                            windarray = None
+                            predictiontype = "predicted"
+
+                            # Call the prediction algo
+                            self.logger.debug("Running prediction regular prediction")
+                            flightpath, coef = self.predictionAlgo(latestpackets, launchsite["lat"], launchsite["lon"], launchsite["elevation"], landingprediction_floor, surface_winds = True, airdensity_function = airdensity_curve, windprofile = windprofile)
                         else:
-                            self.logger.debug("Using pre-calculated air density instead of payload measured values.")
-                            airdensity_curve = self.airdensity
-                    else:
-                        self.logger.debug("kc0dairdensity configuration setting set not true, skipping airdensity calcs.")
-                        airdensity_curve = self.airdensity
-
-
-                    ####################################
-                    # END:  airdensity section
-                    ####################################
-
+                            windarray = [round(winds[2]), round(winds[3]), round(winds[4])]
+                            predictiontype = "wind_adjusted"
 
+                            # Call the prediction algo
+                            self.logger.debug("Running prediction that indludes calcualted surface winds.  winds[0]: %f, winds[1]: %f" % (winds[0], winds[1]))
+                            flightpath, coef = self.predictionAlgo(latestpackets, launchsite["lat"], launchsite["lon"], launchsite["elevation"], landingprediction_floor, surface_winds = True, wind_rates = winds, airdensity_function = airdensity_curve, windprofile = windprofile)
 
-                    ####################################
-                    # START:  compute the landing prediction
-                    ####################################
-                    # If we're unable to estimate the surface winds, then just run a "regular" prediction without winds
-                    # However, in either case (surface winds or not) we only want to process a single landing prediction so the javascript/map display
-                    # will only display a single 'X' on the map.
-
-                    coef = 0.0
-                    if not validity:
-                        winds = None
-                        wind_text = None
-                        predictiontype = "predicted"
-
-                        # Call the prediction algo
-                        self.logger.debug("Running prediction regular prediction")
-                        flightpath, coef = self.predictionAlgo(latestpackets, launchsite["lat"], launchsite["lon"], launchsite["elevation"], landingprediction_floor, surface_winds = True, airdensity_function = airdensity_curve)
-                    else:
-                        wind_text = "ARRAY[" + str(round(winds[2])) + ", " + str(round(winds[3])) + ", " + str(round(winds[4])) + "]"
-                        predictiontype = "wind_adjusted"
-
-                        # Call the prediction algo
-                        self.logger.debug("Running prediction that indludes calcualted surface winds.  winds[0]: %f, winds[1]: %f" % (winds[0], winds[1]))
-                        flightpath, coef = self.predictionAlgo(latestpackets, launchsite["lat"], launchsite["lon"], launchsite["elevation"], landingprediction_floor, surface_winds = True, wind_rates = winds, airdensity_function = airdensity_curve)
+                        # Stop the flight path where it meets the ground
+                        flightpath = self.clipToTerrain(flightpath)
 
-                    ####################################
-                    # END:  compute the landing prediction
-                    ####################################
+                        ####################################
+                        # END:  compute the landing prediction
+                        ####################################
 
 
 
                     ####################################
                     # START:  insert predicted landing record into the database
                     ####################################
-                    # Set the initial value of the LINESTRING text to nothing.
-                    linestring_text = ""
-                    array_text = ""
-                    m = 0
-
-
                     # If there was a prediction calculated
                     if flightpath:
-                        # Now loop through each of these points and create the LINESTRING
-                        for u,v,t,a in flightpath:
-                            if m > 0:
-                                linestring_text = linestring_text + ", "
-                                array_text = array_text + ", "
-                            linestring_text = linestring_text + str(round(v, 6)) + " " + str(round(u, 6))
-                            array_elem = "[" + str(round(u,6)) + ", " + str(round(v,6)) + ", " + str(round(t,4)) + ", " + str(round(a)) + "]"
-                            array_text = array_text + array_elem
-                            m += 1
-                        linestring_text = "LINESTRING(" + linestring_text + ")"
-                        array_text = "ARRAY[" + array_text + "]"
-                        if m < 2:
-                            linestring_text = None
-                            array_text = None
-
-                        # The SQL for inserting this prediction record into the database
-                        landingprediction_sql = """ insert into landingpredictions (tm, flightid, callsign, thetype, coef_a, location2d, flightpath, ttl """ + (", patharray " if array_text else "") + (", winds " if wind_text else "") + """) values (now(), %s, %s, %s, %s::numeric, ST_GeometryFromText('POINT(%s %s)', 4326), ST_GeometryFromText(%s, 4326), %s::numeric """ + (", " + array_text if array_text else "") + (", " + wind_text if wind_text else "") +  """);"""
-
-                        ts = datetime.datetime.now()
+                        # reference:  flightpath columns:  latitude, longitude, ttl, altitude
+                        path = np.array(flightpath, dtype='float64')
 
-                        #self.logger.debug("SQL: " + landingprediction_sql % (ts.strftime("%Y-%m-%d %H:%M:%S"), fid, callsign, predictiontype, str(flightpath[-1][1]), str(flightpath[-1][0]), linestring_text, str(round(float(flightpath[0][2])))))
-                        #print "SQL: " + landingprediction_sql % (ts.strftime("%Y-%m-%d %H:%M:%S"), fid, callsign, predictiontype, str(flightpath[-1][1]), str(flightpath[-1][0]), linestring_text, str(round(float(flightpath[0][2]))))
+                        # The flight path as a binary LINESTRING and as an array of [lat, lon, ttl, altitude] points
+                        pathgeom = self.makePathGeometry(path[:,0], path[:,1])
+                        patharray = None
+                        if pathgeom is not None:
+                            patharray = np.column_stack((np.round(path[:,0], 6), np.round(path[:,1], 6), np.round(path[:,2], 4), np.round(path[:,3]))).tolist()
 
-                        self.logger.debug("Landing prediction: %f, %f" % (flightpath[-1][0], flightpath[-1][1]))
-                        self.logger.debug("Inserting record into database: %s" % ts.strftime("%Y-%m-%d %H:%M:%S"))
+                        self.logger.debug("Landing prediction: %f, %f" % (path[-1,0], path[-1,1]))
 
-                        # execute the SQL insert statement
-                        landingcur.execute(landingprediction_sql, [ fid, callsign, predictiontype, coef, float(flightpath[-1][1]), float(flightpath[-1][0]), linestring_text, round(float(flightpath[0][2]))])
-                        self.landingconn.commit()
+                        # Add this prediction to the list of records to insert into the database at the end of this cycle
+                        predictionrows.append((fid, callsign, predictiontype, float(coef), float(path[-1,1]), float(path[-1,0]), pathgeom, round(float(path[0,2])), patharray, windarray))
 
 
                     ####################################
                     # END:  insert predicted landing record into the database
                     ####################################
 
+                    # Save this result along with the inputs that produced it so it can be reused if nothing changes by the next cycle
+                    self.predictioncache[(fid, callsign)] = {
+                            "fingerprint" : fingerprint,
+                            "flightpath" : flightpath,
+                            "coef" : coef,
+                            "predictiontype" : predictiontype,
+                            "windarray" : windarray,
+                            "written" : self.clock()
+                            }
+
+                    # How soon this beacon is due again depends on how close it is to landing
+                    self.scheduleBeacon(fid, callsign, "descent", ttl = flightpath[0][2] if flightpath else None)
+
                 else:
                     # The flight is still ascending OR conditions are such that we don't want to process a prediction (i.e. immediately post-burst).
                     ####################################
@@ -1663,6 +2222,9 @@ class LandingPredictor(PredictorBase):
                     ####################################
                     self.logger.debug("Flight, %s, isn't descending yet and/or less than 2 packets post-burst have been heard" % fid)
 
+                    # A beacon that hasn't gotten much above the launch site is likely still sitting on the pad
+                    self.scheduleBeacon(fid, callsign, "prelaunch" if max_altitude < launchsite["elevation"] + 1000 else "ascent")
+
                     # If here, then the flight is NOT descending yet.  Or at least, it's not registered 2 packets post-burst.
                     # In this case then we:
                     #   1.  Determine if there is a prediction file loaded for this flight and perform a SQL query to get all
@@ -1680,12 +2242,8 @@ class LandingPredictor(PredictorBase):
                     #    latitude_change_rate, 
                     #    longitude_change_rate
                     
-                    # Get any prediction file rows (if loaded in the database)
-                    rows = queries.getPredictFile(dbconn = self.landingconn, flightid = fid, launchsite = launchsite["name"], logger = self.logger)
-                    predictiondata = rows
-
-                    # we reverse this so that the starting element is the down range landing and the ending element is the launchsite
-                    predictiondata_rev = predictiondata[::-1]
+                    # Get any prediction file rows (if loaded in the database).  The predict file is only queried again if it's changed.
+                    predictfile = self.getPredictFile(fid, launchsite["name"])
 
                     # reference:  predictiondata columns:
                     #     altitude,
@@ -1695,7 +2253,7 @@ class LandingPredictor(PredictorBase):
                     #     delta_secs
 
                     # Latest altitude, latitude, and longitude heard from the flight
-                    latest_altitude = latestpackets[-1, 1]
+                    latest_altitude = float(latestpackets[-1, 1])
                     x = float(latestpackets[-1, 2])
                     y = float(latestpackets[-1, 3])
 
@@ -1704,39 +2262,26 @@ class LandingPredictor(PredictorBase):
                     # Set this to something lower??
                     alt_sanity_threshold = 8500
 
-                    # If there are predict file rows returned, then we run through them finding the "splice" point, the closest point, altitude-wise, 
+                    # If there are predict file rows returned, then we find the "splice" point, the closest point, altitude-wise, 
                     # to the current flight location and also attempt to create an early cutdown prediction.
-                    if len(rows) > 0:
+                    if predictfile is not None and predictfile.length > 0:
+
+                        predictiondata = predictfile.rows
+                        l = predictfile.length
 
                         ####################################
                         # START:  Determine predict file splice point
                         ####################################
-                        predictiondata_slice = []
-                        predictiondata_slice = np.array(predictiondata_slice)
+                        # The splice point is kept as the starting row within the predict file.  The slice we care about runs from there
+                        # to the landing.  None means a splice point wasn't found.
+                        splice_start = None
 
                         # Are we descending and just not enough packets yet to perform a normal landing prediction?  If so then, then we need to determine a different
                         # splice point.
                         if descent_portion.shape[0] > 1 and latest_altitude > alt_sanity_threshold:
                             # The flight is descending, so we look for a splice point from the end of the predict file (instead of the beginning near the launch site).
-
-                            # Loop through the prediction data in reverse order to find the closest altitude
-                            loop_counter = 0
-                            l = predictiondata_rev.shape[0]
-                            prev_pred_alt = 0
-                            while predictiondata_rev[loop_counter,0] < latest_altitude and loop_counter < l - 1:
-                                if prev_pred_alt > predictiondata_rev[loop_counter, 0]:
-                                    # we've hit the top in the pred data and we need to stop
-                                    if loop_counter > 0:
-                                        loop_counter -= 1
-                                    break
-                                prev_pred_alt = predictiondata_rev[loop_counter, 0]
-                                loop_counter += 1
-
-                            # Now slice off the predictiondata we care about
-                            predictiondata_slice = predictiondata_rev[0:loop_counter, 0:]
-                            
-                            # reverse this back in HIGH to LOW altitude order
-                            predictiondata_slice = predictiondata_slice[::-1]
+                            # That is, the rows from the landing back up to the flight's current altitude.
+                            splice_start = l - predictfile.descentIndex(latest_altitude)
 
                         else:
                             # We're still ascending so look for a splice point from the beginning of the predict file
@@ -1745,23 +2290,10 @@ class LandingPredictor(PredictorBase):
                             # That way we're only creating a prediction after we're "sure" the flight has been launched.
                             altitude_threshold = float(rec[5]) * 1.10
                             if latest_altitude > altitude_threshold:
-                                loop_counter = 0
-                                l = predictiondata.shape[0]
-                                prev_pred_alt = 0
-
-                                # We now loop through each row in the prediction data, from launch site elevation to predicted burst until we land on
-                                # an altitude that is greater than where the flight is currently at.
-                                while predictiondata[loop_counter,0] < latest_altitude and loop_counter < l - 1:
-                                    if prev_pred_alt > predictiondata[loop_counter, 0]:
-                                        # we've hit the top in the pred data and we need to stop
-                                        if loop_counter > 0:
-                                            loop_counter -= 1
-                                        break
-                                    prev_pred_alt = predictiondata[loop_counter, 0]
-                                    loop_counter += 1
-
-                                # Now slice off the predictiondata we care about
-                                predictiondata_slice = predictiondata[loop_counter:, 0:]
+
+                                # The first row in the prediction data, from launch site elevation to predicted burst, with an altitude that is 
+                                # greater than where the flight is currently at.
+                                splice_start = predictfile.ascentIndex(latest_altitude)
 
                         ####################################
                         # END:  Determine predict file splice point
@@ -1788,27 +2320,11 @@ class LandingPredictor(PredictorBase):
 
                             self.logger.debug("Calculating early cutdown landing prediction")
                             
-                            # The part of the predict file data that we'll use for vertical rate data.
-                            cutdown_predictiondata_slice = []
-                            cutdown_predictiondata_slice = np.array(cutdown_predictiondata_slice)
-
-                            # Loop through the prediction data in reverse order to find the closest altitude.  Basically iterating from the beginning (i.e. launch) to
-                            # the flight's current altitude.
-                            loop_counter = 0
-                            l = predictiondata_rev.shape[0]
-                            prev_pred_alt = 0
-                            while predictiondata_rev[loop_counter,0] < latest_altitude and loop_counter < l - 1:
-                                if prev_pred_alt > predictiondata_rev[loop_counter, 0]:
-                                    # we've hit the top in the pred data and we need to stop
-                                    if loop_counter > 0:
-                                        loop_counter -= 1
-                                    break
-                                prev_pred_alt = predictiondata_rev[loop_counter, 0]
-                                loop_counter += 1
-
-                            # Now slice off the predictiondata we care about, plus one more element so there are enough data points that the Algo can create a curve.
-                            cutdown_predictiondata_slice = predictiondata_rev[0:loop_counter+1, 0:]
-                            
+                            # The part of the predict file data that we'll use for vertical rate data.  These are the rows from the landing up to
+                            # the flight's current altitude, plus one more element so there are enough data points that the Algo can create a curve.
+                            cutdown_idx = predictfile.descentIndex(latest_altitude)
+                            cutdown_predictiondata_slice = predictiondata[(l - cutdown_idx - 1):][::-1]
+
                             # If we found a splice point then proceed with creating a cutdown landing prediction
                             if cutdown_predictiondata_slice.shape[0] > 0:
 
@@ -1820,32 +2336,39 @@ class LandingPredictor(PredictorBase):
                                 # balloon's ultimate landing location.  ...and we want to have the prediction algorithm calculate predicitons down to 
                                 # that elevation.  This should increase landing prediction accuracy a small amount.
 
-                                # Get our latest position
-                                gpspos = queries.getGPSPosition(dbconn = self.landingconn, logger = self.logger)
-
-                                gps_est = False
-                                if gpspos['isvalid']:
-                                    # Calculate the distance between this system (wherever it might be...home...vehicle...etc.) and the last packet 
-                                    # received from the balloon
-                                    dist_to_balloon = self.distance(
-                                            gpspos['latitude'],
-                                            gpspos['longitude'],
-                                            latestpackets[-1, 2],
-                                            latestpackets[-1, 3]
-                                            )
-
-                                    # If we're close to the balloon, then set the prediction floor to that elevation
-                                    if dist_to_balloon < 30:
-                                        self.logger.debug("Current location < 30 miles from the current flight, using GPS for landing prediction elevation")
-                                        landingprediction_floor = float(gpspos['altitude'])
-                                        gps_estimate = True
-
-                                # If we were unable to get an estimate elevation from the brick's GPS, then then query the database for nearby stations
-                                if gps_est == False:
-                                    self.logger.debug("Checking for stations near the landing prediction to estimate landing prediction elevation")
-                                    estimate = queries.getLandingElevation(dbconn = self.landingconn, callsign = callsign, distance = 30, logger = self.logger)
-                                    if estimate > 0:
-                                        landingprediction_floor = float(estimate)
+                                # Use the ground elevation from the DEM tiles if they cover where this flight is
+                                terrain_floor = self.getTerrainFloor(fid, callsign, float(latestpackets[-1, 2]), float(latestpackets[-1, 3]))
+                                if terrain_floor is not None:
+                                    self.logger.debug("Using DEM tiles for landing prediction elevation")
+                                    landingprediction_floor = terrain_floor
+
+                                else:
+                                    # Get our latest position
+                                    gpspos = self.query(queries.getGPSPosition)
+
+                                    gps_est = False
+                                    if gpspos['isvalid']:
+                                        # Calculate the distance between this system (wherever it might be...home...vehicle...etc.) and the last packet 
+                                        # received from the balloon
+                                        dist_to_balloon = self.distance(
+                                                gpspos['latitude'],
+                                                gpspos['longitude'],
+                                                latestpackets[-1, 2],
+                                                latestpackets[-1, 3]
+                                                )
+
+                                        # If we're close to the balloon, then set the prediction floor to that elevation
+                                        if dist_to_balloon < 30:
+                                            self.logger.debug("Current location < 30 miles from the current flight, using GPS for landing prediction elevation")
+                                            landingprediction_floor = float(gpspos['altitude'])
+                                            gps_estimate = True
+
+                                    # If we were unable to get an estimate elevation from the brick's GPS, then then query the database for nearby stations
+                                    if gps_est == False:
+                                        self.logger.debug("Checking for stations near the landing prediction to estimate landing prediction elevation")
+                                        estimate = self.query(queries.getLandingElevation, callsign = callsign, distance = 30)
+                                        if estimate > 0:
+                                            landingprediction_floor = float(estimate)
 
                                 self.logger.debug("Prediction floor set to: %f" % landingprediction_floor)
 
@@ -1874,7 +2397,10 @@ class LandingPredictor(PredictorBase):
 
                                 # create a landing prediction based on the predict file descent rates and the latest packets seen thus far.
                                 self.logger.debug("Running cutdown landing prediction")
-                                flightpath, coef = self.predictionAlgoCutdown(latestpackets, predicted_descent_rates, launchsite["lat"], launchsite["lon"], launchsite["elevation"], landingprediction_floor)
+                                flightpath, coef = self.predictionAlgoCutdown(latestpackets, predicted_descent_rates, launchsite["lat"], launchsite["lon"], launchsite["elevation"], landingprediction_floor, windprofile = windprofile)
+
+                                # Stop the flight path where it meets the ground
+                                flightpath = self.clipToTerrain(flightpath)
                                 ####################################
                                 # END:  calculate the cutdown landing prediction
                                 ####################################
@@ -1884,42 +2410,18 @@ class LandingPredictor(PredictorBase):
                                 ####################################
                                 # START:  insert cutdown landing prediction record into the database
                                 ####################################
-                                # Set the initial value of the LINESTRING text to nothing.
-                                linestring_text = ""
-                                array_text = ""
-                                m = 0
-
                                 # If there was a prediction calculated
                                 if flightpath:
-                                    # Now loop through each of these points and create the LINESTRING
-                                    for u,v,t,a in flightpath:
-                                        if m > 0:
-                                            linestring_text = linestring_text + ", "
-                                            array_text = array_text + ", "
-                                        linestring_text = linestring_text + str(round(v, 6)) + " " + str(round(u, 6))
-                                        array_elem = "[" + str(round(u,6)) + ", " + str(round(v,6)) + ", " + str(round(t,4)) + ", " + str(round(a)) + "]"
-                                        array_text = array_text + array_elem
-                                        m += 1
-                                    linestring_text = "LINESTRING(" + linestring_text + ")"
-                                    array_text = "ARRAY[" + array_text + "]"
-                                    if m < 2:
-                                        linestring_text = None
-                                        array_text = None
-
-                                    # The SQL for inserting this prediction record into the database
-                                    landingprediction_sql = """ insert into landingpredictions (tm, flightid, callsign, thetype, coef_a, location2d, flightpath) values (now(), %s, %s, 'cutdown', %s::numeric, ST_GeometryFromText('POINT(%s %s)', 4326), ST_GeometryFromText(%s, 4326));"""
-
-                                    ts = datetime.datetime.now()
-
-                                    #self.logger.debug("SQL: " + landingprediction_sql % (ts.strftime("%Y-%m-%d %H:%M:%S"), fid, callsign, predictiontype, str(flightpath[-1][1]), str(flightpath[-1][0]), linestring_text, str(round(float(flightpath[0][2])))))
-                                    #print "SQL: " + landingprediction_sql % (ts.strftime("%Y-%m-%d %H:%M:%S"), fid, callsign, predictiontype, str(flightpath[-1][1]), str(flightpath[-1][0]), linestring_text, str(round(float(flightpath[0][2]))))
-
-                                    self.logger.debug("Landing prediction: %f, %f" % (flightpath[-1][0], flightpath[-1][1]))
-                                    self.logger.debug("Inserting record into database: %s" % ts.strftime("%Y-%m-%d %H:%M:%S"))
-
-                                    # execute the SQL insert statement
-                                    landingcur.execute(landingprediction_sql, [ fid, callsign, coef, float(flightpath[-1][1]), float(flightpath[-1][0]), linestring_text])
-                                    self.landingconn.commit()
+                                    # reference:  flightpath columns:  latitude, longitude, ttl, altitude
+                                    path = np.array(flightpath, dtype='float64')
+
+                                    # The flight path as a binary LINESTRING
+                                    pathgeom = self.makePathGeometry(path[:,0], path[:,1])
+
+                                    self.logger.debug("Landing prediction: %f, %f" % (path[-1,0], path[-1,1]))
+
+                                    # Add this prediction to the list of records to insert into the database at the end of this cycle
+                                    predictionrows.append((fid, callsign, 'cutdown', float(coef), float(path[-1,1]), float(path[-1,0]), pathgeom, None, None, None))
 
                                     # Add this predicted landingn location to our list
                                     landings.append((flightpath[-1][1], flightpath[-1][0]))
@@ -1948,7 +2450,10 @@ class LandingPredictor(PredictorBase):
                         # flight prediction) as well as observed wind data for the flight thus far (i.e. the pre-cutdown prediction).  Combining these
                         # results in a more accurate prediction prior to descent.
                         #
-                        if predictiondata_slice.shape[0] > 0:
+                        if splice_start is not None and splice_start < l:
+
+                            # The end (exclusive) of the pre-flight prediction rows we'll use.  Normally this is the landing.
+                            splice_end = l
 
                             # If there was a pre-cutdown prediction created up above, then we splice that onto the end section of the pre-flight prediction 
                             if flightpath:
@@ -1958,120 +2463,43 @@ class LandingPredictor(PredictorBase):
                                 #     longitude,
                                 #     ttl,
                                 #     altitude
-
-                                # first we find the splice point
-                                loop_counter = 0
-                                prev_pred_alt = 0
+                                cutdown_path = np.array(flightpath, dtype='float64')
 
                                 # this is the altitude that the pre-cutdown landing prediction starts at...and should be our splice point
-                                cutdown_altitude = flightpath[0][3]
-
-                                # we reverse the pre-flight prediction data slice because we want to loop from landing up, towards the current flight altitude.
-                                predictiondata_slice_rev = predictiondata_slice[::-1]
-                                l = predictiondata_slice_rev.shape[0]
-
-                                # Now loop through the prediction data, stopping at the point where the pre-flight altitude is higher than the pre-cutdown starting altitude.
-                                while predictiondata_slice_rev[loop_counter,0] < cutdown_altitude and loop_counter < l - 1:
-                                    if prev_pred_alt > predictiondata_slice_rev[loop_counter, 0]:
-                                        # we've hit the top in the pred data and we need to stop
-                                        if loop_counter > 0:
-                                            loop_counter -= 1
-                                        break
-                                    prev_pred_alt = predictiondata_slice_rev[loop_counter, 0]
-                                    loop_counter += 1
-
-                                # Now slice off the predictiondata we care about
-                                predictiondata_slice_rev = predictiondata_slice_rev[loop_counter:, 0:]
-                                
-                                # reverse this back in HIGH to LOW altitude order
-                                predictiondata_slice = predictiondata_slice_rev[::-1]
-
-                                # reference:  predictiondata columns:
-                                #     altitude,
-                                #     latitude,
-                                #     longitude,
-                                #     vert_rate,
-                                #     delta_secs
-
-                                # reswizzle the flightpath columns into an array that matches the predictiondata format
-                                # convert the flightpath list to a numpyarray
-                                temparray = np.array(flightpath)
+                                cutdown_altitude = cutdown_path[0, 3]
 
-                                # reorder the columns so we have altitude, latitude, longitude, and ttl
-                                newarray = temparray[:,[3,0,1,2]]
-
-                                # add a column with 0's in it
-                                newarray = np.hstack((newarray, np.zeros((newarray.shape[0], 1), dtype=newarray.dtype)))
-
-                                # now zero out the last two columns
-                                newarray[:,[3,4]] = 0
+                                # Find the point, counting from the landing up towards the current flight altitude, where the pre-flight altitude is higher 
+                                # than the pre-cutdown starting altitude.  The pre-flight prediction is cut off there.
+                                splice_end = l - predictfile.descentIndex(cutdown_altitude, length = l - splice_start)
 
                                 # Now we need to translate the pre-cutdown prediction so that it begins (at the similar lat, lon) at the point where the pre-flight
                                 # prediction ends.
                                 # Determine the delta between the end of the pre-flight prediction and the beginning of the pre-cutdown prediction
-                                dx = float(predictiondata_slice[-1, 1]) - newarray[0,1]
-                                dy = float(predictiondata_slice[-1, 2]) - newarray[0,2]
+                                dx = predictiondata[splice_end - 1, 1] - cutdown_path[0, 0]
+                                dy = predictiondata[splice_end - 1, 2] - cutdown_path[0, 1]
 
-                                # Add this delta to the lat and lon columns of the pre-cutdown prediction.  This should translate the pre-cutdown predicted flight path
-                                # so that it begins at the same point that the pre-flight prediction ends.
-                                newarray[:,1] = [dx + i for i in newarray[:,1]]
-                                newarray[:,2] = [dy + i for i in newarray[:,2]]
-
-                                # Now, finally, append the two arrays
-                                predictiondata_slice = np.append(predictiondata_slice, newarray, axis=0)
+                                # Add this delta to the pre-cutdown prediction and append it to the pre-flight prediction
+                                slice_lats = np.concatenate((predictiondata[splice_start:splice_end, 1], cutdown_path[:, 0] + dx))
+                                slice_lons = np.concatenate((predictiondata[splice_start:splice_end, 2], cutdown_path[:, 1] + dy))
 
+                            else:
+                                slice_lats = predictiondata[splice_start:splice_end, 1]
+                                slice_lons = predictiondata[splice_start:splice_end, 2]
 
                             # Determine the delta between the last heard packet and the prediction data
-                            dx = x - float(predictiondata_slice[0, 1]) 
-                            dy = y - float(predictiondata_slice[0, 2])
-
-                            # Apply that delta to the prediction data, translating that curve and create the linestring string in the process
-                            m = 0
-                            linestring_text = ""
-                            for k,u,v,vrate,ds in predictiondata_slice:
-                                if m > 0:
-                                    linestring_text = linestring_text + ", "
-                                linestring_text = linestring_text + str(round(float(v)+dy, 6)) + " " + str(round(float(u)+dx, 6))
-                                m += 1
-                            linestring_text = "LINESTRING(" + linestring_text + ")"
-
-                            # Now we construct the GIS linestring string for the database insert
-                            landingprediction_sql = """
-                                 insert into landingpredictions (tm, flightid, callsign, thetype, coef_a, location2d, flightpath)
-                                 values (now(),
-                                     %s, 
-                                     %s, 
-                                     'translated', 
-                                     %s::numeric, 
-                                     ST_GeometryFromText('POINT(%s %s)', 4326), 
-                                     ST_GeometryFromText(%s, 4326));
-                            """
-
-                            #self.logger.debug("SQL: " + landingprediction_sql % 
-                            #        (   fid, 
-                            #            callsign, 
-                            #            str(-1), 
-                            #            str(float(predictiondata_slice[-1,2])+dy), 
-                            #            str(float(predictiondata_slice[-1,1])+dx), 
-                            #            linestring_text 
-                            #        ))
-
-                            ts = datetime.datetime.now()
-                            self.logger.debug("Inserting record into database: %s" % ts.strftime("%Y-%m-%d %H:%M:%S"))
-
-                            landingcur.execute(landingprediction_sql, 
-                                    [   fid, 
-                                        callsign, 
-                                        float(-1), 
-                                        float(predictiondata_slice[-1,2])+dy, 
-                                        float(predictiondata_slice[-1,1])+dx, 
-                                        linestring_text 
-                                    ]
-                            )
-                            self.landingconn.commit()
+                            dx = x - slice_lats[0]
+                            dy = y - slice_lons[0]
+
+                            # Apply that delta to the prediction data, translating that curve
+                            translated_lats = slice_lats + dx
+                            translated_lons = slice_lons + dy
+
+                            # Add this prediction to the list of records to insert into the database at the end of this cycle
+                            pathgeom = self.makePathGeometry(translated_lats, translated_lons)
+                            predictionrows.append((fid, callsign, 'translated', float(-1), float(translated_lons[-1]), float(translated_lats[-1]), pathgeom, None, None, None))
 
                             # Add this predicted landing location to our list
-                            landings.append((float(predictiondata_slice[-1,2])+dy, float(predictiondata_slice[-1,1])+dx))
+                            landings.append((float(translated_lons[-1]), float(translated_lats[-1])))
 
                         ####################################
                         # END: Insert pre-flight predict file landing prediction into the database
@@ -2084,12 +2512,17 @@ class LandingPredictor(PredictorBase):
                     ####################################
     
                 # now update the shared list of landing locations so other processes can use the data
-                self.updateLocations(landings)
+                self.updateLocations([loc for locs in self.beaconlandings.values() for loc in locs])
 
                 self.logger.debug("============ end processing:   %s : %s ==========" % (fid, callsign))
 
+            # Now write all of the landing predictions from this cycle to the database
+            if len(predictionrows) > 0:
+                ts = datetime.datetime.now()
+                self.logger.debug("Inserting %d records into database: %s" % (len(predictionrows), ts.strftime("%Y-%m-%d %H:%M:%S")))
+                self.query(queries.insertLandingPredictions, predictions = predictionrows)
+
         except pg.DatabaseError as error:
-            landingcur.close()
             self.landingconn.close()
             self.logger.error(f"Database error: {error}")
 
@@ -2103,7 +2536,6 @@ class LandingPredictor(PredictorBase):
 
         # Close the database connection
         self.logger.debug("Closing database connections...")
-        landingcur.close()
         self.landingconn.close()
 
     ################################
@@ -2117,6 +2549,7 @@ class LandingPredictor(PredictorBase):
 # Landing Predictor Process
 ##################################################
 def runLandingPredictor(config):
+    lp = None
     try:
 
         # setup logging
@@ -2133,15 +2566,48 @@ def runLandingPredictor(config):
                 dbstring = habconfig.dbConnectionString, 
                 timezone=config['timezone'], 
                 timeout = 20, 
-                landinglocations = config["landinglocations"], 
-                activebeacons = config["activebeacons"],
+                statebus = config["statebus"],
                 loggingqueue = config["loggingqueue"],
+                pathtolerance = float(config["pathtolerance"]) if "pathtolerance" in config else 0.0,
+                demdirectory = config["demdirectory"] if "demdirectory" in config else None,
+                statefile = config["predictorstate"] if "predictorstate" in config else None
                 )
 
-        # run the landing predictor function continuously, every 5 seconds.
+        # Pick up where we left off if the predictor was recently running
+        lp.loadState()
+
+        # how often (in seconds) to log how many predictions were reused
+        statsinterval = 300
+        laststats = time.monotonic()
+
+        # how often (in seconds) to save the predictor's state
+        stateinterval = 60
+        laststate = time.monotonic()
+
+        # run the landing predictor function continuously, processing each beacon as often as its flight phase calls for.
         while not config["stopevent"].is_set():
             lp.processPredictions()
-            config["stopevent"].wait(5)
+
+            if time.monotonic() - laststats > statsinterval:
+                stats = lp.getCacheStats()
+                if stats["hits"] + stats["misses"] > 0:
+                    logger.info(f"Prediction reuse:  hits: {stats['hits']}, misses: {stats['misses']}, hit rate: {stats['hitrate'] * 100:.1f}%")
+
+                pathstats = lp.getPathStats()
+                if lp.pathtolerance > 0 and pathstats["paths"] > 0:
+                    logger.info(f"Flight path simplification ({lp.pathtolerance}m):  points: {pathstats['points_in']} -> {pathstats['points_out']}, bytes: {pathstats['bytes_in']} -> {pathstats['bytes_out']} ({pathstats['savings'] * 100:.1f}% smaller), time: {pathstats['seconds'] * 1000:.1f}ms")
+
+                schedstats = lp.getScheduleStats()
+                if schedstats["cpu_overruns"] + schedstats["db_overruns"] + schedstats["late"] > 0:
+                    logger.info(f"Prediction scheduler:  cycles: {schedstats['cycles']}, beacons processed: {schedstats['processed']}, overruns: cpu={schedstats['cpu_overruns']} db={schedstats['db_overruns']}, deferred: {schedstats['deferred']}, late: {schedstats['late']}")
+                laststats = time.monotonic()
+
+            if time.monotonic() - laststate > stateinterval:
+                lp.saveState()
+                laststate = time.monotonic()
+
+            # Wait until the next beacon is due, but check for new flights/beacons at least every 5 seconds
+            config["stopevent"].wait(min(5.0, max(1.0, lp.nextDue())))
 
     except (KeyboardInterrupt, SystemExit, GracefulExit) as e: 
         logger.debug(f"runLandingPredictor caught keyboardinterrupt")
@@ -2149,6 +2615,9 @@ def runLandingPredictor(config):
         config["stopevent"].set()
         pass
     finally:
+        # Save our state so a restart can pick up where we left off
+        if lp is not None:
+            lp.saveState()
         logger.info("Landing predictor ended")
 
 
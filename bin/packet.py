@@ -18,15 +18,110 @@
 #
 ##################################################
 
+import struct
+import marshal
+import pickle
+import sys
+import time
 from dataclasses import dataclass, field
 
-##################################    
+
+##################################
+# The packet wire format
+#
+# A fixed 16 byte header followed by the variable length fields:
+#
+#    magic        (uint8)   0xEB
+#    version      (uint8)   WIRE_VERSION
+#    flags        (uint8)   FLAG_* bits below
+#    reserved     (uint8)
+#    mask         (uint32)  bit i is set when the property named PROPERTY_KEYS[i] is present
+#    frequency    (int64)   only meaningful when FLAG_FREQUENCY is set
+#
+# then a marshal (format version 4) encoded tuple of:  text, source, the values of the properties present (in PROPERTY_KEYS order),
+# and, when FLAG_EXTRAS is set, a dictionary of any properties not in PROPERTY_KEYS.
+#
+# PROPERTY_KEYS is append only.  Removing or reordering keys requires a new WIRE_VERSION with its own key list.
+##################################
+WIRE_MAGIC = 0xEB
+WIRE_VERSION = 1
+WIRE_HEADER = struct.Struct("<BBBxIq")
+
+# frequency is set (i.e. not None)
+FLAG_FREQUENCY = 0x01
+
+# the utf8text property is the same as the packet text (and so isn't repeated)
+FLAG_TEXTCOPY = 0x02
+
+# there are properties not in PROPERTY_KEYS
+FLAG_EXTRAS = 0x04
+
+# the properties not in PROPERTY_KEYS couldn't be marshaled, so they're pickled instead
+FLAG_PICKLED = 0x08
+
+# The properties known to the wire format.  These are the keys set by the AX.25/KISS decoders, the connectors, and the packet queues.
+PROPERTY_KEYS = (
+        "source", "destination", "digipeaters", "information", "is_aprs", "channel", "decode_time", "decode_timestamp",
+        "queue_time", "priority", "frequency", "packetsource", "control_field", "frame_type", "protocol_id", "utf8text"
+        )
+PROPERTY_INDEX = { key : i for i, key in enumerate(PROPERTY_KEYS) }
+UTF8TEXT_BIT = 1 << PROPERTY_INDEX["utf8text"]
+
+# Packets from the same source nearly always have the same set of properties, added in the same order.  So the work of laying out
+# the properties is cached:  by the tuple of property names when encoding and by the mask when decoding.  The caches are bounded in
+# case something produces endless different sets of property names.
+LAYOUT_CACHE_SIZE = 256
+_encodelayouts = {}
+_decodelayouts = {}
+
+
+##################################
+# the layout for encoding a set of property names:  (mask, the names in PROPERTY_KEYS order, the names not in PROPERTY_KEYS)
+##################################
+def _encodeLayout(keys: tuple)->tuple:
+
+    layout = _encodelayouts.get(keys)
+    if layout is None:
+        known = sorted((PROPERTY_INDEX[key], key) for key in keys if key in PROPERTY_INDEX)
+        mask = 0
+        for i, key in known:
+            mask |= 1 << i
+
+        layout = (mask, tuple(key for i, key in known), tuple(key for key in keys if key not in PROPERTY_INDEX))
+
+        if len(_encodelayouts) >= LAYOUT_CACHE_SIZE:
+            _encodelayouts.clear()
+        _encodelayouts[keys] = layout
+
+    return layout
+
+
+##################################
+# the property names (in PROPERTY_KEYS order) for a mask
+##################################
+def _decodeLayout(mask: int)->tuple:
+
+    keys = _decodelayouts.get(mask)
+    if keys is None:
+        keys = tuple(key for i, key in enumerate(PROPERTY_KEYS) if mask >> i & 1)
+
+        if len(_decodelayouts) >= LAYOUT_CACHE_SIZE:
+            _decodelayouts.clear()
+        _decodelayouts[mask] = keys
+
+    return keys
+
+
+##################################
 # the Packet class
-##################################    
-@dataclass
+##################################
+@dataclass(slots=True)
 class Packet:
     """
     Used for storing a packet
+
+    Packets are passed between processes in the compact wire format described above (see encode() and decode()).  Pickling a Packet
+    uses the same format.
     """
     text: str
     frequency: int
@@ -46,5 +141,189 @@ class Packet:
         return self.text.encode(encoding = 'utf-8', errors = 'ignore')
 
     def __str__(self):
-        # string representation of theh packet object 
+        # string representation of theh packet object
         return self.text
+
+
+    def encode(self)->bytes:
+        """
+        Encode this packet in the wire format
+        """
+
+        flags = 0
+        mask = 0
+        values = []
+        extras = None
+
+        if self.frequency is not None:
+            flags |= FLAG_FREQUENCY
+
+        properties = self.properties
+        if properties:
+            mask, known, unknown = _encodeLayout(tuple(properties))
+
+            if unknown:
+                extras = { key : properties[key] for key in unknown }
+
+            # the values are kept in PROPERTY_KEYS order.  The utf8text property isn't repeated when it's the same as the packet text.
+            if mask & UTF8TEXT_BIT and properties["utf8text"] == self.text:
+                flags |= FLAG_TEXTCOPY
+                mask &= ~UTF8TEXT_BIT
+                values = [properties[key] for key in known if key != "utf8text"]
+            else:
+                values = [properties[key] for key in known]
+
+        header = WIRE_HEADER.pack(WIRE_MAGIC, WIRE_VERSION, flags | (FLAG_EXTRAS if extras else 0), mask, self.frequency if flags & FLAG_FREQUENCY else 0)
+
+        if extras:
+            try:
+                return header + marshal.dumps((self.text, self.source, values, extras), 4)
+            except ValueError:
+                # something marshal can't handle (ex. an object), so pickle the extras instead
+                extras = pickle.dumps(extras, protocol = pickle.HIGHEST_PROTOCOL)
+                header = WIRE_HEADER.pack(WIRE_MAGIC, WIRE_VERSION, flags | FLAG_EXTRAS | FLAG_PICKLED, mask, self.frequency if flags & FLAG_FREQUENCY else 0)
+                return header + marshal.dumps((self.text, self.source, values, extras), 4)
+
+        return header + marshal.dumps((self.text, self.source, values), 4)
+
+
+    @classmethod
+    def decode(cls, data: bytes):
+        """
+        Create a Packet from its wire format.  Raises ValueError if the data isn't a packet in a format we know.
+        """
+
+        if len(data) < WIRE_HEADER.size:
+            raise ValueError(f"Packet data too short: {len(data)} bytes")
+
+        magic, version, flags, mask, frequency = WIRE_HEADER.unpack_from(data, 0)
+        if magic != WIRE_MAGIC or version != WIRE_VERSION:
+            raise ValueError(f"Unknown packet wire format: {magic=:#x} {version=}")
+
+        fields = marshal.loads(memoryview(data)[WIRE_HEADER.size:])
+        text = fields[0]
+
+        properties = dict(zip(_decodeLayout(mask), fields[2])) if mask else {}
+
+        if flags & FLAG_TEXTCOPY:
+            properties["utf8text"] = text
+
+        if flags & FLAG_EXTRAS:
+            properties.update(pickle.loads(fields[3]) if flags & FLAG_PICKLED else fields[3])
+
+        return cls(text = text, frequency = frequency if flags & FLAG_FREQUENCY else None, source = fields[1], properties = properties)
+
+
+    @classmethod
+    def fromLegacy(cls, obj):
+        """
+        Compatibility shim for packets in older forms:  a Packet (or other object) with text/frequency/source/properties attributes,
+        a dictionary of those, or wire format bytes.  Returns None if obj can't be converted.
+        """
+
+        if obj is None or isinstance(obj, cls):
+            return obj
+
+        if isinstance(obj, (bytes, bytearray, memoryview)):
+            return cls.decode(obj)
+
+        if isinstance(obj, dict):
+            state = obj
+        elif hasattr(obj, "__dict__"):
+            state = vars(obj)
+        else:
+            return None
+
+        if "text" not in state:
+            return None
+
+        return cls(text = state["text"], frequency = state.get("frequency"), source = state.get("source"), properties = dict(state.get("properties") or {}))
+
+
+    def __reduce__(self):
+        # pickle (ex. through an mp.Queue) as the wire format
+        return (_unpickle, (self.encode(),))
+
+
+    def __setstate__(self, state)->None:
+        # Packets pickled before the wire format existed have their attributes saved as a dictionary
+        if isinstance(state, tuple):
+            state = { **(state[0] or {}), **(state[1] or {}) }
+
+        self.text = state.get("text")
+        self.frequency = state.get("frequency")
+        self.source = state.get("source")
+        self.properties = dict(state.get("properties") or {})
+
+
+##################################
+# recreate a pickled Packet from its wire format
+##################################
+def _unpickle(data: bytes)->Packet:
+    return Packet.decode(data)
+
+
+
+##################################
+# the Packet class as it was before the wire format (for benchmarking)
+##################################
+@dataclass
+class _LegacyPacket:
+    text: str
+    frequency: int
+    source: str
+    properties: list = field(default_factory=dict)
+
+
+
+##################################################
+# main
+#
+# Size and speed of the wire format compared with pickling the packet as the plain dataclass it used to be
+##################################################
+def main():
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    text = "KC0D-1>APRS,WIDE2-1:@011912z3946.24N/10459.04W_270/004g008t061r000p000P000h24b10152L548.WD 31"
+    samples = {
+        "RTP/AX.25" : { "digipeaters" : ["WIDE2-1"], "destination" : "APRS", "source" : "KC0D-1", "control_field" : 3, "frame_type" : "U Frame",
+            "is_aprs" : True, "protocol_id" : 240, "information" : text.split(":", 1)[1].encode(), "decode_timestamp" : 1700000000,
+            "utf8text" : text, "frequency" : 144390000, "packetsource" : "ka9q-radio", "queue_time" : 1700000000, "priority" : 1 },
+        "KISS" : { "destination" : "APRS", "source" : "KC0D-1", "digipeaters" : ["WIDE2-1"], "information" : text.split(":", 1)[1].encode(),
+            "decode_time" : 1700000000, "is_aprs" : True, "channel" : 0, "queue_time" : 1700000000, "priority" : 1 },
+        "APRS-IS" : { "queue_time" : 1700000000, "priority" : 1 },
+    }
+
+    for name, properties in samples.items():
+        legacy = _LegacyPacket(text = text, frequency = 144390000, source = "ka9q-radio", properties = dict(properties))
+        packet = Packet(text = text, frequency = 144390000, source = "ka9q-radio", properties = dict(properties))
+
+        start = time.perf_counter()
+        for i in range(n):
+            data = pickle.dumps(legacy, protocol = pickle.HIGHEST_PROTOCOL)
+        pickle_put = (time.perf_counter() - start) / n
+        start = time.perf_counter()
+        for i in range(n):
+            pickle.loads(data)
+        pickle_get = (time.perf_counter() - start) / n
+        pickle_size = len(data)
+
+        start = time.perf_counter()
+        for i in range(n):
+            wire = packet.encode()
+        wire_put = (time.perf_counter() - start) / n
+        start = time.perf_counter()
+        for i in range(n):
+            decoded = Packet.decode(wire)
+        wire_get = (time.perf_counter() - start) / n
+
+        assert decoded == packet
+        assert pickle.loads(pickle.dumps(packet)) == packet
+
+        print(f"{name:>9}:  pickle {pickle_size} bytes, {pickle_put * 1e6:.2f}us encode, {pickle_get * 1e6:.2f}us decode    "
+                f"wire {len(wire)} bytes, {wire_put * 1e6:.2f}us encode, {wire_get * 1e6:.2f}us decode")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+##################################################
+#    This file is part of the HABTracker project for tracking high altitude balloons.
+#
+#    Copyright (C) 2019,2020,2021 Jeff Deaton (N6BA)
+#
+#    HABTracker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    HABTracker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with HABTracker.  If not, see <https://www.gnu.org/licenses/>.
+#
+##################################################
+
+import multiprocessing as mp
+import time
+import sys
+from queue import Empty, Full
+from dataclasses import dataclass
+
+from packet import Packet
+from ringbuffer import RingBuffer
+
+
+# The priority classes, highest priority first.  Tracked packets are those from the beacons on active flights and from this station.
+TRACKED = 0
+GENERAL = 1
+PRIORITY_CLASSES = ("tracked", "general")
+
+
+#####################################
+# The PacketQueue Class
+#
+# A bounded, multiple producer, single consumer queue of Packet objects for passing packets between processes, used for the
+# database and igating queues.  It's a drop-in for the mp.Queue objects those used to be (put, put_nowait, get, get_nowait, qsize, empty).
+#
+# Each priority class has its own queue and packets are always taken from the highest priority class first.  The class queues are
+# shared memory ring buffers (holding packets in their wire format) when ringsize is given, otherwise mp.Queue objects.  The class of a packet comes from its "priority"
+# property (set by the PacketHandler that queued it), defaulting to the lowest priority.
+#
+# When the queue is full, room is made by dropping the oldest packet from the lowest priority class that has anything queued (but
+# never one of higher priority than the packet being added).  Tracked packets are never dropped:  if the queue is full of them, the
+# new tracked packet is queued anyway and a lower priority packet is refused instead.  Drops are counted per class.
+#
+# With ring buffers, a dropped packet is only marked to be skipped and the consumer steps over it (by its length, without copying or
+# decoding it) when it gets to it, so only the consumer ever reads from a ring buffer.  The dropped packet takes up ring buffer space
+# until then.  With mp.Queue objects the producer takes the dropped packet off the queue itself, which costs the producer a read and an
+# unpickle but keeps the queue (and its pipe) bounded.
+#####################################
+@dataclass
+class PacketQueue(object):
+
+    # the number of packets (across all classes) above which lower priority packets are dropped
+    maxsize: int = 250
+
+    # the names of the priority classes, highest priority first
+    classes: tuple = PRIORITY_CLASSES
+
+    # the size (in bytes) of the shared memory ring buffer for each class.  0 uses an mp.Queue for each class instead.
+    ringsize: int = 0
+
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        n = len(self.classes)
+
+        # a queue for each class
+        self.queues = [RingBuffer(size = self.ringsize, encode = Packet.encode, decode = Packet.decode) if self.ringsize > 0 else mp.Queue() for c in self.classes]
+
+        # Shared counters, the number of packets queued for each class, then the number dropped for each class, then the number of
+        # (dropped) packets at the front of each class queue for the consumer to skip.  The lock on this array protects all of the
+        # queue's bookkeeping.
+        self.counters = mp.Array('q', 3 * n)
+
+        # counts the packets available to consumers so get() can block until there's something to get
+        self.available = mp.Semaphore(0)
+
+
+    ################################
+    # the priority class of a packet
+    ################################
+    def priorityOf(self, packet: Packet)->int:
+
+        lowest = len(self.classes) - 1
+
+        try:
+            priority = int(packet.properties["priority"])
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return lowest
+
+        return min(max(priority, 0), lowest)
+
+
+    ################################
+    # add a packet to the queue.  Returns False if the packet was dropped.
+    #
+    # The block and timeout arguments are accepted for compatibility with mp.Queue, but a put never waits on a full queue.
+    ################################
+    def put(self, packet: Packet, block: bool = True, timeout: float = None)->bool:
+
+        n = len(self.classes)
+        c = self.priorityOf(packet)
+        victim = None
+
+        with self.counters.get_lock():
+            queued = sum(self.counters[0:n])
+
+            if queued >= self.maxsize:
+
+                # the lowest priority class, no higher than this packet's class and never the tracked class, with packets queued
+                for v in range(n - 1, max(c, TRACKED + 1) - 1, -1):
+                    if self.counters[v] > 0:
+                        victim = v
+                        break
+
+                if victim is None and c != TRACKED:
+                    # nothing we're allowed to drop to make room, so this packet is dropped instead
+                    self.counters[n + c] += 1
+                    return False
+
+                if victim is not None:
+                    self.counters[victim] -= 1
+                    self.counters[n + victim] += 1
+                    if isinstance(self.queues[victim], RingBuffer):
+                        self.counters[2 * n + victim] += 1
+
+            self.counters[c] += 1
+
+        # The oldest packet in the victim's queue is no longer available to get, so take it off the count.  An mp.Queue is bounded by
+        # taking the packet off here, a ring buffer's consumer skips it.
+        if victim is not None:
+            self.available.acquire(timeout = 1)
+            if not isinstance(self.queues[victim], RingBuffer):
+                try:
+                    self.queues[victim].get(timeout = 1)
+                except Empty:
+                    pass
+
+        try:
+            self.queues[c].put(packet)
+        except Full:
+            # the class's ring buffer is out of space
+            with self.counters.get_lock():
+                self.counters[c] -= 1
+                self.counters[n + c] += 1
+            return False
+
+        self.available.release()
+
+        return True
+
+
+    def put_nowait(self, packet: Packet)->bool:
+        return self.put(packet, block = False)
+
+
+    ################################
+    # remove and return the highest priority packet.  Raises Empty if there isn't one (after waiting up to timeout seconds, if blocking).
+    ################################
+    def get(self, block: bool = True, timeout: float = None)->Packet:
+
+        if not self.available.acquire(block, timeout):
+            raise Empty
+
+        n = len(self.classes)
+        c = None
+        with self.counters.get_lock():
+            for i in range(n):
+                if self.counters[i] > 0:
+                    self.counters[i] -= 1
+                    c = i
+                    break
+
+            # the dropped packets at the front of this class queue
+            skip = self.counters[2 * n + c] if c is not None else 0
+            if skip:
+                self.counters[2 * n + c] = 0
+
+        if c is None:
+            raise Empty
+
+        # The packets were counted before they were put on the queue, so they're there (or about to be, once the producer finishes its
+        # put).  The dropped ones are stepped over without being read.
+        if skip:
+            self.queues[c].discard(skip, timeout = 5)
+
+        return self.queues[c].get(timeout = 5)
+
+
+    def get_nowait(self)->Packet:
+        return self.get(block = False)
+
+
+    ################################
+    # the number of packets queued across all classes
+    ################################
+    def qsize(self)->int:
+        with self.counters.get_lock():
+            return sum(self.counters[0:len(self.classes)])
+
+
+    def empty(self)->bool:
+        return self.qsize() == 0
+
+
+    def full(self)->bool:
+        return self.qsize() >= self.maxsize
+
+
+    ################################
+    # free the shared memory used by the ring buffers.  Only the process that created the queue should call this.
+    ################################
+    def unlink(self)->None:
+        for q in self.queues:
+            if isinstance(q, RingBuffer):
+                q.unlink()
+
+
+    ################################
+    # the number of packets queued and dropped for each class
+    ################################
+    def stats(self)->dict:
+        n = len(self.classes)
+        with self.counters.get_lock():
+            return { name : { "queued" : self.counters[i], "dropped" : self.counters[n + i] } for i, name in enumerate(self.classes) }
+
+
+
+#####################################
+# The PacketClassifier Class
+#
+# Determines the priority class for packets:  tracked for packets from the beacons on active flights (as published by the landing
+# predictor on the shared state bus) and from this station's callsign (any SSID), general for everything else.
+#
+# Reading the state bus is cheap (a copy out of shared memory), but building the set of callsigns isn't free, so the set is refreshed
+# at most every refresh seconds.
+#####################################
+@dataclass
+class PacketClassifier(object):
+
+    # the configuration dictionary (for the state bus and this station's callsign)
+    configuration: dict = None
+
+    # how often (in seconds) the list of active beacons is refreshed
+    refresh: float = 5.0
+
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        # the callsigns of the active beacons and when they were last refreshed
+        self.beacons = set()
+        self.lastrefresh = 0
+
+        # this station's callsign without any SSID
+        callsign = self.configuration["callsign"] if self.configuration and "callsign" in self.configuration else None
+        self.station = callsign.split("-")[0].upper() if callsign else None
+
+
+    ################################
+    # refresh the set of active beacon callsigns from the state bus
+    ################################
+    def refreshBeacons(self)->None:
+
+        now = time.monotonic()
+        if now - self.lastrefresh < self.refresh:
+            return
+
+        self.lastrefresh = now
+
+        bus = self.configuration["statebus"] if self.configuration and "statebus" in self.configuration else None
+        if bus is not None:
+            self.beacons = set(c.upper() for c in bus.getBeacons())
+
+
+    ################################
+    # return the priority class for a packet
+    ################################
+    def classify(self, packet: Packet)->int:
+
+        if packet is None:
+            return GENERAL
+
+        # The source callsign is broken out for packets decoded from RF, otherwise it's the start of the TNC2 formatted text
+        source = packet.properties["source"] if packet.properties and "source" in packet.properties else None
+        if not source and packet.text:
+            source = packet.text.split(">", 1)[0]
+
+        if not source:
+            return GENERAL
+
+        source = source.upper()
+        self.refreshBeacons()
+
+        if source in self.beacons:
+            return TRACKED
+
+        if self.station and source.split("-")[0] == self.station:
+            return TRACKED
+
+        return GENERAL
+
+
+
+##################################################
+# main
+#
+# Fill a queue well past its limit with a mix of tracked and general packets and show what's kept and what's dropped
+##################################################
+def main():
+
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    maxsize = 250
+
+    q = PacketQueue(maxsize = maxsize, ringsize = int(sys.argv[2]) if len(sys.argv) > 2 else 0)
+
+    start = time.perf_counter()
+    for i in range(total):
+        priority = TRACKED if i % 50 == 0 else GENERAL
+        q.put(Packet(text = f"N0CALL-{i}>APRS:>packet {i}", frequency = None, source = "main", properties = { "priority" : priority }))
+    put_secs = time.perf_counter() - start
+
+    print(f"put {total} packets (1 in 50 tracked) into a queue limited to {maxsize}: {put_secs / total * 1e6:.1f}us per put")
+    print(f"    {q.stats()}")
+
+    start = time.perf_counter()
+    kept = []
+    while not q.empty():
+        kept.append(q.get(timeout = 1))
+    get_secs = time.perf_counter() - start
+
+    tracked = [p for p in kept if p.properties["priority"] == TRACKED]
+    print(f"got {len(kept)} packets: {len(tracked)} tracked (all {total // 50} were kept: {len(tracked) == total // 50}), {get_secs / max(len(kept), 1) * 1e6:.1f}us per get")
+    print(f"    first general packet kept: {next(p for p in kept if p.properties['priority'] == GENERAL)}")
+    q.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,509 @@
+##################################################
+#    This file is part of the HABTracker project for tracking high altitude balloons.
+#
+#    Copyright (C) 2019,2020,2021 Jeff Deaton (N6BA)
+#
+#    HABTracker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    HABTracker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with HABTracker.  If not, see <https://www.gnu.org/licenses/>.
+#
+##################################################
+
+import re
+import sys
+import time
+import math
+import aprslib
+
+
+##################################
+# The fast path APRS position parser
+#
+# The database writer parses every packet, but nearly all of the packets that matter (the beacons on a flight) use just a few formats:
+# uncompressed or compressed position reports (with or without a timestamp) with an /A= altitude in the comment, and Mic-E.  This
+# parses those formats directly, producing the same values aprslib.parse() would for the fields the database writer uses (from,
+# latitude, longitude, altitude, course, speed, symbol, symbol_table, comment, and object_name), and hands anything else to aprslib.
+#
+# The fast path only takes a packet when it's sure to get the same answer as aprslib.  Anything with a format or comment extension
+# it doesn't handle (objects, weather, PHG/RNG/DF data, base91 telemetry, DAO, Mic-E telemetry, bad headers, ...) falls back to aprslib,
+# including packets that aprslib will reject, so the same ParseError/UnknownFormat exceptions are raised for those.
+#
+# The same packet is often heard more than once (multiple digipeaters, RF and APRS-IS) so the results of parsing the information part
+# are cached.  Only the header (i.e. the path) differs between the copies.
+##################################
+
+# the packet types handled:  positions without and with a timestamp, and Mic-E
+POSITION_TYPES = "!=/@"
+MICE_TYPES = "`'"
+
+# The regular expressions are the ones aprslib uses, just compiled once
+FROMCALL = re.compile(r"^[a-z0-9]{0,9}(\-[a-z0-9]{1,8})?$", re.I)
+TOCALL = re.compile(r"^([A-Z0-9]{1,6})(-(\d{1,2}))?$")
+DIGIPEATER = re.compile(r"^[A-Z0-9\-]{1,9}\*?$", re.I)
+QCONSTRUCT = re.compile(r"^q..$")
+TIMESTAMP = re.compile(r"^((\d{6})(.))$")
+COMPRESSED = re.compile(r"^[\/\\A-Za-j][!-|]{8}[!-{}][ -|]{3}")
+UNCOMPRESSED = re.compile(r"^(\d{2})([0-9 ]{2}\.[0-9 ]{2})([NnSs])([\/\\0-9A-Z])(\d{3})([0-9 ]{2}\.[0-9 ]{2})([EeWw])([\x21-\x7e])(.*)$")
+COURSESPEED = re.compile(r"^([0-9 \.]{3})/([0-9 \.]{3})")
+DFREPORT = re.compile(r"^/([0-9 \.]{3})/([0-9 \.]{3})")
+PHGRNG = re.compile(r"^(PHG(\d[\x30-\x7e]\d\d)([0-9A-Z]\/)?|RNG(\d{4}))")
+ALTITUDE = re.compile(r"^(.*?)/A=(\-\d{5}|\d{6})(.*)$")
+TELEMETRY = re.compile(r"^(.*?)\|([!-{]{4,14})\|(.*)$")
+DAO = re.compile("^(.*)\\!([\x21-\x7b])([\x20-\x7b]{2})\\!(.*?)$")
+MICE_DSTCALL = re.compile(r"^[0-9A-Z]{3}[0-9L-Z]{3}$")
+MICE_BODY = re.compile(r"^[&-\x7f][&-a][\x1c-\x7f]{2}[\x1c-\x7d][\x1c-\x7f][\x21-\x7e][\/\\0-9A-Z]")
+MICE_AMBIGUITY = re.compile(r"^\d+( *)$")
+MICE_TELEMETRY = re.compile(r"^('[0-9a-f]{10}|`[0-9a-f]{4})(.*)$")
+MICE_ALTITUDE = re.compile(r"^(.*)([!-{]{3})\}(.*)$")
+
+# Mic-E destination address characters to latitude digits (K, L, and Z are spaces)
+MICE_DIGITS = str.maketrans("ABCDEFGHIJKLPQRSTUVWXYZ", "0123456789  0123456789 ")
+
+# the results of parsing information parts, bounded in case of a stream of unique packets
+CACHE_SIZE = 4096
+_cache = {}
+
+# for information parts the fast path doesn't handle
+UNSUPPORTED = None
+
+# counts of packets parsed by the fast path (including those from the cache), cache hits, and packets handed to aprslib
+stats = { "fast" : 0, "cached" : 0, "fallback" : 0 }
+
+
+##################################
+# base91 to decimal (for strings already known to be valid base91)
+##################################
+def _base91(text: str)->int:
+    decimal = 0
+    for c in text:
+        decimal = decimal * 91 + ord(c) - 33
+    return decimal
+
+
+##################################
+# parse the header (the source, destination, and path) of a packet.  Returns None if aprslib would reject it.
+##################################
+def _parseHeader(head: str)->dict:
+
+    fromcall, sep, path = head.partition(">")
+    if not sep or not 1 <= len(fromcall) <= 9 or not FROMCALL.match(fromcall):
+        return None
+
+    path = path.split(",")
+    tocall = path[0]
+    path = path[1:]
+
+    match = TOCALL.match(tocall)
+    if not match or (match.group(3) and int(match.group(3)) > 15):
+        return None
+
+    for digi in path:
+        if not DIGIPEATER.match(digi):
+            return None
+
+    return {
+            "from" : fromcall,
+            "to" : tocall,
+            "path" : path,
+            "via" : path[-1] if len(path) >= 2 and QCONSTRUCT.match(path[-2]) else ""
+            }
+
+
+##################################
+# parse the comment of a position report for course/speed and altitude.  Returns None for anything else in the comment.
+##################################
+def _parseComment(body: str, parsed: dict)->dict:
+
+    # course and speed
+    match = COURSESPEED.match(body)
+    if match:
+        cse, spd = match.groups()
+        body = body[7:]
+        if cse.isdigit() and cse != "000":
+            parsed["course"] = int(cse) if 1 <= int(cse) <= 360 else 0
+        if spd.isdigit() and spd != "000":
+            parsed["speed"] = int(spd) * 1.852
+
+        # a DF report
+        if DFREPORT.match(body):
+            return None
+
+    elif PHGRNG.match(body):
+        return None
+
+    # the altitude
+    match = ALTITUDE.match(body)
+    if match:
+        before, altitude, after = match.groups()
+        body = before + after
+        parsed["altitude"] = int(altitude) * 0.3048
+
+    # base91 telemetry or a DAO extension
+    if TELEMETRY.match(body) or DAO.match(body):
+        return None
+
+    if len(body) > 0 and body[0] == "/":
+        body = body[1:]
+
+    parsed["comment"] = body.strip(" ")
+
+    return parsed
+
+
+##################################
+# parse the information part of a position report (packet types ! = / @)
+##################################
+def _parsePosition(packet_type: str, body: str)->dict:
+
+    parsed = { "messagecapable" : packet_type in "@=" }
+
+    # the timestamp.  The database writer doesn't use it, so it's just split off (aprslib converts it to a time in this month).
+    if packet_type in "/@":
+        match = TIMESTAMP.match(body[0:7])
+        if match:
+            body = body[7:]
+            parsed["raw_timestamp"] = match.group(1)
+            if len(body) == 0:
+                return None
+
+    if COMPRESSED.match(body):
+
+        # aprslib won't decode a '|' in the compressed latitude/longitude
+        if len(body) < 13 or "|" in body[1:9]:
+            return None
+
+        compressed = body[:13]
+        body = body[13:]
+
+        parsed["format"] = "compressed"
+        c1, s1, ctype = [ord(x) - 33 for x in compressed[10:13]]
+
+        if c1 == -1:
+            parsed["gpsfixstatus"] = 1 if ctype & 0x20 == 0x20 else 0
+
+        if -1 in [c1, s1]:
+            pass
+        elif ctype & 0x18 == 0x10:
+            parsed["altitude"] = (1.002 ** (c1 * 91 + s1)) * 0.3048
+        elif c1 >= 0 and c1 <= 89:
+            parsed["course"] = 360 if c1 == 0 else c1 * 4
+            parsed["speed"] = (1.08 ** s1 - 1) * 1.852
+        elif c1 == 90:
+            parsed["radiorange"] = (2 * 1.08 ** s1) * 1.609344
+
+        parsed["symbol"] = compressed[9]
+        parsed["symbol_table"] = compressed[0]
+        parsed["latitude"] = 90 - (_base91(compressed[1:5]) / 380926.0)
+        parsed["longitude"] = -180 + (_base91(compressed[5:9]) / 190463.0)
+
+    else:
+        match = UNCOMPRESSED.match(body)
+        if not match:
+            return None
+
+        lat_deg, lat_min, lat_dir, symbol_table, lon_deg, lon_min, lon_dir, symbol, body = match.groups()
+
+        # position ambiguity
+        posambiguity = lat_min.count(" ")
+        if posambiguity != lon_min.count(" ") or int(lat_deg) > 89 or int(lon_deg) > 179:
+            return None
+
+        # the position is in the center of the ambiguity box
+        if posambiguity >= 4:
+            lat_min = "30"
+            lon_min = "30"
+        else:
+            lat_min = lat_min.replace(" ", "5", 1)
+            lon_min = lon_min.replace(" ", "5", 1)
+
+        latitude = int(lat_deg) + (float(lat_min) / 60.0)
+        longitude = int(lon_deg) + (float(lon_min) / 60.0)
+        latitude *= -1 if lat_dir in "Ss" else 1
+        longitude *= -1 if lon_dir in "Ww" else 1
+
+        parsed["format"] = "uncompressed"
+        parsed["posambiguity"] = posambiguity
+        parsed["symbol"] = symbol
+        parsed["symbol_table"] = symbol_table
+        parsed["latitude"] = latitude
+        parsed["longitude"] = longitude
+
+    # weather reports
+    if parsed["symbol"] == "_":
+        return None
+
+    return _parseComment(body, parsed)
+
+
+##################################
+# parse the information part of a Mic-E packet (packet types ` and ').  The latitude is encoded in the destination callsign.
+##################################
+def _parseMicE(dstcall: str, body: str)->dict:
+
+    dstcall = dstcall.split("-")[0]
+
+    if len(dstcall) != 6 or len(body) < 8 or not MICE_DSTCALL.match(dstcall) or not MICE_BODY.match(body):
+        return None
+
+    # the latitude digits and position ambiguity
+    digits = dstcall.translate(MICE_DIGITS)
+    match = MICE_AMBIGUITY.match(digits)
+    if not match:
+        return None
+
+    posambiguity = len(match.group(1))
+    if posambiguity > 4:
+        return None
+
+    # the coordinates are in the center of the ambiguity box
+    digits = list(digits)
+    if posambiguity > 0:
+        if posambiguity >= 4:
+            digits[2] = "3"
+        else:
+            digits[6 - posambiguity] = "5"
+    digits = "".join(digits)
+
+    latminutes = float(("%s.%s" % (digits[2:4], digits[4:6])).replace(" ", "0"))
+    latitude = int(digits[0:2]) + (latminutes / 60.0)
+    latitude = -latitude if ord(dstcall[3]) <= 0x4c else latitude
+
+    # the longitude
+    longitude = ord(body[0]) - 28
+    longitude += 100 if ord(dstcall[4]) >= 0x50 else 0
+    longitude += -80 if longitude >= 180 and longitude <= 189 else 0
+    longitude += -190 if longitude >= 190 and longitude <= 199 else 0
+
+    lngminutes = ord(body[1]) - 28.0
+    lngminutes += -60 if lngminutes >= 60 else 0
+    lngminutes += ((ord(body[2]) - 28.0) / 100.0)
+
+    if posambiguity == 4:
+        lngminutes = 30
+    elif posambiguity == 3:
+        lngminutes = (math.floor(lngminutes/10) + 0.5) * 10
+    elif posambiguity == 2:
+        lngminutes = math.floor(lngminutes) + 0.5
+    elif posambiguity == 1:
+        lngminutes = (math.floor(lngminutes*10) + 0.5) / 10.0
+
+    longitude += lngminutes / 60.0
+    longitude = 0 - longitude if ord(dstcall[5]) >= 0x50 else longitude
+
+    # speed and course
+    speed = (ord(body[3]) - 28) * 10
+    course = ord(body[4]) - 28
+    quotient = int(course / 10.0)
+    course += -(quotient * 10)
+    course = course*100 + ord(body[5]) - 28
+    speed += quotient
+
+    speed += -800 if speed >= 800 else 0
+    course += -400 if course >= 400 else 0
+
+    parsed = {
+            "format" : "mic-e",
+            "symbol" : body[6],
+            "symbol_table" : body[7],
+            "posambiguity" : posambiguity,
+            "latitude" : latitude,
+            "longitude" : longitude,
+            "speed" : speed * 1.852,
+            "course" : course
+            }
+
+    # the rest is an optional altitude and a comment
+    if len(body) > 8:
+        body = body[8:]
+
+        # telemetry isn't handled here
+        if MICE_TELEMETRY.match(body):
+            return None
+
+        match = MICE_ALTITUDE.match(body)
+        if match:
+            before, altitude, after = match.groups()
+            if "|" in altitude:
+                return None
+            parsed["altitude"] = _base91(altitude) - 10000
+            body = before + after
+
+        if TELEMETRY.match(body) or DAO.match(body):
+            return None
+
+        parsed["comment"] = body.strip(" ")
+
+    return parsed
+
+
+##################################
+# parse an APRS packet
+##################################
+def parse(packet: str)->dict:
+    """
+    Parse an APRS packet (TNC2 format text) returning a dictionary of the decoded fields, just like aprslib.parse().  Position reports and
+    Mic-E packets are parsed here, anything else by aprslib.  Raises aprslib.ParseError or aprslib.UnknownFormat if the packet can't be
+    parsed.
+    """
+
+    if type(packet) is str:
+        packet = packet.rstrip("\r\n")
+        head, sep, body = packet.partition(":")
+
+        if sep and len(body) > 1 and body[0] in POSITION_TYPES + MICE_TYPES:
+
+            header = _parseHeader(head)
+            if header is not None:
+
+                # Mic-E packets depend on the destination callsign as well as the information part
+                key = (header["to"], body) if body[0] in MICE_TYPES else body
+
+                result = _cache.get(key, False)
+                if result is False:
+                    if body[0] in MICE_TYPES:
+                        result = _parseMicE(header["to"], body[1:])
+                    else:
+                        result = _parsePosition(body[0], body[1:])
+
+                    if len(_cache) >= CACHE_SIZE:
+                        _cache.clear()
+                    _cache[key] = result
+                else:
+                    stats["cached"] += 1
+
+                if result is not UNSUPPORTED:
+                    stats["fast"] += 1
+                    return { "raw" : packet, **header, **result }
+
+    stats["fallback"] += 1
+    return aprslib.parse(packet)
+
+
+
+##################################################
+# Parity check packets
+#
+# Position reports in the formats the fast path handles, then some it should hand to aprslib.  main() checks that every one of these
+# parses to the same values as aprslib.parse() for the fields the database writer uses.
+##################################################
+PARITY_PACKETS = (
+    # uncompressed, with and without timestamps, course/speed, and altitude
+    "KC0D-1>APRS,WIDE2-1:/011912h3946.24N/10459.04WO270/004/A=031234 EOSS balloon",
+    "KC0D-1>APRS,WIDE1-1,WIDE2-1:@011912z3946.24N/10459.04WO/A=098765",
+    "KC0D-1>APRS,TCPIP*,qAC,T2USANE:!3946.24N/10459.04W>",
+    "KC0D-1>APRS,KTRSW*,WIDE2:=3946.24N\\10459.04Wk123/045comment /A=-00123 more",
+    "KC0D-2>APZES1,WIDE2-1:/011912z3946.24S/10459.04EO000/000/A=001234 /Ti=-12 /Te=-40 /V=7.1",
+    "KC0D-3>APRS:!3946.2 N/10459.0 W>ambiguous",
+    "KC0D-3>APRS:!39  .  N/104  .  W>very ambiguous",
+    "KC0D-4>APRS:/011912/3946.24N/10459.04WO.../...",
+    "W0ABC-11>APRS,WIDE2-1:!3946.24N/10459.04WO/comment without altitude",
+    "W0ABC-11>APRS:!3946.24N/10459.04WO360/999/A=1234567",
+    # compressed, with course/speed, altitude, and range
+    "KC0D-5>APRS,WIDE2-1:!/5L!!<*e7O7P[/A=031234 compressed",
+    "KC0D-5>APRS:@011912z/5L!!<*e7OS]S balloon",
+    "KC0D-5>APRS:=/5L!!<*e7>{?!",
+    "KC0D-5>APRS:!\\5L!!<*e7>  !",
+    # Mic-E, with and without altitude and comments
+    "KC0D-9>T4SP0W,WIDE1-1,WIDE2-1:`c51l#|>/`\"4V}_%",
+    "KC0D-9>S32U6T:`(_fn\"Oj/]\"4T}EOSS",
+    "KC0D-9>S32U6T-1:'(_fn\"Oj/",
+    "KC0D-9>S32UZZ:`(_fn\"Oj/ ambiguous",
+    # handed to aprslib:  objects, weather, PHG, DAO, telemetry, status, messages, and bad packets
+    "KC0D>APRS:;EOSS-123 *111111z3946.24N/10459.04WO/A=031234",
+    "KC0D>APRS:@011912z3946.24N/10459.04W_270/004g008t061r000p000P000h24b10152",
+    "KC0D>APRS:!3946.24N/10459.04W#PHG5360/digipeater",
+    "KC0D>APRS:!3946.24N/10459.04W>test !W12!",
+    "KC0D>APRS:!3946.24N/10459.04W>test |!!!!!!|",
+    "KC0D>APRS:>status message",
+    "KC0D>APRS::N0CALL   :message{01",
+    "KC0D>APRS:!3946.24N/10459.04",
+    "bad header:!3946.24N/10459.04W>",
+)
+
+# the fields the database writer uses
+WRITER_FIELDS = ("from", "object_name", "comment", "latitude", "longitude", "altitude", "course", "symbol", "symbol_table", "speed")
+
+
+##################################################
+# main
+#
+# Check parity with aprslib, for the packets above or for a file of packets (one per line) given on the command line, then compare the
+# time to parse the position reports.
+##################################################
+def main():
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r", errors="ignore") as f:
+            packets = [line.rstrip("\r\n") for line in f if line.strip()]
+    else:
+        packets = list(PARITY_PACKETS)
+
+    def outcome(parser, packet):
+        try:
+            parsed = parser(packet)
+            return { k : parsed[k] for k in WRITER_FIELDS if k in parsed }
+        except (aprslib.ParseError, aprslib.UnknownFormat) as e:
+            return type(e).__name__
+
+    mismatches = 0
+    for packet in packets:
+        expected = outcome(aprslib.parse, packet)
+        got = outcome(parse, packet)
+        if got != expected:
+            mismatches += 1
+            print(f"   mismatch: {packet}\n      aprslib: {expected}\n      fast:    {got}")
+
+    print(f"Parity:  {len(packets)} packets, {mismatches} mismatches, {stats['fast']} parsed by the fast path")
+
+    # timing for those the fast path handles
+    positions = []
+    for packet in packets:
+        fallbacks = stats["fallback"]
+        try:
+            parse(packet)
+        except (aprslib.ParseError, aprslib.UnknownFormat):
+            pass
+        if stats["fallback"] == fallbacks:
+            positions.append(packet)
+
+    n = max(1, 50000 // max(len(positions), 1))
+    count = n * len(positions)
+
+    start = time.perf_counter()
+    for i in range(n):
+        for packet in positions:
+            aprslib.parse(packet)
+    aprslib_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(n):
+        _cache.clear()
+        for packet in positions:
+            parse(packet)
+    fast_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(n):
+        for packet in positions:
+            parse(packet)
+    cached_secs = time.perf_counter() - start
+
+    print(f"aprslib.parse:  {aprslib_secs / count * 1e6:.2f}us per packet")
+    print(f"   fast path:  {fast_secs / count * 1e6:.2f}us per packet")
+    print(f"   fast path (repeated packets, cached):  {cached_secs / count * 1e6:.2f}us per packet")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -28,11 +28,14 @@
 # All of these functions require a valid and open connection the postgresql database.
 #
 #def getFlights(dbconn = None, logger = None):
-#def getLatestPackets(dbconn = None, callsign = None, timezone = None, cutoff = 20, logger = None):
+#def getLatestPackets(dbconn = None, callsign = None, timezone = None, cutoff = 20, since = None, logger = None):
 #def getSurfaceWinds(dbconn = None, flightid = None, logger = None):
 #def getLandingElevation(dbconn = None, callsign = None, distance = None, logger = None):
 #def getGPSPosition(dbconn = None, logger = None):
 #def getPredictFile(dbconn = None, flightid = None, launchsite = None, logger = None):
+#def getPredictFileVersion(dbconn = None, flightid = None, launchsite = None, logger = None):
+#def makeLineString(lats = None, lons = None, srid = 4326):
+#def insertLandingPredictions(dbconn = None, predictions = None, logger = None):
 #def test_connectToDatabase(db_connection_string = None, logger = None):
 ##################################################
 
@@ -42,6 +45,7 @@ from math import radians, cos, sin, asin, sqrt
 import time
 import datetime 
 import psycopg2 as pg
+import psycopg2.extras
 import sys
 import numpy as np
 from scipy.integrate import *
@@ -49,6 +53,7 @@ from scipy.interpolate import *
 from scipy.optimize import *
 from inspect import getframeinfo, stack
 import json
+import struct
 import logging
 from logging.handlers import QueueHandler
 
@@ -125,7 +130,8 @@ def getFlights(dbconn = None, logger = None):
 # Function for querying the database to get a list of latest packets for the provided callsign
 # The resulting list of packets is returned if no callsign is given then an empty list is returned
 # columns returned in the list:  altitude, latitude, longitude, altitude_change_rate, latitude_change_rate, longitude_change_rate
-def getLatestPackets(dbconn = None, callsign = None, timezone = None, cutoff = 20, logger = None):
+# If since (epoch seconds, see the epoch column) is given, then only those packets heard after that are returned.
+def getLatestPackets(dbconn = None, callsign = None, timezone = None, cutoff = 20, since = None, logger = None):
 
     # if a callsign wasn't provided, then return a empty numpy array
     if not dbconn or not callsign or not timezone:
@@ -207,7 +213,10 @@ def getLatestPackets(dbconn = None, callsign = None, timezone = None, cutoff = 2
                 round((y.pressure_pa / (287.05 * y.temperature_k)) / 515.2381961366, 8)
             else
                 NULL
-            end as air_density_slugs_per_ft3
+            end as air_density_slugs_per_ft3,
+
+            -- When the packet was heard (epoch seconds)
+            y.epoch
 
             from 
             (
@@ -238,11 +247,13 @@ def getLatestPackets(dbconn = None, callsign = None, timezone = None, cutoff = 2
                     c.heardfrom,
                     c.freq,
                     c.channel,
-                    c.source
+                    c.source,
+                    c.epoch
 
                     from (
                             select 
                             date_trunc('milliseconds', a.tm)::timestamp without time zone as thetime,
+                            extract(epoch from a.tm) as epoch,
                             case
                                 when a.raw similar to '%%[0-9]{6}h%%' then
                                     date_trunc('milliseconds', ((to_timestamp(now()::date || ' ' || substring(a.raw from position('h' in a.raw) - 6 for 6), 'YYYY-MM-DD HH24MISS')::timestamp at time zone 'UTC') at time zone %s)::time)::time without time zone
@@ -300,6 +311,9 @@ def getLatestPackets(dbconn = None, callsign = None, timezone = None, cutoff = 2
                             where 
                             a.location2d != '' 
                             and a.tm > (now() - interval '06:00:00')
+
+                            -- When only the newer packets are wanted, those from a little before are still needed for the change rates
+                            and a.tm > to_timestamp(%s) - interval '00:10:00'
                             and fm.flightid = f.flightid
                             and f.active = 'y'
                             and a.callsign = fm.callsign
@@ -343,10 +357,14 @@ def getLatestPackets(dbconn = None, callsign = None, timezone = None, cutoff = 2
 
         # Execute the SQL statment and get all rows returned
         landingcur = dbconn.cursor()
-        landingcur.execute(latestpackets_sql, [ timezone, callsign.upper() ])
+        landingcur.execute(latestpackets_sql, [ timezone, since if since else 0, callsign.upper() ])
         rows = landingcur.fetchall()
         landingcur.close()
 
+        # Leave off the packets from before since that were only queried for the change rates
+        if since:
+            rows = [r for r in rows if r[11] > since]
+
         if len(rows) > 0:
             # If the last heard packet is > xx mins old, return zero rows....because we don't want to process a landing prediction for a flight that is over/stale/lost/etc.
             if rows[-1][7] > cutoff:
@@ -951,6 +969,177 @@ def getPredictFile(dbconn = None, flightid = None, launchsite = None, logger = N
         return np.array([])
 
 
+################################
+# Get a small "version" for the predict file loaded for a flight (the date of the predict file and its number of rows).  This is a lot cheaper
+# than getPredictFile and can be used to tell if the predict file has changed since it was last queried.
+def getPredictFileVersion(dbconn = None, flightid = None, launchsite = None, logger = None):
+
+    # if the flightid or the launchsite wasn't given, then return nothing
+    if not dbconn or not flightid or not launchsite:
+        return None
+
+    # if no logger was supplied then we create one
+    if logger == None:
+        logger = logging.getLogger(f"{__name__}.getPredictFileVersion")
+        logger.setLevel(logging.INFO)
+
+    # SQL to query the latest predict file date and row count for the flightid
+    version_sql = """
+        select
+        d.thedate,
+        count(*)
+
+        from
+        predictiondata d
+
+        where
+        d.flightid = %s
+        and d.launchsite = %s
+
+        group by
+        d.thedate
+
+        order by
+        d.thedate desc
+
+        limit 1;
+        """
+
+    try:
+
+        landingcur = dbconn.cursor()
+        landingcur.execute(version_sql, [ flightid, launchsite ])
+        rows = landingcur.fetchall()
+        landingcur.close()
+
+        if len(rows) > 0:
+            return (str(rows[0][0]), int(rows[0][1]))
+
+        return None
+
+    except pg.DatabaseError as error:
+        # If there was a connection/db error
+        landingcur.close()
+        logger.error(f"Database error: {error}")
+        return None
+
+
+################################
+# Encode a set of points as a PostGIS EWKB LINESTRING.  This is passed to the database as a binary parameter (i.e. ST_GeomFromEWKB) instead
+# of building up a 'LINESTRING(...)' text string, point by point.
+#
+# Arguments:
+#    lats:  (array) latitudes in decimal degrees
+#    lons:  (array) longitudes in decimal degrees
+#    srid:  (int) the spatial reference ID for the geometry
+#
+# Returns the EWKB bytes (wrapped for psycopg2) or None if there are fewer than two points.
+def makeLineString(lats = None, lons = None, srid = 4326):
+
+    if lats is None or lons is None:
+        return None
+
+    # x,y pairs are longitude, latitude
+    coords = np.column_stack((np.asarray(lons, dtype='float64'), np.asarray(lats, dtype='float64')))
+
+    # A linestring must have at least two points
+    if coords.shape[0] < 2:
+        return None
+
+    # EWKB header:  byte order (1 = little endian), geometry type (2 = LINESTRING) with the SRID flag set, the SRID, and the number of points
+    header = struct.pack('<BIII', 1, 0x20000002, srid, coords.shape[0])
+
+    return pg.Binary(header + coords.astype('<f8').tobytes())
+
+
+################################
+# Insert a batch of landing predictions into the landingpredictions table with a single statement and commit.
+#
+# Arguments:
+#    predictions:  (list) of tuples with these columns:
+#        flightid,
+#        callsign,
+#        thetype,
+#        coef_a,
+#        longitude,
+#        latitude,
+#        flightpath (EWKB from makeLineString or None),
+#        ttl (or None),
+#        patharray (list of [lat, lon, ttl, altitude] lists or None),
+#        winds (list or None)
+#
+# Returns True if the rows were written.
+def insertLandingPredictions(dbconn = None, predictions = None, logger = None):
+
+    # if there's nothing to insert then return
+    if not dbconn or not predictions:
+        return False
+
+    # if no logger was supplied then we create one
+    if logger == None:
+        logger = logging.getLogger(f"{__name__}.insertLandingPredictions")
+        logger.setLevel(logging.INFO)
+
+    # The SQL for inserting landing prediction records.  The values list is filled in by execute_values using the template for each row.
+    #
+    # Only the latest prediction for a beacon needs the full resolution path array (that's all the map displays use), so the path arrays 
+    # for prior predictions from any beacon with a new path array are cleared in the same statement.
+    landingprediction_sql = """
+        with newrows (flightid, callsign, thetype, coef_a, location2d, flightpath, ttl, patharray, winds) as (
+            values %s
+        ),
+        cleared as (
+            update landingpredictions l set 
+                patharray = NULL 
+
+            from 
+                newrows n 
+
+            where 
+                n.patharray is not null 
+                and l.patharray is not null 
+                and l.flightid = n.flightid 
+                and l.callsign = n.callsign 
+                and l.tm > now() - interval '01:00:00'
+        )
+        insert into landingpredictions (tm, flightid, callsign, thetype, coef_a, location2d, flightpath, ttl, patharray, winds) 
+        select 
+            now(), 
+            n.flightid, 
+            n.callsign, 
+            n.thetype, 
+            n.coef_a, 
+            n.location2d, 
+            n.flightpath, 
+            n.ttl, 
+            n.patharray, 
+            n.winds 
+
+        from 
+            newrows n;
+    """
+    landingprediction_template = """(%s::text, %s::text, %s::text, %s::numeric, ST_SetSRID(ST_MakePoint(%s, %s), 4326), ST_GeomFromEWKB(%s), %s::numeric, %s::numeric[], %s::numeric[])"""
+
+    try:
+
+        landingcur = dbconn.cursor()
+
+        # insert all rows at once
+        pg.extras.execute_values(landingcur, landingprediction_sql, predictions, template = landingprediction_template, page_size = len(predictions))
+        dbconn.commit()
+        landingcur.close()
+
+        logger.debug("Inserted %d landing prediction records" % len(predictions))
+
+        return True
+
+    except pg.DatabaseError as error:
+        # If there was a connection/db error
+        landingcur.close()
+        logger.error(f"Database error: {error}")
+        return False
+
+
 ##################################################
 # get the list of frequencies that we're supposed to listen too
 ##################################################
@@ -0,0 +1,203 @@
+##################################################
+#    This file is part of the HABTracker project for tracking high altitude balloons.
+#
+#    Copyright (C) 2019,2020,2021 Jeff Deaton (N6BA)
+#
+#    HABTracker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    HABTracker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with HABTracker.  If not, see <https://www.gnu.org/licenses/>.
+#
+##################################################
+
+import sys
+import time
+import math
+import logging
+import multiprocessing as mp
+from dataclasses import dataclass
+from logging.handlers import QueueHandler
+
+
+#####################################
+# The RadiusController Class
+#
+# Adjusts the radius (in km) of the APRS-IS range filter to the load the rest of the system can take.  Each time the filter is rebuilt
+# update() is given the number of packets accepted from the APRS-IS feed so far, the depth of the database queue, and the number of
+# packets the database queue has dropped so far.
+#
+# The feed is overloaded when the accepted packet rate is over maxrate, the queue is over the high water mark, or the queue dropped
+# packets.  Then the radius is cut right away:  since the number of stations goes with the area of the circle, it's scaled so the
+# rate would come down to maxrate (but by at least decrease, and never below minradius).  Once the feed has been quiet (the queue under
+# the low water mark, and the rate low enough that it would still be under maxrate with the bigger radius) for calm updates in a
+# row, the radius grows back by increase, up to maxradius (the configured radius).
+#
+# Only the range filter is adjusted.  The beacon, friend, station, and custom filters are always sent as they are.
+#####################################
+@dataclass
+class RadiusController(object):
+
+    # the radius (km) never goes outside these bounds.  It starts at maxradius.
+    minradius: float = 25.0
+    maxradius: float = 200.0
+
+    # the accepted packets/sec the feed should stay under
+    maxrate: float = 50.0
+
+    # the queue high and low water marks (as a fraction of the queue's maxsize)
+    highwater: float = 0.5
+    lowwater: float = 0.1
+
+    # the radius is multiplied by at most decrease when overloaded, and by increase when growing back
+    decrease: float = 0.7
+    increase: float = 1.2
+
+    # the number of quiet updates in a row before growing the radius back
+    calm: int = 3
+
+    # for logging the adjustments
+    name: str = "APRS-IS"
+    loggingqueue: mp.Queue = None
+
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        # setup logging
+        self.logger = logging.getLogger(f"{__name__}.{__class__}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+
+        # check if a logging queue was supplied
+        if self.loggingqueue is not None:
+            handler = QueueHandler(self.loggingqueue)
+            self.logger.addHandler(handler)
+
+        self.minradius = min(self.minradius, self.maxradius)
+        self.radius = round(self.maxradius)
+
+        # the counts from the last update
+        self.lastcount = None
+        self.lastdropped = None
+        self.lasttime = None
+
+        # the number of quiet updates in a row
+        self.quiet = 0
+
+        # the latest measurements:  accepted packets/sec, database queue depth and maxsize, and packets dropped since the update before
+        self.rate = 0.0
+        self.depth = 0
+        self.maxdepth = 0
+        self.dropped = 0
+
+        # the last few adjustments:  (time, old radius, new radius, rate, depth, dropped)
+        self.adjustments = []
+
+
+    ################################
+    # update the radius from the latest measurements, returning the radius (km) to use
+    #
+    # count:     the total number of packets accepted from the feed
+    # depth:     the number of packets on the database queue
+    # maxdepth:  the database queue's maxsize
+    # dropped:   the total number of packets the database queue has dropped
+    ################################
+    def update(self, count: int, depth: int, maxdepth: int, dropped: int = 0, now: float = None)->float:
+
+        if now is None:
+            now = time.monotonic()
+
+        # the first measurement is just the starting point
+        if self.lasttime is None or now <= self.lasttime:
+            self.lastcount, self.lastdropped, self.lasttime = count, dropped, now
+            return self.radius
+
+        rate = (count - self.lastcount) / (now - self.lasttime)
+        newdrops = max(dropped - self.lastdropped, 0)
+        fill = depth / maxdepth if maxdepth else 0.0
+        self.lastcount, self.lastdropped, self.lasttime = count, dropped, now
+        self.rate, self.depth, self.maxdepth, self.dropped = rate, depth, maxdepth, newdrops
+
+        radius = self.radius
+
+        if rate > self.maxrate or fill > self.highwater or newdrops:
+            # overloaded.  The rate goes with the area, so scale the radius by the square root of how far over we are.
+            self.quiet = 0
+            scale = math.sqrt(self.maxrate / rate) if rate > self.maxrate else 1.0
+            radius = max(radius * min(scale, self.decrease), self.minradius)
+
+        elif rate * self.increase ** 2 < self.maxrate and fill < self.lowwater:
+            # quiet, grow back once it's been quiet for a while
+            self.quiet += 1
+            if self.quiet >= self.calm:
+                self.quiet = 0
+                radius = min(radius * self.increase, self.maxradius)
+
+        else:
+            self.quiet = 0
+
+        radius = round(radius)
+        if radius != round(self.radius):
+            self.logger.info("%s filter radius %dkm -> %dkm:  %.1f packets/sec accepted, database queue %d/%d, %d packets dropped",
+                    self.name, round(self.radius), radius, rate, depth, maxdepth, newdrops)
+            self.adjustments = self.adjustments[-9:] + [(time.time(), round(self.radius), radius, rate, depth, newdrops)]
+
+        self.radius = radius
+        return self.radius
+
+
+    ################################
+    # the current radius (km) and the latest measurements it was adjusted for
+    ################################
+    def status(self)->dict:
+        return { "radius" : self.radius, "maxradius" : round(self.maxradius), "rate" : self.rate, "depth" : self.depth, "maxdepth" : self.maxdepth, "dropped" : self.dropped }
+
+
+
+##################################################
+# main
+#
+# Simulate an APRS-IS feed where the packet rate goes with the area of the filter circle, with a busy event part way through that
+# triples the density of stations, and a database writer that can keep up with 60 packets/sec.
+##################################################
+def main():
+
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    interval = 20.0
+
+    controller = RadiusController(minradius = 25, maxradius = 200, maxrate = 50)
+    controller.logger.addHandler(logging.StreamHandler(sys.stdout))
+
+    count = 0
+    depth = 0
+    dropped = 0
+    maxdepth = 250
+    capacity = 60.0
+
+    for i in range(updates):
+        # stations per square km, tripled during the event
+        density = 0.0006 * (3 if updates // 4 <= i < updates // 2 else 1)
+        rate = density * math.pi * controller.radius ** 2
+
+        # the packets accepted over this interval and what the database writer couldn't keep up with
+        count += int(rate * interval)
+        backlog = depth + (rate - capacity) * interval
+        dropped += int(max(backlog - maxdepth, 0))
+        depth = int(min(max(backlog, 0), maxdepth))
+
+        controller.update(count, depth, maxdepth, dropped, now = i * interval)
+        print(f"t={i * interval:>5.0f}s  density x{density / 0.0006:.0f}  rate {rate:6.1f}/s  queue {depth:>3}/{maxdepth}  dropped {dropped:>6}  radius {controller.radius:.0f}km")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,564 @@
+#!/usr/bin/python3
+##################################################
+#    This file is part of the HABTracker project for tracking high altitude balloons.
+#
+#    Copyright (C) 2019,2020,2021 Jeff Deaton (N6BA)
+#
+#    HABTracker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    HABTracker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with HABTracker.  If not, see <https://www.gnu.org/licenses/>.
+#
+##################################################
+
+##################################################
+# Replay a flight through the landing predictor
+#
+# This feeds a recorded (or synthetic) flight through the LandingPredictor in accelerated time against a throwaway database, then
+# reports how long each prediction cycle took (broken down by database queries, the prediction algorithms, and the insert of the
+# landing predictions) along with how far the predicted landings were from where the flight actually landed.
+#
+# A throwaway database is created (and dropped afterwards unless --keep is given) using the schema in sql/aprs-database.v2.sql, so
+# the database user needs the createdb privilege and PostGIS needs to be available.
+#
+# The recorded flight is a CSV file with a header row and these columns (a "raw" column is optional):
+#     time, callsign, latitude, longitude, altitude
+#
+# The time column can be either seconds or a timestamp.  Packets for a flight can be exported from the database with something like:
+#     \copy (select tm as time, callsign, ST_Y(location2d) as latitude, ST_X(location2d) as longitude, altitude, raw from packets
+#           where callsign in ('AE0SS-11', 'KC0D-2') and tm::date = '2021-06-12' and location2d != '' order by tm) to 'flight.csv' csv header
+#
+# Without a recording, a synthetic flight is generated from the launch site, burst altitude, ascent rate, and packet interval options.
+#
+# Time is accelerated by shifting the timestamps of everything already in the database back in time each cycle, so the predictor
+# (and its SQL queries that look relative to now()) see packets arriving with the same spacing as the recording.
+##################################################
+
+import os
+import sys
+import re
+import csv
+import json
+import math
+import time
+import datetime
+import inspect
+import logging
+import numpy as np
+import psycopg2 as pg
+from optparse import OptionParser
+from dataclasses import dataclass
+
+#import local configuration items
+import habconfig
+import queries
+import databasechecks
+import geodesy
+from landingpredictor import LandingPredictor
+
+
+##################################################
+# Command line options
+##################################################
+def argument_parser():
+    description = 'Replay a recorded or synthetic flight through the landing predictor and report latency and landing error'
+    parser = OptionParser(usage="%prog: [options] [flight.csv]", description=description)
+    parser.add_option(
+        "", "--launchsite", dest="launchsite", type="string", default=None,
+        help="Launch site as lat,lon,elevation(ft).  Defaults to the first packet of a recording, or Deer Trail for a synthetic flight.")
+    parser.add_option(
+        "", "--burst", dest="burst", type="float", default=90000,
+        help="Synthetic flight burst altitude in feet [default=%default]")
+    parser.add_option(
+        "", "--ascentrate", dest="ascentrate", type="float", default=1000,
+        help="Synthetic flight ascent rate in ft/min [default=%default]")
+    parser.add_option(
+        "", "--descentrate", dest="descentrate", type="float", default=20,
+        help="Synthetic flight descent rate at the launch site elevation in ft/s [default=%default]")
+    parser.add_option(
+        "", "--interval", dest="interval", type="float", default=60,
+        help="Synthetic flight seconds between packets [default=%default]")
+    parser.add_option(
+        "", "--callsign", dest="callsign", type="string", default="REPLAY-11",
+        help="Synthetic flight beacon callsign [default=%default]")
+    parser.add_option(
+        "", "--step", dest="step", type="float", default=5,
+        help="Simulated seconds between prediction cycles [default=%default]")
+    parser.add_option(
+        "", "--speedup", dest="speedup", type="float", default=0,
+        help="How much faster than real time to run, 0 for as fast as possible [default=%default]")
+    parser.add_option(
+        "", "--admindb", dest="admindb", type="string", default="dbname=postgres user=" + habconfig.dbUser + " password=" + habconfig.dbPassword,
+        help="Connection string used to create and drop the throwaway database")
+    parser.add_option(
+        "", "--dbname", dest="dbname", type="string", default=habconfig.dbName + "_replay_" + str(os.getpid()),
+        help="Name of the throwaway database [default=%default]")
+    parser.add_option(
+        "", "--keep", dest="keep", action="store_true", default=False,
+        help="Don't drop the throwaway database when finished")
+    parser.add_option(
+        "", "--dem", dest="dem", type="string", default=None,
+        help="Directory of DEM tiles to use for landing elevations")
+    parser.add_option(
+        "", "--pathtolerance", dest="pathtolerance", type="float", default=0.0,
+        help="Flight path simplification tolerance in meters [default=%default]")
+    parser.add_option(
+        "", "--json", dest="json", type="string", default=None,
+        help="Also write the results to this JSON file (for comparing runs)")
+    parser.add_option(
+        "", "--debug", dest="debug", action="store_true", default=False,
+        help="Log the predictor's debug messages")
+    return parser
+
+
+##################################################
+# Format a lat/lon as an APRS uncompressed position (ex. 3936.60N/10402.52W)
+##################################################
+def aprsPosition(lat, lon, symbol = "/O"):
+    latdeg = int(abs(lat))
+    londeg = int(abs(lon))
+    return "%02d%05.2f%s%s%03d%05.2f%s%s" % (
+            latdeg, (abs(lat) - latdeg) * 60, "N" if lat >= 0 else "S",
+            symbol[0],
+            londeg, (abs(lon) - londeg) * 60, "E" if lon >= 0 else "W",
+            symbol[1])
+
+
+##################################################
+# Create the packets for a synthetic flight
+#
+# The flight ascends at a constant rate to the burst altitude, then descends under a parachute whose descent rate increases with
+# the thinner air aloft.  Winds blow from the west, peaking at the jet stream, with a light southerly component.
+#
+# Returns a list of packets (secs, callsign, lat, lon, altitude, raw).  The last packet is the landing.
+##################################################
+def syntheticFlight(options, launch_lat, launch_lon, launch_elev):
+
+    lat = launch_lat
+    lon = launch_lon
+    alt = launch_elev
+    secs = 0.0
+    ascending = True
+    packets = []
+    next_packet = 0.0
+
+    while True:
+
+        # Send a packet every so often
+        if secs >= next_packet:
+            raw = "%s>APRS,WIDE2-1:!%s000/000/A=%06d" % (options.callsign, aprsPosition(lat, lon), round(alt))
+            packets.append((secs, options.callsign, lat, lon, alt, raw))
+            next_packet += options.interval
+
+        # Wind speed in mph:  from the west peaking at 35,000ft, with a light wind from the south
+        east_mph = 10 + 50 * math.exp(-((alt - 35000) / 12000) ** 2)
+        north_mph = 5
+        dlat, dlon = geodesy.feetToDegrees(north_mph * 5280 / 3600, east_mph * 5280 / 3600, lat)
+        lat += dlat
+        lon += dlon
+
+        # Vertical movement over this one second
+        if ascending:
+            alt += options.ascentrate / 60
+            if alt >= options.burst:
+                ascending = False
+        else:
+            alt -= options.descentrate * math.exp((alt - launch_elev) / 54000)
+
+        secs += 1
+
+        # Touchdown
+        if not ascending and alt <= launch_elev:
+            alt = launch_elev
+            raw = "%s>APRS,WIDE2-1:!%s000/000/A=%06d" % (options.callsign, aprsPosition(lat, lon), round(alt))
+            packets.append((secs, options.callsign, lat, lon, alt, raw))
+            break
+
+    return packets
+
+
+##################################################
+# Read the packets for a recorded flight from a CSV file
+#
+# Returns a list of packets (secs, callsign, lat, lon, altitude, raw) sorted by time
+##################################################
+def loadRecording(filename):
+
+    packets = []
+    with open(filename, newline = "") as csvfile:
+        for row in csv.DictReader(csvfile):
+            try:
+                secs = float(row["time"])
+            except ValueError:
+                secs = datetime.datetime.fromisoformat(row["time"]).timestamp()
+
+            callsign = row["callsign"].upper()
+            lat = float(row["latitude"])
+            lon = float(row["longitude"])
+            alt = float(row["altitude"])
+
+            # The timestamp within a packet would no longer match when it's replayed, so it's replaced with a plain position
+            raw = row.get("raw") or "%s>APRS:!%s000/000/A=%06d" % (callsign, aprsPosition(lat, lon), round(alt))
+            raw = re.sub(r"[/@*][0-9]{6}[hz/]", "!", raw, count = 1)
+
+            packets.append((secs, callsign, lat, lon, alt, raw))
+
+    packets.sort(key = lambda p: p[0])
+
+    # Times are relative to the first packet
+    return [(p[0] - packets[0][0],) + p[1:] for p in packets] if len(packets) > 0 else []
+
+
+##################################################
+# Create the throwaway database
+##################################################
+def createDatabase(options):
+
+    if options.dbname == habconfig.dbName:
+        raise ValueError(f"Refusing to replay into the live database, {habconfig.dbName}")
+
+    adminconn = pg.connect(options.admindb)
+    adminconn.set_session(autocommit=True)
+    admincur = adminconn.cursor()
+    admincur.execute("create database " + options.dbname + ";")
+    admincur.close()
+    adminconn.close()
+
+
+##################################################
+# Load the schema and the flight into the throwaway database
+##################################################
+def loadDatabase(options, launchsite, callsigns, logger):
+
+    dbstring = "dbname=" + options.dbname + " user=" + habconfig.dbUser + " password=" + habconfig.dbPassword
+
+    # Load the schema and bring it up to date the same way the daemon does at startup
+    dbconn = pg.connect(dbstring)
+    dbconn.set_session(autocommit=True)
+    dbcur = dbconn.cursor()
+    dbcur.execute("create extension if not exists postgis;")
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sql", "aprs-database.v2.sql")) as schema:
+        dbcur.execute(schema.read())
+    databasechecks.databaseUpdates(logger, dbstring)
+
+    # No GPS position, so the landing elevation doesn't depend on where this computer is
+    dbcur.execute("delete from gpsposition;")
+
+    # The flight and its beacons
+    dbcur.execute("insert into launchsites values ('Replay', %s, %s, %s);", launchsite)
+    dbcur.execute("insert into flights values ('REPLAY', 'Landing predictor replay', now()::date, 't', 'Replay');")
+    for callsign in callsigns:
+        dbcur.execute("insert into flightmap values ('REPLAY', %s, 'replay', 144.39);", [ callsign ])
+
+    dbcur.close()
+
+    return dbstring, dbconn
+
+
+##################################################
+# Drop the throwaway database
+##################################################
+def dropDatabase(options):
+    adminconn = pg.connect(options.admindb)
+    adminconn.set_session(autocommit=True)
+    admincur = adminconn.cursor()
+    admincur.execute("drop database if exists " + options.dbname + ";")
+    admincur.close()
+    adminconn.close()
+
+
+##################################################
+# Add a packet to the database that was heard this many seconds ago
+##################################################
+def insertPacket(dbconn, packet, age):
+    secs, callsign, lat, lon, alt, raw = packet
+
+    dbcur = dbconn.cursor()
+    dbcur.execute("""insert into packets (tm, source, channel, frequency, callsign, symbol, speed_mph, bearing, altitude, comment, location2d, location3d, raw, ptype, hash) values (
+        now() - make_interval(secs => %s),
+        'replay',
+        0,
+        144.39,
+        %s,
+        '/O',
+        0,
+        0,
+        %s,
+        '',
+        ST_SetSRID(ST_MakePoint(%s, %s), 4326),
+        ST_SetSRID(ST_MakePoint(%s, %s, %s), 4326),
+        %s,
+        '!',
+        md5(%s)
+        );""", [ age, callsign, alt, lon, lat, lon, lat, alt, raw, raw + str(secs) ])
+    dbcur.close()
+
+
+##################################################
+# Move everything in the database back in time.  This is how time is accelerated.
+##################################################
+def shiftTime(dbconn, seconds):
+    dbcur = dbconn.cursor()
+    dbcur.execute("update packets set tm = tm - make_interval(secs => %s);", [ seconds ])
+    dbcur.execute("update landingpredictions set tm = tm - make_interval(secs => %s);", [ seconds ])
+    dbcur.close()
+
+
+##################################################
+# The latest landing prediction for a beacon:  type, lat, lon, ttl (secs)
+##################################################
+def latestPrediction(dbconn, callsign):
+    dbcur = dbconn.cursor()
+    dbcur.execute("""select l.thetype, ST_Y(l.location2d), ST_X(l.location2d), l.ttl
+        from landingpredictions l
+        where l.callsign = %s
+        order by l.tm desc, case when l.thetype in ('predicted', 'wind_adjusted') then 0 when l.thetype = 'cutdown' then 1 else 2 end
+        limit 1;""", [ callsign ])
+    rows = dbcur.fetchall()
+    dbcur.close()
+
+    return rows[0] if len(rows) > 0 else None
+
+
+#####################################
+# The CycleTimer Class
+#
+# Accumulates the time spent in each category of work during a prediction cycle by wrapping the functions that do that work.
+#####################################
+@dataclass
+class CycleTimer(object):
+
+    def __post_init__(self)->None:
+        self.current = { "query" : 0.0, "algorithm" : 0.0, "insert" : 0.0 }
+
+    def reset(self):
+        for key in self.current:
+            self.current[key] = 0.0
+
+    def wrap(self, category, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.current[category] += time.perf_counter() - start
+        return timed
+
+
+##################################################
+# Percentile summary (in milliseconds) of a list of durations (in seconds)
+##################################################
+def summarize(values):
+    if len(values) == 0:
+        return None
+
+    v = np.array(values) * 1000
+    return { "mean" : float(np.mean(v)), "p50" : float(np.percentile(v, 50)), "p95" : float(np.percentile(v, 95)), "max" : float(np.max(v)) }
+
+
+##################################################
+# main function
+##################################################
+def main():
+
+    options, args = argument_parser().parse_args()
+
+    logging.basicConfig(format = "%(asctime)s %(levelname)s %(name)s: %(message)s")
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+
+    # The flight to replay
+    if len(args) > 0:
+        packets = loadRecording(args[0])
+        if len(packets) == 0:
+            print(f"No packets in {args[0]}")
+            sys.exit(1)
+        launchsite = [packets[0][2], packets[0][3], packets[0][4]]
+    else:
+        launchsite = [39.610, -104.042, 5200]
+
+    if options.launchsite:
+        launchsite = [float(v) for v in options.launchsite.split(",")]
+
+    if len(args) == 0:
+        packets = syntheticFlight(options, launchsite[0], launchsite[1], launchsite[2])
+
+    # Each beacon's actual landing is its last packet, and the flight starts descending after its highest packet
+    callsigns = sorted(set(p[1] for p in packets))
+    landings = {}
+    bursts = {}
+    for callsign in callsigns:
+        beacon = [p for p in packets if p[1] == callsign]
+        landings[callsign] = beacon[-1]
+        bursts[callsign] = max(beacon, key = lambda p: p[4])[0]
+        if beacon[-1][4] > launchsite[2] + 3000:
+            logger.warning(f"Last packet from {callsign} is at {beacon[-1][4]:.0f}ft, using it as the landing anyway.")
+
+    print(f"Replaying {len(packets)} packets from {', '.join(callsigns)} over {packets[-1][0] / 60:.1f} mins, launch site: {launchsite}")
+
+    dbconn = None
+    lp = None
+    created = False
+    try:
+        createDatabase(options)
+        created = True
+        dbstring, dbconn = loadDatabase(options, launchsite, callsigns, logger)
+
+        lp = LandingPredictor(
+                dbstring = dbstring,
+                timeout = 20,
+                pathtolerance = options.pathtolerance,
+                demdirectory = options.dem
+                )
+        if options.debug:
+            lp.logger.setLevel(logging.DEBUG)
+            lp.logger.propagate = True
+
+        # Beacons are scheduled by the simulated time of the replay
+        clock = { "sim" : 0.0 }
+        lp.clock = lambda: clock["sim"]
+
+        # Time the database queries, prediction algorithms, and the inserts
+        timer = CycleTimer()
+        for name, func in inspect.getmembers(queries, inspect.isfunction):
+            if func.__module__ == queries.__name__ and name not in ("makeLineString", "connectToDatabase", "test_queries"):
+                setattr(queries, name, timer.wrap("insert" if name.startswith("insert") else "query", func))
+        lp.predictionAlgo = timer.wrap("algorithm", lp.predictionAlgo)
+        lp.predictionAlgoCutdown = timer.wrap("algorithm", lp.predictionAlgoCutdown)
+
+        cycles = []
+        errors = []
+        idx = 0
+        sim = -options.step
+        end = packets[-1][0] + options.step
+        lastreal = time.monotonic()
+
+        while sim < end:
+            sim += options.step
+            clock["sim"] = sim
+
+            # Age everything in the database by the simulated time (less the real time that's already passed)
+            real = time.monotonic()
+            shiftTime(dbconn, options.step - (real - lastreal))
+            lastreal = real
+
+            # The packets that would have been heard by now
+            while idx < len(packets) and packets[idx][0] <= sim:
+                insertPacket(dbconn, packets[idx], sim - packets[idx][0])
+                idx += 1
+
+            # Run a prediction cycle
+            timer.reset()
+            start = time.perf_counter()
+            lp.processPredictions()
+            total = time.perf_counter() - start
+
+            cycle = dict(timer.current)
+            cycle["total"] = total
+            cycle["other"] = max(0.0, total - sum(timer.current.values()))
+            cycle["sim"] = sim
+            cycle["phase"] = "descent" if any(sim > bursts[c] for c in callsigns) else "ascent"
+            cycles.append(cycle)
+
+            # How far off the latest landing prediction is for each beacon
+            for callsign in callsigns:
+                landing = landings[callsign]
+                if sim > landing[0]:
+                    continue
+
+                prediction = latestPrediction(dbconn, callsign)
+                if prediction is None:
+                    continue
+
+                thetype, lat, lon, ttl = prediction
+                errors.append({
+                    "callsign" : callsign,
+                    "sim" : sim,
+                    "mins_to_landing" : (landing[0] - sim) / 60,
+                    "type" : thetype,
+                    "error_miles" : lp.distance(float(lat), float(lon), landing[2], landing[3]),
+                    "ttl_error_mins" : (float(ttl) - (landing[0] - sim)) / 60 if ttl is not None else None
+                    })
+
+            if options.speedup > 0:
+                time.sleep(max(0.0, options.step / options.speedup - (time.monotonic() - real)))
+
+
+        ####################################
+        # Report
+        ####################################
+        results = { "cycles" : len(cycles), "latency" : {}, "errors" : {} }
+
+        print(f"\nPrediction cycle latency (ms) over {len(cycles)} cycles:")
+        print("%-10s %-10s %10s %10s %10s %10s" % ("phase", "category", "mean", "p50", "p95", "max"))
+        for phase in ("ascent", "descent", "all"):
+            results["latency"][phase] = {}
+            for category in ("query", "algorithm", "insert", "other", "total"):
+                stats = summarize([c[category] for c in cycles if phase == "all" or c["phase"] == phase])
+                if stats is None:
+                    continue
+                results["latency"][phase][category] = stats
+                print("%-10s %-10s %10.2f %10.2f %10.2f %10.2f" % (phase, category, stats["mean"], stats["p50"], stats["p95"], stats["max"]))
+
+        schedstats = lp.getScheduleStats()
+        results["scheduler"] = schedstats
+        print(f"\nScheduler:  beacons processed: {schedstats['processed']}, overruns: cpu={schedstats['cpu_overruns']} db={schedstats['db_overruns']}, deferred: {schedstats['deferred']}, late: {schedstats['late']}")
+
+        # The prediction error at a few points before landing
+        checkpoints = [ 90, 60, 45, 30, 20, 15, 10, 5, 2 ]
+        for callsign in callsigns:
+            beacon = [e for e in errors if e["callsign"] == callsign]
+            results["errors"][callsign] = {}
+            print(f"\nLanding prediction error for {callsign}, actual landing: {landings[callsign][2]:.5f}, {landings[callsign][3]:.5f}")
+            if len(beacon) == 0:
+                print("    no predictions")
+                continue
+
+            print("%12s %-14s %12s %14s" % ("mins to land", "type", "error (mi)", "ttl error (min)"))
+            for minutes in checkpoints:
+                matches = [e for e in beacon if e["mins_to_landing"] <= minutes]
+                if len(matches) == 0:
+                    continue
+                e = matches[0]
+                results["errors"][callsign][str(minutes)] = e
+                print("%12.1f %-14s %12.2f %14s" % (e["mins_to_landing"], e["type"], e["error_miles"], "%.1f" % e["ttl_error_mins"] if e["ttl_error_mins"] is not None else "-"))
+
+            descent = [e["error_miles"] for e in beacon if e["sim"] > bursts[callsign]]
+            if len(descent) > 0:
+                results["errors"][callsign]["descent_mean_miles"] = float(np.mean(descent))
+                print(f"    mean error during descent: {np.mean(descent):.2f} mi over {len(descent)} cycles")
+
+        if options.json:
+            with open(options.json, "w") as jsonfile:
+                json.dump(results, jsonfile, indent = 4)
+            print(f"\nResults written to {options.json}")
+
+    except (pg.DatabaseError, ValueError) as error:
+        logger.error(f"Replay failed: {error}")
+
+    except KeyboardInterrupt:
+        logger.info("Interrupted.")
+
+    finally:
+        if lp is not None and isinstance(lp.landingconn, pg.extensions.connection):
+            lp.landingconn.close()
+
+        if dbconn is not None:
+            dbconn.close()
+
+        if created and not options.keep:
+            dropDatabase(options)
+        elif created:
+            print(f"Kept database {options.dbname}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+##################################################
+#    This file is part of the HABTracker project for tracking high altitude balloons.
+#
+#    Copyright (C) 2019,2020,2021 Jeff Deaton (N6BA)
+#
+#    HABTracker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    HABTracker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with HABTracker.  If not, see <https://www.gnu.org/licenses/>.
+#
+##################################################
+
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import pickle
+import struct
+import time
+import sys
+from queue import Empty, Full
+
+
+# The header at the start of the shared memory block:  head (total bytes written), tail (total bytes read), records written, records read
+HEADER = struct.Struct("=QQQQ")
+
+# Each record is a 4 byte length followed by the record itself.  A length of WRAP means the rest of the buffer is unused and the next
+# record starts back at the beginning.
+LENGTH = struct.Struct("=I")
+WRAP = 0xFFFFFFFF
+
+
+#####################################
+# The RingBuffer Class
+#
+# A multiple producer, single consumer queue in a multiprocessing.shared_memory block.  It's a drop-in for an mp.Queue (put, put_nowait,
+# get, get_nowait, qsize, empty) with put_many and get_many for batches.
+#
+# An mp.Queue sends every object through a feeder thread and a pipe.  Here a put copies the encoded object straight into shared memory
+# and a get copies it straight back out, so there's no feeder thread, no pipe, and no system call unless the consumer is asleep
+# waiting for something to arrive.
+#
+# Objects are pickled by default.  Pass encode/decode functions (bytes in, bytes out) for a more compact format.
+#
+# The buffer must be created before the processes using it are started (it's inherited through fork).  The process that created it
+# should call unlink() once everything is done with it.
+#####################################
+class RingBuffer(object):
+
+    def __init__(self, size: int = 4194304, encode: callable = None, decode: callable = None)->None:
+
+        # the number of bytes available for records
+        self.size = size
+
+        # encoder and decoder for the objects stored
+        self.encode = encode if encode else lambda obj: pickle.dumps(obj, protocol = pickle.HIGHEST_PROTOCOL)
+        self.decode = decode if decode else pickle.loads
+
+        self.shm = shared_memory.SharedMemory(create = True, size = HEADER.size + size)
+        self.buf = self.shm.buf
+        HEADER.pack_into(self.buf, 0, 0, 0, 0, 0)
+
+        # held by producers while adding records and by the consumer while updating the header
+        self.lock = mp.Lock()
+
+        # set when a record is added to an empty buffer, so a consumer waiting on an empty buffer wakes up
+        self.notempty = mp.Event()
+
+        # records refused because the buffer was full
+        self.dropped = mp.Value('Q', 0, lock = False)
+
+
+    ################################
+    # the name of the shared memory block
+    ################################
+    @property
+    def name(self)->str:
+        return self.shm.name
+
+
+    ################################
+    # write encoded records into the buffer.  Returns the number written (records that don't fit are left off).
+    ################################
+    def write(self, records: list)->int:
+
+        written = 0
+        base = HEADER.size
+        size = self.size
+        buf = self.buf
+
+        with self.lock:
+            head, tail, puts, gets = HEADER.unpack_from(buf, 0)
+            wasempty = head == tail
+
+            for data in records:
+                n = len(data)
+                offset = head % size
+
+                # the record plus its length (and a wrap marker, if the record won't fit before the end of the buffer) has to fit
+                # in the free space
+                needed = LENGTH.size + n
+                skip = size - offset if size - offset < needed else 0
+                if (head - tail) + skip + needed > size:
+                    break
+
+                if skip:
+                    # when there isn't even room for a wrap marker, the reader skips to the start on its own
+                    if skip >= LENGTH.size:
+                        LENGTH.pack_into(buf, base + offset, WRAP)
+                    head += skip
+                    offset = 0
+
+                LENGTH.pack_into(buf, base + offset, n)
+                buf[base + offset + LENGTH.size:base + offset + needed] = data
+                head += needed
+                written += 1
+
+            HEADER.pack_into(buf, 0, head, tail, puts + written, gets)
+            self.dropped.value += len(records) - written
+
+        # wake up a consumer that's waiting on an empty buffer
+        if wasempty and written:
+            self.notempty.set()
+
+        return written
+
+
+    ################################
+    # read up to maxcount encoded records from the buffer.  Only the (single) consumer calls this.
+    ################################
+    def read(self, maxcount: int)->list:
+
+        base = HEADER.size
+        size = self.size
+        buf = self.buf
+
+        with self.lock:
+            head, tail, puts, gets = HEADER.unpack_from(buf, 0)
+
+        records = []
+        while tail < head and len(records) < maxcount:
+            offset = tail % size
+
+            # too close to the end for a length, or a wrap marker, means the next record is at the start of the buffer
+            if size - offset < LENGTH.size:
+                tail += size - offset
+                continue
+
+            n = LENGTH.unpack_from(buf, base + offset)[0]
+            if n == WRAP:
+                tail += size - offset
+                continue
+
+            start = base + offset + LENGTH.size
+            records.append(bytes(buf[start:start + n]))
+            tail += LENGTH.size + n
+
+        # the consumer owns the tail, but the producers read it, so it's updated under the lock
+        with self.lock:
+            head, oldtail, puts, gets = HEADER.unpack_from(buf, 0)
+            HEADER.pack_into(buf, 0, head, tail, puts, gets + len(records))
+
+        return records
+
+
+    ################################
+    # throw away the next n records without copying or decoding them, waiting up to timeout seconds for any that haven't been written
+    # yet.  Only the (single) consumer calls this.  Returns the number thrown away.
+    ################################
+    def discard(self, n: int, timeout: float = None)->int:
+
+        base = HEADER.size
+        size = self.size
+        buf = self.buf
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        discarded = 0
+
+        while discarded < n:
+            with self.lock:
+                head, tail, puts, gets = HEADER.unpack_from(buf, 0)
+
+            # step the tail over each record by its length
+            count = 0
+            while tail < head and discarded + count < n:
+                offset = tail % size
+
+                if size - offset < LENGTH.size:
+                    tail += size - offset
+                    continue
+
+                length = LENGTH.unpack_from(buf, base + offset)[0]
+                if length == WRAP:
+                    tail += size - offset
+                    continue
+
+                tail += LENGTH.size + length
+                count += 1
+
+            with self.lock:
+                head, oldtail, puts, gets = HEADER.unpack_from(buf, 0)
+                HEADER.pack_into(buf, 0, head, tail, puts, gets + count)
+
+            discarded += count
+
+            # the rest haven't been written yet
+            if discarded < n and not self.wait(max(deadline - time.monotonic(), 0) if deadline is not None else None):
+                break
+
+        return discarded
+
+
+    ################################
+    # wait until there's something to read.  Returns False if the timeout passed first.
+    ################################
+    def wait(self, timeout: float = None)->bool:
+
+        if not self.empty():
+            return True
+
+        # clear the flag, then check again in case a record was added just before it was cleared
+        self.notempty.clear()
+        if not self.empty():
+            return True
+
+        return self.notempty.wait(timeout) and not self.empty()
+
+
+    ################################
+    # add an object.  Raises Full if there isn't room (a put never waits for room, the block and timeout arguments are for compatibility).
+    ################################
+    def put(self, obj, block: bool = True, timeout: float = None)->None:
+        if self.write([self.encode(obj)]) == 0:
+            raise Full
+
+
+    def put_nowait(self, obj)->None:
+        self.put(obj, block = False)
+
+
+    ################################
+    # add a list of objects.  Returns the number added (any that don't fit are dropped).
+    ################################
+    def put_many(self, objs: list)->int:
+        return self.write([self.encode(obj) for obj in objs])
+
+
+    ################################
+    # remove and return an object.  Raises Empty if there isn't one (after waiting up to timeout seconds, if blocking).
+    ################################
+    def get(self, block: bool = True, timeout: float = None):
+
+        records = self.read(1)
+        if not records and block and self.wait(timeout):
+            records = self.read(1)
+
+        if not records:
+            raise Empty
+
+        return self.decode(records[0])
+
+
+    def get_nowait(self):
+        return self.get(block = False)
+
+
+    ################################
+    # remove and return up to maxcount objects, waiting up to timeout seconds for the first one.  Returns an empty list if there weren't any.
+    ################################
+    def get_many(self, maxcount: int = 1000, timeout: float = 0)->list:
+
+        records = self.read(maxcount)
+        if not records and timeout and self.wait(timeout):
+            records = self.read(maxcount)
+
+        return [self.decode(r) for r in records]
+
+
+    ################################
+    # the number of objects in the buffer
+    ################################
+    def qsize(self)->int:
+        head, tail, puts, gets = HEADER.unpack_from(self.buf, 0)
+        return puts - gets
+
+
+    def empty(self)->bool:
+        head, tail, puts, gets = HEADER.unpack_from(self.buf, 0)
+        return head == tail
+
+
+    def full(self)->bool:
+        head, tail, puts, gets = HEADER.unpack_from(self.buf, 0)
+        return head - tail >= self.size
+
+
+    ################################
+    # detach from the shared memory block.  unlink() also frees it (only the creating process should unlink).
+    ################################
+    def close(self)->None:
+        self.buf = None
+        self.shm.close()
+
+
+    def unlink(self)->None:
+        self.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+
+##################################################
+# main
+#
+# Throughput and latency of a RingBuffer compared with an mp.Queue, passing Packet objects from producer processes to this process.
+##################################################
+def main():
+
+    from packet import Packet
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    producers = 2
+
+    def makePacket(i):
+        return Packet(text = f"KC0D-1>APRS,TCPIP*,qAC,T2USANE:@011912z3946.24N/10459.04W_270/004g008t061r000p000P000h24b10152L548.WD {i}",
+                frequency = 144390000, source = "benchmark",
+                properties = { "source" : "KC0D-1", "destination" : "APRS", "digipeaters" : ["TCPIP*", "qAC", "T2USANE"],
+                    "information" : b"@011912z3946.24N/10459.04W_270/004", "decode_time" : int(time.time()), "sent" : 0.0 })
+
+    def producer(q, n, batch):
+        packets = [makePacket(i) for i in range(n)]
+        if batch:
+            for i in range(0, n, 100):
+                chunk = packets[i:i + 100]
+                for p in chunk:
+                    p.properties["sent"] = time.perf_counter()
+                while chunk:
+                    chunk = chunk[q.put_many(chunk):]
+                    if chunk:
+                        # the buffer filled up, only an issue for this benchmark
+                        time.sleep(0.001)
+        else:
+            for p in packets:
+                p.properties["sent"] = time.perf_counter()
+                while True:
+                    try:
+                        q.put(p)
+                        break
+                    except Full:
+                        time.sleep(0.001)
+
+    def consume(q, total, batch):
+        latencies = []
+        while len(latencies) < total:
+            if batch:
+                got = q.get_many(1000, timeout = 5)
+            else:
+                got = [q.get(timeout = 5)]
+            now = time.perf_counter()
+            latencies.extend(now - p.properties["sent"] for p in got)
+        return sorted(latencies)
+
+    def bench(name, q, batch = False):
+        procs = [mp.Process(target = producer, args = (q, count // producers, batch)) for i in range(producers)]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+        lat = consume(q, (count // producers) * producers, batch)
+        secs = time.perf_counter() - start
+        for p in procs:
+            p.join()
+        print(f"{name:>22}:  {len(lat) / secs:>9.0f} packets/sec, latency median {lat[len(lat)//2] * 1e6:.0f}us, p99 {lat[int(len(lat) * .99)] * 1e6:.0f}us")
+
+    # Trickle a packet through at a time to measure latency when the consumer is waiting on an empty queue
+    def trickle(name, q):
+        def slowproducer(q):
+            for i in range(200):
+                time.sleep(0.002)
+                p = makePacket(i)
+                p.properties["sent"] = time.perf_counter()
+                q.put(p)
+        proc = mp.Process(target = slowproducer, args = (q,))
+        proc.start()
+        lat = consume(q, 200, False)
+        proc.join()
+        print(f"{name:>22}:  idle wakeup latency median {lat[len(lat)//2] * 1e6:.0f}us, p99 {lat[int(len(lat) * .99)] * 1e6:.0f}us")
+
+    print(f"{count} packets from {producers} producer processes")
+
+    bench("mp.Queue", mp.Queue())
+
+    ring = RingBuffer()
+    bench("RingBuffer", ring)
+    bench("RingBuffer (batches)", ring, batch = True)
+
+    trickle("mp.Queue", mp.Queue())
+    trickle("RingBuffer", ring)
+    ring.unlink()
+
+
+if __name__ == "__main__":
+    mp.set_start_method("fork")
+    main()
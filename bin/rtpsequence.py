@@ -0,0 +1,217 @@
+##################################################
+#    This file is part of the HABTracker project for tracking high altitude balloons.
+#
+#    Copyright (C) 2019,2020,2021 Jeff Deaton (N6BA)
+#
+#    HABTracker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    HABTracker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with HABTracker.  If not, see <https://www.gnu.org/licenses/>.
+#
+##################################################
+
+import sys
+import time
+import socket
+import struct
+from dataclasses import dataclass
+
+
+# the per source counters kept by the SequenceTracker (indexes into each source's list)
+NEXT = 0
+RECEIVED = 1
+LOST = 2
+LATE = 3
+RESTARTS = 4
+MISSING = 5
+
+
+#####################################
+# The SequenceTracker Class
+#
+# Keeps track of the RTP sequence numbers from each source (ssrc) to measure the packets lost between ka9q-radio and us.  ka9q-radio
+# uses a separate ssrc for each frequency (the ssrc is the frequency in kHz), so this is a count for each frequency being listened to.
+#
+# A jump forward in the sequence numbers counts the skipped packets as lost.  A packet from behind the expected sequence number is late
+# (reordered or duplicated).  If it's one of the skipped packets (they're remembered as far back as maxmisorder) it takes one back off of
+# the lost count, otherwise it's a duplicate and the lost count is left alone.  A jump of more than maxdropout packets ahead, or maxmisorder
+# behind, is taken to mean the source restarted and it's counted from scratch (this is the same approach as RFC 3550, appendix A.1).
+#####################################
+@dataclass
+class SequenceTracker(object):
+
+    # the largest jump forward that's still counted as lost packets
+    maxdropout: int = 3000
+
+    # the furthest behind that a packet is still counted as late
+    maxmisorder: int = 100
+
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        # the counters for each source:  ssrc -> [next sequence number, received, lost, late, restarts, the skipped sequence numbers]
+        self.sources = {}
+
+
+    ################################
+    # record the sequence number of a packet from a source
+    ################################
+    def update(self, ssrc: int, sequence: int)->None:
+
+        counters = self.sources.get(ssrc)
+        if counters is None:
+            self.sources[ssrc] = [(sequence + 1) & 0xffff, 1, 0, 0, 0, set()]
+            return
+
+        counters[RECEIVED] += 1
+        delta = (sequence - counters[NEXT]) & 0xffff
+
+        if delta == 0:
+            # the packet we expected
+            counters[NEXT] = (sequence + 1) & 0xffff
+
+        elif delta <= self.maxdropout:
+            # some packets were skipped.  Those that could still arrive late are remembered, and any too far behind now are forgotten.
+            counters[LOST] += delta
+            expected = (sequence + 1) & 0xffff
+            missing = counters[MISSING]
+            missing.update((sequence - i) & 0xffff for i in range(1, min(delta, self.maxmisorder) + 1))
+            missing.difference_update([s for s in missing if (expected - s) & 0xffff > self.maxmisorder])
+            counters[NEXT] = expected
+
+        elif 0x10000 - delta <= self.maxmisorder:
+            # a late (reordered or duplicated) packet.  Only a skipped packet was counted as lost.
+            counters[LATE] += 1
+            if sequence in counters[MISSING]:
+                counters[MISSING].discard(sequence)
+                counters[LOST] -= 1
+
+        else:
+            # too big a jump to be lost packets, the source must have restarted
+            counters[RESTARTS] += 1
+            counters[NEXT] = (sequence + 1) & 0xffff
+            counters[MISSING].clear()
+
+
+    ################################
+    # the counts for each source
+    ################################
+    def stats(self)->dict:
+        return { ssrc : { "received" : c[RECEIVED], "lost" : c[LOST], "late" : c[LATE], "restarts" : c[RESTARTS] } for ssrc, c in self.sources.items() }
+
+
+    ################################
+    # the total number of packets received and lost across all sources
+    ################################
+    def totals(self)->tuple:
+        return (sum(c[RECEIVED] for c in self.sources.values()), sum(c[LOST] for c in self.sources.values()))
+
+
+    ################################
+    # a one line summary of the sources with lost packets (the ssrc is shown as a frequency, as that's what ka9q-radio uses it for)
+    ################################
+    def summary(self)->str:
+
+        parts = []
+        for ssrc, c in sorted(self.sources.items()):
+            if c[LOST] or c[LATE] or c[RESTARTS]:
+                expected = c[RECEIVED] + c[LOST]
+                parts.append(f"{ssrc / 1000.0:.3f}MHz {c[LOST]} lost of {expected} ({c[LOST] / expected * 100.0:.2f}%), {c[LATE]} late, {c[RESTARTS]} restarts")
+
+        received, lost = self.totals()
+        return f"{received} RTP packets received, {lost} lost" + (":  " + ", ".join(parts) if parts else "")
+
+
+
+##################################################
+# main
+#
+# Benchmark the RTP receive path:  the recv() into a new bytes object plus the parse_RTP() dictionary that RTPStream used, against a
+# recv_into() a preallocated buffer plus parse_RTP_header() on a memoryview.  Datagrams are sent over a local UDP socket, a few are
+# dropped along the way to check the sequence accounting.
+##################################################
+def main():
+
+    import decoders
+    import ax25codec
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    # an RTP packet carrying an AX.25 frame, as ka9q-radio sends them
+    frame = bytes.fromhex(ax25codec.GOLDEN_RTP_AX25[0][0])
+    def rtp(sequence, ssrc):
+        return struct.pack("!BBHII", 0x80, 96, sequence & 0xffff, sequence * 160, ssrc) + frame
+
+    ssrcs = (144390, 145825)
+    datagrams = [rtp(i // 2, ssrcs[i % 2]) for i in range(count)]
+
+    # drop every 1000th packet from the first frequency
+    sent = [d for i, d in enumerate(datagrams) if not (i % 1000 == 0 and i % 2 == 0 and i > 0)]
+
+    def run(name, receive):
+        rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        rx.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8388608)
+        rx.bind(("127.0.0.1", 0))
+        rx.settimeout(1)
+        tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        tracker = SequenceTracker()
+        received = 0
+        secs = 0.0
+        for i in range(0, len(sent), 500):
+            for d in sent[i:i + 500]:
+                tx.sendto(d, rx.getsockname())
+
+            start = time.perf_counter()
+            for d in sent[i:i + 500]:
+                if receive(rx, tracker):
+                    received += 1
+            secs += time.perf_counter() - start
+
+        rx.close()
+        tx.close()
+        print(f"{name:>36}:  {received / secs:.0f} packets/sec ({secs / received * 1e6:.2f}us per packet)")
+        print(f"{'':>36}   {tracker.summary()}")
+
+    def old(sock, tracker):
+        data = sock.recv(4096)
+        rtp = decoders.parse_RTP(data)
+        tracker.update(rtp["ssrc"], rtp["sequence_number"])
+        return rtp
+
+    def oldax25(sock, tracker):
+        rtp = old(sock, tracker)
+        return decoders.parse_ax25(rtp["payload"])
+
+    buffer = bytearray(65536)
+    view = memoryview(buffer)
+    def new(sock, tracker):
+        n = sock.recv_into(buffer)
+        header = decoders.parse_RTP_header(view[:n])
+        tracker.update(header[3], header[1])
+        return header
+
+    def newax25(sock, tracker):
+        n = sock.recv_into(buffer)
+        return decoders.parse_RTP_AX25(view[:n], tracker)
+
+    print(f"{len(sent)} RTP datagrams on {len(ssrcs)} frequencies ({count - len(sent)} dropped)")
+    run("recv + parse_RTP", old)
+    run("recv_into + parse_RTP_header", new)
+    run("recv + parse_RTP + parse_ax25", oldax25)
+    run("recv_into + parse_RTP_AX25", newax25)
+
+
+if __name__ == "__main__":
+    main()
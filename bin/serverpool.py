@@ -0,0 +1,662 @@
+##################################################
+#    This file is part of the HABTracker project for tracking high altitude balloons.
+#
+#    Copyright (C) 2019,2020,2021 Jeff Deaton (N6BA)
+#
+#    HABTracker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    HABTracker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with HABTracker.  If not, see <https://www.gnu.org/licenses/>.
+#
+##################################################
+
+##################################################
+# Upstream server failover for the APRS-IS and CWOP connections.
+#
+# A ServerPool holds an ordered list of servers (most preferred first).  Connecting tries them in parallel:  the first is tried right
+# away and each of the others is started stagger seconds later (or as soon as an earlier one fails), and the first to finish its login
+# wins.  A dead or unreachable server then costs a quarter second instead of a full timeout.  Servers that fail are held down for a
+# while (doubling with each failure in a row) and servers with a poor health score are tried after the healthy ones.
+#
+# Where it's allowed (read-only connections) a standby connection is kept logged in to another server, so when the connection in use
+# drops the stream can switch over to it without waiting on a connect or a login.
+#
+# The time spent offline after losing each server (until the stream was connected again) is measured, along with the time connected.
+##################################################
+
+import sys
+import time
+import socket
+import select
+import logging
+import threading as th
+import multiprocessing as mp
+from queue import Queue, Empty
+from dataclasses import dataclass
+from logging.handlers import QueueHandler
+
+
+# the default APRS-IS port (for the user defined filter)
+APRSIS_PORT = 14580
+
+
+##################################################
+# Split a comma separated list of servers (ex. "noam.aprs2.net, rotate.aprs2.net:14580") into a list of (hostname, port) tuples.
+# Servers without a port get the default port.
+##################################################
+def parseServers(spec, portnum: int = APRSIS_PORT)->list:
+
+    if isinstance(spec, str):
+        spec = spec.split(",")
+
+    servers = []
+    for s in spec:
+        s = s.strip()
+        if not s:
+            continue
+
+        # a port is only split off if what's left isn't an IPv6 address
+        hostname, sep, port = s.rpartition(":")
+        if sep and port.isdigit() and ":" not in hostname:
+            servers.append((hostname.strip("[]"), int(port)))
+        else:
+            servers.append((s.strip("[]"), portnum))
+
+    return servers
+
+
+#####################################
+# The ServerHealth Class
+#
+# The connection history for one server in a pool.  The health score is an exponentially weighted average of how connection attempts
+# turned out (1 for a login, 0 for a failure or a connection that dropped within minsession seconds).  Each failure in a row holds the
+# server down twice as long as the last one.
+#####################################
+@dataclass
+class ServerHealth(object):
+
+    # the Server (anything with hostname, portnum, and nickname attributes)
+    server: object = None
+
+    # its position in the configured list (0 is the most preferred)
+    order: int = 0
+
+    # the weight of the latest attempt in the health score
+    alpha: float = 0.3
+
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        self.health = 1.0
+
+        # average time (in seconds) to connect and log in
+        self.latency = None
+
+        self.attempts = 0
+        self.connects = 0
+        self.failures = 0
+        self.consecutive = 0
+        self.lasterror = None
+
+        # not tried again before this time (time.monotonic())
+        self.helduntil = 0.0
+
+        # when the current connection to this server started (None if we're not connected to it), and the time spent connected
+        self.connected = None
+        self.uptime = 0.0
+
+        # the number of times losing this server left us offline, and the total time offline until we were connected again
+        self.outages = 0
+        self.downtime = 0.0
+
+
+    ################################
+    # a connection attempt that logged in after latency seconds
+    ################################
+    def succeeded(self, latency: float)->None:
+
+        self.attempts += 1
+        self.connects += 1
+        self.consecutive = 0
+        self.helduntil = 0.0
+        self.health += self.alpha * (1.0 - self.health)
+        self.latency = latency if self.latency is None else self.latency + self.alpha * (latency - self.latency)
+
+
+    ################################
+    # a connection attempt (or a connection) that failed.  The server is held down for holddown seconds, doubled for each failure
+    # in a row, up to maxhold.
+    ################################
+    def failed(self, error, now: float, holddown: float, maxhold: float)->None:
+
+        self.attempts += 1
+        self.failures += 1
+        self.consecutive += 1
+        self.lasterror = str(error)
+        self.health -= self.alpha * self.health
+        self.helduntil = now + min(holddown * 2 ** (self.consecutive - 1), maxhold)
+
+
+    ################################
+    # the time connected, including the current connection
+    ################################
+    def uptimeAt(self, now: float)->float:
+        return self.uptime + (now - self.connected if self.connected is not None else 0.0)
+
+
+
+#####################################
+# The ServerPool Class
+#
+# The ordered list of servers for a stream along with their health, the parallel connect, and the standby connection.  The pool doesn't
+# know anything about the protocol:  connecting to a server is done by an opener function, opener(server, timeout), that connects and
+# logs in (within timeout seconds) and returns a tuple of (socket, FrameBuffer), or raises an exception if it couldn't.
+#####################################
+@dataclass
+class ServerPool(object):
+
+    # the servers, most preferred first
+    servers: list = None
+
+    # the most time (in seconds) a connection attempt (connect and log in) can take
+    timeout: float = 10.0
+
+    # the time (in seconds) between starting the parallel attempts
+    stagger: float = 0.25
+
+    # how long a failed server is held down (doubled for each failure in a row), and the most it's held down
+    holddown: float = 1.0
+    maxhold: float = 30.0
+
+    # a connection shorter than this many seconds counts against the server's health
+    minsession: float = 30.0
+
+    # a standby connection that's heard nothing (not even a keepalive) for this many seconds is replaced
+    idletimeout: float = 60.0
+
+    # servers with a health score under this are tried after the healthy ones
+    unhealthy: float = 0.5
+
+    # for logging
+    name: str = "APRS-IS"
+    loggingqueue: mp.Queue = None
+
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        # setup logging
+        self.logger = logging.getLogger(f"{__name__}.{__class__}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+
+        # check if a logging queue was supplied
+        if self.loggingqueue is not None:
+            handler = QueueHandler(self.loggingqueue)
+            self.logger.addHandler(handler)
+
+        self.health = [ServerHealth(server = s, order = i) for i, s in enumerate(self.servers or [])]
+        self.lock = th.Lock()
+
+        # the server we're connected to (its ServerHealth), and when and from which server the current outage started
+        self.active = None
+        self.offlinesince = None
+        self.lost = None
+
+        # the time offline, in total and waiting on the first connection
+        self.offline = 0.0
+        self.startup = None
+        self.created = time.monotonic()
+
+        # the standby connection:  (ServerHealth, (socket, FrameBuffer), when it was last heard from), and the thread keeping it
+        self.standby = None
+        self.standbythread = None
+        self.failovers = 0
+
+
+    ################################
+    # the ServerHealth for a server
+    ################################
+    def find(self, server)->ServerHealth:
+
+        for h in self.health:
+            if h.server is server:
+                return h
+
+        return None
+
+
+    ################################
+    # the servers that aren't held down, healthy ones first and then in the configured order
+    ################################
+    def available(self, now: float = None)->list:
+
+        if now is None:
+            now = time.monotonic()
+
+        with self.lock:
+            return sorted((h for h in self.health if h.helduntil <= now), key = lambda h: (h.health < self.unhealthy, h.order))
+
+
+    ################################
+    # the number of seconds until a server is available again (0 if one is now)
+    ################################
+    def retryDelay(self, now: float = None)->float:
+
+        if now is None:
+            now = time.monotonic()
+
+        with self.lock:
+            if not self.health:
+                return self.maxhold
+            return max(min(h.helduntil for h in self.health) - now, 0.0)
+
+
+    ################################
+    # record a failed attempt
+    ################################
+    def failed(self, h: ServerHealth, error, now: float = None)->None:
+
+        if now is None:
+            now = time.monotonic()
+
+        with self.lock:
+            h.failed(error, now, self.holddown, self.maxhold)
+            held = h.helduntil - now
+
+        self.logger.info(f"{self.name} {h.server.hostname}:{h.server.portnum} failed ({error}), holding it down for {held:.0f}s")
+
+
+    ################################
+    # connect to the best available server, trying them in parallel.  Returns a tuple of (server, socket, FrameBuffer), or None if
+    # none of them could be connected to.
+    ################################
+    def connect(self, opener, stopevent = None)->tuple:
+
+        winner = self.race(opener, self.available(), stopevent)
+        if winner is None:
+            return None
+
+        h, conn = winner
+        self.up(h)
+
+        return (h.server, conn[0], conn[1])
+
+
+    ################################
+    # try connecting to each of the candidates (a list of ServerHealth), starting them stagger seconds apart.  Returns a tuple of
+    # (ServerHealth, (socket, FrameBuffer)) for the first to log in, or None if they all failed (or the stopevent was set).
+    ################################
+    def race(self, opener, candidates: list, stopevent = None)->tuple:
+
+        candidates = list(candidates)
+        results = Queue()
+
+        def attempt(h):
+            start = time.monotonic()
+            try:
+                conn = opener(h.server, self.timeout)
+            except Exception as e:
+                results.put((h, None, e, time.monotonic() - start))
+            else:
+                results.put((h, conn, None, time.monotonic() - start))
+
+        pending = 0
+        winner = None
+        nextstart = time.monotonic()
+
+        while winner is None and (candidates or pending):
+
+            if stopevent is not None and stopevent.is_set():
+                break
+
+            # start the next attempt if nothing's in flight, or the last one has had stagger seconds to finish
+            now = time.monotonic()
+            if candidates and (pending == 0 or now >= nextstart):
+                h = candidates.pop(0)
+                th.Thread(name = f"{self.name} connect {h.server.hostname}", target = attempt, args = (h,), daemon = True).start()
+                pending += 1
+                nextstart = now + self.stagger
+                continue
+
+            try:
+                h, conn, error, secs = results.get(timeout = min(max(nextstart - now, 0.01), 0.5) if candidates else 0.5)
+            except Empty:
+                continue
+
+            pending -= 1
+            if conn is None:
+                self.failed(h, error)
+
+                # don't wait out the stagger, go on to the next server now
+                nextstart = time.monotonic()
+            else:
+                with self.lock:
+                    h.succeeded(secs)
+                winner = (h, conn)
+
+        # close the connections that finish after the winner (or after we've given up)
+        if pending:
+            th.Thread(name = f"{self.name} connect cleanup", target = self.discard, args = (results, pending), daemon = True).start()
+
+        return winner
+
+
+    ################################
+    # wait for the rest of the parallel attempts to finish, recording how they went and closing their connections
+    ################################
+    def discard(self, results: Queue, pending: int)->None:
+
+        for i in range(pending):
+            try:
+                h, conn, error, secs = results.get(timeout = self.timeout + 5)
+            except Empty:
+                return
+
+            if conn is None:
+                self.failed(h, error)
+            else:
+                with self.lock:
+                    h.succeeded(secs)
+                conn[0].close()
+
+
+    ################################
+    # we're now connected to a server (a ServerHealth), ending the outage (if there was one)
+    ################################
+    def up(self, h: ServerHealth, now: float = None)->None:
+
+        if now is None:
+            now = time.monotonic()
+
+        with self.lock:
+            if self.offlinesince is not None:
+                secs = now - self.offlinesince
+                self.offline += secs
+                if self.lost is not None:
+                    self.lost.outages += 1
+                    self.lost.downtime += secs
+                self.offlinesince = None
+                self.lost = None
+
+            elif self.startup is None:
+                # the first connection
+                self.startup = now - self.created
+                self.offline += self.startup
+
+            h.connected = now
+            self.active = h
+
+
+    ################################
+    # the connection to a server was lost.  The outage lasts until we're connected again (to any server).
+    ################################
+    def down(self, server, reason: str = "connection lost", now: float = None)->None:
+
+        if now is None:
+            now = time.monotonic()
+
+        h = self.find(server)
+        if h is None or h.connected is None:
+            return
+
+        with self.lock:
+            secs = now - h.connected
+            h.uptime += secs
+            h.connected = None
+            if self.active is h:
+                self.active = None
+            self.offlinesince = now
+            self.lost = h
+
+        self.logger.info(f"{self.name} lost {server.hostname}:{server.portnum} after {secs:.0f}s ({reason})")
+        self.logger.info(self.summary())
+
+        # a connection that didn't last counts as a failure
+        if secs < self.minsession:
+            self.failed(h, f"connection only lasted {secs:.1f}s", now)
+
+
+    ################################
+    # start the thread keeping a standby connection logged in, using opener to connect (does nothing if it's already running)
+    ################################
+    def keepStandby(self, opener, stopevent)->None:
+
+        if self.standbythread is None:
+            self.standbythread = th.Thread(name = f"{self.name} standby", target = self.standbyLoop, args = (opener, stopevent), daemon = True)
+            self.standbythread.start()
+
+
+    ################################
+    # take the standby connection to switch over to it.  Returns a tuple of (server, socket, FrameBuffer), or None if there isn't one.
+    ################################
+    def takeStandby(self)->tuple:
+
+        with self.lock:
+            standby = self.standby
+            self.standby = None
+
+        if standby is None:
+            return None
+
+        h, conn, heard = standby
+        self.failovers += 1
+        self.up(h)
+
+        return (h.server, conn[0], conn[1])
+
+
+    ################################
+    # the thread keeping a standby connection logged in to the best server we're not using
+    ################################
+    def standbyLoop(self, opener, stopevent)->None:
+
+        while not stopevent.is_set():
+
+            standby = self.standby
+
+            if standby is None:
+                # only while we're connected, preferring the servers other than the one in use (if there are any)
+                if self.active is None:
+                    stopevent.wait(0.25)
+                    continue
+
+                candidates = self.available()
+                others = [h for h in candidates if h is not self.active]
+                winner = self.race(opener, others or candidates, stopevent)
+                if winner is None:
+                    stopevent.wait(max(self.retryDelay(), 0.25))
+                    continue
+
+                h, conn = winner
+                with self.lock:
+                    self.standby = (h, conn, time.monotonic())
+
+                self.logger.info(f"{self.name} standby connection to {h.server.hostname}:{h.server.portnum} ready")
+                continue
+
+            # Keep the standby connection drained (it only gets the server's keepalives, it has no filter) and make sure it's alive
+            h, conn, heard = standby
+            sock = conn[0]
+            try:
+                readable = select.select([sock], [], [], 1)[0]
+            except (OSError, ValueError):
+                readable = True
+
+            with self.lock:
+                # it was taken while we were waiting
+                if self.standby is not standby:
+                    continue
+
+                error = None
+                now = time.monotonic()
+                if readable:
+                    try:
+                        sock.setblocking(False)
+                        if sock.recv(4096):
+                            self.standby = (h, conn, now)
+                        else:
+                            error = "closed by the server"
+                    except (BlockingIOError, InterruptedError):
+                        pass
+                    except (OSError, ValueError) as e:
+                        error = e
+
+                elif now - heard > self.idletimeout:
+                    error = f"nothing heard for {now - heard:.0f}s"
+
+                if error is not None:
+                    self.standby = None
+
+            if error is not None:
+                sock.close()
+                self.failed(h, f"standby connection {error}")
+
+        # shutting down
+        with self.lock:
+            standby = self.standby
+            self.standby = None
+        if standby is not None:
+            standby[1][0].close()
+
+
+    ################################
+    # the statistics for each server
+    ################################
+    def stats(self, now: float = None)->list:
+
+        if now is None:
+            now = time.monotonic()
+
+        with self.lock:
+            return [{ "server" : f"{h.server.hostname}:{h.server.portnum}", "order" : h.order, "health" : h.health, "latency" : h.latency,
+                "attempts" : h.attempts, "connects" : h.connects, "failures" : h.failures, "uptime" : h.uptimeAt(now),
+                "outages" : h.outages, "downtime" : h.downtime, "lasterror" : h.lasterror, "active" : h is self.active,
+                "standby" : self.standby is not None and self.standby[0] is h } for h in self.health]
+
+
+    ################################
+    # a one line summary
+    ################################
+    def summary(self)->str:
+
+        parts = []
+        for s in self.stats():
+            latency = f"{s['latency'] * 1000:.0f}ms" if s["latency"] is not None else "n/a"
+            role = " (active)" if s["active"] else " (standby)" if s["standby"] else ""
+            parts.append(f"{s['server']}{role} health {s['health']:.2f}, login {latency}, up {s['uptime']:.0f}s, {s['outages']} outages {s['downtime']:.1f}s down, {s['failures']} failures")
+
+        return f"{self.name} servers:  " + "; ".join(parts)
+
+
+
+##################################################
+# main
+#
+# Fail over between local APRS-IS style servers:  the first accepts connections but never sends a banner (a server that's hung, or a
+# link that's dropping everything), the others log us in.  Each time, the server in use goes down and we measure how long it takes to
+# be connected again:  trying the servers one at a time, in parallel, and in parallel with a standby connection.
+##################################################
+def main():
+
+    from framebuffer import FrameBuffer
+
+    drops = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+    class FakeServer(object):
+        def __init__(self, hostname, portnum, nickname):
+            self.hostname, self.portnum, self.nickname = hostname, portnum, nickname
+
+    # a listener that never accepts:  the connect works, but no banner is ever sent
+    hung = socket.socket()
+    hung.bind(("127.0.0.1", 0))
+    hung.listen(64)
+
+    # a working server, until it's killed
+    def serve(listener, clients):
+        while True:
+            try:
+                conn, addr = listener.accept()
+                conn.sendall(b"# aprsc 2.1.14\r\n")
+                conn.recv(1024)
+                conn.sendall(b"# logresp N0CALL unverified, server T2TEST\r\n")
+                clients.append(conn)
+            except OSError:
+                return
+
+    def opener(server, timeout):
+        sock = socket.create_connection((server.hostname, server.portnum), timeout = timeout)
+        fb = FrameBuffer(b"\r\n")
+        deadline = time.monotonic() + timeout
+        try:
+            for banner in range(2):
+                while fb.next() is None:
+                    if not select.select([sock], [], [], max(deadline - time.monotonic(), 0))[0]:
+                        raise TimeoutError("no banner")
+                    if fb.recv_into(sock) == 0:
+                        raise ConnectionError("closed during login")
+                if banner == 0:
+                    sock.sendall(b"user N0CALL pass -1 vers test 1.0\r\n")
+        except OSError:
+            sock.close()
+            raise
+        return (sock, fb)
+
+    logging.getLogger(f"{__name__}.{ServerPool}").addHandler(logging.StreamHandler(sys.stdout))
+
+    for name, stagger, standby in (("one at a time", 3.0, False), ("in parallel", 0.25, False), ("in parallel with a standby", 0.25, True)):
+        print(f"servers tried {name}")
+
+        listeners = {}
+        servers = [FakeServer("127.0.0.1", hung.getsockname()[1], "hung")]
+        for i in range(drops + 1):
+            listener = socket.socket()
+            listener.bind(("127.0.0.1", 0))
+            listener.listen(16)
+            clients = []
+            th.Thread(target = serve, args = (listener, clients), daemon = True).start()
+            listeners[listener.getsockname()[1]] = (listener, clients)
+            servers.append(FakeServer("127.0.0.1", listener.getsockname()[1], f"server{i}"))
+
+        stopevent = th.Event()
+        pool = ServerPool(servers = servers, timeout = 3.0, stagger = stagger, minsession = 0.0)
+        if standby:
+            pool.keepStandby(opener, stopevent)
+
+        times = []
+        for d in range(drops + 1):
+            start = time.monotonic()
+            server, sock, fb = pool.takeStandby() or pool.connect(opener, stopevent)
+            times.append(time.monotonic() - start)
+
+            # give the standby a moment to log in, then the server goes down
+            time.sleep(1.0)
+            listener, clients = listeners[server.portnum]
+            listener.shutdown(socket.SHUT_RDWR)
+            listener.close()
+            for conn in clients:
+                conn.close()
+            sock.close()
+            pool.down(server, "server went down")
+
+        stopevent.set()
+        print(f"time to connect:  first {times[0] * 1000:.0f}ms, then " + ", ".join(f"{t * 1000:.0f}ms" for t in times[1:]))
+        print(pool.summary())
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+##################################################
+#    This file is part of the HABTracker project for tracking high altitude balloons.
+#
+#    Copyright (C) 2019,2020,2021 Jeff Deaton (N6BA)
+#
+#    HABTracker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    HABTracker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with HABTracker.  If not, see <https://www.gnu.org/licenses/>.
+#
+##################################################
+
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import struct
+import time
+import zlib
+import sys
+
+
+# Each record starts with a sequence number and a CRC32 of its contents, followed by the fixed layout of the record itself.  The
+# sequence number is odd while the record is being written.
+RECORD_HEADER = struct.Struct("=QI4x")
+
+# The GPS fix:  mode, latitude, longitude, altitude (feet), bearing, speed (mph), the UTC time and status strings from the GPS poller,
+# and when the fix was written (seconds since the epoch).
+POSITION = struct.Struct("=i4x5d32s16sd")
+POSITION_KEYS = ("mode", "lat", "lon", "altitude", "bearing", "speed_mph")
+
+# The APRS-IS feed:  the range filter radius (km) and the configured (largest) radius, the accepted packets/sec, the database queue
+# depth and maxsize, the packets it dropped since the last adjustment (see radiuscontroller.py), and when it was written.
+FEED = struct.Struct("=2qd3qd")
+FEED_KEYS = ("radius", "maxradius", "rate", "depth", "maxdepth", "dropped", "updated")
+
+# a callsign slot in the active beacons record
+CALLSIGN_LEN = 16
+
+# how many times a reader retries a record that's being written before settling for the last copy it read
+READ_RETRIES = 100
+
+
+#####################################
+# The SeqRecord Class
+#
+# A fixed layout record in shared memory protected by a seqlock.  There's a single writer for each record, which bumps the sequence
+# number to odd, writes the record, then bumps it back to even.  Readers never wait on the writer:  a reader copies the record, and
+# if the sequence number was odd or changed while it was copying (or the CRC doesn't match, in case a write wasn't seen in order)
+# it tries again.  A reader that can't get a clean copy after READ_RETRIES tries (ex. the writer died part way through a write)
+# gets the last copy it read instead.
+#####################################
+class SeqRecord(object):
+
+    def __init__(self, buf: memoryview, offset: int, layout: struct.Struct)->None:
+
+        self.buf = buf
+        self.offset = offset
+        self.layout = layout
+        self.start = offset + RECORD_HEADER.size
+        self.end = self.start + layout.size
+
+        # this process's last clean copy of the record (None until one's been read)
+        self.last = None
+        self.lastseq = None
+
+
+    ################################
+    # the number of bytes used in the shared memory block
+    ################################
+    @property
+    def size(self)->int:
+        return RECORD_HEADER.size + self.layout.size
+
+
+    ################################
+    # write the record (only ever called by the record's one writer)
+    ################################
+    def write(self, *values)->None:
+
+        data = self.layout.pack(*values)
+        seq = RECORD_HEADER.unpack_from(self.buf, self.offset)[0]
+
+        RECORD_HEADER.pack_into(self.buf, self.offset, seq + 1, 0)
+        self.buf[self.start:self.end] = data
+        RECORD_HEADER.pack_into(self.buf, self.offset, seq + 2, zlib.crc32(data))
+
+
+    ################################
+    # read the record.  Returns the tuple of values, or None if it's never been written.
+    ################################
+    def read(self)->tuple:
+
+        buf = self.buf
+        offset = self.offset
+
+        for i in range(READ_RETRIES):
+            seq, crc = RECORD_HEADER.unpack_from(buf, offset)
+
+            # nothing new since the last read
+            if seq == self.lastseq:
+                return self.last
+
+            if seq & 1:
+                continue
+
+            data = bytes(buf[self.start:self.end])
+            if RECORD_HEADER.unpack_from(buf, offset)[0] != seq or zlib.crc32(data) != crc:
+                continue
+
+            # never written
+            if seq == 0:
+                return None
+
+            self.last = self.layout.unpack(data)
+            self.lastseq = seq
+            return self.last
+
+        return self.last
+
+
+    ################################
+    # the number of times the record has been written
+    ################################
+    def writes(self)->int:
+        return RECORD_HEADER.unpack_from(self.buf, self.offset)[0] // 2
+
+
+
+#####################################
+# The StateBus Class
+#
+# The state shared between processes:  the GPS fix (written by the GPS poller), and the callsigns of the beacons on active flights and
+# their predicted landing locations (written by the landing predictor).  These used to be multiprocessing.Manager dictionaries, where
+# every read was a round trip to the manager's process.  Here they're seqlock protected records in a shared memory block, so a read is
+# a copy out of shared memory and readers never block.
+#
+# The StateBus must be created before the processes using it are started (it's inherited through fork).  The process that created it
+# should call unlink() once everything is done with it.
+#####################################
+class StateBus(object):
+
+    def __init__(self, maxbeacons: int = 64, maxlandings: int = 64)->None:
+
+        self.maxbeacons = maxbeacons
+        self.maxlandings = maxlandings
+
+        # active beacons:  the count, then a slot for each callsign.  Landing locations:  the count, then (longitude, latitude) pairs.
+        beacons = struct.Struct(f"=I4x{maxbeacons * CALLSIGN_LEN}s")
+        landings = struct.Struct(f"=I4x{maxlandings * 2}d")
+
+        size = sum(RECORD_HEADER.size + s.size for s in (POSITION, beacons, landings, FEED))
+        self.shm = shared_memory.SharedMemory(create = True, size = size)
+        self.buf = self.shm.buf
+        self.buf[:size] = bytes(size)
+
+        self.position = SeqRecord(self.buf, 0, POSITION)
+        self.beacons = SeqRecord(self.buf, self.position.offset + self.position.size, beacons)
+        self.landings = SeqRecord(self.buf, self.beacons.offset + self.beacons.size, landings)
+        self.feed = SeqRecord(self.buf, self.landings.offset + self.landings.size, FEED)
+
+
+    ################################
+    # the name of the shared memory block
+    ################################
+    @property
+    def name(self)->str:
+        return self.shm.name
+
+
+    ################################
+    # publish the GPS fix from a GPS poller status dictionary
+    ################################
+    def setPosition(self, gpsdata: dict)->None:
+
+        self.position.write(int(gpsdata["mode"]), *(float(gpsdata[k]) for k in POSITION_KEYS[1:]),
+                str(gpsdata.get("utc_time", "n/a")).encode()[:32], str(gpsdata.get("status", "")).encode()[:16], time.time())
+
+
+    ################################
+    # the latest GPS fix as a dictionary with the same keys as the GPS poller's status (mode, lat, lon, altitude, bearing, speed_mph,
+    # utc_time, status) plus when it was written (updated).  None if there hasn't been one.
+    ################################
+    def getPosition(self)->dict:
+
+        values = self.position.read()
+        if values is None:
+            return None
+
+        position = dict(zip(POSITION_KEYS, values))
+        position["utc_time"] = values[6].rstrip(b"\0").decode(errors = "ignore")
+        position["status"] = values[7].rstrip(b"\0").decode(errors = "ignore")
+        position["updated"] = values[8]
+
+        return position
+
+
+    ################################
+    # publish the callsigns of the beacons on active flights (any more than maxbeacons are left off)
+    ################################
+    def setBeacons(self, callsigns: list)->None:
+
+        callsigns = [str(c).encode()[:CALLSIGN_LEN] for c in callsigns][:self.maxbeacons]
+        self.beacons.write(len(callsigns), b"".join(c.ljust(CALLSIGN_LEN, b"\0") for c in callsigns))
+
+
+    ################################
+    # the callsigns of the beacons on active flights
+    ################################
+    def getBeacons(self)->list:
+
+        values = self.beacons.read()
+        if values is None:
+            return []
+
+        count, slots = values
+        return [slots[i:i + CALLSIGN_LEN].rstrip(b"\0").decode(errors = "ignore") for i in range(0, count * CALLSIGN_LEN, CALLSIGN_LEN)]
+
+
+    ################################
+    # publish the predicted landing locations, a list of (longitude, latitude) tuples (any more than maxlandings are left off)
+    ################################
+    def setLandings(self, landings: list)->None:
+
+        landings = list(landings)[:self.maxlandings]
+        coords = [float(c) for lon, lat in landings for c in (lon, lat)]
+        self.landings.write(len(landings), *coords, *([0.0] * (2 * self.maxlandings - len(coords))))
+
+
+    ################################
+    # the predicted landing locations, a list of (longitude, latitude) tuples
+    ################################
+    def getLandings(self)->list:
+
+        values = self.landings.read()
+        if values is None:
+            return []
+
+        count = values[0]
+        return [(values[1 + 2 * i], values[2 + 2 * i]) for i in range(count)]
+
+
+    ################################
+    # publish the APRS-IS filter radius and feed load from a RadiusController status dictionary
+    ################################
+    def setFeed(self, status: dict)->None:
+        self.feed.write(*(int(status[k]) if k != "rate" else float(status[k]) for k in FEED_KEYS[:-1]), time.time())
+
+
+    ################################
+    # the APRS-IS filter radius and feed load as a dictionary (radius, maxradius, rate, depth, maxdepth, dropped, updated).  None if it
+    # hasn't been published.
+    ################################
+    def getFeed(self)->dict:
+
+        values = self.feed.read()
+        if values is None:
+            return None
+
+        return dict(zip(FEED_KEYS, values))
+
+
+    ################################
+    # free the shared memory.  Only the process that created the StateBus should call this.
+    ################################
+    def unlink(self)->None:
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+
+##################################################
+# main
+#
+# Read latency of the StateBus against a Manager dictionary, with a writer process updating the GPS fix as fast as it can (to show
+# reads aren't held up by writes and never see a torn fix).
+##################################################
+def main():
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    fix = { "utc_time" : "2023-10-14 18:01:02", "mode" : 3, "host" : "localhost", "status" : "normal", "devicepath" : "/dev/ttyACM0",
+            "lat" : 39.739281, "lon" : -104.984894, "satellites" : [], "bearing" : 270.0, "speed_mph" : 45.5, "altitude" : 5280.0, "error" : "n/a" }
+
+    manager = mp.Manager()
+    position = manager.dict()
+    position["gpsdata"] = fix
+    activebeacons = manager.dict()
+    activebeacons["callsigns"] = ["KC0D-1", "KC0D-2", "AE0SS-11"]
+
+    bus = StateBus()
+    bus.setPosition(fix)
+    bus.setBeacons(["KC0D-1", "KC0D-2", "AE0SS-11"])
+    bus.setLandings([(-104.1, 39.5), (-103.2, 40.1)])
+
+    def timeit(name, f, n):
+        start = time.perf_counter()
+        for i in range(n):
+            f()
+        secs = (time.perf_counter() - start) / n
+        print(f"{name:>40}:  {secs * 1e6:.2f}us")
+        return secs
+
+    print("reads with nothing writing")
+    timeit("Manager position['gpsdata']", lambda: position["gpsdata"], count // 10)
+    timeit("StateBus getPosition()", bus.getPosition, count)
+    timeit("Manager activebeacons.get('callsigns')", lambda: activebeacons.get("callsigns", []), count // 10)
+    timeit("StateBus getBeacons()", bus.getBeacons, count)
+    timeit("Manager position['gpsdata'] = fix", lambda: position.__setitem__("gpsdata", fix), count // 10)
+    timeit("StateBus setPosition(fix)", lambda: bus.setPosition(fix), count)
+
+    # a writer process publishing a new fix as fast as it can.  Each fix has lat = lon + 144 so a torn read would show.
+    stop = mp.Event()
+    def writer():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            bus.setPosition({ "mode" : 3, "lat" : i * 1e-6, "lon" : i * 1e-6 - 144, "altitude" : 0, "bearing" : 0, "speed_mph" : 0 })
+
+    w = mp.Process(target = writer, daemon = True)
+    w.start()
+    time.sleep(0.2)
+
+    print("reads while another process writes the GPS fix continuously")
+    torn = 0
+    start = time.perf_counter()
+    for i in range(count):
+        p = bus.getPosition()
+        if abs(p["lat"] - p["lon"] - 144) > 1e-6:
+            torn += 1
+    secs = (time.perf_counter() - start) / count
+    stop.set()
+    w.join()
+    print(f"{'StateBus getPosition()':>40}:  {secs * 1e6:.2f}us, {torn} torn reads, {bus.position.writes()} writes")
+
+    manager.shutdown()
+    bus.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -149,11 +149,9 @@ class SubProcess:
             while nofix == True and trycount < 2:
                 
                 # This retreives the latest GPS data (assuming GPS Poller process is running)
-                g = self.configuration["position"]
-
-                if "gpsdata" in g: 
-                    position = g["gpsdata"]
+                position = self.configuration["statebus"].getPosition() if "statebus" in self.configuration else None
 
+                if position: 
                     if "mode"  in position:
                         mode = int(position["mode"])
 
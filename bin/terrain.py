@@ -0,0 +1,286 @@
+##################################################
+#    This file is part of the HABTracker project for tracking high altitude balloons.
+#
+#    Copyright (C) 2019,2020,2021 Jeff Deaton (N6BA)
+#
+#    HABTracker is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    HABTracker is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with HABTracker.  If not, see <https://www.gnu.org/licenses/>.
+#
+##################################################
+
+import os
+import math
+import time
+import sys
+import numpy as np
+import logging
+import multiprocessing as mp
+from collections import OrderedDict
+from dataclasses import dataclass
+from logging.handlers import QueueHandler
+
+
+#####################################
+# The Terrain Class
+#
+# This answers "what is the ground elevation here" from local DEM tiles in the SRTM .hgt format.  Each tile covers one degree of
+# latitude and longitude and is named for its southwest corner (ex. N39W105.hgt covers 39N to 40N and 105W to 104W).  A tile is a
+# square grid of big-endian, signed 16bit elevations in meters, with rows running north to south and columns running west to east.
+# SRTM3 tiles are 1201 x 1201 samples and SRTM1 tiles are 3601 x 3601 samples.  Voids (i.e. no data) are marked with -32768.
+#
+# Tiles are memory mapped so that only the pages needed for a lookup are ever read from disk, and only the most recently used
+# tiles are kept open.
+#
+# All elevations returned are in feet.
+#####################################
+@dataclass
+class Terrain(object):
+
+    # The directory holding the .hgt tiles
+    directory: str = "/eosstracker/dem"
+
+    # The maximum number of tiles kept open at once
+    maxtiles: int = 16
+
+    # the logging queue
+    loggingqueue: mp.Queue = None
+
+
+    #####################################
+    # the post init constructor
+    #####################################
+    def __post_init__(self)->None:
+
+        # setup logging
+        self.logger = logging.getLogger(f"{__name__}.{__class__}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+
+        # check if a logging queue was supplied
+        if self.loggingqueue is not None:
+
+            # a queue was supplied so we setup a queuehandler
+            handler = QueueHandler(self.loggingqueue)
+            self.logger.addHandler(handler)
+
+        # The open tiles, most recently used last.  Tiles that don't exist are remembered as None so we don't keep looking for them.
+        self.tiles = OrderedDict()
+
+        # Counts of tile lookups that were already open (hits) vs. opened from disk (misses)
+        self.tilestats = { "hits" : 0, "misses" : 0 }
+
+        # The tile names available in the directory
+        self.available = set()
+        if self.directory and os.path.isdir(self.directory):
+            self.available = set(f[:-4].upper() for f in os.listdir(self.directory) if f.lower().endswith(".hgt"))
+
+        self.logger.debug(f"Terrain instance created.  Tiles available in {self.directory}: {len(self.available)}")
+
+
+    ################################
+    # return true if there are any DEM tiles to use
+    ################################
+    def hasTiles(self):
+        return len(self.available) > 0
+
+
+    ################################
+    # the name of the tile holding this lat/lon (ex. N39W105)
+    ################################
+    @staticmethod
+    def tileName(lat_floor, lon_floor):
+        return "%s%02d%s%03d" % ("N" if lat_floor >= 0 else "S", abs(lat_floor), "E" if lon_floor >= 0 else "W", abs(lon_floor))
+
+
+    ################################
+    # return the memory mapped grid for a tile, opening it if needed.  Returns None if there isn't a tile for this location.
+    ################################
+    def getTile(self, lat_floor, lon_floor):
+
+        key = (lat_floor, lon_floor)
+
+        if key in self.tiles:
+            self.tilestats["hits"] += 1
+            self.tiles.move_to_end(key)
+            return self.tiles[key]
+
+        self.tilestats["misses"] += 1
+
+        grid = None
+        name = self.tileName(lat_floor, lon_floor)
+        if name in self.available:
+
+            # The tile file could be named with either case
+            filename = os.path.join(self.directory, name + ".hgt")
+            if not os.path.isfile(filename):
+                filename = os.path.join(self.directory, name.lower() + ".hgt")
+
+            try:
+                # The grid is square so the number of samples per side comes from the file size
+                samples = int(math.sqrt(os.path.getsize(filename) / 2))
+                if samples < 2 or samples * samples * 2 != os.path.getsize(filename):
+                    self.logger.warning(f"DEM tile {filename} isn't a square grid of 16bit samples, skipping.")
+                else:
+                    grid = np.memmap(filename, dtype='>i2', mode='r', shape=(samples, samples))
+                    self.logger.debug(f"Opened DEM tile {filename}, {samples}x{samples}")
+
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Unable to open DEM tile {filename}: {e}")
+
+        self.tiles[key] = grid
+
+        # Close the least recently used tiles
+        while len(self.tiles) > self.maxtiles:
+            self.tiles.popitem(last = False)
+
+        return grid
+
+
+    ################################
+    # return the ground elevation (in feet) for arrays of lats and lons.  Locations without DEM coverage are returned as NaN.
+    ################################
+    def elevations(self, lats, lons):
+
+        lats = np.asarray(lats, dtype='float64')
+        lons = np.asarray(lons, dtype='float64')
+        elevs = np.full(lats.shape, np.nan)
+
+        lat_floors = np.floor(lats)
+        lon_floors = np.floor(lons)
+
+        # Group the points by the tile they fall within.  A path almost always stays within one or two tiles.
+        tilekeys = np.stack((lat_floors, lon_floors), axis = -1).reshape(-1, 2)
+        for lat_floor, lon_floor in np.unique(tilekeys[np.all(np.isfinite(tilekeys), axis = 1)], axis = 0):
+
+            grid = self.getTile(int(lat_floor), int(lon_floor))
+            if grid is None:
+                continue
+
+            mask = (lat_floors == lat_floor) & (lon_floors == lon_floor)
+            last = grid.shape[0] - 1
+
+            # Fractional row (from the north edge) and column (from the west edge) within the grid
+            row = (lat_floor + 1 - lats[mask]) * last
+            col = (lons[mask] - lon_floor) * last
+            r0 = np.clip(np.floor(row).astype(int), 0, last - 1)
+            c0 = np.clip(np.floor(col).astype(int), 0, last - 1)
+            dr = row - r0
+            dc = col - c0
+
+            # Bilinear interpolation between the four surrounding samples
+            z00 = grid[r0, c0].astype('float64')
+            z01 = grid[r0, c0 + 1].astype('float64')
+            z10 = grid[r0 + 1, c0].astype('float64')
+            z11 = grid[r0 + 1, c0 + 1].astype('float64')
+            z = z00 * (1 - dr) * (1 - dc) + z01 * (1 - dr) * dc + z10 * dr * (1 - dc) + z11 * dr * dc
+
+            # Any void among the surrounding samples leaves this point unknown
+            void = (z00 == -32768) | (z01 == -32768) | (z10 == -32768) | (z11 == -32768)
+            z[void] = np.nan
+
+            # Convert from meters to feet
+            elevs[mask] = z * 3.28084
+
+        return elevs
+
+
+    ################################
+    # return the ground elevation (in feet) at a single lat/lon, or None if there isn't DEM coverage
+    ################################
+    def elevation(self, lat, lon):
+
+        elev = self.elevations([lat], [lon])[0]
+
+        return None if np.isnan(elev) else float(elev)
+
+
+    ################################
+    # Clip a predicted flight path where it first meets the ground
+    #
+    # Arguments:
+    #    path:  (array) rows of latitude, longitude, ttl, altitude running from the flight's latest position down to the prediction floor
+    #
+    # Returns the path up to and including the point where it meets the ground, or None if the path never meets the ground or there
+    # isn't DEM coverage along the path.
+    ################################
+    def clipPath(self, path):
+
+        path = np.asarray(path, dtype='float64')
+        if path.shape[0] < 2:
+            return None
+
+        # How far above the ground each point along the path is
+        ground = self.elevations(path[:,0], path[:,1])
+        above = path[:,3] - ground
+
+        # The first point at or below ground level
+        below = np.nonzero(above <= 0)[0]
+        if below.shape[0] == 0:
+            return None
+
+        i = below[0]
+
+        # Already at or below the ground at the latest position
+        if i == 0:
+            clipped = path[0:1].copy()
+            clipped[:,2] = 0
+            return clipped
+
+        # No DEM coverage just before the ground was reached
+        if np.isnan(above[i-1]):
+            return None
+
+        # Interpolate between the last point above the ground and the first point below it for where the path crosses the ground
+        f = above[i-1] / (above[i-1] - above[i])
+        touchdown = path[i-1] + f * (path[i] - path[i-1])
+        touchdown[3] = ground[i-1] + f * (ground[i] - ground[i-1])
+        clipped = np.vstack((path[:i], touchdown))
+
+        # The time to live at each point now counts down to the touchdown instead of to the prediction floor
+        clipped[:,2] -= touchdown[2]
+
+        return clipped
+
+
+
+##################################################
+# main
+##################################################
+def main():
+
+    if len(sys.argv) < 4:
+        print(f"Usage:  {sys.argv[0]} <dem directory> <latitude> <longitude>")
+        sys.exit(1)
+
+    terrain = Terrain(directory = sys.argv[1])
+    lat = float(sys.argv[2])
+    lon = float(sys.argv[3])
+
+    elev = terrain.elevation(lat, lon)
+    if elev is None:
+        print(f"No DEM coverage at {lat}, {lon}")
+        sys.exit(1)
+
+    print(f"Elevation at {lat}, {lon}:  {elev:.0f}ft")
+
+    # Time a batch of lookups around that point
+    lats = lat + (np.random.random(10000) - 0.5) * 0.1
+    lons = lon + (np.random.random(10000) - 0.5) * 0.1
+    start = time.perf_counter()
+    terrain.elevations(lats, lons)
+    elapsed = time.perf_counter() - start
+    print(f"{lats.shape[0]} lookups in {elapsed * 1000:.2f}ms ({elapsed / lats.shape[0] * 1e6:.2f}us per lookup)")
+
+
+if __name__ == "__main__":
+    main()